@@ -0,0 +1,192 @@
+"""
+Lab 1.1 (extension): Selector-based Echo Server
+Same TIME/ECHO commands as tcp_echo_server.py, but one thread serves many
+clients using the `selectors` module (epoll on Linux, kqueue on macOS).
+
+- Non-blocking sockets, one reactor loop
+- Per-connection receive buffer (FrameDecoder) and send buffer (bytearray)
+- Partial sends: unsent bytes stay buffered and EVENT_WRITE is enabled
+- Backpressure: stop reading from a client whose send buffer is too large
+- Half-close: after a client's EOF, buffered responses are still sent;
+  the connection is closed once they are out
+"""
+import os
+import sys
+import socket
+import logging
+import argparse
+import selectors
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.framing import FrameDecoder, FrameError, LINE, MODES
+from common.logpipe import (SampledLogger, setup_logging, add_logging_args,
+                            configure_request_log)
+from tcp_echo_server import build_response
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+request_log = SampledLogger(logger)
+
+MAX_OUTBUF = 1024 * 1024    # Pause reading above 1 MiB of unsent data
+
+
+class Connection:
+    """State for one client: socket, framed input, pending output"""
+    __slots__ = ('sock', 'addr', 'decoder', 'outbuf', 'events', 'eof')
+
+    def __init__(self, sock, addr, framing):
+        self.sock = sock
+        self.addr = addr
+        self.decoder = FrameDecoder(framing)
+        self.outbuf = bytearray()
+        self.events = selectors.EVENT_READ
+        self.eof = False            # Peer shut down its side: no more requests
+
+
+class SelectorEchoServer:
+    def __init__(self, host='localhost', port=9999, framing=LINE, backlog=1024):
+        self.host = host
+        self.port = port
+        self.framing = framing
+        self.backlog = backlog
+        self.selector = selectors.DefaultSelector()
+        self.connections = {}
+        self.total_requests = 0
+
+        self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind((self.host, self.port))
+        self.server_socket.listen(self.backlog)
+        self.server_socket.setblocking(False)
+        self.selector.register(self.server_socket, selectors.EVENT_READ, None)
+
+        logger.info(f"Selector Echo Server listening on {self.host}:{self.port} "
+                    f"({type(self.selector).__name__}, {self.framing} framing)")
+
+    def accept(self):
+        """Accept every pending connection (listen socket is readable)"""
+        while True:
+            try:
+                sock, addr = self.server_socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            sock.setblocking(False)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn = Connection(sock, addr, self.framing)
+            self.connections[sock.fileno()] = conn
+            self.selector.register(sock, conn.events, conn)
+            request_log.info("Client connected from %s:%s (Active: %d)",
+                             addr[0], addr[1], len(self.connections))
+
+    def read(self, conn):
+        """Read what is available, answer every complete frame"""
+        try:
+            n = conn.decoder.recv_into(conn.sock)
+        except (BlockingIOError, InterruptedError):
+            return
+        except ConnectionError:
+            self.close(conn)        # Reset: nobody left to answer
+            return
+        if not n:
+            # Peer closed its side (maybe only that: shutdown(SHUT_WR)). Stop
+            # reading, but send what we owe first; write() closes once it is out
+            conn.eof = True
+            self.write(conn)
+            return
+
+        for frame in conn.decoder.frames():
+            message = str(frame, 'utf-8', 'replace').strip()
+            response = build_response(message)
+            conn.outbuf += conn.decoder.encode(response.encode('utf-8'))
+            self.total_requests += 1
+            request_log.debug("%s: %r -> %r", conn.addr[0], message, response)
+
+        self.write(conn)
+
+    def write(self, conn):
+        """Send as much buffered output as the kernel accepts"""
+        if conn.outbuf:
+            try:
+                sent = conn.sock.send(conn.outbuf)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except ConnectionError:
+                self.close(conn)
+                return
+            del conn.outbuf[:sent]
+        self.update_interest(conn)
+
+    def update_interest(self, conn):
+        """Wait for EVENT_WRITE only while output is pending"""
+        if conn.sock.fileno() not in self.connections:
+            return
+        if conn.eof and not conn.outbuf:
+            self.close(conn)        # Everything owed has been sent
+            return
+        events = 0
+        if len(conn.outbuf) < MAX_OUTBUF and not conn.eof:
+            events |= selectors.EVENT_READ
+        if conn.outbuf:
+            events |= selectors.EVENT_WRITE
+        if events != conn.events:
+            conn.events = events
+            self.selector.modify(conn.sock, events, conn)
+
+    def close(self, conn):
+        fd = conn.sock.fileno()
+        if fd in self.connections:
+            del self.connections[fd]
+            self.selector.unregister(conn.sock)
+            conn.sock.close()
+            request_log.info("Connection closed with %s:%s (Active: %d)",
+                             conn.addr[0], conn.addr[1], len(self.connections))
+
+    def run(self):
+        """Reactor loop"""
+        try:
+            while True:
+                for key, mask in self.selector.select():
+                    conn = key.data
+                    if conn is None:
+                        self.accept()
+                        continue
+                    try:
+                        if mask & selectors.EVENT_WRITE:
+                            self.write(conn)
+                        if mask & selectors.EVENT_READ and conn.sock.fileno() >= 0:
+                            self.read(conn)
+                    except FrameError as e:
+                        logger.warning(f"Framing error from {conn.addr[0]}: {e}")
+                        self.close(conn)
+        except KeyboardInterrupt:
+            logger.info("Server shutting down...")
+        finally:
+            for conn in list(self.connections.values()):
+                self.close(conn)
+            self.selector.close()
+            self.server_socket.close()
+            logger.info(f"Server closed ({self.total_requests} requests served)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lab 1.1 Selector Echo Server")
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--framing', choices=MODES, default=LINE,
+                        help="line = newline-delimited, length = 4-byte length prefix")
+    add_logging_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    setup_logging()
+    configure_request_log(request_log, args)
+    server = SelectorEchoServer(port=args.port, framing=args.framing)
+    server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,59 +1,88 @@
+import os
+import sys
 import socket
 import logging
+import argparse
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.framing import FrameDecoder, FrameError, LINE, MODES
+from common.logpipe import (SampledLogger, setup_logging, add_logging_args,
+                            configure_request_log)
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+# Per-connection / per-message lines (can be sampled or switched off)
+request_log = SampledLogger(logger)
+
+def build_response(message):
+    """Apply the TIME/ECHO command semantics to one message"""
+    # Handle special commands
+    if message.upper() == "TIME":
+        return f"SERVER TIME: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    # Echo back with prefix
+    return f"ECHO: {message}"
 
-def handle_client(client_socket, client_address):
+def handle_client(client_socket, client_address, framing=LINE):
     """Handle client connection and echo messages back"""
-    logger.info(f"Client connected from {client_address[0]}:{client_address[1]}")
+    request_log.info("Client connected from %s:%s", *client_address)
+    decoder = FrameDecoder(framing)
     
     try:
         while True:
-            # Receive message from client
-            data = client_socket.recv(1024).decode('utf-8')
-            
-            if not data:
-                logger.info(f"Client {client_address[0]}:{client_address[1]} disconnected")
+            # Receive straight into the connection buffer
+            if not decoder.recv_into(client_socket):
+                request_log.info("Client %s:%s disconnected", *client_address)
                 break
             
-            message = data.strip()
-            logger.info(f"Received from {client_address[0]}: {message}")
-            
-            # Handle special commands
-            if message.upper() == "TIME":
-                response = f"SERVER TIME: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-            else:
-                # Echo back with prefix
-                response = f"ECHO: {message}"
-            
-            # Send response back to client
-            client_socket.send(response.encode('utf-8'))
-            logger.info(f"Sent to {client_address[0]}: {response}")
+            # One recv() may hold several messages (or only part of one)
+            for frame in decoder.frames():
+                message = str(frame, 'utf-8').strip()
+                request_log.info("Received from %s: %s", client_address[0], message)
+                
+                response = build_response(message)
+                
+                # Send response back to client
+                client_socket.sendall(decoder.encode(response.encode('utf-8')))
+                request_log.info("Sent to %s: %s", client_address[0], response)
             
+    except FrameError as e:
+        logger.warning(f"Framing error from {client_address[0]}: {e}")
     except Exception as e:
         logger.error(f"Error handling client {client_address[0]}: {str(e)}")
     finally:
         client_socket.close()
-        logger.info(f"Connection closed with {client_address[0]}:{client_address[1]}")
+        request_log.info("Connection closed with %s:%s", *client_address)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lab 1.1 TCP Echo Server")
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--framing', choices=MODES, default=LINE,
+                        help="line = newline-delimited, length = 4-byte length prefix")
+    add_logging_args(parser)
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    setup_logging()
+    configure_request_log(request_log, args)
+    
     # Create TCP socket
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     
-    # Bind to port 9999
-    PORT = 9999
+    # Bind to port 9999 (default)
+    PORT = args.port
     server_socket.bind(('localhost', PORT))
     
     # Listen for incoming connections
     server_socket.listen(1)
     logger.info(f"TCP Echo Server listening on port {PORT}...")
+    logger.info(f"Framing mode: {args.framing}")
     
     try:
         while True:
@@ -61,7 +90,7 @@ def main():
             client_socket, client_address = server_socket.accept()
             
             # Handle client (sequential, one at a time)
-            handle_client(client_socket, client_address)
+            handle_client(client_socket, client_address, args.framing)
             
     except KeyboardInterrupt:
         logger.info("Server shutting down...")
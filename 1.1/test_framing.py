@@ -0,0 +1,98 @@
+"""
+Lab 1.1: FrameDecoder tests (common/framing.py)
+Frames must come out the same however the byte stream is split into reads.
+"""
+import os
+import sys
+import socket
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.framing import FrameDecoder, FrameError, LINE, LENGTH, encode_frame
+
+MESSAGES = [b'hello', b'', b'x' * 5000, b'with\rcarriage', b'\x00\xffbinary']
+
+
+def decode(mode, data, step, bufsize=16):
+    """Feed data `step` bytes at a time; returns every frame, copied"""
+    decoder = FrameDecoder(mode, bufsize=bufsize)
+    frames = []
+    for i in range(0, len(data), step):
+        decoder.feed(data[i:i + step])
+        frames.extend(bytes(frame) for frame in decoder.frames())
+    return decoder, frames
+
+
+@pytest.mark.parametrize('step', [1, 2, 3, 7, 64, 100000])
+def test_length_frames_survive_any_split(step):
+    data = b''.join(encode_frame(m, LENGTH) for m in MESSAGES)
+    decoder, frames = decode(LENGTH, data, step)
+    assert frames == MESSAGES
+    assert decoder.pending == 0
+
+
+@pytest.mark.parametrize('step', [1, 2, 5, 64, 100000])
+def test_line_frames_survive_any_split(step):
+    lines = [m for m in MESSAGES if b'\n' not in m and b'\x00' not in m]
+    data = b''.join(encode_frame(m, LINE) for m in lines)
+    _, frames = decode(LINE, data, step)
+    assert frames == lines
+
+
+@pytest.mark.parametrize('data, expected', [
+    (b'a\r\nb\n', [b'a', b'b']),            # CRLF and bare LF
+    (b'\n\n', [b'', b'']),                  # Empty lines are frames
+    (b'a\rb\n', [b'a\rb']),                 # Only a CR right before LF is stripped
+    (b'partial', []),
+])
+def test_line_endings(data, expected):
+    _, frames = decode(LINE, data, len(data))
+    assert frames == expected
+
+
+def test_partial_frame_stays_pending():
+    decoder = FrameDecoder(LENGTH)
+    decoder.feed(encode_frame(b'abcdef', LENGTH)[:7])
+    assert list(decoder.frames()) == []
+    assert decoder.pending == 7
+    decoder.feed(b'def')
+    assert [bytes(f) for f in decoder.frames()] == [b'abcdef']
+
+
+def test_oversized_frames_are_rejected():
+    decoder = FrameDecoder(LENGTH, max_frame=10)
+    decoder.feed(encode_frame(b'x' * 11, LENGTH))
+    with pytest.raises(FrameError):
+        list(decoder.frames())
+    decoder = FrameDecoder(LINE, max_frame=10)
+    decoder.feed(b'y' * 11)
+    with pytest.raises(FrameError):
+        list(decoder.frames())
+
+
+def test_frames_are_views_valid_until_the_next_read():
+    decoder = FrameDecoder(LINE, bufsize=8)
+    decoder.feed(b'first\nsec')
+    (first,) = decoder.frames()
+    assert isinstance(first, memoryview)
+    kept = bytes(first)
+    decoder.feed(b'ond line that grows the buffer\n')
+    assert [bytes(f) for f in decoder.frames()] == [b'second line that grows the buffer']
+    assert kept == b'first'
+
+
+def test_recv_into_reads_from_a_socket():
+    a, b = socket.socketpair()
+    with a, b:
+        a.sendall(encode_frame(b'one', LENGTH) + encode_frame(b'two', LENGTH))
+        decoder = FrameDecoder(LENGTH)
+        received = 0
+        while received < 14:
+            received += decoder.recv_into(b)
+        assert [bytes(f) for f in decoder.frames()] == [b'one', b'two']
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        FrameDecoder('xml')
@@ -0,0 +1,438 @@
+"""
+Lab 1.2: Async UDP Chat Server
+asyncio DatagramProtocol version of udp_chat_server.py, built for rooms of
+tens of thousands of clients:
+- every chat line is encoded once; the same bytes go to every recipient
+- fan-out runs in its own task and sends in batches (sendmmsg on Linux),
+  so datagram_received() only parses and enqueues - ingestion never waits
+  for a broadcast to finish
+- when the socket send buffer is full the fan-out backs off and retries
+  instead of blocking the loop; if too many broadcasts pile up, new ones
+  are dropped (and counted) rather than growing memory without bound
+
+Channels: a message costs O(members of its channel), not O(all clients).
+    /join <channel>     join (and talk in) a channel
+    /leave [channel]    leave a channel (default: the current one)
+    /list               channels and member counts
+    /who [channel]      members of a channel
+    /msg <nick> <text>  private message
+    /ping               heartbeat (no reply)
+    /quit               leave the chat
+Plain text goes to the channel joined last. New clients start in #lobby.
+
+Liveness: any datagram counts as activity. Clients silent for longer than
+--client-timeout are evicted by a timer wheel (common/timerwheel.py), so
+fan-out cost follows the live population, not everyone who ever joined.
+
+--wire binary swaps the UTF-8 lines for compact frames with numeric sender
+and channel ids (chat_wire.py): a chat message is forwarded as a header plus
+the client's own bytes, with no decoding or formatting.
+
+--reliable runs the same protocol over reliable_udp.py (sequence numbers,
+selective ACKs, retransmission, fragmentation). Clients must use
+udp_chat_client.py --reliable.
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import logging
+import argparse
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.logpipe import SampledLogger, setup_logging, add_logging_args, configure_request_log
+from common.metrics import MetricsRegistry
+from common.udpbatch import BatchSender, BATCH_SIZE, sendmmsg_supported
+from common.timerwheel import TimerWheel
+from chat_channels import ChannelIndex
+from reliable_udp import ReliableEndpoint, ReliableSender
+from chat_wire import TextWire, BinaryWire, Interner, HELLO, TEXT
+
+logger = logging.getLogger(__name__)
+request_log = SampledLogger(logger)
+
+MAX_PENDING = 10000         # Broadcasts waiting for fan-out before new ones are dropped
+SEND_RETRY_DELAY = 0.001    # Back-off when the socket send buffer is full
+SOCKET_BUFFER = 4 * 1024 * 1024   # SO_SNDBUF / SO_RCVBUF: absorb bursts
+DEFAULT_CHANNEL = 'lobby'
+MAX_CHANNEL_NAME = 32
+MAX_LISTED = 50             # Entries returned by /list and /who
+CLIENT_TIMEOUT = 30         # Seconds without any datagram before eviction
+EXPIRY_TICK = 1.0           # Timer wheel resolution, seconds
+HELP = ("[SERVER] Commands: /join <channel>, /leave [channel], /list, "
+        "/who [channel], /msg <nick> <text>, /quit, /help")
+
+
+class Broadcast:
+    """One encoded payload and the recipients it still has to reach"""
+    __slots__ = ('payload', 'recipients', 'offset', 'queued_at')
+
+    def __init__(self, payload, recipients):
+        self.payload = payload
+        self.recipients = recipients
+        self.offset = 0
+        self.queued_at = time.perf_counter_ns()
+
+
+class ChatServerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, addr):
+        self.server.on_datagram(data, addr)
+
+    def error_received(self, exc):
+        # ICMP port unreachable from a client that went away
+        logger.debug("Socket error: %s", exc)
+
+
+class AsyncChatServer:
+    def __init__(self, host='localhost', port=8888, batch_size=BATCH_SIZE,
+                 max_pending=MAX_PENDING, use_sendmmsg=True, metrics_interval=10,
+                 default_channel=DEFAULT_CHANNEL, client_timeout=CLIENT_TIMEOUT,
+                 reliable=False, wire='text'):
+        self.host = host
+        self.port = port
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.use_sendmmsg = use_sendmmsg
+        self.metrics_interval = metrics_interval
+        self.default_channel = default_channel
+        self.reliable = reliable
+        self.wire = BinaryWire() if wire == 'binary' else TextWire()
+
+        # Dictionary to store connected clients: (ip, port) -> nickname
+        self.clients = {}
+        self.nicknames = {}     # nickname -> (ip, port), for private messages
+        self.channels = ChannelIndex()
+        self.active = {}        # (ip, port) -> channel that plain text goes to
+        self.client_ids = {}    # (ip, port) -> numeric sender id (binary wire)
+        self.channel_ids = Interner()
+        self._next_id = 1
+        self.liveness = TimerWheel(client_timeout, tick=EXPIRY_TICK)
+        self.pending = deque()
+        self.sock = None
+        self.sender = None
+        self.transport = None
+        self._wakeup = None
+
+        self.metrics = MetricsRegistry('chat_')
+        self.received = self.metrics.counter(
+            'datagrams_received_total', 'Datagrams read from clients')
+        self.broadcasts = self.metrics.counter(
+            'broadcasts_total', 'Messages queued for fan-out')
+        self.sent = self.metrics.counter(
+            'datagrams_sent_total', 'Datagrams delivered to the socket')
+        self.dropped = self.metrics.counter(
+            'broadcasts_dropped_total', 'Broadcasts dropped because fan-out fell behind')
+        self.evictions = self.metrics.counter(
+            'evictions_total', 'Clients removed after --client-timeout of silence')
+        self.quits = self.metrics.counter(
+            'quits_total', 'Clients that left with /quit')
+        self.metrics.gauge('clients', 'Registered clients', fn=lambda: len(self.clients))
+        self.metrics.gauge('channels', 'Channels with at least one member',
+                           fn=lambda: len(self.channels.members))
+        self.metrics.gauge('fanout_pending', 'Broadcasts waiting for fan-out',
+                           fn=lambda: len(self.pending))
+        self.metrics.gauge('send_syscalls', 'sendto/sendmmsg calls made',
+                           fn=lambda: self.sender.syscalls if self.sender else 0)
+        self.fanout_latency = self.metrics.histogram(
+            'fanout_seconds', 'Time from message received to last recipient sent')
+
+    # ---- receive path: parse and enqueue only ------------------------
+
+    def on_datagram(self, data, addr):
+        self.received.inc()
+        nickname = self.clients.get(addr)
+        kind, channel_id, body = self.wire.decode(data, nickname is not None)
+
+        if nickname is None:
+            # A heartbeat from a client we already evicted must not become a nickname
+            if kind == HELLO:
+                self.register(addr, body.decode('utf-8', errors='replace').strip())
+            return
+        self.liveness.touch(addr)
+        if kind != TEXT:
+            return
+        if body.lstrip()[:1] == b'/':
+            self.handle_command(addr, nickname, body.decode('utf-8', errors='replace').strip())
+            return
+        if not body.strip():
+            return
+        channel = self.channel_ids.name(channel_id) if channel_id else self.active.get(addr)
+        if channel is None or not self.channels.is_member(addr, channel):
+            self.reply(addr, "[SERVER] You are not in a channel - /join <channel>")
+            return
+        request_log.info("Message from %s (%s) to #%s (%d bytes)", nickname, addr[0], channel, len(body))
+        self.send_to(self.wire.chat(self.client_ids[addr], nickname,
+                                    self.channel_ids.ids[channel], channel, body),
+                     self.channels.recipients(channel, exclude=addr))
+
+    def register(self, addr, message):
+        # Register new user - extract nickname from first message
+        parts = message.split(':', 1)
+        base = parts[0].strip() or f"User_{addr[0]}_{addr[1]}"
+        nickname, n = base, 1
+        while nickname in self.nicknames:
+            n += 1
+            nickname = f"{base}_{n}"
+        self.clients[addr] = nickname
+        self.nicknames[nickname] = addr
+        self.client_ids[addr] = client_id = self._next_id
+        self._next_id += 1
+        self.liveness.touch(addr)
+        logger.info("User '%s' joined from %s:%s", nickname, addr[0], addr[1])
+        welcome = self.wire.welcome(client_id, nickname)
+        if welcome:
+            self.send_to(welcome, (addr,))
+        if nickname != base:
+            self.reply(addr, f"[SERVER] Nickname '{base}' is taken, you are '{nickname}'")
+        if self.default_channel:
+            self.join_channel(addr, nickname, self.default_channel)
+
+    def reply(self, addr, text):
+        self.send_to(self.wire.system(text), (addr,))
+
+    # ---- channels ----------------------------------------------------
+
+    def join_channel(self, addr, nickname, channel):
+        channel_id = self.channel_ids.intern(channel)
+        if self.channels.join(addr, channel):
+            self.send_to(self.wire.joined(self.client_ids[addr], nickname, channel_id, channel),
+                         self.channels.recipients(channel, exclude=addr))
+            # Binary wire: the channel name and member nicknames, once
+            members = ((self.client_ids[a], self.clients[a]) for a in self.channels.members[channel])
+            for frame in self.wire.channel_info(channel_id, channel, members):
+                self.send_to(frame, (addr,))
+        self.active[addr] = channel
+        size = len(self.channels.members[channel])
+        self.reply(addr, f"[SERVER] You are in #{channel} ({size} member{'s' if size != 1 else ''})")
+
+    def leave_channel(self, addr, nickname, channel):
+        if not self.channels.leave(addr, channel):
+            self.reply(addr, f"[SERVER] You are not in #{channel}")
+            return
+        channel_id = self.channel_ids.ids[channel]
+        self.send_to(self.wire.left(self.client_ids[addr], nickname, channel_id, f"left #{channel}"),
+                     self.channels.recipients(channel))
+        if channel not in self.channels.members:
+            self.channel_ids.release(channel)
+        if self.active.get(addr) == channel:
+            remaining = self.channels.channels_of(addr)
+            if remaining:
+                self.active[addr] = next(iter(remaining))
+            else:
+                del self.active[addr]
+        current = self.active.get(addr)
+        self.reply(addr, f"[SERVER] Left #{channel}" +
+                   (f", now talking in #{current}" if current else ""))
+
+    def remove_client(self, addr, reason):
+        """Forget a client everywhere and tell its channels"""
+        nickname = self.clients.pop(addr, None)
+        if nickname is None:
+            return
+        del self.nicknames[nickname]
+        self.active.pop(addr, None)
+        self.liveness.remove(addr)
+        self.sender.forget(addr)
+        client_id = self.client_ids.pop(addr)
+        for channel in self.channels.leave_all(addr):
+            self.send_to(self.wire.left(client_id, nickname, self.channel_ids.ids[channel], reason),
+                         self.channels.recipients(channel))
+            if channel not in self.channels.members:
+                self.channel_ids.release(channel)
+        logger.info("User '%s' (%s:%s) %s", nickname, addr[0], addr[1], reason)
+
+    def on_peer_failed(self, addr):
+        # Reliable mode: the client stopped acknowledging, don't wait for the timeout
+        self.evictions.inc()
+        self.remove_client(addr, 'became unreachable')
+
+    @staticmethod
+    def channel_name(arg):
+        name = arg.strip().lstrip('#')
+        if not name or len(name) > MAX_CHANNEL_NAME or any(c.isspace() for c in name):
+            return None
+        return name
+
+    def handle_command(self, addr, nickname, message):
+        command, _, arg = message.partition(' ')
+        command = command.lower()
+
+        if command == '/ping':
+            return
+        if command == '/quit':
+            self.quits.inc()
+            self.remove_client(addr, 'left the chat')
+        elif command == '/join':
+            channel = self.channel_name(arg)
+            if channel is None:
+                self.reply(addr, f"[SERVER] Usage: /join <channel> (max {MAX_CHANNEL_NAME} chars)")
+            else:
+                self.join_channel(addr, nickname, channel)
+        elif command == '/leave':
+            channel = self.channel_name(arg) if arg.strip() else self.active.get(addr)
+            if channel is None:
+                self.reply(addr, "[SERVER] Usage: /leave [channel]")
+            else:
+                self.leave_channel(addr, nickname, channel)
+        elif command == '/list':
+            sizes = list(self.channels.sizes().items())
+            listed = ', '.join(f"#{c} ({n})" for c, n in sizes[:MAX_LISTED])
+            more = f" and {len(sizes) - MAX_LISTED} more" if len(sizes) > MAX_LISTED else ""
+            self.reply(addr, f"[SERVER] Channels: {listed or 'none'}{more}")
+        elif command == '/who':
+            channel = self.channel_name(arg) if arg.strip() else self.active.get(addr)
+            members = self.channels.members.get(channel, ()) if channel else ()
+            names = sorted(self.clients[a] for a in members)
+            more = f" and {len(names) - MAX_LISTED} more" if len(names) > MAX_LISTED else ""
+            self.reply(addr, f"[SERVER] #{channel}: {', '.join(names[:MAX_LISTED]) or 'nobody'}{more}")
+        elif command == '/msg':
+            target, _, text = arg.strip().partition(' ')
+            target_addr = self.nicknames.get(target)
+            if target_addr is None or not text.strip():
+                self.reply(addr, "[SERVER] Usage: /msg <nick> <text> (nickname must be online)")
+            else:
+                request_log.info("Private message from %s to %s", nickname, target)
+                self.send_to(self.wire.private(self.client_ids[addr], nickname, text.strip()),
+                             (target_addr,))
+        else:
+            self.reply(addr, HELP)
+
+    def send_to(self, payload, recipients):
+        """Queue an already-encoded payload for fan-out"""
+        if not recipients:
+            return
+        if len(self.pending) >= self.max_pending:
+            self.dropped.inc()
+            return
+        self.broadcasts.inc()
+        self.pending.append(Broadcast(payload, recipients))
+        self._wakeup.set()
+
+    # ---- fan-out path ------------------------------------------------
+
+    async def fanout_loop(self):
+        pending = self.pending
+        while True:
+            await self._wakeup.wait()
+            while pending:
+                item = pending[0]
+                chunk = item.recipients[item.offset:item.offset + self.batch_size]
+                n = self.sender.send_many(item.payload, chunk)
+                item.offset += n
+                self.sent.inc(n)
+                if n < len(chunk):
+                    # Send buffer full: let the kernel drain it
+                    await asyncio.sleep(SEND_RETRY_DELAY)
+                    continue
+                if item.offset >= len(item.recipients):
+                    pending.popleft()
+                    self.fanout_latency.record_ns(time.perf_counter_ns() - item.queued_at)
+                # Let datagram_received() run between batches
+                await asyncio.sleep(0)
+            self._wakeup.clear()
+
+    async def expiry_loop(self):
+        """Evict clients that stayed silent for longer than the timeout"""
+        while True:
+            await asyncio.sleep(EXPIRY_TICK)
+            for addr in self.liveness.advance():
+                self.evictions.inc()
+                self.remove_client(addr, 'timed out')
+
+    async def metrics_loop(self):
+        last = None
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            current = (self.received.value, self.evictions.value)
+            if current == last:
+                continue
+            last = current
+            lat = self.fanout_latency
+            logger.info("Metrics: %d clients | %d channels | %d received | %d broadcasts | %d sent "
+                        "(%d syscalls) | %d dropped | %d evicted | %d quit | "
+                        "fan-out p50 %.2fms p99 %.2fms",
+                        len(self.clients), len(self.channels.members),
+                        self.received.value, self.broadcasts.value,
+                        self.sent.value, self.sender.syscalls, self.dropped.value,
+                        self.evictions.value, self.quits.value,
+                        lat.percentile(50) / 1000, lat.percentile(99) / 1000)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+        self.sock.setblocking(False)
+        self.sock.bind((self.host, self.port))
+        self._wakeup = asyncio.Event()
+
+        if self.reliable:
+            self.transport, endpoint = await loop.create_datagram_endpoint(
+                lambda: ReliableEndpoint(self.on_datagram, self.on_peer_failed),
+                sock=self.sock)
+            self.sender = ReliableSender(endpoint)
+            mode = 'reliable (per-peer windows)'
+        else:
+            self.sender = BatchSender(self.sock, self.batch_size, self.use_sendmmsg)
+            self.transport, _ = await loop.create_datagram_endpoint(
+                lambda: ChatServerProtocol(self), sock=self.sock)
+            mode = 'sendmmsg' if self.sender.use_sendmmsg else 'sendto'
+        logger.info("Async UDP Chat Server listening on %s:%s", self.host, self.port)
+        logger.info("Fan-out: %s, batch size %d", mode, self.batch_size)
+
+        tasks = [asyncio.create_task(self.fanout_loop()),
+                 asyncio.create_task(self.expiry_loop()),
+                 asyncio.create_task(self.metrics_loop())]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.transport.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lab 1.2 Async UDP Chat Server")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help="recipients per send batch")
+    parser.add_argument('--no-sendmmsg', action='store_true',
+                        help="use one sendto() per recipient even if sendmmsg is available")
+    parser.add_argument('--default-channel', default=DEFAULT_CHANNEL,
+                        help="channel new clients join ('' = none)")
+    parser.add_argument('--client-timeout', type=float, default=CLIENT_TIMEOUT,
+                        help="seconds of silence before a client is evicted")
+    parser.add_argument('--reliable', action='store_true',
+                        help="ordered, retransmitted delivery (clients need --reliable too)")
+    parser.add_argument('--wire', choices=('text', 'binary'), default='text',
+                        help="text lines or compact binary frames (clients need --binary)")
+    add_logging_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    setup_logging()
+    configure_request_log(request_log, args)
+    if not sendmmsg_supported():
+        logger.info("sendmmsg not available on this platform - using sendto()")
+    server = AsyncChatServer(args.host, args.port, args.batch_size,
+                             use_sendmmsg=not args.no_sendmmsg,
+                             default_channel=args.default_channel,
+                             client_timeout=args.client_timeout,
+                             reliable=args.reliable, wire=args.wire)
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        logger.info("Server shutting down...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Lab 1.2: Benchmark - Many Small Rooms vs One Large Room
+Starts async_chat_server.py, registers N UDP clients, puts them either in
+one channel or in many small channels, then sends chat messages from random
+members and counts what the clients receive.
+
+A message costs O(members of its channel): with rooms of 10, the server
+delivers many more *messages* per second than with one room of 2,000, at a
+similar number of *datagrams* per second.
+
+--wire binary runs the same cases with the compact binary frames
+(chat_wire.py) and reports bytes per delivered datagram.
+
+Usage:
+    python chat_benchmark.py [--clients 2000] [--room-size 10] [--deliveries 200000]
+                             [--wire text|binary]
+"""
+import os
+import sys
+import time
+import random
+import socket
+import asyncio
+import argparse
+import subprocess
+
+from chat_wire import encode_hello, encode_text
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'async_chat_server.py')
+
+
+class ClientProtocol(asyncio.DatagramProtocol):
+    def __init__(self, counter):
+        self.counter = counter
+
+    def datagram_received(self, data, addr):
+        self.counter[0] += 1
+        self.counter[1] += len(data)
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+async def _settle(counter, quiet=0.5, timeout=30):
+    """Wait until no datagram arrived for `quiet` seconds"""
+    deadline = time.perf_counter() + timeout
+    last, last_change = counter[0], time.perf_counter()
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+        if counter[0] != last:
+            last, last_change = counter[0], time.perf_counter()
+        elif time.perf_counter() - last_change >= quiet:
+            break
+    return last_change
+
+
+async def run_case(port, clients, room_size, deliveries, binary=False):
+    """Returns (messages sent, datagrams expected, datagrams received, bytes received, seconds)"""
+    loop = asyncio.get_running_loop()
+    server = ('127.0.0.1', port)
+    hello = encode_hello if binary else str.encode
+    text = encode_text if binary else str.encode
+    counter = [0, 0]
+    transports = []
+    for i in range(clients):
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: ClientProtocol(counter), local_addr=('127.0.0.1', 0))
+        transports.append(transport)
+
+    rooms = max(1, clients // room_size)
+    for i, transport in enumerate(transports):
+        transport.sendto(hello(f"bench{i}"), server)
+        transport.sendto(text(f"/join room{i % rooms}"), server)
+        if i % 100 == 99:
+            await asyncio.sleep(0.01)
+    await _settle(counter)
+
+    per_message = clients // rooms - 1
+    messages = max(1, deliveries // max(1, per_message))
+    counter[0] = counter[1] = 0
+    start = time.perf_counter()
+    for n in range(messages):
+        random.choice(transports).sendto(text(f"benchmark message {n}"), server)
+        if n % 200 == 199:
+            await asyncio.sleep(0)
+    last_change = await _settle(counter)
+    elapsed = last_change - start
+
+    received, received_bytes = counter
+    for transport in transports:
+        transport.close()
+    return messages, messages * per_message, received, received_bytes, elapsed
+
+
+def run(clients, room_size, deliveries, wire='text'):
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, SERVER, '--host', '127.0.0.1', '--port', str(port),
+         '--default-channel', '', '--request-log', 'off', '--wire', wire],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        time.sleep(0.5)
+        return asyncio.run(run_case(port, clients, room_size, deliveries, wire == 'binary'))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lab 1.2 Chat Rooms Benchmark")
+    parser.add_argument('--clients', type=int, default=2000)
+    parser.add_argument('--room-size', type=int, default=10,
+                        help="members per room in the small-rooms case")
+    parser.add_argument('--deliveries', type=int, default=200000,
+                        help="target datagrams delivered per case")
+    parser.add_argument('--wire', choices=('text', 'binary'), default='text')
+    args = parser.parse_args()
+
+    print(f"\n🔬 Chat delivery ({args.wire} wire): {args.clients} clients, "
+          f"~{args.deliveries} deliveries per case")
+    print("-" * 88)
+    print(f"{'Case':<22} {'Messages':>9} {'Delivered':>18} {'msg/sec':>10} {'datagrams/sec':>15} "
+          f"{'bytes/dgram':>11}")
+    cases = [(f"{args.clients // args.room_size} rooms of {args.room_size}", args.room_size),
+             (f"1 room of {args.clients}", args.clients)]
+    for name, room_size in cases:
+        messages, expected, received, size, elapsed = run(
+            args.clients, room_size, args.deliveries, args.wire)
+        print(f"{name:<22} {messages:>9} {received:>9}/{expected:<8} "
+              f"{messages / elapsed:>10.0f} {received / elapsed:>15.0f} "
+              f"{size / max(1, received):>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Lab 1.2: Channel Membership Index
+Two indexes kept in sync so every operation costs O(members touched):
+- channel -> set of member addresses (fan-out of a channel message)
+- address -> set of channels (leave everything when a client goes away)
+Empty channels are deleted, so the index only holds live state.
+"""
+
+
+class ChannelIndex:
+    def __init__(self):
+        self.members = {}       # channel -> {addr}
+        self.memberships = {}   # addr -> {channel}
+
+    def join(self, addr, channel):
+        """Add addr to channel; False if it was already a member"""
+        members = self.members.setdefault(channel, set())
+        if addr in members:
+            return False
+        members.add(addr)
+        self.memberships.setdefault(addr, set()).add(channel)
+        return True
+
+    def leave(self, addr, channel):
+        """Remove addr from channel; False if it was not a member"""
+        members = self.members.get(channel)
+        if members is None or addr not in members:
+            return False
+        members.discard(addr)
+        if not members:
+            del self.members[channel]
+        channels = self.memberships[addr]
+        channels.discard(channel)
+        if not channels:
+            del self.memberships[addr]
+        return True
+
+    def leave_all(self, addr):
+        """Remove addr from every channel; returns the channels it left"""
+        channels = self.memberships.pop(addr, set())
+        for channel in channels:
+            members = self.members[channel]
+            members.discard(addr)
+            if not members:
+                del self.members[channel]
+        return channels
+
+    def recipients(self, channel, exclude=None):
+        """Tuple of the channel's members, minus `exclude`"""
+        members = self.members.get(channel)
+        if not members:
+            return ()
+        if exclude in members:
+            return tuple(members - {exclude})
+        return tuple(members)
+
+    def channels_of(self, addr):
+        return self.memberships.get(addr, set())
+
+    def is_member(self, addr, channel):
+        return addr in self.members.get(channel, ())
+
+    def sizes(self):
+        """channel -> member count, largest first"""
+        return dict(sorted(((c, len(m)) for c, m in self.members.items()),
+                           key=lambda item: (-item[1], item[0])))
@@ -0,0 +1,225 @@
+"""
+Lab 1.2: Chat Wire Formats
+The server builds every outgoing datagram through a wire object, so the
+protocol can be switched without touching the chat logic.
+
+TextWire - the original protocol: UTF-8 lines such as
+    "[#lobby] alice: hello"
+formatted (and encoded) for every message.
+
+BinaryWire - a compact framing. Every frame starts with an 11-byte header
+    !BIHI   type, sender id, channel id, timestamp (unix seconds)
+followed by a type-specific payload. Nicknames and channel names are
+interned: each is sent once (WELCOME / JOIN / NAMES / CHANNEL frames) and
+referred to by number afterwards. A chat frame is the header plus the
+client's own bytes - the server never decodes or formats the text.
+
+    client -> server   HELLO     payload = nickname
+                       TEXT      payload = text or /command; channel 0 = current
+    server -> client   WELCOME   sender = your id, payload = your nickname
+                       CHANNEL   channel id, payload = channel name
+                       NAMES     payload = (!IB id, length + nickname)*
+                       JOIN      sender joined channel, payload = nickname
+                       LEAVE     sender left channel, payload = reason
+                       CHAT      sender said payload in channel
+                       PRIVATE   payload = !B length + sender nickname + text
+                       SYSTEM    payload = server text
+ChatDecoder turns frames back into the text lines the client displays.
+"""
+import time
+import struct
+
+HELLO = 1
+TEXT = 2
+WELCOME = 16
+CHANNEL = 17
+NAMES = 18
+JOIN = 19
+LEAVE = 20
+CHAT = 21
+PRIVATE = 22
+SYSTEM = 23
+
+HEADER = struct.Struct('!BIHI')
+_NAME = struct.Struct('!IB')
+MAX_FRAME = 1200            # NAMES tables are split to stay below this
+MAX_NAME = 255
+
+
+def encode_hello(nickname):
+    return HEADER.pack(HELLO, 0, 0, int(time.time())) + nickname.encode('utf-8')[:MAX_NAME]
+
+
+def encode_text(text, channel_id=0):
+    return HEADER.pack(TEXT, 0, channel_id, int(time.time())) + text.encode('utf-8')
+
+
+def _short(name):
+    raw = name.encode('utf-8')[:MAX_NAME]
+    return bytes((len(raw),)) + raw
+
+
+class Interner:
+    """name <-> small integer id; ids of released names are reused"""
+
+    def __init__(self, limit=0xFFFF):
+        self.limit = limit
+        self.ids = {}
+        self.names = {}
+        self._free = []
+        self._next = 1
+
+    def intern(self, name):
+        cid = self.ids.get(name)
+        if cid is None:
+            if self._free:
+                cid = self._free.pop()
+            elif self._next <= self.limit:
+                cid = self._next
+                self._next += 1
+            else:
+                raise OverflowError("no free ids")
+            self.ids[name] = cid
+            self.names[cid] = name
+        return cid
+
+    def release(self, name):
+        cid = self.ids.pop(name, None)
+        if cid is not None:
+            del self.names[cid]
+            self._free.append(cid)
+
+    def name(self, cid):
+        return self.names.get(cid)
+
+
+class TextWire:
+    """The original UTF-8 text protocol"""
+    binary = False
+
+    def decode(self, data, registered):
+        """(kind, channel id, body bytes) of a client datagram"""
+        if registered or data.lstrip().startswith(b'/'):
+            return TEXT, 0, data
+        return HELLO, 0, data
+
+    def system(self, text):
+        return text.encode('utf-8')
+
+    def welcome(self, client_id, nickname):
+        return None
+
+    def channel_info(self, channel_id, channel, members):
+        return []
+
+    def joined(self, client_id, nickname, channel_id, channel):
+        return f"[SERVER] '{nickname}' joined #{channel}".encode('utf-8')
+
+    def left(self, client_id, nickname, channel_id, reason):
+        return f"[SERVER] '{nickname}' {reason}".encode('utf-8')
+
+    def chat(self, client_id, nickname, channel_id, channel, body):
+        message = body.decode('utf-8', errors='replace').strip()
+        return f"[#{channel}] {nickname}: {message}".encode('utf-8')
+
+    def private(self, client_id, nickname, text):
+        return f"[PM] {nickname}: {text}".encode('utf-8')
+
+
+class BinaryWire:
+    """Compact frames with interned nickname and channel ids"""
+    binary = True
+
+    def decode(self, data, registered):
+        if len(data) < HEADER.size:
+            return None, 0, b''
+        kind, _, channel_id, _ = HEADER.unpack_from(data)
+        return kind, channel_id, data[HEADER.size:]
+
+    def system(self, text):
+        return HEADER.pack(SYSTEM, 0, 0, int(time.time())) + text.encode('utf-8')
+
+    def welcome(self, client_id, nickname):
+        return HEADER.pack(WELCOME, client_id, 0, int(time.time())) + nickname.encode('utf-8')
+
+    def channel_info(self, channel_id, channel, members):
+        """CHANNEL frame, then NAMES frames for members = [(id, nickname)]"""
+        now = int(time.time())
+        frames = [HEADER.pack(CHANNEL, 0, channel_id, now) + channel.encode('utf-8')]
+        header = HEADER.pack(NAMES, 0, channel_id, now)
+        entries, size = [], len(header)
+        for member_id, nickname in members:
+            raw = nickname.encode('utf-8')[:MAX_NAME]
+            entry = _NAME.pack(member_id, len(raw)) + raw
+            if size + len(entry) > MAX_FRAME and entries:
+                frames.append(header + b''.join(entries))
+                entries, size = [], len(header)
+            entries.append(entry)
+            size += len(entry)
+        if entries:
+            frames.append(header + b''.join(entries))
+        return frames
+
+    def joined(self, client_id, nickname, channel_id, channel):
+        return HEADER.pack(JOIN, client_id, channel_id, int(time.time())) + nickname.encode('utf-8')
+
+    def left(self, client_id, nickname, channel_id, reason):
+        return HEADER.pack(LEAVE, client_id, channel_id, int(time.time())) + reason.encode('utf-8')
+
+    def chat(self, client_id, nickname, channel_id, channel, body):
+        return HEADER.pack(CHAT, client_id, channel_id, int(time.time())) + body
+
+    def private(self, client_id, nickname, text):
+        return (HEADER.pack(PRIVATE, client_id, 0, int(time.time())) +
+                _short(nickname) + text.encode('utf-8'))
+
+
+class ChatDecoder:
+    """Client side of BinaryWire: keeps the interned tables, renders frames"""
+
+    def __init__(self):
+        self.client_id = None
+        self.names = {}         # sender id -> nickname
+        self.channels = {}      # channel id -> channel name
+
+    def _nick(self, sender):
+        return self.names.get(sender, f"#{sender}")
+
+    def _channel(self, channel_id):
+        return self.channels.get(channel_id, str(channel_id))
+
+    def format(self, frame):
+        """Text line to show for a frame, or None for table updates"""
+        if len(frame) < HEADER.size:
+            return None
+        kind, sender, channel_id, _ = HEADER.unpack_from(frame)
+        payload = frame[HEADER.size:]
+        if kind == CHAT:
+            text = payload.decode('utf-8', errors='replace').strip()
+            return f"[#{self._channel(channel_id)}] {self._nick(sender)}: {text}"
+        if kind == SYSTEM:
+            return payload.decode('utf-8', errors='replace')
+        if kind == JOIN:
+            self.names[sender] = payload.decode('utf-8', errors='replace')
+            return f"[SERVER] '{self.names[sender]}' joined #{self._channel(channel_id)}"
+        if kind == LEAVE:
+            nickname = self._nick(sender)
+            return f"[SERVER] '{nickname}' {payload.decode('utf-8', errors='replace')}"
+        if kind == PRIVATE and payload:
+            size = payload[0]
+            nickname = payload[1:1 + size].decode('utf-8', errors='replace')
+            self.names[sender] = nickname
+            return f"[PM] {nickname}: {payload[1 + size:].decode('utf-8', errors='replace')}"
+        if kind == WELCOME:
+            self.client_id = sender
+            self.names[sender] = payload.decode('utf-8', errors='replace')
+        elif kind == CHANNEL:
+            self.channels[channel_id] = payload.decode('utf-8', errors='replace')
+        elif kind == NAMES:
+            offset = 0
+            while offset + _NAME.size <= len(payload):
+                member_id, size = _NAME.unpack_from(payload, offset)
+                offset += _NAME.size
+                self.names[member_id] = payload[offset:offset + size].decode('utf-8', errors='replace')
+                offset += size
+        return None
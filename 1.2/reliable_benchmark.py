@@ -0,0 +1,181 @@
+"""
+Lab 1.2: Benchmark - Reliable UDP vs TCP for Chat Messages
+Two parts, both on loopback:
+
+1. Impaired link: sends a mix of short and multi-fragment messages through
+   ImpairedLink (loss + reordering in both directions) and checks that
+   every message arrives intact and in order.
+2. Small messages vs TCP: echo round trips of a short chat line over
+   reliable_udp.py and over a TCP stream, measured two ways:
+   - first message: a new client sends one line and waits for the echo
+     (TCP pays the connection handshake, reliable UDP does not)
+   - steady state: ping-pong on an established client
+
+Usage:
+    python reliable_benchmark.py [--loss 0.1] [--reorder 0.1] [--messages 2000]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import Histogram
+from reliable_udp import open_reliable_endpoint, ImpairedLink
+
+CHAT_LINE = b"[#lobby] alice: hello everyone, how is it going?"
+
+
+async def impaired_transfer(messages, loss, reorder, seed=1):
+    """Returns (all delivered in order, seconds, sender stats)"""
+    received = []
+    receiver = await open_reliable_endpoint(
+        on_message=lambda data, addr: received.append(data),
+        link=ImpairedLink(loss, reorder, seed=seed))
+    sender = await open_reliable_endpoint(link=ImpairedLink(loss, reorder, seed=seed + 1))
+    addr = receiver.transport.get_extra_info('sockname')
+
+    rng = random.Random(seed)
+    sent = [b'%d:' % i + b'x' * rng.choice((20, 200, 3000, 10000)) for i in range(messages)]
+    start = time.perf_counter()
+    for data in sent:
+        sender.send(data, addr)
+    await sender.flush(timeout=120)
+    elapsed = time.perf_counter() - start
+    stats = sender.stats()
+    sender.transport.close()
+    receiver.transport.close()
+    return received == sent, elapsed, stats
+
+
+async def _udp_echo_server():
+    endpoint = None
+
+    def echo(data, addr):
+        endpoint.send(data, addr)
+
+    endpoint = await open_reliable_endpoint(on_message=echo)
+    return endpoint, endpoint.transport.get_extra_info('sockname')
+
+
+async def _tcp_echo_server():
+    async def handle(reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                writer.write(line)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', 0)
+    return server, server.sockets[0].getsockname()
+
+
+class _UDPClient:
+    def __init__(self):
+        self.replies = asyncio.Queue()
+
+    async def open(self):
+        self.endpoint = await open_reliable_endpoint(
+            on_message=lambda data, addr: self.replies.put_nowait(data))
+        return self
+
+    async def roundtrip(self, addr, data):
+        self.endpoint.send(data, addr)
+        return await self.replies.get()
+
+    def close(self):
+        self.endpoint.transport.close()
+
+
+async def first_message(trials):
+    """Histograms (µs) for: new client, one line, wait for the echo"""
+    udp, tcp = Histogram('udp_first'), Histogram('tcp_first')
+    udp_server, udp_addr = await _udp_echo_server()
+    tcp_server, tcp_addr = await _tcp_echo_server()
+    for _ in range(trials):
+        start = time.perf_counter()
+        client = await _UDPClient().open()
+        await client.roundtrip(udp_addr, CHAT_LINE)
+        udp.record((time.perf_counter() - start) * 1e6)
+        client.close()
+
+        start = time.perf_counter()
+        reader, writer = await asyncio.open_connection(*tcp_addr)
+        writer.write(CHAT_LINE + b'\n')
+        await reader.readline()
+        tcp.record((time.perf_counter() - start) * 1e6)
+        writer.close()
+        await writer.wait_closed()
+    udp_server.transport.close()
+    tcp_server.close()
+    await tcp_server.wait_closed()
+    return udp, tcp
+
+
+async def steady_state(messages):
+    """Histograms (µs) for ping-pong on an established client"""
+    udp, tcp = Histogram('udp_steady'), Histogram('tcp_steady')
+    udp_server, udp_addr = await _udp_echo_server()
+    tcp_server, tcp_addr = await _tcp_echo_server()
+    client = await _UDPClient().open()
+    reader, writer = await asyncio.open_connection(*tcp_addr)
+    for _ in range(messages):
+        start = time.perf_counter()
+        await client.roundtrip(udp_addr, CHAT_LINE)
+        udp.record((time.perf_counter() - start) * 1e6)
+
+        start = time.perf_counter()
+        writer.write(CHAT_LINE + b'\n')
+        await reader.readline()
+        tcp.record((time.perf_counter() - start) * 1e6)
+    client.close()
+    writer.close()
+    await writer.wait_closed()
+    udp_server.transport.close()
+    tcp_server.close()
+    await tcp_server.wait_closed()
+    return udp, tcp
+
+
+def _row(name, hist):
+    print(f"{name:<28} {hist.mean / 1000:>9.3f} {hist.percentile(50) / 1000:>9.3f} "
+          f"{hist.percentile(99) / 1000:>9.3f}")
+
+
+async def run(args):
+    print(f"\n🔬 Impaired link: {args.messages} messages, "
+          f"{args.loss:.0%} loss, {args.reorder:.0%} reordering (both directions)")
+    ok, elapsed, stats = await impaired_transfer(args.messages, args.loss, args.reorder)
+    print(f"   {'✅ all delivered in order' if ok else '❌ delivery mismatch'} in {elapsed:.2f}s | "
+          f"{stats['packets_sent']} packets, {stats['retransmits']} timeout + "
+          f"{stats['fast_retransmits']} fast retransmits")
+
+    print(f"\n🔬 Small chat message ({len(CHAT_LINE)} bytes) round trips, ms")
+    print("-" * 58)
+    print(f"{'Case':<28} {'mean':>9} {'p50':>9} {'p99':>9}")
+    udp, tcp = await first_message(args.trials)
+    _row("first message, reliable UDP", udp)
+    _row("first message, TCP", tcp)
+    udp, tcp = await steady_state(args.messages)
+    _row("steady state, reliable UDP", udp)
+    _row("steady state, TCP", tcp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lab 1.2 Reliable UDP Benchmark")
+    parser.add_argument('--loss', type=float, default=0.1)
+    parser.add_argument('--reorder', type=float, default=0.1)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--trials', type=int, default=300,
+                        help="new clients in the first-message case")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,483 @@
+"""
+Lab 1.2: Reliable Ordered Delivery over UDP
+An optional layer under the chat protocol that fixes what plain datagrams
+don't guarantee:
+
+- sequence numbers: every packet to a peer gets the next number; the
+  receiver delivers messages strictly in order and drops duplicates
+- selective ACKs: an ACK carries the next expected number plus up to 4
+  ranges received out of order, so only real holes are resent
+- retransmission: timeout from the smoothed RTT (RFC 6298, Karn's rule),
+  doubled on every timeout; a hole with 3 later packets SACKed is resent
+  at once (fast retransmit)
+- sliding window: at most WINDOW packets in flight per peer, and never
+  more than the receiver advertises it can buffer
+- fragmentation: messages larger than MTU_PAYLOAD are split and put back
+  together before delivery (no more 1024-byte truncation)
+
+Packets:
+    DATA  !BBII  type, flags (END = last fragment), stream, seq  + payload
+    ACK   !BBIIHB type, 0, stream, next expected seq, window, n  + n x !II SACK ranges
+`stream` is random per sender and peer, and ACKs echo it. A sender that
+drops its state for a peer (forget(), the peer stopped acknowledging, or
+a restart) starts again at seq 0 under a new stream, and the receiver
+resets for it instead of taking the new packets for duplicates.
+
+ImpairedLink injects loss, reordering and delay on the sending side, so the
+whole layer can be tested on loopback.
+"""
+import random
+import socket
+import struct
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DATA = 1
+ACK = 2
+FLAG_END = 0x01
+
+_DATA = struct.Struct('!BBII')
+_ACK = struct.Struct('!BBIIHB')
+_SACK = struct.Struct('!II')
+SEQ_MASK = 0xFFFFFFFF
+
+MTU_PAYLOAD = 1200          # Message bytes per datagram (below common path MTUs)
+WINDOW = 64                 # Packets in flight / buffered out of order, per peer
+SOCKET_BUFFER = 1 << 20     # A burst of full windows must fit in the kernel buffers
+MAX_SACK_BLOCKS = 4
+INITIAL_RTO = 0.2           # Seconds, before the first RTT sample
+MIN_RTO = 0.01
+MAX_RTO = 1.0             # Low cap: a chat line late by seconds is as bad as lost
+MAX_RETRIES = 8             # Retransmissions of one packet before the peer is dropped
+DUP_THRESHOLD = 3           # Later packets SACKed before a hole is resent early
+
+
+def _unwrap(seq32, reference):
+    """The integer closest to `reference` whose low 32 bits are seq32"""
+    diff = (seq32 - reference) & SEQ_MASK
+    if diff >= 0x80000000:
+        diff -= 0x100000000
+    return reference + diff
+
+
+class ImpairedLink:
+    """Test shim: drop, reorder and delay datagrams before they hit the socket"""
+
+    def __init__(self, loss=0.0, reorder=0.0, delay=0.0, jitter=0.005, seed=None):
+        self.loss = loss
+        self.reorder = reorder
+        self.delay = delay
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.dropped = 0
+        self.reordered = 0
+
+    def send(self, transport, data, addr):
+        if self.loss and self.rng.random() < self.loss:
+            self.dropped += 1
+            return
+        delay = self.delay
+        if self.reorder and self.rng.random() < self.reorder:
+            # Held back, so packets sent after it overtake it
+            self.reordered += 1
+            delay += self.jitter * (1 + self.rng.random())
+        if delay:
+            asyncio.get_running_loop().call_later(delay, self._late_send, transport, data, addr)
+        else:
+            transport.sendto(data, addr)
+
+    @staticmethod
+    def _late_send(transport, data, addr):
+        if not transport.is_closing():
+            transport.sendto(data, addr)
+
+
+class _Outgoing:
+    __slots__ = ('packet', 'sent_at', 'retries', 'sacked', 'fast_resent')
+
+    def __init__(self, packet, sent_at):
+        self.packet = packet
+        self.sent_at = sent_at
+        self.retries = 0
+        self.sacked = False
+        self.fast_resent = False
+
+
+class _Peer:
+    """Send and receive state for one remote address"""
+
+    def __init__(self):
+        # Sending
+        self.stream = random.getrandbits(32)
+        self.next_seq = 0
+        self.snd_una = 0            # Oldest unacknowledged seq
+        self.inflight = {}          # seq -> _Outgoing, in seq order
+        self.backlog = deque()      # (flags, chunk) waiting for window space
+        self.peer_window = WINDOW
+        self.srtt = None
+        self.rttvar = 0.0
+        self.rto = INITIAL_RTO
+        self.timer = None
+        self.waiters = []           # flush() futures
+        # Receiving
+        self.remote_stream = None
+        self.retired_stream = None  # The stream before it: late packets of it are ignored
+        self.expected = 0
+        self.out_of_order = {}      # seq -> (flags, payload)
+        self.fragments = []
+        self.ack_scheduled = False
+
+    @property
+    def idle(self):
+        return not self.inflight and not self.backlog
+
+    def sample_rtt(self, sample):
+        if self.srtt is None:
+            self.srtt = sample
+            self.rttvar = sample / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - sample)
+            self.srtt = 0.875 * self.srtt + 0.125 * sample
+        self.rto = min(MAX_RTO, max(MIN_RTO, self.srtt + 4 * self.rttvar))
+
+
+class ReliableEndpoint(asyncio.DatagramProtocol):
+    """
+    One UDP socket, a reliable ordered message stream to/from each peer.
+
+    on_message(data, addr) is called with complete messages, in order.
+    on_peer_failed(addr) is called when a peer stops acknowledging.
+    """
+
+    def __init__(self, on_message=None, on_peer_failed=None, mtu=MTU_PAYLOAD,
+                 window=WINDOW, link=None):
+        self.on_message = on_message
+        self.on_peer_failed = on_peer_failed
+        self.mtu = mtu
+        self.window = window
+        self.link = link
+        self.peers = {}
+        self.transport = None
+        self.loop = None
+
+        self.messages_sent = 0
+        self.messages_delivered = 0
+        self.packets_sent = 0
+        self.retransmits = 0
+        self.fast_retransmits = 0
+        self.duplicates = 0
+        self.acks_sent = 0
+        self.peers_failed = 0
+
+    # ---- plumbing ----------------------------------------------------
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.loop = asyncio.get_running_loop()
+
+    def connection_lost(self, exc):
+        for addr in list(self.peers):
+            self.forget(addr)
+
+    def error_received(self, exc):
+        logger.debug("Socket error: %s", exc)
+
+    def _sendto(self, packet, addr):
+        self.packets_sent += 1
+        if self.link is not None:
+            self.link.send(self.transport, packet, addr)
+        else:
+            self.transport.sendto(packet, addr)
+
+    def _peer(self, addr):
+        peer = self.peers.get(addr)
+        if peer is None:
+            peer = self.peers[addr] = _Peer()
+        return peer
+
+    def stats(self):
+        return {
+            'messages_sent': self.messages_sent,
+            'messages_delivered': self.messages_delivered,
+            'packets_sent': self.packets_sent,
+            'retransmits': self.retransmits,
+            'fast_retransmits': self.fast_retransmits,
+            'duplicates': self.duplicates,
+            'acks_sent': self.acks_sent,
+            'peers': len(self.peers),
+            'peers_failed': self.peers_failed,
+        }
+
+    # ---- sending -----------------------------------------------------
+
+    def send(self, data, addr):
+        """Queue one message (any size) for reliable, ordered delivery"""
+        peer = self._peer(addr)
+        mtu = self.mtu
+        chunks = [data[i:i + mtu] for i in range(0, len(data), mtu)] or [b'']
+        last = len(chunks) - 1
+        for i, chunk in enumerate(chunks):
+            peer.backlog.append((FLAG_END if i == last else 0, chunk))
+        self.messages_sent += 1
+        self._pump(addr, peer)
+
+    def _pump(self, addr, peer):
+        """Send backlog packets while the window allows"""
+        limit = min(self.window, peer.peer_window)
+        if peer.backlog and peer.next_seq - peer.snd_una < limit:
+            now = self.loop.time()
+            while peer.backlog and peer.next_seq - peer.snd_una < limit:
+                flags, chunk = peer.backlog.popleft()
+                seq = peer.next_seq
+                peer.next_seq += 1
+                packet = _DATA.pack(DATA, flags, peer.stream, seq & SEQ_MASK) + chunk
+                peer.inflight[seq] = _Outgoing(packet, now)
+                self._sendto(packet, addr)
+            if peer.timer is None:
+                self._arm_timer(addr, peer)
+
+    def _arm_timer(self, addr, peer):
+        if peer.timer is not None:
+            peer.timer.cancel()
+            peer.timer = None
+        oldest = min((o.sent_at for o in peer.inflight.values() if not o.sacked), default=None)
+        if oldest is not None:
+            peer.timer = self.loop.call_at(oldest + peer.rto, self._on_timeout, addr)
+
+    def _on_timeout(self, addr):
+        peer = self.peers.get(addr)
+        if peer is None:
+            return
+        peer.timer = None
+        now = self.loop.time()
+        expired = [o for o in peer.inflight.values()
+                   if not o.sacked and o.sent_at + peer.rto <= now]
+        if expired:
+            if any(o.retries >= MAX_RETRIES for o in expired):
+                self._fail(addr, peer)
+                return
+            for out in expired:
+                out.retries += 1
+                out.sent_at = now
+                self.retransmits += 1
+                self._sendto(out.packet, addr)
+            peer.rto = min(MAX_RTO, peer.rto * 2)
+        self._arm_timer(addr, peer)
+
+    def _fail(self, addr, peer):
+        logger.debug("Peer %s stopped acknowledging - dropping its state", addr)
+        self.peers_failed += 1
+        self.forget(addr)
+        if self.on_peer_failed:
+            self.on_peer_failed(addr)
+
+    def forget(self, addr):
+        """Drop all state for a peer (it left, or was evicted)"""
+        peer = self.peers.pop(addr, None)
+        if peer is None:
+            return
+        if peer.timer is not None:
+            peer.timer.cancel()
+        for waiter in peer.waiters:
+            if not waiter.done():
+                waiter.set_result(False)
+
+    async def flush(self, addr=None, timeout=None):
+        """Wait until everything sent (to addr, or to everyone) is acknowledged"""
+        waiters = []
+        for peer_addr, peer in list(self.peers.items()):
+            if (addr is None or peer_addr == addr) and not peer.idle:
+                waiter = self.loop.create_future()
+                peer.waiters.append(waiter)
+                waiters.append(waiter)
+        if waiters:
+            await asyncio.wait_for(asyncio.gather(*waiters), timeout)
+
+    # ---- receiving ---------------------------------------------------
+
+    def datagram_received(self, data, addr):
+        if len(data) < 2:
+            return
+        kind = data[0]
+        if kind == DATA and len(data) >= _DATA.size:
+            self._on_data(data, addr)
+        elif kind == ACK and len(data) >= _ACK.size:
+            self._on_ack(data, addr)
+
+    def _on_data(self, data, addr):
+        _, flags, stream, seq32 = _DATA.unpack_from(data)
+        peer = self._peer(addr)
+        if peer.remote_stream != stream:
+            if stream == peer.retired_stream:
+                return      # Straggler from before the reset
+            # New peer, or the peer dropped its state for us: start a fresh stream
+            peer.retired_stream = peer.remote_stream
+            peer.remote_stream = stream
+            peer.expected = 0
+            peer.out_of_order = {}
+            peer.fragments = []
+        seq = _unwrap(seq32, peer.expected)
+        payload = data[_DATA.size:]
+
+        if seq < peer.expected or seq in peer.out_of_order:
+            self.duplicates += 1
+        elif seq - peer.expected < self.window:
+            if seq == peer.expected:
+                self._deliver(addr, peer, flags, payload)
+            else:
+                peer.out_of_order[seq] = (flags, payload)
+        # Beyond the window: drop; the sender resends once we catch up
+
+        if not peer.ack_scheduled:
+            # One ACK for everything that arrived in this loop iteration
+            peer.ack_scheduled = True
+            self.loop.call_soon(self._send_ack, addr)
+
+    def _deliver(self, addr, peer, flags, payload):
+        buffered = peer.out_of_order
+        while True:
+            peer.fragments.append(payload)
+            peer.expected += 1
+            if flags & FLAG_END:
+                message = b''.join(peer.fragments)
+                peer.fragments = []
+                self.messages_delivered += 1
+                if self.on_message:
+                    self.on_message(message, addr)
+            nxt = buffered.pop(peer.expected, None)
+            if nxt is None:
+                return
+            flags, payload = nxt
+
+    def _send_ack(self, addr):
+        peer = self.peers.get(addr)
+        if peer is None or self.transport is None or self.transport.is_closing():
+            return
+        peer.ack_scheduled = False
+        blocks = []
+        if peer.out_of_order:
+            start = end = None
+            for seq in sorted(peer.out_of_order):
+                if start is not None and seq == end:
+                    end += 1
+                    continue
+                if start is not None:
+                    blocks.append((start, end))
+                    if len(blocks) == MAX_SACK_BLOCKS:
+                        break
+                start, end = seq, seq + 1
+            if start is not None and len(blocks) < MAX_SACK_BLOCKS:
+                blocks.append((start, end))
+        window = max(0, self.window - len(peer.out_of_order))
+        packet = _ACK.pack(ACK, 0, peer.remote_stream, peer.expected & SEQ_MASK,
+                           window, len(blocks))
+        packet += b''.join(_SACK.pack(s & SEQ_MASK, e & SEQ_MASK) for s, e in blocks)
+        self.acks_sent += 1
+        self._sendto(packet, addr)
+
+    def _on_ack(self, data, addr):
+        peer = self.peers.get(addr)
+        if peer is None:
+            return
+        _, _, stream, ack32, window, count = _ACK.unpack_from(data)
+        if stream != peer.stream:
+            return      # ACK for a stream this endpoint has since dropped
+        now = self.loop.time()
+        sample = None
+
+        cumulative = min(_unwrap(ack32, peer.snd_una), peer.next_seq)
+        if cumulative > peer.snd_una:
+            for seq in range(peer.snd_una, cumulative):
+                out = peer.inflight.pop(seq, None)
+                # Karn: never time a packet that was retransmitted
+                if out is not None and out.retries == 0 and not out.sacked:
+                    sample = now - out.sent_at
+            peer.snd_una = cumulative
+
+        highest = None
+        offset = _ACK.size
+        for _ in range(count):
+            if offset + _SACK.size > len(data):
+                break
+            start32, end32 = _SACK.unpack_from(data, offset)
+            offset += _SACK.size
+            start = _unwrap(start32, peer.snd_una)
+            end = min(_unwrap(end32, peer.snd_una), peer.next_seq)
+            for seq in range(max(start, peer.snd_una), end):
+                out = peer.inflight.get(seq)
+                if out is not None and not out.sacked:
+                    out.sacked = True
+                    if out.retries == 0:
+                        sample = now - out.sent_at
+            if highest is None or end > highest:
+                highest = end
+
+        if sample is not None:
+            peer.sample_rtt(sample)
+        peer.peer_window = window
+
+        if highest is not None:
+            # Fast retransmit: holes with DUP_THRESHOLD later packets received
+            for seq in range(peer.snd_una, highest - DUP_THRESHOLD + 1):
+                out = peer.inflight.get(seq)
+                if out is not None and not out.sacked and not out.fast_resent:
+                    out.fast_resent = True
+                    out.retries += 1
+                    out.sent_at = now
+                    self.fast_retransmits += 1
+                    self._sendto(out.packet, addr)
+
+        self._pump(addr, peer)
+        if peer.idle:
+            if peer.timer is not None:
+                peer.timer.cancel()
+                peer.timer = None
+            for waiter in peer.waiters:
+                if not waiter.done():
+                    waiter.set_result(True)
+            peer.waiters = []
+        else:
+            self._arm_timer(addr, peer)
+
+
+async def open_reliable_endpoint(local_addr=None, sock=None, **kwargs):
+    """Create a ReliableEndpoint on a new (local_addr) or existing (sock) socket"""
+    loop = asyncio.get_running_loop()
+    if sock is None:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(local_addr or ('127.0.0.1', 0))
+        # Overflowing the default buffers looks exactly like packet loss
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+    sock.setblocking(False)
+    _, endpoint = await loop.create_datagram_endpoint(
+        lambda: ReliableEndpoint(**kwargs), sock=sock)
+    return endpoint
+
+
+class ReliableSender:
+    """
+    BatchSender interface (common/udpbatch.py) on top of a ReliableEndpoint,
+    so a fan-out loop can switch transports without changes. Every recipient
+    has its own sequence space, so the payload is queued once per peer.
+    """
+    use_sendmmsg = False
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+
+    @property
+    def syscalls(self):
+        return self.endpoint.packets_sent
+
+    def send_many(self, payload, addrs):
+        send = self.endpoint.send
+        for addr in addrs:
+            send(payload, addr)
+        return len(addrs)
+
+    def forget(self, addr):
+        self.endpoint.forget(addr)
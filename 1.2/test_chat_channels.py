@@ -0,0 +1,96 @@
+"""
+Lab 1.2: ChannelIndex tests (chat_channels.py)
+The two indexes must agree after any sequence of joins and leaves.
+"""
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from chat_channels import ChannelIndex
+
+A, B, C = ('10.0.0.1', 5000), ('10.0.0.2', 5000), ('10.0.0.3', 5000)
+
+
+def check_consistent(index):
+    for channel, members in index.members.items():
+        assert members, f"empty channel {channel} kept"
+        for addr in members:
+            assert channel in index.memberships[addr]
+    for addr, channels in index.memberships.items():
+        assert channels, f"member {addr} without channels kept"
+        for channel in channels:
+            assert addr in index.members[channel]
+
+
+def test_join_and_leave():
+    index = ChannelIndex()
+    assert index.join(A, '#lab')
+    assert not index.join(A, '#lab')        # Already a member
+    assert index.join(B, '#lab')
+    assert index.is_member(A, '#lab')
+    assert index.leave(A, '#lab')
+    assert not index.leave(A, '#lab')
+    assert not index.leave(C, '#nowhere')
+    assert index.channels_of(A) == set()
+    assert index.sizes() == {'#lab': 1}
+    check_consistent(index)
+
+
+def test_empty_channels_are_dropped():
+    index = ChannelIndex()
+    index.join(A, '#a')
+    index.leave(A, '#a')
+    assert index.members == {} and index.memberships == {}
+
+
+def test_leave_all():
+    index = ChannelIndex()
+    for channel in ('#a', '#b', '#c'):
+        index.join(A, channel)
+    index.join(B, '#b')
+    assert index.leave_all(A) == {'#a', '#b', '#c'}
+    assert index.leave_all(A) == set()
+    assert index.sizes() == {'#b': 1}
+    check_consistent(index)
+
+
+def test_recipients_exclude_the_sender():
+    index = ChannelIndex()
+    for addr in (A, B, C):
+        index.join(addr, '#lab')
+    assert sorted(index.recipients('#lab', exclude=A)) == [B, C]
+    assert sorted(index.recipients('#lab', exclude=('other', 1))) == [A, B, C]
+    assert index.recipients('#none') == ()
+
+
+def test_sizes_largest_first():
+    index = ChannelIndex()
+    index.join(A, '#small')
+    for addr in (A, B, C):
+        index.join(addr, '#big')
+    assert list(index.sizes().items()) == [('#big', 3), ('#small', 1)]
+
+
+def test_random_operations_keep_the_indexes_in_sync():
+    rng = random.Random(7)
+    index = ChannelIndex()
+    model = {}                  # channel -> set, the obvious implementation
+    addrs = [('10.0.0.%d' % i, 4000) for i in range(20)]
+    channels = ['#%d' % i for i in range(6)]
+    for _ in range(3000):
+        addr, channel = rng.choice(addrs), rng.choice(channels)
+        op = rng.random()
+        if op < 0.5:
+            assert index.join(addr, channel) == (addr not in model.get(channel, ()))
+            model.setdefault(channel, set()).add(addr)
+        elif op < 0.9:
+            assert index.leave(addr, channel) == (addr in model.get(channel, ()))
+            model.get(channel, set()).discard(addr)
+        else:
+            left = {c for c, members in model.items() if addr in members}
+            assert index.leave_all(addr) == left
+            for members in model.values():
+                members.discard(addr)
+    check_consistent(index)
+    assert index.members == {c: m for c, m in model.items() if m}
@@ -0,0 +1,139 @@
+"""
+Lab 1.2: Chat wire format tests (chat_wire.py)
+Every BinaryWire frame, rendered by ChatDecoder, must read exactly like
+the TextWire line for the same event; truncated frames must not raise.
+"""
+import os
+import sys
+import random
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from chat_wire import (TextWire, BinaryWire, ChatDecoder, Interner, encode_hello, encode_text,
+                       HEADER, HELLO, TEXT, NAMES, MAX_FRAME, MAX_NAME)
+
+NICKS = ['alice', 'bob', 'zoë', '名前']
+
+
+def joined_decoder(binary):
+    """A ChatDecoder that has seen WELCOME and #lobby's CHANNEL/NAMES frames"""
+    decoder = ChatDecoder()
+    assert decoder.format(binary.welcome(1, 'alice')) is None
+    for frame in binary.channel_info(7, 'lobby', list(enumerate(NICKS, 1))):
+        assert decoder.format(frame) is None
+    return decoder
+
+
+@pytest.mark.parametrize('event', [
+    ('system', ("Welcome to the chat!",)),
+    ('joined', (2, 'bob', 7, 'lobby')),
+    ('left', (3, 'zoë', 7, 'left #lobby')),
+    ('chat', (4, '名前', 7, 'lobby', '  hello, wörld \n'.encode('utf-8'))),
+    ('chat', (2, 'bob', 7, 'lobby', b'\xff broken utf-8')),
+    ('private', (2, 'bob', 'psst')),
+    ('private', (9, 'n' * 300, 'long nickname')),
+])
+def test_binary_frames_read_like_text_lines(event):
+    method, args = event
+    text, binary = TextWire(), BinaryWire()
+    decoder = joined_decoder(binary)
+    expected = getattr(text, method)(*args).decode('utf-8')
+    if method == 'private':                 # Nicknames travel at most MAX_NAME bytes long
+        expected = expected.replace(args[1], args[1][:MAX_NAME])
+    assert decoder.format(getattr(binary, method)(*args)) == expected
+
+
+def test_welcome_and_tables():
+    decoder = joined_decoder(BinaryWire())
+    assert decoder.client_id == 1
+    assert decoder.channels == {7: 'lobby'}
+    assert decoder.names == dict(enumerate(NICKS, 1))
+
+
+def test_unknown_ids_are_shown_by_number():
+    decoder = ChatDecoder()
+    frame = BinaryWire().chat(42, 'ghost', 9, 'nowhere', b'boo')
+    assert decoder.format(frame) == "[#9] #42: boo"
+
+
+def test_names_are_split_below_max_frame():
+    members = [(i, f"member-{i:04d}-{'x' * (i % 40)}") for i in range(1, 401)]
+    frames = BinaryWire().channel_info(3, 'big', members)
+    names = [f for f in frames if HEADER.unpack_from(f)[0] == NAMES]
+    assert len(names) > 1
+    assert all(len(frame) <= MAX_FRAME for frame in frames)
+    decoder = ChatDecoder()
+    for frame in frames:
+        decoder.format(frame)
+    assert decoder.names == dict(members)
+
+
+def test_long_nicknames_are_cut_at_max_name():
+    frames = BinaryWire().channel_info(3, 'c', [(1, 'é' * 200)])   # 400 bytes of UTF-8
+    decoder = ChatDecoder()
+    for frame in frames:
+        decoder.format(frame)
+    assert decoder.names[1] == 'é' * (MAX_NAME // 2) + '�'     # Cut mid-character
+
+
+def test_empty_channel_has_no_names_frame():
+    assert len(BinaryWire().channel_info(3, 'empty', [])) == 1
+
+
+def test_truncated_frames_do_not_raise():
+    binary = BinaryWire()
+    frames = (binary.channel_info(7, 'lobby', list(enumerate(NICKS, 1)))
+              + [binary.welcome(1, 'alice'), binary.joined(2, 'bob', 7, 'lobby'),
+                 binary.left(2, 'bob', 7, 'quit'), binary.private(2, 'bob', 'hi'),
+                 binary.chat(2, 'bob', 7, 'lobby', b'hello'), binary.system('note')])
+    for frame in frames:
+        for cut in range(len(frame)):
+            decoder = ChatDecoder()
+            line = decoder.format(frame[:cut])
+            assert line is None or isinstance(line, str)
+            if cut < HEADER.size:
+                assert line is None
+    rng = random.Random(5)
+    for _ in range(2000):                   # Garbage after a valid header
+        kind = rng.choice([NAMES, 22, 21, 19, 99])
+        payload = bytes(rng.randrange(256) for _ in range(rng.randrange(12)))
+        ChatDecoder().format(HEADER.pack(kind, 1, 1, 0) + payload)
+
+
+def test_client_frames_decode_on_the_server():
+    binary = BinaryWire()
+    assert binary.decode(encode_hello('zoë'), registered=False) == (HELLO, 0, 'zoë'.encode())
+    assert binary.decode(encode_text('/join #x', 5), registered=True) == (TEXT, 5, b'/join #x')
+    assert binary.decode(b'short', registered=True) == (None, 0, b'')
+    hello = encode_hello('n' * 300)
+    assert len(hello) == HEADER.size + MAX_NAME
+
+
+def test_text_wire_decode():
+    text = TextWire()
+    assert text.decode(b'alice', registered=False) == (HELLO, 0, b'alice')
+    assert text.decode(b' /nick bob', registered=False)[0] == TEXT
+    assert text.decode(b'hello', registered=True) == (TEXT, 0, b'hello')
+
+
+def test_interner_reuses_released_ids():
+    interner = Interner()
+    a, b = interner.intern('alice'), interner.intern('bob')
+    assert (a, b) == (1, 2) and interner.intern('alice') == a
+    interner.release('alice')
+    interner.release('alice')               # Twice: must not free the id twice
+    assert interner.name(a) is None
+    assert interner.intern('carol') == a
+    assert interner.intern('dave') == 3
+    assert interner.name(a) == 'carol' and interner.ids == {'bob': 2, 'carol': 1, 'dave': 3}
+
+
+def test_interner_limit():
+    interner = Interner(limit=2)
+    interner.intern('a')
+    interner.intern('b')
+    with pytest.raises(OverflowError):
+        interner.intern('c')
+    interner.release('a')
+    assert interner.intern('c') == 1
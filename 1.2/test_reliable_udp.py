@@ -0,0 +1,129 @@
+"""
+Lab 1.2: Reliable UDP tests (reliable_udp.py)
+Delivery over real loopback sockets, with ImpairedLink for loss and
+reordering; stream resets checked with hand-made datagrams.
+"""
+import os
+import sys
+import struct
+import asyncio
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from reliable_udp import (open_reliable_endpoint, ImpairedLink, _unwrap, DATA, FLAG_END,
+                          SEQ_MASK)
+
+_DATA = struct.Struct('!BBII')
+
+
+@pytest.mark.parametrize('seq32, reference, expected', [
+    (5, 0, 5),
+    (0, 0, 0),
+    (SEQ_MASK, 0, -1),                          # Just before the reference
+    (2, SEQ_MASK, SEQ_MASK + 3),                # Wrapped forwards
+    (SEQ_MASK - 1, (1 << 32) + 5, SEQ_MASK - 1),  # Wrapped backwards
+])
+def test_unwrap(seq32, reference, expected):
+    assert _unwrap(seq32, reference) == expected
+
+
+async def pair(link=None):
+    """(sender, receiver, receiver address, messages received)"""
+    received = []
+    receiver = await open_reliable_endpoint(on_message=lambda data, addr: received.append(data))
+    sender = await open_reliable_endpoint(link=link)
+    return sender, receiver, receiver.transport.get_extra_info('sockname'), received
+
+
+def close(*endpoints):
+    for endpoint in endpoints:
+        endpoint.transport.close()
+
+
+def test_in_order_delivery_over_a_lossy_link():
+    async def main():
+        link = ImpairedLink(loss=0.1, reorder=0.1, seed=11)
+        sender, receiver, addr, received = await pair(link)
+        messages = [b'message %d' % i for i in range(300)]
+        for message in messages:
+            sender.send(message, addr)
+        await sender.flush(timeout=20)
+        await asyncio.sleep(0.05)
+        close(sender, receiver)
+        return messages, received, link, sender
+    messages, received, link, sender = asyncio.run(main())
+    assert received == messages
+    assert link.dropped and link.reordered
+    assert sender.retransmits + sender.fast_retransmits >= link.dropped // 2
+
+
+def test_large_messages_are_fragmented_and_reassembled():
+    async def main():
+        sender, receiver, addr, received = await pair(ImpairedLink(loss=0.05, seed=2))
+        big = bytes(range(256)) * 200           # 51200 bytes, ~43 datagrams
+        sender.send(big, addr)
+        sender.send(b'', addr)
+        await sender.flush(timeout=20)
+        await asyncio.sleep(0.05)
+        close(sender, receiver)
+        return big, received
+    big, received = asyncio.run(main())
+    assert received == [big, b'']
+
+
+def test_send_after_forget_is_delivered():
+    """forget() restarts at seq 0: the receiver must not take it for duplicates"""
+    async def main():
+        sender, receiver, addr, received = await pair()
+        for i in range(3):
+            sender.send(b'before %d' % i, addr)
+        await sender.flush(timeout=5)
+        sender.forget(addr)
+        sender.send(b'after-forget', addr)
+        await sender.flush(timeout=5)
+        await asyncio.sleep(0.05)
+        close(sender, receiver)
+        return received
+    assert asyncio.run(main())[-1] == b'after-forget'
+
+
+def test_stream_reset_and_stragglers():
+    async def main():
+        received = []
+        receiver = await open_reliable_endpoint(on_message=lambda data, addr: received.append(data))
+        peer = ('127.0.0.1', 9)                 # Nothing listens: ACKs go nowhere
+        old, new = 0x1111, 0x2222
+
+        def data(stream, seq, payload):
+            receiver.datagram_received(_DATA.pack(DATA, FLAG_END, stream, seq) + payload, peer)
+
+        data(old, 0, b'a')
+        data(old, 1, b'b')
+        data(old, 1, b'b')                      # Duplicate
+        data(new, 0, b'c')                      # The sender dropped its state: reset
+        data(old, 2, b'late')                   # Straggler of the replaced stream
+        data(new, 1, b'd')
+        await asyncio.sleep(0.01)
+        receiver.transport.close()
+        return received, receiver.duplicates
+    received, duplicates = asyncio.run(main())
+    assert received == [b'a', b'b', b'c', b'd']
+    assert duplicates == 1
+
+
+def test_out_of_order_packets_wait_for_the_hole():
+    async def main():
+        received = []
+        receiver = await open_reliable_endpoint(on_message=lambda data, addr: received.append(data))
+        peer = ('127.0.0.1', 9)
+        for seq in (2, 1, 3):
+            receiver.datagram_received(_DATA.pack(DATA, FLAG_END, 7, seq) + b'%d' % seq, peer)
+        early = list(received)
+        receiver.datagram_received(_DATA.pack(DATA, FLAG_END, 7, 0) + b'0', peer)
+        await asyncio.sleep(0.01)
+        receiver.transport.close()
+        return early, received
+    early, received = asyncio.run(main())
+    assert early == []
+    assert received == [b'0', b'1', b'2', b'3']
@@ -0,0 +1,95 @@
+"""
+Lab 1.2: TimerWheel tests (common/timerwheel.py)
+Keys expire once idle for `timeout`, never earlier, and at most one tick
+late, however they are touched.
+"""
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.timerwheel import TimerWheel
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_idle_key_expires_after_timeout():
+    clock = Clock()
+    wheel = TimerWheel(10.0, tick=1.0, clock=clock)
+    wheel.touch('a')
+    clock.now += 9.5
+    assert wheel.advance() == []
+    clock.now += 1.5
+    assert wheel.advance() == ['a']
+    assert 'a' not in wheel and len(wheel) == 0
+
+
+def test_touch_postpones_expiry():
+    clock = Clock()
+    wheel = TimerWheel(10.0, clock=clock)
+    wheel.touch('a')
+    for _ in range(30):         # Active for 30s, touched every second
+        clock.now += 1.0
+        wheel.touch('a')
+        assert wheel.advance() == []
+    clock.now += 11.0
+    assert wheel.advance() == ['a']
+
+
+def test_remove():
+    clock = Clock()
+    wheel = TimerWheel(5.0, clock=clock)
+    wheel.touch('a')
+    wheel.touch('b')
+    wheel.remove('a')
+    wheel.remove('missing')
+    clock.now += 6.0
+    assert wheel.advance() == ['b']
+
+
+def test_long_pause_expires_everything_once():
+    clock = Clock()
+    wheel = TimerWheel(5.0, clock=clock)
+    for i in range(100):
+        wheel.touch(i)
+    clock.now += 10000.0
+    assert sorted(wheel.advance()) == list(range(100))
+    assert wheel.advance() == []
+
+
+def test_explicit_times():
+    """Capture-time use: the clock is never called when times are given"""
+    wheel = TimerWheel(60.0, clock=lambda: 0.0)
+    wheel.touch('x', 30.0)
+    assert wheel.advance(89.0) == []
+    assert wheel.advance(91.0) == ['x']
+
+
+def test_random_touches_match_a_plain_dict():
+    rng = random.Random(3)
+    timeout, tick = 20.0, 1.0
+    clock = Clock(0.0)
+    wheel = TimerWheel(timeout, tick=tick, clock=clock)
+    last_seen = {}
+    previous = clock.now        # Time of the previous advance()
+    for step in range(5000):
+        clock.now += rng.uniform(0, 0.5)
+        key = rng.randrange(300)
+        wheel.touch(key)
+        last_seen[key] = clock.now
+        if step % 7 == 0:
+            # Late by at most a tick, plus the time since advance() last ran
+            slack = tick + (clock.now - previous)
+            for key in wheel.advance():
+                idle = clock.now - last_seen.pop(key)
+                assert timeout <= idle <= timeout + slack
+            overdue = [k for k, seen in last_seen.items() if clock.now - seen > timeout + tick]
+            assert overdue == []
+            previous = clock.now
+    assert set(last_seen) == set(wheel.last_seen)
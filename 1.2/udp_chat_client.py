@@ -1,7 +1,15 @@
 import socket
+import asyncio
+import argparse
 import threading
 import logging
 
+from reliable_udp import open_reliable_endpoint
+from chat_wire import ChatDecoder, encode_hello, encode_text
+
+HEARTBEAT_INTERVAL = 10     # Seconds between keepalives (server evicts after 30s)
+RECV_BUFFER = 65535         # Largest datagram; binary NAMES frames exceed 1024 bytes
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -10,31 +18,69 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 class UDPChatClient:
-    def __init__(self, nickname, server_host='localhost', server_port=8888):
+    def __init__(self, nickname, server_host='localhost', server_port=8888, binary=False):
         self.nickname = nickname
+        self.decoder = ChatDecoder() if binary else None
         self.server_addr = (server_host, server_port)
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.stopped = threading.Event()
+    
+    def send(self, data):
+        self.socket.sendto(data, self.server_addr)
+    
+    def encode(self, text):
+        return encode_text(text) if self.decoder else text.encode('utf-8')
+    
+    def hello(self):
+        return encode_hello(self.nickname) if self.decoder else self.nickname.encode('utf-8')
+    
+    def deliver(self, data):
+        """Show one datagram from the server"""
+        if self.decoder:
+            line = self.decoder.format(data)
+            if line is not None:
+                self.show(line)
+        else:
+            self.show(data.decode('utf-8', 'replace'))
+    
+    def show(self, message):
+        print(f"\n{message}")
+        print(f"[{self.nickname}]: ", end='', flush=True)
+    
+    def start(self):
+        """Register with the server and start receiving"""
+        # Send nickname to register
+        self.send(self.hello())
+        
+        # Start receive thread
+        recv_thread = threading.Thread(target=self.receive_messages, daemon=True)
+        recv_thread.start()
+    
+    def close(self):
+        self.socket.close()
+    
+    def send_heartbeats(self):
+        """Tell the server we are still here, even while the user is idle"""
+        while not self.stopped.wait(HEARTBEAT_INTERVAL):
+            try:
+                self.send(self.encode('/ping'))
+            except OSError:
+                break
     
     def receive_messages(self):
         """Receive messages from server in separate thread"""
         while True:
             try:
-                data, _ = self.socket.recvfrom(1024)
-                message = data.decode('utf-8')
-                print(f"\n{message}")
-                print(f"[{self.nickname}]: ", end='', flush=True)
+                data, _ = self.socket.recvfrom(RECV_BUFFER)
+                self.deliver(data)
             except Exception as e:
                 logger.error(f"Error receiving message: {str(e)}")
                 break
     
     def run(self):
         """Main client loop"""
-        # Send nickname to register
-        self.socket.sendto(self.nickname.encode('utf-8'), self.server_addr)
-        
-        # Start receive thread
-        recv_thread = threading.Thread(target=self.receive_messages, daemon=True)
-        recv_thread.start()
+        self.start()
+        threading.Thread(target=self.send_heartbeats, daemon=True).start()
         
         # Send messages from user input
         print(f"Connected as '{self.nickname}'. Type messages to send (Ctrl+C to quit):")
@@ -42,18 +88,68 @@ class UDPChatClient:
             while True:
                 message = input(f"[{self.nickname}]: ")
                 if message.strip():
-                    self.socket.sendto(message.encode('utf-8'), self.server_addr)
+                    self.send(self.encode(message))
         except KeyboardInterrupt:
             print("\nDisconnecting...")
         finally:
-            self.socket.close()
+            self.stopped.set()
+            try:
+                self.send(self.encode('/quit'))
+            except OSError:
+                pass
+            self.close()
+
+class ReliableChatClient(UDPChatClient):
+    """
+    Same client over reliable_udp.py: messages arrive in order, lost ones are
+    resent and long ones are fragmented. The endpoint lives on an asyncio
+    loop in a background thread; input() stays in the main thread.
+    """
+    
+    def start(self):
+        # Peer state is keyed by the address replies come from: resolve names
+        host, port = self.server_addr
+        self.server_addr = (socket.gethostbyname(host), port)
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.endpoint = asyncio.run_coroutine_threadsafe(
+            open_reliable_endpoint(('0.0.0.0', 0), on_message=self.on_message),
+            self.loop).result()
+        self.send(self.hello())
+    
+    def on_message(self, data, addr):
+        self.deliver(data)
+    
+    def send(self, data):
+        self.loop.call_soon_threadsafe(self.endpoint.send, data, self.server_addr)
+    
+    def close(self):
+        # Give /quit a chance to be acknowledged
+        try:
+            asyncio.run_coroutine_threadsafe(
+                self.endpoint.flush(timeout=2), self.loop).result(timeout=3)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.endpoint.transport.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.socket.close()
 
 def main():
+    parser = argparse.ArgumentParser(description="Lab 1.2 UDP Chat Client")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8888)
+    parser.add_argument('--reliable', action='store_true',
+                        help="ordered, retransmitted delivery (server needs --reliable too)")
+    parser.add_argument('--binary', action='store_true',
+                        help="compact binary frames (server needs --wire binary)")
+    args = parser.parse_args()
+    
     nickname = input("Enter your nickname: ").strip()
     if not nickname:
         nickname = "Anonymous"
     
-    client = UDPChatClient(nickname)
+    client_class = ReliableChatClient if args.reliable else UDPChatClient
+    client = client_class(nickname, args.host, args.port, args.binary)
     client.run()
 
 if __name__ == "__main__":
@@ -1,6 +1,13 @@
+import os
+import sys
 import socket
 import logging
-from threading import Thread, Lock
+from threading import Thread, Lock, Event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.timerwheel import TimerWheel
+
+CLIENT_TIMEOUT = 30     # Seconds without any datagram before a client is removed
 
 # Setup logging
 logging.basicConfig(
@@ -19,45 +26,83 @@ class UDPChatServer:
         # Dictionary to store connected clients: (ip, port) -> nickname
         self.clients = {}
         self.clients_lock = Lock()
+        # Last activity per client; idle ones are removed by the reaper thread
+        self.liveness = TimerWheel(CLIENT_TIMEOUT)
+        self.evictions = 0
+        self.stopped = Event()
         
         logger.info(f"UDP Chat Server listening on {self.host}:{self.port}")
     
     def broadcast(self, message, sender_addr=None):
         """Send message to all clients except sender"""
+        # Encode once, and don't hold the lock while sending
+        payload = message.encode('utf-8')
+        with self.clients_lock:
+            recipients = [addr for addr in self.clients if addr != sender_addr]
+        for client_addr in recipients:
+            try:
+                self.socket.sendto(payload, client_addr)
+            except Exception as e:
+                logger.error(f"Failed to send to {client_addr}: {str(e)}")
+    
+    def remove_client(self, addr, reason):
         with self.clients_lock:
-            for client_addr in self.clients:
-                if client_addr != sender_addr:
-                    try:
-                        self.socket.sendto(message.encode('utf-8'), client_addr)
-                    except Exception as e:
-                        logger.error(f"Failed to send to {client_addr}: {str(e)}")
+            nickname = self.clients.pop(addr, None)
+            self.liveness.remove(addr)
+        if nickname is not None:
+            logger.info(f"User '{nickname}' {reason}")
+            self.broadcast(f"[SERVER] '{nickname}' {reason}", addr)
+    
+    def reap_idle_clients(self):
+        """Remove clients that sent nothing (not even /ping) for CLIENT_TIMEOUT"""
+        while not self.stopped.wait(self.liveness.tick):
+            with self.clients_lock:
+                expired = self.liveness.advance()
+                nicknames = [self.clients.pop(addr) for addr in expired]
+            for addr, nickname in zip(expired, nicknames):
+                self.evictions += 1
+                logger.info(f"User '{nickname}' timed out (evictions: {self.evictions})")
+                self.broadcast(f"[SERVER] '{nickname}' timed out", addr)
     
     def run(self):
         """Main server loop"""
+        Thread(target=self.reap_idle_clients, daemon=True).start()
         try:
             while True:
                 data, addr = self.socket.recvfrom(1024)
                 message = data.decode('utf-8').strip()
                 
+                with self.clients_lock:
+                    nickname = self.clients.get(addr)
+                    if nickname is not None:
+                        self.liveness.touch(addr)
+                
                 # Register new user
-                if addr not in self.clients:
+                if nickname is None:
+                    if message.startswith('/'):
+                        continue    # Heartbeat/command from a client we already dropped
                     # Extract nickname from first message
                     parts = message.split(':', 1)
                     nickname = parts[0] if len(parts) > 0 else f"User_{addr[0]}_{addr[1]}"
                     
                     with self.clients_lock:
                         self.clients[addr] = nickname
+                        self.liveness.touch(addr)
                     
                     logger.info(f"User '{nickname}' joined from {addr[0]}:{addr[1]}")
                     self.broadcast(f"[SERVER] '{nickname}' joined the chat", addr)
+                elif message == '/ping':
+                    continue
+                elif message == '/quit':
+                    self.remove_client(addr, 'left the chat')
                 else:
-                    nickname = self.clients[addr]
                     logger.info(f"Message from {nickname} ({addr[0]}): {message}")
                     self.broadcast(f"{nickname}: {message}", addr)
         
         except KeyboardInterrupt:
             logger.info("Server shutting down...")
         finally:
+            self.stopped.set()
             self.socket.close()
 
 def main():
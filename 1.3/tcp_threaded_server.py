@@ -1,7 +1,16 @@
+import os
+import sys
+import time
 import socket
 import threading
 import logging
-from queue import Queue
+import argparse
+from queue import Queue, Full
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.framing import FrameDecoder, FrameError, LINE, MODES
+from common.logpipe import (SampledLogger, setup_logging, add_logging_args,
+                            configure_request_log)
 
 # Setup logging
 logging.basicConfig(
@@ -9,85 +18,196 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+# Per-connection / per-message lines (can be sampled or switched off)
+request_log = SampledLogger(logger)
 
 class ThreadPoolServer:
-    def __init__(self, host='localhost', port=9998, max_threads=10):
+    """
+    Fixed-size worker pool: max_threads workers are started up front and
+    pull accepted connections from a bounded queue. When the queue is full
+    the accept loop blocks (backpressure) instead of rejecting clients, so
+    new connections wait in the kernel backlog.
+    """
+    
+    def __init__(self, host='localhost', port=9998, max_threads=10, framing=LINE,
+                 queue_size=50, metrics_interval=10):
+        if max_threads < 1:
+            raise ValueError("max_threads must be at least 1")
+        if queue_size < 1:
+            raise ValueError("queue_size must be at least 1 (Queue(0) would be unbounded)")
         self.host = host
         self.port = port
         self.max_threads = max_threads
+        self.framing = framing
+        self.queue_size = queue_size
+        self.metrics_interval = metrics_interval
         self.active_connections = 0
         self.connections_lock = threading.Lock()
         
+        # Accepted connections waiting for a free worker: (socket, addr, enqueued_at)
+        self.accept_queue = Queue(maxsize=queue_size)
+        self.workers = []
+        
+        # Queue wait metrics (guarded by connections_lock)
+        self.total_connections = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.backpressure_events = 0
+        
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self.server_socket.bind((self.host, self.port))
-        self.server_socket.listen(5)
+        self.server_socket.listen(max(5, queue_size))
         
         logger.info(f"Multi-threaded TCP Server listening on {self.host}:{self.port}")
-        logger.info(f"Max threads: {self.max_threads}")
+        logger.info(f"Max threads: {self.max_threads}, accept queue depth: {self.queue_size}")
+    
+    def start_workers(self):
+        """Pre-start the fixed set of worker threads"""
+        for i in range(self.max_threads):
+            worker = threading.Thread(
+                target=self.worker_loop,
+                name=f"worker-{i}",
+                daemon=True
+            )
+            worker.start()
+            self.workers.append(worker)
+    
+    def worker_loop(self):
+        """Serve queued connections until a None sentinel arrives"""
+        while True:
+            item = self.accept_queue.get()
+            if item is None:
+                break
+            
+            client_socket, client_address, enqueued_at = item
+            wait = time.perf_counter() - enqueued_at
+            with self.connections_lock:
+                self.active_connections += 1
+                self.total_connections += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+            
+            self.handle_client(client_socket, client_address)
+    
+    def get_metrics(self):
+        """Snapshot of pool and queue wait metrics"""
+        with self.connections_lock:
+            served = self.total_connections
+            return {
+                'workers': self.max_threads,
+                'active_connections': self.active_connections,
+                'queued': self.accept_queue.qsize(),
+                'queue_size': self.queue_size,
+                'total_connections': served,
+                'avg_queue_wait_ms': (self.total_wait / served * 1000) if served else 0.0,
+                'max_queue_wait_ms': self.max_wait * 1000,
+                'backpressure_events': self.backpressure_events,
+            }
+    
+    def log_metrics(self):
+        m = self.get_metrics()
+        logger.info(f"=== POOL METRICS === "
+                    f"Active: {m['active_connections']}/{m['workers']} | "
+                    f"Queued: {m['queued']}/{m['queue_size']} | "
+                    f"Served: {m['total_connections']} | "
+                    f"Queue wait avg/max: {m['avg_queue_wait_ms']:.1f}/"
+                    f"{m['max_queue_wait_ms']:.1f} ms | "
+                    f"Backpressure: {m['backpressure_events']}")
+    
+    def metrics_loop(self):
+        while True:
+            time.sleep(self.metrics_interval)
+            self.log_metrics()
     
     def handle_client(self, client_socket, client_address):
         """Handle individual client connection"""
+        decoder = FrameDecoder(self.framing)
         try:
-            logger.info(f"Client connected: {client_address[0]}:{client_address[1]} "
-                       f"(Active: {self.active_connections})")
+            request_log.info("Client connected: %s:%s (Active: %d)",
+                             client_address[0], client_address[1], self.active_connections)
             
             while True:
-                data = client_socket.recv(1024).decode('utf-8')
-                
-                if not data:
-                    logger.info(f"Client {client_address[0]} disconnected")
+                if not decoder.recv_into(client_socket):
+                    request_log.info("Client %s disconnected", client_address[0])
                     break
                 
-                message = data.strip()
-                logger.info(f"Received from {client_address[0]}: {message}")
-                
-                # Echo back with prefix
-                response = f"ECHO: {message}"
-                client_socket.send(response.encode('utf-8'))
-                logger.info(f"Sent to {client_address[0]}: {response}")
+                for frame in decoder.frames():
+                    message = str(frame, 'utf-8').strip()
+                    request_log.info("Received from %s: %s", client_address[0], message)
+                    
+                    # Echo back with prefix
+                    response = f"ECHO: {message}"
+                    client_socket.sendall(decoder.encode(response.encode('utf-8')))
+                    request_log.info("Sent to %s: %s", client_address[0], response)
         
+        except FrameError as e:
+            logger.warning(f"Framing error from {client_address[0]}: {e}")
         except Exception as e:
             logger.error(f"Error handling client {client_address[0]}: {str(e)}")
         finally:
             client_socket.close()
             with self.connections_lock:
                 self.active_connections -= 1
-            logger.info(f"Connection closed with {client_address[0]}. "
-                       f"Active connections: {self.active_connections}")
+            request_log.info("Connection closed with %s. Active connections: %d",
+                             client_address[0], self.active_connections)
     
     def run(self):
         """Main server loop"""
+        self.start_workers()
+        threading.Thread(target=self.metrics_loop, daemon=True).start()
+        
         try:
             while True:
                 client_socket, client_address = self.server_socket.accept()
+                item = (client_socket, client_address, time.perf_counter())
                 
-                with self.connections_lock:
-                    if self.active_connections >= self.max_threads:
-                        logger.warning(f"Max connections ({self.max_threads}) reached. "
-                                      f"Rejecting connection from {client_address[0]}")
-                        client_socket.send(b"Server is full. Try again later.")
-                        client_socket.close()
-                        continue
-                    
-                    self.active_connections += 1
-                
-                # Spawn new thread for this client
-                client_thread = threading.Thread(
-                    target=self.handle_client,
-                    args=(client_socket, client_address),
-                    daemon=False
-                )
-                client_thread.start()
+                try:
+                    self.accept_queue.put_nowait(item)
+                except Full:
+                    # Backpressure: stop accepting until a worker frees a slot
+                    with self.connections_lock:
+                        self.backpressure_events += 1
+                    logger.warning(f"Accept queue full ({self.queue_size}). "
+                                   f"{client_address[0]} waits for a free worker")
+                    self.accept_queue.put(item)
         
         except KeyboardInterrupt:
             logger.info("Server shutting down...")
         finally:
             self.server_socket.close()
+            self.log_metrics()
+            for _ in self.workers:
+                try:
+                    self.accept_queue.put_nowait(None)
+                except Full:
+                    break
             logger.info("Server closed")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lab 1.3 Multi-threaded TCP Server")
+    parser.add_argument('--port', type=int, default=9998)
+    parser.add_argument('--framing', choices=MODES, default=LINE,
+                        help="line = newline-delimited, length = 4-byte length prefix")
+    parser.add_argument('--workers', type=int, default=10,
+                        help="number of pre-started worker threads")
+    parser.add_argument('--queue-size', type=int, default=50,
+                        help="accepted connections allowed to wait for a worker")
+    add_logging_args(parser)
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.queue_size < 1:
+        # Queue(maxsize=0) is unbounded: no backpressure at all
+        parser.error("--queue-size must be at least 1")
+    return args
+
 def main():
-    server = ThreadPoolServer(max_threads=10)
+    args = parse_args()
+    setup_logging()
+    configure_request_log(request_log, args)
+    server = ThreadPoolServer(port=args.port, max_threads=args.workers, framing=args.framing,
+                              queue_size=args.queue_size)
     server.run()
 
 if __name__ == "__main__":
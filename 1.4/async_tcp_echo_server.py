@@ -9,24 +9,75 @@ Features:
 - Connection timeout (30s idle)
 - Graceful shutdown
 - Metrics tracking
+- Message framing (newline or length-prefixed, see common/framing.py)
+- Pipelined mode: batch all buffered requests into one write
+- Multi-process mode: --workers N processes sharing the port (SO_REUSEPORT)
+- Metrics registry with latency histogram, scraped at :9100/metrics
+- Non-blocking, sampled per-request logging (--request-log on|sampled|off)
 """
 
 import asyncio
+import argparse
+import functools
+import logging
+import os
 import sys
+import time
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.framing import FrameDecoder, FrameError, LINE, MODES, READ_SIZE
+from common.workers import WorkerSupervisor
+from common.metrics import MetricsRegistry, serve_metrics
+from common.logpipe import (SampledLogger, setup_logging, add_logging_args,
+                            configure_request_log)
+
+logger = logging.getLogger(__name__)
+# Per-connection / per-request lines go through a queue and can be sampled
+request_log = SampledLogger(logger)
+
 
 class AsyncEchoServer:
     """Async TCP Echo Server with metrics"""
     
-    def __init__(self, host='0.0.0.0', port=9999, timeout=30):
+    def __init__(self, host='0.0.0.0', port=9999, timeout=30, framing=LINE,
+                 pipelined=False, reuse_port=False, metrics_sink=None,
+                 metrics_interval=10, metrics_port=None, backlog=4096):
         self.host = host
         self.port = port
         self.idle_timeout = timeout
-        self.active_connections = 0
-        self.total_requests = 0
-        self.bytes_received = 0
+        self.framing = framing
+        self.pipelined = pipelined
+        self.reuse_port = reuse_port
+        # asyncio's default of 100 overflows when thousands of clients connect at once
+        self.backlog = backlog
+        # Multi-process mode: snapshots go to the supervisor instead of stdout
+        self.metrics_sink = metrics_sink
+        self.metrics_interval = metrics_interval
+        self.metrics_port = metrics_port
         self.server = None
+        
+        self.metrics = MetricsRegistry('echo_')
+        self.requests = self.metrics.counter(
+            'requests_total', 'Requests answered')
+        self.bytes_in = self.metrics.counter(
+            'bytes_received_total', 'Bytes read from clients')
+        self.connections = self.metrics.gauge(
+            'active_connections', 'Open client connections')
+        self.latency = self.metrics.histogram(
+            'service_seconds', 'Time from request parsed to response written')
+    
+    @property
+    def total_requests(self):
+        return self.requests.value
+    
+    @property
+    def bytes_received(self):
+        return self.bytes_in.value
+    
+    @property
+    def active_connections(self):
+        return self.connections.value
     
     async def handle_client(self, reader, writer):
         """
@@ -34,70 +85,130 @@ class AsyncEchoServer:
         With 30s idle timeout
         """
         addr = writer.get_extra_info('peername')
-        self.active_connections += 1
+        decoder = FrameDecoder(self.framing)
+        self.connections.inc()
         
-        print(f"[{self._timestamp()}] ✅ Client connected: {addr} "
-              f"(Active: {self.active_connections})")
+        request_log.info("✅ Client connected: %s (Active: %d)",
+                         addr, self.active_connections)
         
         try:
             while True:
                 try:
                     # Read with timeout for idle connection detection
                     data = await asyncio.wait_for(
-                        reader.read(1024),
+                        reader.read(READ_SIZE),
                         timeout=self.idle_timeout
                     )
                     
                     if not data:
                         break
                     
-                    message = data.decode('utf-8', errors='replace').strip()
-                    self.total_requests += 1
-                    self.bytes_received += len(data)
-                    
-                    print(f"[{self._timestamp()}] 📥 {addr}: {message} "
-                          f"(Request #{self.total_requests})")
+                    self.bytes_in.inc(len(data))
+                    decoder.feed(data)
                     
-                    # Echo back
-                    response = f"ECHO: {message}".encode('utf-8')
-                    writer.write(response)
-                    await writer.drain()
+                    if self.pipelined:
+                        await self._answer_pipelined(addr, decoder, writer)
+                        continue
                     
-                    print(f"[{self._timestamp()}] 📤 Echo sent to {addr}")
+                    # A single read may carry several framed requests
+                    for frame in decoder.frames():
+                        started = time.perf_counter_ns()
+                        message = str(frame, 'utf-8', 'replace').strip()
+                        self.requests.inc()
+                        
+                        request_log.info("📥 %s: %s (Request #%d)",
+                                         addr, message, self.total_requests)
+                        
+                        # Echo back
+                        response = f"ECHO: {message}".encode('utf-8')
+                        writer.write(decoder.encode(response))
+                        await writer.drain()
+                        self.latency.record_ns(time.perf_counter_ns() - started)
+                        
+                        request_log.info("📤 Echo sent to %s", addr)
                 
                 except asyncio.TimeoutError:
-                    print(f"[{self._timestamp()}] ⏱️  Timeout: {addr} idle >{self.idle_timeout}s")
+                    logger.info("⏱️  Timeout: %s idle >%ss", addr, self.idle_timeout)
                     break
         
+        except FrameError as e:
+            logger.warning("⚠️  Framing error from %s: %s", addr, e)
+        
         except Exception as e:
-            print(f"[{self._timestamp()}] ❌ Error with {addr}: {e}")
+            logger.error("❌ Error with %s: %s", addr, e)
         
         finally:
-            self.active_connections -= 1
+            self.connections.dec()
             try:
                 writer.close()
                 await writer.wait_closed()
             except:
                 pass
             
-            print(f"[{self._timestamp()}] 🔌 Disconnected: {addr} "
-                  f"(Active: {self.active_connections})")
+            request_log.info("🔌 Disconnected: %s (Active: %d)",
+                             addr, self.active_connections)
+    
+    async def _answer_pipelined(self, addr, decoder, writer):
+        """
+        Answer every request already buffered in one pass:
+        responses are coalesced into a single writelines() call and we only
+        wait for the socket once the transport passes its high-water mark
+        """
+        started = time.perf_counter_ns()
+        responses = []
+        for frame in decoder.frames():
+            message = str(frame, 'utf-8', 'replace').strip()
+            responses.append(decoder.encode(f"ECHO: {message}".encode('utf-8')))
+        
+        if not responses:
+            return
+        
+        self.requests.inc(len(responses))
+        writer.writelines(responses)
+        
+        transport = writer.transport
+        _, high_water = transport.get_write_buffer_limits()
+        if transport.get_write_buffer_size() > high_water:
+            await writer.drain()
+        # Every request in the batch waited for the whole batch
+        self.latency.record_ns(time.perf_counter_ns() - started, count=len(responses))
+        
+        request_log.info("📦 %s: %d pipelined requests (Total: %d)",
+                         addr, len(responses), self.total_requests)
     
     async def print_metrics_periodic(self):
         """Periodically print server metrics (every 10 seconds)"""
         while True:
             try:
-                await asyncio.sleep(10)
-                self.print_metrics()
+                await asyncio.sleep(self.metrics_interval)
+                self.report_metrics()
             except asyncio.CancelledError:
                 break
     
+    def metrics_snapshot(self):
+        """Additive counters/gauges, summed across workers by the supervisor"""
+        return {
+            'total_requests': self.total_requests,
+            'bytes_received': self.bytes_received,
+            'active_connections': self.active_connections,
+        }
+    
+    def report_metrics(self):
+        if self.metrics_sink:
+            self.metrics_sink(self.metrics_snapshot())
+        else:
+            self.print_metrics()
+    
     def print_metrics(self):
         """Print current server metrics"""
         print(f"\n[{self._timestamp()}] 📊 Server Metrics:")
         print(f"   ├─ Total Requests: {self.total_requests}")
         print(f"   ├─ Active Connections: {self.active_connections}")
-        print(f"   └─ Bytes Received: {self.bytes_received / 1024:.1f} KB")
+        print(f"   ├─ Bytes Received: {self.bytes_received / 1024:.1f} KB")
+        lat = self.latency
+        print(f"   └─ Service Time (ms): p50 {lat.percentile(50) / 1000:.2f} | "
+              f"p99 {lat.percentile(99) / 1000:.2f} | "
+              f"p99.9 {lat.percentile(99.9) / 1000:.2f} | max {lat.max / 1000:.2f}")
     
     async def start(self):
         """Start server and handle graceful shutdown"""
@@ -105,7 +216,9 @@ class AsyncEchoServer:
             self.server = await asyncio.start_server(
                 self.handle_client,
                 self.host,
-                self.port
+                self.port,
+                backlog=self.backlog,
+                reuse_port=self.reuse_port or None
             )
             
             print(f"\n{'='*60}")
@@ -113,7 +226,12 @@ class AsyncEchoServer:
             print(f"   Host: {self.host}")
             print(f"   Port: {self.port}")
             print(f"   Idle Timeout: {self.idle_timeout}s")
+            print(f"   Framing: {self.framing}")
+            print(f"   Pipelined: {self.pipelined}")
             print(f"   Can handle 100+ concurrent connections")
+            if self.metrics_port:
+                await serve_metrics(self.metrics, '127.0.0.1', self.metrics_port)
+                print(f"   Metrics: http://127.0.0.1:{self.metrics_port}/metrics (.json)")
             print(f"{'='*60}\n")
             
             # Start metrics printer
@@ -129,7 +247,7 @@ class AsyncEchoServer:
             sys.exit(1)
         finally:
             print(f"\n[{self._timestamp()}] 🛑 Shutting down...")
-            self.print_metrics()
+            self.report_metrics()
             print(f"[{self._timestamp()}] ✓ Server stopped")
     
     @staticmethod
@@ -138,14 +256,69 @@ class AsyncEchoServer:
         return datetime.now().strftime("%H:%M:%S")
 
 
-async def main():
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lab 1.4 Async TCP Echo Server")
+    parser.add_argument('--framing', choices=MODES, default=LINE,
+                        help="line = newline-delimited, length = 4-byte length prefix")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="answer all buffered requests with one batched write")
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes sharing the port via SO_REUSEPORT")
+    parser.add_argument('--metrics-port', type=int, default=9100,
+                        help="local scrape endpoint (worker i uses port + i), 0 = off")
+    add_logging_args(parser)
+    return parser.parse_args()
+
+
+def configure_logging(args):
+    """Queue-based logging in the same '[HH:MM:SS] message' style as the prints"""
+    setup_logging(fmt='[%(asctime)s] %(message)s', datefmt='%H:%M:%S',
+                  stream=sys.stdout)
+    configure_request_log(request_log, args)
+
+
+def build_server(args, worker_id=0, **kwargs):
+    metrics_port = args.metrics_port + worker_id if args.metrics_port else None
+    return AsyncEchoServer(host='0.0.0.0', port=args.port, timeout=30,
+                           framing=args.framing, pipelined=args.pipeline,
+                           metrics_port=metrics_port, **kwargs)
+
+
+def run_worker(args, worker_id, metrics_queue):
+    """Entry point of one forked worker process"""
+    # The parent's log writer thread does not survive fork()
+    configure_logging(args)
+    
+    def sink(snapshot):
+        metrics_queue.put((worker_id, snapshot))
+    
+    server = build_server(args, worker_id, reuse_port=True, metrics_sink=sink,
+                          metrics_interval=2)
+    try:
+        asyncio.run(server.start())
+    except KeyboardInterrupt:
+        pass
+
+
+async def main(args=None):
     """Main entry point"""
-    server = AsyncEchoServer(host='0.0.0.0', port=9999, timeout=30)
+    if args is None:
+        args = parse_args()
+        configure_logging(args)
+    server = build_server(args)
     await server.start()
 
 
 if __name__ == '__main__':
-    try:
-        asyncio.run(main())
-    except KeyboardInterrupt:
-        print("\n[*] Server shutdown")
+    args = parse_args()
+    configure_logging(args)
+    if args.workers > 1:
+        supervisor = WorkerSupervisor(functools.partial(run_worker, args),
+                                      args.workers, name='async-echo')
+        supervisor.run()
+    else:
+        try:
+            asyncio.run(main(args))
+        except KeyboardInterrupt:
+            print("\n[*] Server shutdown")
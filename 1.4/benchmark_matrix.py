@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Lab 1.4: Benchmark Matrix - Every Server, Same Workloads
+
+Launches each server implementation on a free local port and drives it with
+identical closed-loop workloads (loadgen.py) across a matrix of:
+- message size
+- concurrent connections
+- pipelining depth (requests in flight per connection)
+- connection reuse vs churn (new connection per request batch)
+
+For every cell it records throughput, latency percentiles, errors, server
+CPU usage and peak RSS (from /proc, Linux only) and writes one CSV and one
+JSON report.
+
+Usage:
+    python benchmark_matrix.py
+    python benchmark_matrix.py --servers asyncio,fixed --sizes 64,4096 \\
+        --connections 1,100 --pipeline 1,32 --modes reuse --duration 5 \\
+        --output results/matrix
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+from loadgen import LoadGenerator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (script, arguments, module that must be importable)
+SERVERS = {
+    'sequential': ('1.1/tcp_echo_server.py', ['--port', '{port}', '--request-log', 'off'], None),
+    'selector': ('1.1/selector_echo_server.py', ['--port', '{port}', '--request-log', 'off'], None),
+    'threaded': ('1.3/tcp_threaded_server.py', ['--port', '{port}', '--request-log', 'off'], None),
+    'asyncio': ('1.4/async_tcp_echo_server.py',
+                ['--port', '{port}', '--metrics-port', '0', '--request-log', 'off'], None),
+    'fixed': ('1.6/fixed_server.py',
+              ['--port', '{port}', '--metrics-port', '0', '--request-log', 'off', '--no-uvloop'], None),
+    'fixed-uvloop': ('1.6/fixed_server.py',
+                     ['--port', '{port}', '--metrics-port', '0', '--request-log', 'off'], 'uvloop'),
+    'buggy': ('1.6/buggy_server.py', ['{port}'], None),
+}
+
+MODES = ('reuse', 'churn')
+
+FIELDS = ['server', 'message_size', 'connections', 'pipeline', 'mode',
+          'sent', 'completed', 'errors', 'elapsed_s', 'throughput_rps',
+          'latency_min_ms', 'latency_mean_ms', 'latency_p50_ms', 'latency_p90_ms',
+          'latency_p99_ms', 'latency_p99.9_ms', 'latency_max_ms',
+          'cpu_percent', 'rss_peak_mb', 'note']
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def _available(module):
+    if module is None:
+        return True
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+class ProcessSampler(threading.Thread):
+    """Samples CPU time and peak RSS of one process from /proc"""
+
+    def __init__(self, pid, interval=0.1):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.rss_peak = 0
+        self._stop_event = threading.Event()
+
+    def cpu_seconds(self):
+        try:
+            with open(f'/proc/{self.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            return None
+        # utime and stime are fields 14 and 15 of stat(5)
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+    def rss_bytes(self):
+        try:
+            with open(f'/proc/{self.pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return 0
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.rss_peak = max(self.rss_peak, self.rss_bytes())
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def run_cell(server, size, connections, pipeline, mode, duration):
+    """Start `server`, drive one workload against it and return a report row"""
+    script, arguments, _ = SERVERS[server]
+    port = _free_port()
+    row = {'server': server, 'message_size': size, 'connections': connections,
+           'pipeline': pipeline, 'mode': mode, 'note': ''}
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, script)] +
+        [arg.format(port=port) for arg in arguments],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        if not _wait_for_port(port):
+            row['note'] = 'server did not start'
+            return row
+        sampler = ProcessSampler(proc.pid)
+        cpu_before = sampler.cpu_seconds()
+        sampler.start()
+        gen = LoadGenerator('127.0.0.1', port, connections, duration=duration,
+                            payload_size=size, pipeline=pipeline, reuse=(mode == 'reuse'))
+        result = asyncio.run(gen.run())
+        cpu_after = sampler.cpu_seconds()
+        sampler.stop()
+
+        row.update(result.summary())
+        if cpu_before is not None and cpu_after is not None and result.elapsed:
+            row['cpu_percent'] = round((cpu_after - cpu_before) / result.elapsed * 100, 1)
+        if sampler.rss_peak:
+            row['rss_peak_mb'] = round(sampler.rss_peak / (1024 * 1024), 1)
+        if proc.poll() is not None:
+            row['note'] = f'server exited ({proc.returncode})'
+        return row
+    finally:
+        if proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+
+
+def write_reports(rows, prefix):
+    directory = os.path.dirname(prefix)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(prefix + '.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: row.get(k, '') for k in FIELDS})
+    with open(prefix + '.json', 'w') as f:
+        json.dump({'created': datetime.now().isoformat(timespec='seconds'),
+                   'results': rows}, f, indent=2)
+    return prefix + '.csv', prefix + '.json'
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(',') if v]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Lab 1.4 Benchmark Matrix")
+    parser.add_argument('--servers', default=','.join(SERVERS),
+                        help=f"comma-separated subset of: {', '.join(SERVERS)}")
+    parser.add_argument('--sizes', type=_int_list, default=[64, 1024],
+                        help="message sizes in bytes")
+    parser.add_argument('--connections', type=_int_list, default=[1, 50])
+    parser.add_argument('--pipeline', type=_int_list, default=[1, 16],
+                        help="requests in flight per connection")
+    parser.add_argument('--modes', default=','.join(MODES),
+                        help="reuse (persistent connections) and/or churn")
+    parser.add_argument('--duration', type=float, default=3.0,
+                        help="seconds per cell")
+    parser.add_argument('--output', default='benchmark_matrix',
+                        help="report path prefix (.csv and .json are added)")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    servers = [s for s in args.servers.split(',') if s]
+    modes = [m for m in args.modes.split(',') if m]
+    for name in servers:
+        if name not in SERVERS:
+            sys.exit(f"❌ Unknown server: {name}")
+    for mode in modes:
+        if mode not in MODES:
+            sys.exit(f"❌ Unknown mode: {mode}")
+
+    print(f"\n🔬 Benchmark matrix: {len(servers)} servers x {len(args.sizes)} sizes x "
+          f"{len(args.connections)} connection counts x {len(args.pipeline)} depths x "
+          f"{len(modes)} modes ({args.duration:.0f}s per cell)")
+    print("-" * 100)
+    print(f"{'Server':<14} {'Size':>6} {'Conns':>6} {'Depth':>6} {'Mode':<6} "
+          f"{'req/sec':>10} {'p50 ms':>9} {'p99 ms':>9} {'p99.9 ms':>9} "
+          f"{'Errors':>7} {'CPU %':>6} {'RSS MB':>7}")
+
+    rows = []
+    for server in servers:
+        if not _available(SERVERS[server][2]):
+            print(f"{server:<14} skipped ({SERVERS[server][2]} not installed)")
+            continue
+        for size in args.sizes:
+            for connections in args.connections:
+                for pipeline in args.pipeline:
+                    for mode in modes:
+                        row = run_cell(server, size, connections, pipeline, mode, args.duration)
+                        rows.append(row)
+                        if 'throughput_rps' not in row:
+                            print(f"{server:<14} {size:>6} {connections:>6} {pipeline:>6} "
+                                  f"{mode:<6} ❌ {row['note']}")
+                            continue
+                        print(f"{server:<14} {size:>6} {connections:>6} {pipeline:>6} {mode:<6} "
+                              f"{row['throughput_rps']:>10.0f} {row['latency_p50_ms']:>9.3f} "
+                              f"{row['latency_p99_ms']:>9.3f} {row['latency_p99.9_ms']:>9.3f} "
+                              f"{row['errors']:>7} {row.get('cpu_percent', ''):>6} "
+                              f"{row.get('rss_peak_mb', ''):>7}")
+
+    csv_path, json_path = write_reports(rows, args.output)
+    print(f"\n📄 Reports: {csv_path}, {json_path}")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⏹️  Benchmark interrupted")
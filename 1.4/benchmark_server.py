@@ -8,15 +8,34 @@ Usage:
     
     # Terminal 2: Run benchmark
     python benchmark_server.py
+
+    # Another target: host:port, clients, requests per client
+    python benchmark_server.py localhost:9995 50 20
+
+    # 10,000 simultaneous connections from 4 client processes
+    python benchmark_server.py --async --connections 10000 --requests 10 --processes 4
+
+    # Phases, payload distributions, think time from a scenario file
+    python benchmark_server.py --scenario scenarios/spike.json
 """
 
+import os
 import socket
 import time
 import threading
 import sys
+import asyncio
+import argparse
+import multiprocessing
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
+from loadgen import LoadResult, read_response, stream_limit
+from scenario_runner import main as run_scenario_file
+
+CONNECT_CONCURRENCY = 500   # Outstanding connect() calls per client process
+DEFAULT_MESSAGE = b'Benchmark test message from client\n'
+
 
 def _timestamp():
     return datetime.now().strftime("%H:%M:%S")
@@ -25,9 +44,10 @@ def _timestamp():
 class BenchmarkClient:
     """Simple client for stress testing"""
     
-    def __init__(self, host='127.0.0.1', port=9999):
+    def __init__(self, host='127.0.0.1', port=9999, message=DEFAULT_MESSAGE):
         self.host = host
         self.port = port
+        self.message = message
         self.success_count = 0
         self.fail_count = 0
         self.total_time = 0
@@ -43,8 +63,7 @@ class BenchmarkClient:
             sock.settimeout(5.0)
             sock.connect((self.host, self.port))
             
-            message = b'Benchmark test message from client'
-            sock.send(message)
+            sock.sendall(self.message)
             
             response = sock.recv(1024)
             sock.close()
@@ -74,12 +93,13 @@ class BenchmarkClient:
             return False
 
 
-def stress_test_sequential(num_clients=50):
+def stress_test_sequential(num_clients=50, host='127.0.0.1', port=9999,
+                           message=DEFAULT_MESSAGE):
     """Sequential requests (one by one)"""
     print(f"\n📊 Sequential Test ({num_clients} requests)")
     print("-" * 60)
     
-    client = BenchmarkClient()
+    client = BenchmarkClient(host, port, message)
     start_time = time.time()
     
     for i in range(num_clients):
@@ -103,12 +123,13 @@ def stress_test_sequential(num_clients=50):
     return elapsed
 
 
-def stress_test_concurrent(num_clients=50, max_workers=50):
+def stress_test_concurrent(num_clients=50, max_workers=50, host='127.0.0.1', port=9999,
+                           message=DEFAULT_MESSAGE):
     """Concurrent requests using ThreadPoolExecutor"""
     print(f"\n📊 Concurrent Test ({num_clients} requests, {max_workers} workers)")
     print("-" * 60)
     
-    client = BenchmarkClient()
+    client = BenchmarkClient(host, port, message)
     start_time = time.time()
     
     def worker(_):
@@ -140,24 +161,202 @@ def stress_test_concurrent(num_clients=50, max_workers=50):
     return elapsed
 
 
-def main():
+def _raise_fd_limit(needed):
+    """Each connection is a file descriptor; lift the soft limit if we can"""
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = needed + 256
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        new_soft = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (new_soft, hard))
+
+
+async def _async_connection(host, port, message, num_requests, interval,
+                            connect_sem, all_connected, finished, result, progress):
+    """One persistent connection: connect, wait for the others, send the stream"""
+    try:
+        async with connect_sem:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port, limit=stream_limit(len(message))),
+                timeout=10.0)
+    except (OSError, asyncio.TimeoutError):
+        result.errors += 1
+        progress['failed'] += 1
+        return
+    progress['connected'] += 1
+    try:
+        try:
+            await all_connected.wait()
+            for _ in range(num_requests):
+                start = time.perf_counter_ns()
+                writer.write(message)
+                result.sent += 1
+                response = await asyncio.wait_for(read_response(reader, 'line'), timeout=10.0)
+                if not response.startswith(b'ECHO:'):
+                    result.errors += 1
+                    break
+                result.latency.record_ns(time.perf_counter_ns() - start)
+                result.completed += 1
+                if interval:
+                    await asyncio.sleep(interval)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            # ValueError: a response line longer than the reader's limit
+            result.errors += 1
+        finally:
+            # Whatever happened, _async_clients waits for every connection's count
+            progress['done'] += 1
+        # Hold the connection open until every client is done
+        await finished.wait()
+    finally:
+        writer.close()
+
+
+async def _async_clients(host, port, num_connections, num_requests, message, interval):
+    """Open `num_connections` at once in this process and drive them"""
+    result = LoadResult()
+    progress = {'connected': 0, 'failed': 0, 'done': 0}
+    connect_sem = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    all_connected = asyncio.Event()
+    finished = asyncio.Event()
+
+    tasks = [asyncio.create_task(_async_connection(
+                host, port, message, num_requests, interval,
+                connect_sem, all_connected, finished, result, progress))
+             for _ in range(num_connections)]
+
+    # Release the request streams only once every connection is up
+    while progress['connected'] + progress['failed'] < num_connections:
+        await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    all_connected.set()
+    while progress['done'] < progress['connected']:
+        await asyncio.sleep(0.05)
+    result.elapsed = time.perf_counter() - start
+    finished.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return progress['connected'], result
+
+
+def _async_client_process(host, port, num_connections, num_requests, message,
+                          interval, results_queue):
+    _raise_fd_limit(num_connections)
+    peak, result = asyncio.run(_async_clients(
+        host, port, num_connections, num_requests, message, interval))
+    results_queue.put((peak, result.state()))
+
+
+def stress_test_async(num_connections=10000, num_requests=10, processes=1,
+                      host='127.0.0.1', port=9999, message_size=34, interval=0.0):
+    """
+    Hold `num_connections` simultaneous connections (one coroutine each,
+    spread over `processes` client processes) and send `num_requests`
+    request/response round trips on each.
+    """
+    print(f"\n📊 Async Test ({num_connections} connections x {num_requests} requests, "
+          f"{processes} process{'es' if processes > 1 else ''})")
+    print("-" * 60)
+
+    message = b'x' * max(0, message_size - 1) + b'\n'
+    shares = [num_connections // processes + (1 if i < num_connections % processes else 0)
+              for i in range(processes)]
+    ctx = multiprocessing.get_context('fork' if hasattr(os, 'fork') else 'spawn')
+    results_queue = ctx.Queue()
+    procs = [ctx.Process(target=_async_client_process,
+                         args=(host, port, share, num_requests, message, interval,
+                               results_queue))
+             for share in shares if share]
+    for proc in procs:
+        proc.start()
+
+    total = LoadResult()
+    peak = 0
+    for _ in procs:
+        proc_peak, state = results_queue.get()
+        peak += proc_peak
+        total.merge(LoadResult.from_state(state))
+    for proc in procs:
+        proc.join()
+
+    print(f"\n✅ Async Results:")
+    print(f"   Simultaneous connections: {peak}/{num_connections}")
+    total.print_summary("Request Stream")
+    return total
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Lab 1.4 Benchmark")
+    parser.add_argument('target', nargs='?', help="host:port (default 127.0.0.1:9999)")
+    parser.add_argument('clients', nargs='?', type=int,
+                        help="concurrent clients (--async: connections)")
+    parser.add_argument('requests_per_client', nargs='?', type=int,
+                        help="requests per client")
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help="asyncio client: one coroutine per connection")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--connections', type=int, default=10000,
+                        help="--async: simultaneous connections")
+    parser.add_argument('--requests', type=int, default=10,
+                        help="--async: requests per connection")
+    parser.add_argument('--processes', type=int, default=1,
+                        help="--async: client processes to spread connections over")
+    parser.add_argument('--message-size', type=int, default=None,
+                        help=f"bytes per request incl. newline (default {len(DEFAULT_MESSAGE)})")
+    parser.add_argument('--interval', type=float, default=0.0,
+                        help="--async: seconds between requests on a connection")
+    parser.add_argument('--scenario', help="run a scenario file (see scenario_runner.py)")
+    args = parser.parse_args(argv)
+    if args.target:
+        host, _, port = args.target.rpartition(':')
+        if not host or not port.isdigit():
+            parser.error(f"target must be host:port, got {args.target!r}")
+        args.host, args.port = host, int(port)
+    if args.clients is not None:
+        args.connections = args.clients
+    if args.requests_per_client is not None:
+        args.requests = args.requests_per_client
+    return args
+
+
+def main(argv=None):
     """Run benchmarks"""
+    args = parse_args(argv)
+    if args.scenario:
+        run_scenario_file([args.scenario] + (['--target', args.target] if args.target else []))
+        return
+
+    if args.message_size:
+        message = b'x' * max(0, args.message_size - 1) + b'\n'
+    else:
+        message = DEFAULT_MESSAGE
+    if args.use_async:
+        stress_test_async(args.connections, args.requests, args.processes,
+                          args.host, args.port, len(message), args.interval)
+        return
+
     print("\n" + "="*60)
     print("🔬 Async Server Benchmark")
     print("="*60)
-    print("\n⚠️  Make sure server is running!")
+    print(f"\n⚠️  Make sure server is running on {args.host}:{args.port}!")
     print("   Run: python async_tcp_echo_server.py")
     
     # Wait for server
     time.sleep(2)
     
-    # Test configurations
-    test_configs = [
-        (50, 50),     # 50 clients
-        (100, 50),    # 100 clients
-        (200, 100),   # 200 clients
-        (500, 100),   # 500 clients (stress test)
-    ]
+    # Test configurations: (total requests, concurrent workers)
+    if args.clients is not None:
+        requests_per_client = args.requests_per_client or 1
+        test_configs = [(args.clients * requests_per_client, args.clients)]
+    else:
+        test_configs = [
+            (50, 50),     # 50 clients
+            (100, 50),    # 100 clients
+            (200, 100),   # 200 clients
+            (500, 100),   # 500 clients (stress test)
+        ]
     
     results = []
     
@@ -169,14 +368,15 @@ def main():
             
             # Sequential test (small scale only)
             if num_clients <= 50:
-                seq_time = stress_test_sequential(num_clients)
+                seq_time = stress_test_sequential(num_clients, args.host, args.port, message)
             else:
                 seq_time = None
             
             time.sleep(1)
             
             # Concurrent test
-            conc_time = stress_test_concurrent(num_clients, max_workers)
+            conc_time = stress_test_concurrent(num_clients, max_workers, args.host, args.port,
+                                               message)
             
             if seq_time and conc_time:
                 improvement = (seq_time - conc_time) / seq_time * 100
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Lab 1.4: Load Generation Engine
+
+Two ways to load a server:
+- Open loop (--rate R): requests are scheduled at a constant arrival rate
+  whether or not earlier responses came back, over persistent connections.
+  Latency is measured from the *intended* send time, so a stalled server
+  shows up in the tail instead of silently slowing the client down
+  (coordinated omission).
+- Closed loop (no --rate): each connection sends, waits for the answer,
+  sends again. With --expected-interval the histogram back-fills the
+  requests a stalled client never sent (HdrHistogram-style correction).
+  A failed request (refused, reset, timed out) is counted as an error
+  and the connection is reopened, so the offered concurrency holds for
+  the whole run.
+
+All timing uses perf_counter_ns(); latencies go into a log-linear
+histogram (common/metrics.py) and are reported as p50/p90/p99/p99.9.
+
+Usage:
+    python loadgen.py --port 9999 --connections 50 --rate 5000 --duration 10
+    python loadgen.py --port 9999 --connections 50 --duration 10   # closed loop
+"""
+
+import argparse
+import asyncio
+import os
+import struct
+import sys
+import time
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import Histogram
+from common.framing import LINE, LENGTH, MAX_FRAME_SIZE, encode_frame
+
+RAW = 'raw'     # No framing: one read() is one response (buggy/legacy servers)
+FRAMINGS = (LINE, LENGTH, RAW)
+
+_HEADER = struct.Struct('!I')
+RECONNECT_DELAY = 0.01          # Seconds after a failure, doubled while failures repeat
+MAX_RECONNECT_DELAY = 1.0
+STREAM_LIMIT = 64 * 1024        # asyncio's default StreamReader limit
+
+
+class LoadResult:
+    """Counters plus latency histogram (microseconds) of one run"""
+
+    def __init__(self):
+        self.latency = Histogram('latency')
+        self.sent = 0
+        self.completed = 0
+        self.errors = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        return self.completed / self.elapsed if self.elapsed else 0.0
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.sent += other.sent
+        self.completed += other.completed
+        self.errors += other.errors
+        self.elapsed = max(self.elapsed, other.elapsed)
+
+    def state(self):
+        """Picklable form, to ship results between processes"""
+        return {'latency': self.latency.state(), 'sent': self.sent,
+                'completed': self.completed, 'errors': self.errors,
+                'elapsed': self.elapsed}
+
+    @classmethod
+    def from_state(cls, state):
+        result = cls()
+        result.latency.load_state(state['latency'])
+        result.sent = state['sent']
+        result.completed = state['completed']
+        result.errors = state['errors']
+        result.elapsed = state['elapsed']
+        return result
+
+    def summary(self):
+        """Flat dict: counts, throughput and latency in milliseconds"""
+        lat = self.latency
+        return {
+            'sent': self.sent,
+            'completed': self.completed,
+            'errors': self.errors,
+            'elapsed_s': round(self.elapsed, 3),
+            'throughput_rps': round(self.throughput, 1),
+            'latency_min_ms': (lat.min or 0) / 1000,
+            'latency_mean_ms': round(lat.mean / 1000, 3),
+            'latency_p50_ms': lat.percentile(50) / 1000,
+            'latency_p90_ms': lat.percentile(90) / 1000,
+            'latency_p99_ms': lat.percentile(99) / 1000,
+            'latency_p99.9_ms': lat.percentile(99.9) / 1000,
+            'latency_max_ms': lat.max / 1000,
+        }
+
+    def print_summary(self, title="Load Results"):
+        s = self.summary()
+        print(f"\n✅ {title}:")
+        print(f"   Sent / Completed / Errors: {s['sent']} / {s['completed']} / {s['errors']}")
+        print(f"   Duration: {s['elapsed_s']:.2f}s")
+        print(f"   Throughput: {s['throughput_rps']:.1f} req/sec")
+        print(f"   Latency (ms): min {s['latency_min_ms']:.3f} | mean {s['latency_mean_ms']:.3f} | "
+              f"max {s['latency_max_ms']:.3f}")
+        print(f"   Percentiles (ms): p50 {s['latency_p50_ms']:.3f} | p90 {s['latency_p90_ms']:.3f} | "
+              f"p99 {s['latency_p99_ms']:.3f} | p99.9 {s['latency_p99.9_ms']:.3f}")
+
+
+def stream_limit(payload_size):
+    """StreamReader limit that fits a line response to a `payload_size`-byte request"""
+    # readline() raises ValueError on longer lines; echoes add a prefix
+    return max(STREAM_LIMIT, 2 * payload_size + 1024)
+
+
+async def read_response(reader, framing):
+    """Read one framed response; b'' when the server closed the connection"""
+    if framing == LINE:
+        return await reader.readline()
+    if framing == LENGTH:
+        header = await reader.readexactly(_HEADER.size)
+        (length,) = _HEADER.unpack(header)
+        return header + await reader.readexactly(length)
+    return await reader.read(65536)
+
+
+class LoadGenerator:
+    """
+    Drive one server with `connections` persistent connections.
+
+    rate=None -> closed loop; rate=R -> open loop at R requests/sec.
+    The run stops after `duration` seconds or `requests` requests,
+    whichever comes first.
+
+    Closed loop only: `pipeline` requests are written back-to-back before
+    reading their answers, and reuse=False opens a new connection for
+    every batch (connect time counts towards latency).
+
+    `payload_dist` and `think_time` are optional callables returning a
+    payload size (bytes) per request and a pause (seconds) after each
+    closed-loop batch.
+    """
+
+    def __init__(self, host='127.0.0.1', port=9999, connections=10, rate=None,
+                 duration=10.0, requests=None, payload_size=32, framing=LINE,
+                 expected_interval=None, timeout=5.0, pipeline=1, reuse=True,
+                 payload_dist=None, think_time=None):
+        self.host = host
+        self.port = port
+        self.connections = connections
+        self.rate = rate
+        self.duration = duration
+        self.requests = requests
+        self.framing = framing
+        self.timeout = timeout
+        # Closed loop only: expected gap between requests, in seconds
+        self.expected_interval = expected_interval
+        # One read() cannot be split into several unframed responses
+        self.pipeline = 1 if framing == RAW else max(1, pipeline)
+        self.reuse = reuse
+        self.payload_dist = payload_dist
+        self.think_time = think_time
+        self._frames = {}
+        self.payload = self._frame(payload_size)
+        # Distributed sizes are not known up front: allow the largest frame
+        self.limit = stream_limit(MAX_FRAME_SIZE if payload_dist else payload_size)
+        self.result = LoadResult()
+
+    def _frame(self, size):
+        frame = self._frames.get(size)
+        if frame is None:
+            body = b'x' * size
+            frame = body if self.framing == RAW else encode_frame(body, self.framing)
+            # Wide size distributions would otherwise cache every size
+            if len(self._frames) < 256:
+                self._frames[size] = frame
+        return frame
+
+    def next_payload(self):
+        if self.payload_dist is None:
+            return self.payload
+        return self._frame(max(0, int(self.payload_dist())))
+
+    async def _connect(self):
+        return await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, limit=self.limit),
+            timeout=self.timeout)
+
+    # ---- closed loop -------------------------------------------------
+
+    async def _closed_loop_worker(self, deadline, budget):
+        result = self.result
+        expected_us = int(self.expected_interval * 1e6) if self.expected_interval else 0
+        reader = writer = None
+        backoff = RECONNECT_DELAY
+        while time.perf_counter_ns() < deadline and budget[0] > 0:
+            depth = int(min(self.pipeline, budget[0]))
+            budget[0] -= depth
+            answered = 0
+            try:
+                if writer is None and self.reuse:
+                    reader, writer = await self._connect()
+                started = time.perf_counter_ns()
+                if writer is None:
+                    reader, writer = await self._connect()
+                if depth == 1:
+                    writer.write(self.next_payload())
+                else:
+                    writer.write(b''.join(self.next_payload() for _ in range(depth)))
+                result.sent += depth
+                for _ in range(depth):
+                    response = await asyncio.wait_for(
+                        read_response(reader, self.framing), timeout=self.timeout)
+                    if not response:
+                        raise ConnectionResetError("server closed the connection")
+                    latency_us = (time.perf_counter_ns() - started) // 1000
+                    if expected_us:
+                        result.latency.record_corrected(latency_us, expected_us)
+                    else:
+                        result.latency.record(latency_us)
+                    result.completed += 1
+                    answered += 1
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                # ValueError: a line response longer than the reader's limit.
+                # Every request of the batch that got no answer is an error. The
+                # connection is in an unknown state (late answers would be taken
+                # for the next batch's): drop it and reconnect after a pause.
+                result.errors += depth - answered
+                if writer is not None:
+                    writer.close()
+                    reader = writer = None
+                await asyncio.sleep(max(0, min(backoff, (deadline - time.perf_counter_ns()) / 1e9)))
+                backoff = min(MAX_RECONNECT_DELAY, backoff * 2)
+                continue
+            backoff = RECONNECT_DELAY
+            if not self.reuse:
+                writer.close()
+                reader = writer = None
+            if self.think_time:
+                await asyncio.sleep(self.think_time())
+        if writer is not None:
+            writer.close()
+
+    # ---- open loop ---------------------------------------------------
+
+    async def _receiver(self, reader, writer, pending):
+        """Match in-order responses to the intended send times"""
+        result = self.result
+        try:
+            while True:
+                response = await read_response(reader, self.framing)
+                if not response:
+                    break
+                intended = pending.popleft()
+                result.latency.record((time.perf_counter_ns() - intended) // 1000)
+                result.completed += 1
+        except (OSError, asyncio.IncompleteReadError, IndexError, ValueError):
+            pass
+        # Nothing more is read from this connection: close it so that its
+        # later requests count as errors (and its unanswered ones at the end)
+        writer.close()
+
+    async def _open_loop(self, total):
+        result = self.result
+        conns = []
+        for _ in range(self.connections):
+            try:
+                reader, writer = await self._connect()
+            except (OSError, asyncio.TimeoutError):
+                result.errors += 1
+                continue
+            pending = deque()
+            task = asyncio.create_task(self._receiver(reader, writer, pending))
+            conns.append((writer, pending, task))
+        if not conns:
+            return
+
+        interval = int(1e9 / self.rate)
+        start = time.perf_counter_ns()
+        i = 0
+        while i < total:
+            # Send everything that is due (the loop may wake up late)
+            due = min(total, (time.perf_counter_ns() - start) // interval + 1)
+            while i < due:
+                writer, pending, _ = conns[i % len(conns)]
+                if not writer.is_closing():
+                    pending.append(start + i * interval)
+                    writer.write(self.next_payload())
+                    result.sent += 1
+                else:
+                    result.errors += 1
+                i += 1
+            if i < total:
+                delay = start + i * interval - time.perf_counter_ns()
+                await asyncio.sleep(max(0, delay) / 1e9)
+
+        # Give outstanding requests `timeout` seconds to complete
+        grace = time.perf_counter_ns() + int(self.timeout * 1e9)
+        while any(pending for _, pending, _ in conns) and time.perf_counter_ns() < grace:
+            await asyncio.sleep(0.01)
+        for writer, pending, task in conns:
+            result.errors += len(pending)
+            task.cancel()
+            writer.close()
+
+    # ---- entry point -------------------------------------------------
+
+    async def run(self):
+        start = time.perf_counter()
+        if self.rate:
+            total = int(self.rate * self.duration)
+            if self.requests:
+                total = min(total, self.requests)
+            await self._open_loop(total)
+        else:
+            deadline = time.perf_counter_ns() + int(self.duration * 1e9)
+            budget = [self.requests or float('inf')]
+            await asyncio.gather(*(self._closed_loop_worker(deadline, budget)
+                                   for _ in range(self.connections)))
+        self.result.elapsed = time.perf_counter() - start
+        return self.result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Lab 1.4 Load Generator")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9999)
+    parser.add_argument('--connections', type=int, default=10)
+    parser.add_argument('--rate', type=float, default=None,
+                        help="open loop: requests/sec (omit for closed loop)")
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--requests', type=int, default=None,
+                        help="stop after this many requests")
+    parser.add_argument('--payload-size', type=int, default=32)
+    parser.add_argument('--framing', choices=FRAMINGS, default=LINE)
+    parser.add_argument('--pipeline', type=int, default=1,
+                        help="closed loop: requests in flight per connection")
+    parser.add_argument('--churn', action='store_true',
+                        help="closed loop: new connection for every request batch")
+    parser.add_argument('--expected-interval', type=float, default=None,
+                        help="closed loop: expected seconds between requests "
+                             "(enables coordinated-omission correction)")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    mode = f"open loop @ {args.rate:.0f} req/s" if args.rate else "closed loop"
+    print(f"\n🔬 Load test {args.host}:{args.port} - {mode}, "
+          f"{args.connections} connections, {args.duration:.0f}s")
+    gen = LoadGenerator(args.host, args.port, args.connections, args.rate,
+                        args.duration, args.requests, args.payload_size,
+                        args.framing, args.expected_interval,
+                        pipeline=args.pipeline, reuse=not args.churn)
+    result = asyncio.run(gen.run())
+    result.print_summary()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⏹️  Load test interrupted")
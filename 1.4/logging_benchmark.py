@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Lab 1.4: Benchmark - Cost of Per-request Logging
+
+Starts async_tcp_echo_server.py once per --request-log mode (on, sampled,
+off) and measures requests/sec for the same request/response workload.
+
+Usage:
+    python logging_benchmark.py [connections] [requests_per_connection]
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'async_tcp_echo_server.py')
+MODES = ('on', 'sampled', 'off')
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+async def _client(port, num_requests):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    for i in range(num_requests):
+        writer.write(b'logging benchmark %d\n' % i)
+        await reader.readline()
+    writer.close()
+    await writer.wait_closed()
+
+
+async def _drive(port, connections, requests):
+    start = time.perf_counter()
+    await asyncio.gather(*(_client(port, requests) for _ in range(connections)))
+    return time.perf_counter() - start
+
+
+def run_mode(mode, connections, requests):
+    """Run one server with --request-log mode and return req/sec"""
+    port = _free_port()
+    with tempfile.TemporaryFile() as log_file:
+        proc = subprocess.Popen(
+            [sys.executable, SERVER, '--port', str(port), '--metrics-port', '0',
+             '--request-log', mode],
+            stdout=log_file, stderr=subprocess.STDOUT
+        )
+        try:
+            if not _wait_for_port(port):
+                raise RuntimeError("server did not start")
+            elapsed = asyncio.run(_drive(port, connections, requests))
+        finally:
+            proc.terminate()
+            proc.wait()
+        log_size = log_file.seek(0, os.SEEK_END)
+    return connections * requests / elapsed, log_size
+
+
+def main():
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    print(f"\n🔬 Per-request logging cost ({connections} connections x {requests} requests)")
+    print("-" * 60)
+    print(f"{'Mode':<12} {'Throughput':<18} {'Log output':<12}")
+    results = {}
+    for mode in MODES:
+        rate, log_size = run_mode(mode, connections, requests)
+        results[mode] = rate
+        print(f"{mode:<12} {rate:>10.0f} req/sec   {log_size / 1024:>8.1f} KB")
+
+    if results.get('on'):
+        print(f"\n⚡ Logging off is {results['off'] / results['on']:.2f}x "
+              f"the throughput of logging every request")
+
+
+if __name__ == '__main__':
+    main()
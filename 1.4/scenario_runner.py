@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+Lab 1.4: Scenario-driven Benchmark Runner
+
+A scenario file (JSON) describes the target and a list of phases, e.g.
+warm-up -> ramp -> steady state -> spike. Each phase sets:
+
+    duration      seconds
+    connections   number, or [from, to] to ramp linearly over the phase
+    rate          open-loop requests/sec (number or [from, to]); omit = closed loop
+    pipeline      requests in flight per connection (closed loop)
+    reuse         true = persistent connections, false = new connection per batch
+    payload       size distribution in bytes (see below)
+    think_time    pause after each closed-loop batch, seconds (distribution)
+    record        false to run the phase without keeping its results (warm-up)
+
+Keys under "defaults" apply to every phase. Distributions are a number or
+    {"dist": "fixed", "value": 64}
+    {"dist": "uniform", "min": 16, "max": 4096}
+    {"dist": "choice", "values": [64, 1024, 16384], "weights": [80, 15, 5]}
+    {"dist": "exponential", "mean": 512, "max": 65536}
+
+Every run is saved as results/<scenario>/<timestamp>[-label].json and
+compared with the previous run of the same scenario.
+
+Usage:
+    python scenario_runner.py scenarios/spike.json
+    python scenario_runner.py scenarios/spike.json --target localhost:9995 --label buggy
+    python scenario_runner.py --compare results/spike/A.json results/spike/B.json
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import sys
+from datetime import datetime
+
+from loadgen import LoadGenerator, LoadResult, FRAMINGS
+
+RAMP_STEPS = 5      # A ramp phase runs as this many equal steps
+
+
+def make_distribution(spec):
+    """Turn a number or {"dist": ...} dict into a zero-argument callable"""
+    if spec is None:
+        return None
+    if isinstance(spec, (int, float)):
+        return lambda: spec
+    kind = spec.get('dist', 'fixed')
+    if kind == 'fixed':
+        value = spec['value']
+        return lambda: value
+    if kind == 'uniform':
+        low, high = spec['min'], spec['max']
+        if isinstance(low, int) and isinstance(high, int):
+            return lambda: random.randint(low, high)
+        return lambda: random.uniform(low, high)
+    if kind == 'choice':
+        values = spec['values']
+        weights = spec.get('weights')
+        return lambda: random.choices(values, weights)[0]
+    if kind == 'exponential':
+        mean = spec['mean']
+        cap = spec.get('max', float('inf'))
+        return lambda: min(cap, random.expovariate(1.0 / mean))
+    raise ValueError(f"Unknown distribution: {kind!r}")
+
+
+def parse_target(target):
+    host, _, port = target.rpartition(':')
+    if not host or not port.isdigit():
+        raise ValueError(f"Target must be host:port, got {target!r}")
+    return host, int(port)
+
+
+def load_scenario(path):
+    with open(path) as f:
+        scenario = json.load(f)
+    if not scenario.get('phases'):
+        raise ValueError(f"{path}: scenario has no phases")
+    scenario.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    return scenario
+
+
+def _interpolate(value, step, steps):
+    """[from, to] -> value at step (of steps); plain values pass through"""
+    if not isinstance(value, list):
+        return value
+    start, end = value
+    if steps == 1:
+        return end
+    return start + (end - start) * step / (steps - 1)
+
+
+async def run_phase(host, port, framing, phase):
+    """Run one phase (as RAMP_STEPS sub-runs if it ramps) and merge the results"""
+    connections = phase.get('connections', 10)
+    rate = phase.get('rate')
+    ramps = isinstance(connections, list) or isinstance(rate, list)
+    steps = RAMP_STEPS if ramps else 1
+
+    result = LoadResult()
+    elapsed = 0.0
+    for step in range(steps):
+        step_rate = _interpolate(rate, step, steps)
+        gen = LoadGenerator(
+            host, port,
+            connections=max(1, int(_interpolate(connections, step, steps))),
+            rate=step_rate or None,
+            duration=phase.get('duration', 10) / steps,
+            framing=framing,
+            pipeline=phase.get('pipeline', 1),
+            reuse=phase.get('reuse', True),
+            payload_dist=make_distribution(phase.get('payload', 64)),
+            think_time=make_distribution(phase.get('think_time')),
+        )
+        step_result = await gen.run()
+        elapsed += step_result.elapsed
+        result.merge(step_result)
+    result.elapsed = elapsed
+    return result
+
+
+def run_scenario(scenario, target=None):
+    """Run every phase; returns the run record (dict) that gets persisted"""
+    host, port = parse_target(target or scenario.get('target', '127.0.0.1:9999'))
+    framing = scenario.get('framing', 'line')
+    if framing not in FRAMINGS:
+        raise ValueError(f"Unknown framing: {framing!r}")
+    defaults = scenario.get('defaults', {})
+
+    print(f"\n🔬 Scenario '{scenario['name']}' against {host}:{port}")
+    print("-" * 90)
+    print(f"{'Phase':<14} {'Duration':>9} {'req/sec':>10} {'p50 ms':>9} {'p90 ms':>9} "
+          f"{'p99 ms':>9} {'p99.9 ms':>9} {'Errors':>7}")
+
+    phases = []
+    total = LoadResult()
+    for index, phase in enumerate(scenario['phases']):
+        phase = dict(defaults, **phase)
+        name = phase.get('name', f"phase-{index + 1}")
+        result = asyncio.run(run_phase(host, port, framing, phase))
+        summary = result.summary()
+        recorded = phase.get('record', True)
+        marker = '' if recorded else '  (not recorded)'
+        print(f"{name:<14} {summary['elapsed_s']:>8.1f}s {summary['throughput_rps']:>10.0f} "
+              f"{summary['latency_p50_ms']:>9.3f} {summary['latency_p90_ms']:>9.3f} "
+              f"{summary['latency_p99_ms']:>9.3f} {summary['latency_p99.9_ms']:>9.3f} "
+              f"{summary['errors']:>7}{marker}")
+        if recorded:
+            phases.append({'name': name, 'config': phase, 'results': summary})
+            elapsed = total.elapsed
+            total.merge(result)
+            total.elapsed = elapsed + result.elapsed
+
+    return {
+        'scenario': scenario['name'],
+        'target': f"{host}:{port}",
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'phases': phases,
+        'total': total.summary(),
+    }
+
+
+def save_run(run, results_dir, label=None):
+    directory = os.path.join(results_dir, run['scenario'])
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    if label:
+        run['label'] = label
+        stamp += f"-{label}"
+    path = os.path.join(directory, f"{stamp}.json")
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+    return path
+
+
+def previous_run(results_dir, scenario_name, exclude):
+    runs = sorted(glob.glob(os.path.join(results_dir, scenario_name, '*.json')))
+    runs = [r for r in runs if os.path.abspath(r) != os.path.abspath(exclude)]
+    return runs[-1] if runs else None
+
+
+def _change(before, after):
+    if not before:
+        return '   n/a'
+    return f"{(after - before) / before * 100:+6.1f}%"
+
+
+def compare_runs(path_a, path_b):
+    """Print throughput / tail latency deltas of run B against run A, per phase"""
+    with open(path_a) as f:
+        run_a = json.load(f)
+    with open(path_b) as f:
+        run_b = json.load(f)
+    label_a = run_a.get('label') or os.path.basename(path_a)
+    label_b = run_b.get('label') or os.path.basename(path_b)
+
+    print(f"\n📈 {label_b} vs {label_a}")
+    print("-" * 90)
+    print(f"{'Phase':<14} {'req/sec A':>10} {'req/sec B':>10} {'Δ':>8} "
+          f"{'p99 A':>9} {'p99 B':>9} {'Δ':>8} {'Errors A/B':>12}")
+    phases_a = {p['name']: p['results'] for p in run_a['phases']}
+    rows = [(p['name'], p['results']) for p in run_b['phases']]
+    rows.append(('total', run_b['total']))
+    phases_a['total'] = run_a['total']
+    for name, b in rows:
+        a = phases_a.get(name)
+        if a is None:
+            print(f"{name:<14} (not in {label_a})")
+            continue
+        print(f"{name:<14} {a['throughput_rps']:>10.0f} {b['throughput_rps']:>10.0f} "
+              f"{_change(a['throughput_rps'], b['throughput_rps']):>8} "
+              f"{a['latency_p99_ms']:>9.3f} {b['latency_p99_ms']:>9.3f} "
+              f"{_change(a['latency_p99_ms'], b['latency_p99_ms']):>8} "
+              f"{a['errors']:>5}/{b['errors']:<6}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Lab 1.4 Scenario Benchmark Runner")
+    parser.add_argument('scenario', nargs='?', help="scenario JSON file")
+    parser.add_argument('--target', help="host:port, overrides the scenario's target")
+    parser.add_argument('--label', help="tag for this run, e.g. buggy / fixed")
+    parser.add_argument('--results-dir', default='results')
+    parser.add_argument('--compare', nargs=2, metavar=('RUN_A', 'RUN_B'),
+                        help="compare two saved runs instead of running")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.compare:
+        compare_runs(*args.compare)
+        return
+    if not args.scenario:
+        sys.exit("❌ Give a scenario file or --compare RUN_A RUN_B")
+
+    scenario = load_scenario(args.scenario)
+    run = run_scenario(scenario, args.target)
+    path = save_run(run, args.results_dir, args.label)
+    print(f"\n📄 Saved: {path}")
+
+    previous = previous_run(args.results_dir, run['scenario'], path)
+    if previous:
+        compare_runs(previous, path)
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\n⏹️  Scenario interrupted")
@@ -0,0 +1,237 @@
+"""
+Lab 1.5: ARP Binding Monitor
+The state behind continuous ARP spoof detection. Every request, reply and
+gratuitous ARP whose sender is not 0.0.0.0 (a DHCP/duplicate-address
+probe) claims "sender IP is at sender MAC" - hosts update their caches
+from requests too, which is what request-based poisoning relies on.
+
+Bindings
+    IP -> MAC, with first/last seen times and the times of recent MAC
+    changes. A binding not refreshed for `ttl` seconds expires
+    (common/timerwheel.py on capture time): a host that comes back later
+    with a new NIC is a new binding, not an alert. At most
+    `max_bindings` are kept (the least recently claimed goes first),
+    enough for a /16.
+Claims per MAC
+    the IPs each MAC claimed within the last `window` seconds, capped at
+    a little over `many_ips` per MAC and expired with the MAC, so one
+    noisy MAC cannot grow them without bound either.
+
+Alerts, each at most once per `cooldown` seconds per kind and subject:
+    binding_change  a live binding's IP is claimed by another MAC
+    gratuitous      ... and the claim was a gratuitous ARP (sender IP ==
+                    target IP), i.e. an announced takeover
+    flapping        one IP changed MAC `flap_count` times within
+                    `window` seconds: two hosts answer for it
+    many_ips        one MAC claimed more than `many_ips` IPs within
+                    `window` seconds (routers doing proxy ARP belong in
+                    `allow_macs`)
+    eth_mismatch    the Ethernet source differs from the ARP sender MAC
+
+Times are packet timestamps, so a capture replays exactly as it ran live.
+"""
+import os
+import sys
+from collections import Counter, OrderedDict, deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.pcapio import ip_ntop, mac_ntop
+from common.timerwheel import TimerWheel
+
+BINDING_TTL = 1200.0            # Seconds without a claim before a binding expires
+WINDOW = 60.0                   # Seconds for the flapping and many-IPs checks
+FLAP_COUNT = 3                  # MAC changes within WINDOW that count as flapping
+MANY_IPS = 16                   # IPs one MAC may claim within WINDOW
+COOLDOWN = 60.0                 # Seconds before the same alert is raised again
+MAX_BINDINGS = 131072
+MAX_MACS = 65536
+EXPIRY_TICK = 1.0
+RECENT_ALERTS = 100
+ZERO_IP = bytes(4)
+
+ARP_REQUEST, ARP_REPLY = 1, 2
+
+
+class Binding:
+    __slots__ = ('mac', 'first_seen', 'last_seen', 'changes')
+
+    def __init__(self, mac, ts):
+        self.mac = mac
+        self.first_seen = self.last_seen = ts
+        # Times of the last MAC changes; most bindings never change, and
+        # an empty deque per binding would be ~45 MB for a /16
+        self.changes = None
+
+
+class Alert:
+    __slots__ = ('ts', 'kind', 'ip', 'mac', 'detail')
+
+    def __init__(self, ts, kind, ip, mac, detail=''):
+        self.ts = ts
+        self.kind = kind
+        self.ip = ip                # Packed addresses
+        self.mac = mac
+        self.detail = detail
+
+    def to_dict(self):
+        return {'time': self.ts, 'kind': self.kind, 'ip': ip_ntop(self.ip),
+                'mac': mac_ntop(self.mac), 'detail': self.detail}
+
+    def __str__(self):
+        return f"{self.kind}: {ip_ntop(self.ip)} at {mac_ntop(self.mac)} {self.detail}".rstrip()
+
+
+class ARPMonitor:
+    def __init__(self, on_alert=None, ttl=BINDING_TTL, window=WINDOW, flap_count=FLAP_COUNT,
+                 many_ips=MANY_IPS, cooldown=COOLDOWN, max_bindings=MAX_BINDINGS,
+                 max_macs=MAX_MACS, allow_macs=()):
+        if flap_count < 2:
+            raise ValueError("flap_count must be at least 2 (MAC changes)")
+        if many_ips < 1:
+            raise ValueError("many_ips must be at least 1")
+        if ttl <= 0 or window <= 0:
+            raise ValueError("ttl and window must be positive")
+        self.on_alert = on_alert
+        self.ttl = ttl
+        self.window = window
+        self.flap_count = flap_count
+        self.many_ips = many_ips
+        self.cooldown = cooldown
+        self.max_bindings = max_bindings
+        self.max_macs = max_macs
+        self.allow_macs = frozenset(allow_macs)     # Packed MACs exempt from many_ips
+        # Least recently claimed first, so that at the cap a stale entry is
+        # evicted, not a live one (whose spoofing would then go unnoticed)
+        self.bindings = OrderedDict()   # packed IP -> Binding
+        self.claims = OrderedDict()     # packed MAC -> {packed IP: last claim time}
+        self.binding_expiry = None  # TimerWheels on capture time, made at the first packet
+        self.mac_expiry = None
+        self._next_tick = 0.0
+        self._next_forget = 0.0
+        self._raised = {}           # (kind, subject) -> time of the last alert
+        self.recent = deque(maxlen=RECENT_ALERTS)
+        # Statistics
+        self.packets = 0
+        self.requests = 0
+        self.replies = 0
+        self.gratuitous = 0
+        self.probes = 0
+        self.expired = 0
+        self.evicted = 0
+        self.suppressed = 0
+        self.alerts = Counter()     # kind -> alerts raised
+
+    def __len__(self):
+        return len(self.bindings)
+
+    def process(self, ts, arp):
+        """One ARPPacket (common/pcapio.py) seen at capture time ts"""
+        if self.binding_expiry is None:
+            self.binding_expiry = TimerWheel(self.ttl, tick=EXPIRY_TICK, clock=lambda: ts)
+            self.mac_expiry = TimerWheel(self.window, tick=EXPIRY_TICK, clock=lambda: ts)
+            self._next_tick = ts + EXPIRY_TICK
+        elif ts >= self._next_tick:
+            self._next_tick = ts + EXPIRY_TICK
+            self._expire(ts)
+        self.packets += 1
+        op, sha, spa = arp.op, arp.sha, arp.spa
+        if op == ARP_REQUEST:
+            self.requests += 1
+        elif op == ARP_REPLY:
+            self.replies += 1
+        else:
+            return
+        if arp.eth_src is not None and arp.eth_src != sha:
+            self._alert(ts, 'eth_mismatch', spa, sha, f"(Ethernet source {mac_ntop(arp.eth_src)})")
+        if spa == ZERO_IP:
+            self.probes += 1        # Address probe: claims nothing
+            return
+        gratuitous = spa == arp.tpa
+        if gratuitous:
+            self.gratuitous += 1
+        self._bind(ts, spa, sha, gratuitous)
+        if sha not in self.allow_macs:
+            self._claim(ts, spa, sha)
+
+    def _bind(self, ts, ip, mac, gratuitous):
+        binding = self.bindings.get(ip)
+        if binding is None:
+            if len(self.bindings) >= self.max_bindings:
+                oldest, _ = self.bindings.popitem(last=False)
+                self.binding_expiry.remove(oldest)
+                self.evicted += 1
+            self.bindings[ip] = Binding(mac, ts)
+        else:
+            self.bindings.move_to_end(ip)
+            if binding.mac != mac:
+                previous = binding.mac
+                binding.mac = mac
+                changes = binding.changes
+                if changes is None:
+                    changes = binding.changes = deque(maxlen=self.flap_count)
+                changes.append(ts)
+                self._alert(ts, 'gratuitous' if gratuitous else 'binding_change', ip, mac,
+                            f"(was {mac_ntop(previous)} for {ts - binding.first_seen:.0f}s)")
+                binding.first_seen = ts
+                if len(changes) == self.flap_count and ts - changes[0] <= self.window:
+                    self._alert(ts, 'flapping', ip, mac,
+                                f"({len(changes)} MAC changes in {ts - changes[0]:.1f}s)")
+            binding.last_seen = ts
+        self.binding_expiry.touch(ip, ts)
+
+    def _claim(self, ts, ip, mac):
+        claims = self.claims.get(mac)
+        if claims is None:
+            if len(self.claims) >= self.max_macs:
+                oldest, _ = self.claims.popitem(last=False)
+                self.mac_expiry.remove(oldest)
+            claims = self.claims[mac] = {}
+        else:
+            self.claims.move_to_end(mac)
+        self.mac_expiry.touch(mac, ts)
+        claims[ip] = ts
+        if len(claims) > self.many_ips:
+            horizon = ts - self.window
+            for old in [i for i, seen in claims.items() if seen < horizon]:
+                del claims[old]
+            if len(claims) > self.many_ips:
+                self._alert(ts, 'many_ips', ip, mac,
+                            f"({len(claims)} IPs in {self.window:g}s)")
+                # Keep the newest just over the threshold: still alerting, bounded
+                while len(claims) > self.many_ips + 1:
+                    del claims[next(iter(claims))]
+
+    def _alert(self, ts, kind, ip, mac, detail=''):
+        subject = (kind, mac if kind == 'many_ips' else ip)
+        last = self._raised.get(subject)
+        if last is not None and ts - last < self.cooldown:
+            self.suppressed += 1
+            return
+        self._raised[subject] = ts
+        alert = Alert(ts, kind, ip, mac, detail)
+        self.alerts[kind] += 1
+        self.recent.append(alert)
+        if self.on_alert:
+            self.on_alert(alert)
+
+    def _expire(self, ts):
+        for ip in self.binding_expiry.advance(ts):
+            del self.bindings[ip]
+            self.expired += 1
+        for mac in self.mac_expiry.advance(ts):
+            del self.claims[mac]
+        if ts >= self._next_forget:
+            # Subjects whose cooldown is over need no entry
+            self._next_forget = ts + self.cooldown
+            horizon = ts - self.cooldown
+            self._raised = {key: seen for key, seen in self._raised.items() if seen >= horizon}
+
+    def snapshot(self):
+        """JSON-ready state summary"""
+        return {
+            'packets': self.packets, 'requests': self.requests, 'replies': self.replies,
+            'gratuitous': self.gratuitous, 'probes': self.probes,
+            'bindings': len(self.bindings), 'macs': len(self.claims),
+            'expired': self.expired, 'evicted': self.evicted,
+            'alerts': dict(self.alerts), 'suppressed': self.suppressed,
+        }
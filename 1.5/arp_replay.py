@@ -0,0 +1,96 @@
+"""
+Lab 1.5: ARP Detector Replay Harness
+Writes a synthetic ARP capture with known attacks (pcap_synth.arp_capture),
+replays it through ARPSpoofDetector and compares the alerts raised with
+the expected ones: expected but not raised are misses, raised but not
+expected are false positives. The benign traffic includes address probes,
+announcements and a host that comes back with a new NIC after its binding
+expired, none of which may alert. Exits 0 only on an exact match.
+
+Usage:
+    python arp_replay.py [--hosts 4096] [--duration 900] [--seed 1] [--workers 1]
+    python arp_replay.py --hosts 65526 --no-attacks      # a quiet /16
+    python arp_replay.py --keep /tmp/arp.pcap            # keep the capture
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pcap_synth import arp_capture, ATTACKS_END
+from arp_spoof_detector import ARPSpoofDetector
+
+TTL = 300.0                     # Binding TTL for the replay (the capture is built around it)
+
+
+def replay(path, expected, workers=0, ttl=TTL):
+    """Run the detector over `path`; returns (detector, misses, false positives, seconds)"""
+    detector = ARPSpoofDetector(verbose=False, ttl=ttl)
+    started = time.perf_counter()
+    if workers:
+        detector.run_pipeline(path)
+    else:
+        detector.analyze_file(path)
+    elapsed = time.perf_counter() - started
+    raised = set(detector.suspicious)
+    return detector, expected - raised, raised - expected, elapsed
+
+
+def rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lab 1.5: ARP Detector Replay Harness")
+    parser.add_argument('--hosts', type=int, default=4096, help="stations on the LAN")
+    parser.add_argument('--duration', type=float, default=900.0, help="seconds of traffic")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-attacks', action='store_true', help="benign traffic only")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="replay through the packet pipeline")
+    parser.add_argument('--keep', metavar='FILE', help="write the capture here and keep it")
+    parser.add_argument('-q', '--quiet', action='store_true', help="do not log each alert")
+    args = parser.parse_args()
+    if not args.no_attacks and args.duration <= ATTACKS_END:
+        parser.error(f"the attacks run until {ATTACKS_END:g}s: --duration must be longer")
+    return args
+
+
+def main():
+    args = parse_args()
+    if args.quiet:
+        logging.getLogger('arp_spoof_detector').setLevel(logging.ERROR)
+    path = args.keep or tempfile.mkstemp(suffix='.pcap')[1]
+    try:
+        started = time.perf_counter()
+        packets, expected = arp_capture(path, args.hosts, args.duration, ttl=TTL,
+                                        seed=args.seed, attacks=not args.no_attacks)
+        print(f"Synthesized {packets} ARP packets ({args.hosts} hosts, {args.duration:g}s) "
+              f"in {time.perf_counter() - started:.1f}s, {len(expected)} alerts expected")
+        detector, misses, false_positives, elapsed = replay(path, expected, args.workers)
+    finally:
+        if not args.keep:
+            os.unlink(path)
+
+    print(f"\nReplayed in {elapsed:.2f}s ({packets / max(elapsed, 1e-9):,.0f} packets/s), "
+          f"max RSS {rss_mb():.0f} MB")
+    for kind, subject in sorted(misses):
+        print(f"  MISSED          {kind} {subject}")
+    for kind, subject in sorted(false_positives):
+        print(f"  FALSE POSITIVE  {kind} {subject}")
+    if misses or false_positives:
+        print(f"FAIL: {len(misses)} missed, {len(false_positives)} false positives "
+              f"of {len(expected)} expected")
+        sys.exit(1)
+    print(f"PASS: all {len(expected)} expected alerts raised, no false positives")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,216 @@
 """
 Lab 1.5.4: ARP Spoof Detector
 Detect duplicate IPs and ARP spoofing attacks
+
+Requests, replies and gratuitous ARPs all feed arp_monitor.py, which keeps
+time-stamped IP -> MAC bindings that expire after --ttl seconds of
+silence and raises alerts for binding changes, gratuitous takeovers, MAC
+flapping, one MAC claiming many IPs and Ethernet/ARP source mismatches.
+Memory stays bounded (a /16 worth of bindings), so --continuous can run
+until Ctrl+C, logging a status line every --status-every seconds and
+appending alerts to --alerts FILE as JSON lines.
+
+Packets come from scapy's sniff() (root), from a capture file (--read,
+decoded with common/pcapio.py, no scapy needed), or - with --workers -
+through packet_pipeline.py, where capture only queues raw frames and a
+separate process checks them. ARP state is global (one MAC across many
+IPs), so that is always a single analysis process.
+
+arp_replay.py checks the detector against synthetic captures with known
+attacks.
+
+Usage:
+    sudo python arp_spoof_detector.py [--count 100] [--interface eth0]
+    sudo python arp_spoof_detector.py --continuous [--alerts alerts.jsonl] [--workers 1]
+    python arp_spoof_detector.py --read capture.pcap [-v]
 """
+import os
+import sys
+import json
+import time
 import logging
-from scapy.all import ARP, sniff, conf
-from collections import defaultdict
+import argparse
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.pcapio import (iter_frames, decode_arp, ARPPacket, CaptureError,
+                           ip_ntop, ip_pton, mac_ntop, mac_bytes)
+from arp_monitor import ARPMonitor, BINDING_TTL, WINDOW, FLAP_COUNT, MANY_IPS, ARP_REPLY
+from packet_pipeline import PacketPipeline
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-conf.verb = 0
+
+STATUS_EVERY = 60.0             # Seconds of traffic between status lines (continuous mode)
+LIST_BINDINGS = 50              # Print the bindings table only up to this size
 
 class ARPSpoofDetector:
-    def __init__(self, packet_count=100):
+    def __init__(self, packet_count=100, interface=None, continuous=False, verbose=True,
+                 status_every=STATUS_EVERY, alerts_path=None, ttl=BINDING_TTL, window=WINDOW,
+                 flap_count=FLAP_COUNT, many_ips=MANY_IPS, allow_macs=()):
         self.packet_count = packet_count
-        # Map IP to MAC addresses seen
-        self.ip_mac_map = defaultdict(set)
-        # Track potential spoofing
-        self.suspicious_ips = defaultdict(int)
-    
+        self.interface = interface
+        self.continuous = continuous
+        self.verbose = verbose
+        self.status_every = status_every
+        self.alerts_path = alerts_path
+        self._alerts_file = None
+        self.options = dict(ttl=ttl, window=window, flap_count=flap_count, many_ips=many_ips,
+                            allow_macs=allow_macs)
+        self.monitor = ARPMonitor(self.on_alert, ttl=ttl, window=window, flap_count=flap_count,
+                                  many_ips=many_ips, allow_macs=[mac_bytes(m) for m in allow_macs])
+        # (alert kind, IP or MAC) -> alerts; at most a few per address on the LAN
+        self.suspicious = Counter()
+        self._next_status = None
+        self.worker_summary = None      # summary() from the pipeline worker
+        self.pipeline = None            # PacketPipeline report, with --workers
+
+    def handle_arp(self, arp, ts=None):
+        """One ARP packet (pcapio ARPPacket) seen at capture time ts"""
+        ts = time.time() if ts is None else ts
+        if self.verbose:
+            if arp.op == ARP_REPLY:
+                logger.info(f"ARP Reply: {arp.psrc} is at {arp.hwsrc}")
+            else:
+                logger.info(f"ARP Request: who has {arp.pdst}? tell {arp.psrc} ({arp.hwsrc})")
+        self.monitor.process(ts, arp)
+        if self.continuous:
+            if self._next_status is None:
+                self._next_status = ts + self.status_every
+            elif ts >= self._next_status:
+                self._next_status = ts + self.status_every
+                self.log_status()
+
+    def on_alert(self, alert):
+        subject = mac_ntop(alert.mac) if alert.kind == 'many_ips' else ip_ntop(alert.ip)
+        self.suspicious[(alert.kind, subject)] += 1
+        logger.warning(f"⚠️  ALERT {alert}")
+        if self.alerts_path:
+            if self._alerts_file is None:
+                self._alerts_file = open(self.alerts_path, 'a')
+            self._alerts_file.write(json.dumps(alert.to_dict()) + '\n')
+            self._alerts_file.flush()
+
+    def log_status(self):
+        s = self.monitor.snapshot()
+        logger.info(f"Status: {s['packets']} ARP packets, {s['bindings']} bindings "
+                    f"({s['expired']} expired), {s['macs']} active MACs, "
+                    f"alerts {s['alerts'] or 'none'}")
+
     def packet_callback(self, packet):
         """Process ARP packets"""
+        from scapy.all import ARP, Ether
         if packet.haslayer(ARP):
             arp_layer = packet[ARP]
-            
-            # Only monitor replies and requests
-            if arp_layer.op == 2:  # ARP reply (op=2)
-                src_ip = arp_layer.psrc
-                src_mac = arp_layer.hwsrc
-                
-                logger.info(f"ARP Reply: {src_ip} is at {src_mac}")
-                
-                # Check for duplicate IPs (potential spoof)
-                if src_ip in self.ip_mac_map:
-                    if src_mac not in self.ip_mac_map[src_ip]:
-                        logger.warning(f"⚠️  ALERT: Duplicate IP detected!")
-                        logger.warning(f"   IP {src_ip} previously: {self.ip_mac_map[src_ip]}")
-                        logger.warning(f"   IP {src_ip} now claims: {src_mac}")
-                        self.suspicious_ips[src_ip] += 1
-                
-                self.ip_mac_map[src_ip].add(src_mac)
-    
+            if arp_layer.hwlen != 6 or arp_layer.plen != 4:
+                return
+            eth_src = mac_bytes(packet[Ether].src) if packet.haslayer(Ether) else None
+            self.handle_arp(ARPPacket(arp_layer.op, mac_bytes(arp_layer.hwsrc),
+                                      ip_pton(arp_layer.psrc), mac_bytes(arp_layer.hwdst),
+                                      ip_pton(arp_layer.pdst), eth_src),
+                            float(packet.time))
+
+    def handle_frame(self, ts, linktype, frame):
+        """One raw frame (capture file or pipeline worker)"""
+        arp = decode_arp(frame, linktype)
+        if arp is not None:
+            self.handle_arp(arp, ts)
+
+    def summary(self):
+        """Everything print_results() shows (picklable, sent back by a pipeline worker)"""
+        bindings = self.monitor.bindings
+        listed = list(bindings.items())[:LIST_BINDINGS] if len(bindings) <= LIST_BINDINGS else []
+        return {
+            'state': self.monitor.snapshot(),
+            'suspicious': self.suspicious,
+            'recent': [alert.to_dict() for alert in self.monitor.recent],
+            'bindings': [(ip_ntop(ip), mac_ntop(b.mac)) for ip, b in listed],
+        }
+
+    def result(self):
+        if self._alerts_file:
+            self._alerts_file.close()
+        return self.summary()
+
+    def merge_result(self, result):
+        self.worker_summary = result
+        self.suspicious = result['suspicious']
+
+    def analyze_file(self, path):
+        """Check every ARP packet in a pcap/pcapng file"""
+        logger.info(f"\nReading {path}...")
+        logger.info("="*60)
+        started = time.perf_counter()
+        try:
+            for ts, linktype, frame in iter_frames(path):
+                self.handle_frame(ts, linktype, frame)
+        except (OSError, CaptureError) as e:
+            logger.error(f"Error: {e}")
+            return False
+        elapsed = time.perf_counter() - started
+        logger.info("="*60)
+        logger.info(f"{self.monitor.packets} ARP packets in {elapsed:.2f}s "
+                    f"({self.monitor.packets / max(elapsed, 1e-9):,.0f} packets/s)")
+        self.print_results()
+        return True
+
+    def run_pipeline(self, path=None):
+        """Capture (live, or replay `path`) here, check ARP in a worker process"""
+        options = dict(self.options, continuous=self.continuous, verbose=self.verbose,
+                       status_every=self.status_every, alerts_path=self.alerts_path)
+        pipeline = PacketPipeline(lambda worker_id: ARPSpoofDetector(**options), 1,
+                                  lossless=path is not None)
+        logger.info(f"\n{'Reading ' + path if path else 'Monitoring ARP traffic'} "
+                    f"in a worker process...")
+        logger.info("="*60)
+        pipeline.start()
+        try:
+            if path:
+                pipeline.replay(path)
+            else:
+                pipeline.sniff(self.interface, 'arp',
+                               count=0 if self.continuous else self.packet_count,
+                               timeout=None if self.continuous else 60)
+        except (OSError, CaptureError, RuntimeError) as e:
+            logger.error(f"Error: {e}")
+        except KeyboardInterrupt:
+            logger.info("Stopping capture...")
+        finally:
+            results = pipeline.stop()
+        if 0 in results:
+            self.merge_result(results[0])
+        self.pipeline = pipeline.report()
+        logger.info("="*60)
+        self.print_results()
+        return bool(results)
+
     def analyze(self):
         """Start ARP monitoring"""
-        logger.info(f"\nMonitoring ARP traffic for {self.packet_count} packets...")
+        try:
+            from scapy.all import sniff, conf
+        except ImportError:
+            logger.error("Error: live capture needs scapy (pip install scapy); "
+                         "use --read FILE to check a capture file")
+            return False
+        conf.verb = 0
+        if self.continuous:
+            logger.info(f"\nMonitoring ARP traffic until Ctrl+C...")
+        else:
+            logger.info(f"\nMonitoring ARP traffic for {self.packet_count} packets...")
         logger.info("(Generate ARP traffic with ping or arp -a)\n")
         logger.info("="*60)
-        
+
         try:
             sniff(
+                iface=self.interface,
                 filter="arp",
                 prn=self.packet_callback,
-                count=self.packet_count,
-                timeout=60
+                count=0 if self.continuous else self.packet_count,
+                timeout=None if self.continuous else 60,
+                store=False
             )
         except PermissionError:
             logger.error("Error: Requires administrator/root privileges")
@@ -64,49 +220,120 @@ class ARPSpoofDetector:
         except Exception as e:
             logger.error(f"Error: {str(e)}")
             return False
-        
+
         logger.info("="*60)
         self.print_results()
         return True
-    
+
     def print_results(self):
         """Print analysis results"""
+        summary = self.worker_summary or self.summary()
+        state = summary['state']
         logger.info(f"\n--- ARP Analysis Results ---")
-        logger.info(f"Total unique IPs seen: {len(self.ip_mac_map)}")
-        
-        logger.info(f"\nIP to MAC mapping:")
-        for ip in sorted(self.ip_mac_map.keys()):
-            macs = self.ip_mac_map[ip]
-            if len(macs) > 1:
-                logger.warning(f"  ⚠️  {ip}: {macs}")
-            else:
-                logger.info(f"  ✓ {ip}: {list(macs)[0]}")
-        
-        if self.suspicious_ips:
-            logger.warning(f"\n⚠️  SUSPICIOUS IPs (possible spoofing):")
-            for ip, count in sorted(self.suspicious_ips.items(), 
-                                   key=lambda x: x[1], reverse=True):
-                logger.warning(f"   {ip}: {count} conflicts detected")
+        if self.pipeline:
+            report = self.pipeline
+            logger.info(f"Pipeline: {report['received']} frames captured, "
+                        f"{report['dropped']} dropped (ring full)")
+        logger.info(f"ARP packets: {state['packets']} ({state['requests']} requests, "
+                    f"{state['replies']} replies, {state['gratuitous']} gratuitous, "
+                    f"{state['probes']} probes)")
+        logger.info(f"Current IP bindings: {state['bindings']} "
+                    f"({state['expired']} expired, {state['evicted']} evicted)")
+
+        suspicious_ips = {subject for (kind, subject) in self.suspicious if kind != 'many_ips'}
+        if summary['bindings']:
+            logger.info(f"\nIP to MAC mapping:")
+            for ip, mac in sorted(summary['bindings'], key=lambda b: ip_pton(b[0])):
+                if ip in suspicious_ips:
+                    logger.warning(f"  ⚠️  {ip}: {mac}")
+                else:
+                    logger.info(f"  ✓ {ip}: {mac}")
+
+        if self.suspicious:
+            alerts = ', '.join(f"{kind}: {n}" for kind, n in sorted(state['alerts'].items()))
+            logger.warning(f"\n⚠️  ALERTS: {alerts} ({state['suppressed']} repeats suppressed)")
+            logger.warning(f"⚠️  SUSPICIOUS addresses (possible spoofing):")
+            for (kind, subject), count in self.suspicious.most_common(20):
+                logger.warning(f"   {subject}: {kind} x{count}")
+            if len(self.suspicious) > 20:
+                logger.warning(f"   ... and {len(self.suspicious) - 20} more")
         else:
             logger.info(f"\n✓ No ARP spoofing detected")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lab 1.5.4: ARP Spoof Detector")
+    parser.add_argument('-r', '--read', metavar='FILE',
+                        help="check a pcap/pcapng file instead of sniffing")
+    parser.add_argument('-c', '--count', type=int, default=None,
+                        help="live mode: packets to monitor (asked for when omitted)")
+    parser.add_argument('-i', '--interface', default=None, help="live mode: interface")
+    parser.add_argument('--continuous', action='store_true',
+                        help="live mode: run until Ctrl+C with periodic status lines")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="log every ARP packet (always on for a counted live capture)")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="check packets in a separate process (any value > 0)")
+    parser.add_argument('--alerts', metavar='FILE', help="append alerts to FILE as JSON lines")
+    parser.add_argument('--status-every', type=float, default=STATUS_EVERY, metavar='SECONDS')
+    parser.add_argument('--ttl', type=float, default=BINDING_TTL,
+                        help="seconds without a claim before a binding expires")
+    parser.add_argument('--window', type=float, default=WINDOW,
+                        help="seconds for the flapping and many-IPs checks")
+    parser.add_argument('--flap-count', type=int, default=FLAP_COUNT,
+                        help="MAC changes within the window that mean flapping")
+    parser.add_argument('--many-ips', type=int, default=MANY_IPS,
+                        help="IPs one MAC may claim within the window")
+    parser.add_argument('--allow-mac', action='append', default=[], metavar='MAC',
+                        help="MAC allowed to claim many IPs (proxy ARP router); repeatable")
+    args = parser.parse_args()
+    if args.flap_count < 2:
+        parser.error("--flap-count must be at least 2")
+    if args.many_ips < 1:
+        parser.error("--many-ips must be at least 1")
+    if args.ttl <= 0 or args.window <= 0:
+        parser.error("--ttl and --window must be positive")
+    return args
+
+def detector_options(args):
+    return dict(status_every=args.status_every, alerts_path=args.alerts, ttl=args.ttl,
+                window=args.window, flap_count=args.flap_count, many_ips=args.many_ips,
+                allow_macs=args.allow_mac)
+
 def main():
+    args = parse_args()
     print("\n" + "="*60)
     print("Lab 1.5.4: ARP Spoof Detector")
     print("="*60)
+    if args.read:
+        detector = ARPSpoofDetector(verbose=args.verbose, **detector_options(args))
+        if args.workers:
+            detector.run_pipeline(args.read)
+        else:
+            detector.analyze_file(args.read)
+        print("="*60 + "\n")
+        return
+
     print("\nNote: Requires administrator/root privileges")
     print("To generate ARP traffic:")
     print("  Windows: arp -a")
     print("  Linux/Mac: arp-scan -l or ping other hosts")
-    
-    try:
-        count = int(input("\nPackets to monitor (default: 100): ") or "100")
-    except ValueError:
-        count = 100
-    
-    detector = ARPSpoofDetector(packet_count=count)
-    detector.analyze()
-    
+
+    count = args.count
+    if count is None and not args.continuous:
+        try:
+            count = int(input("\nPackets to monitor (default: 100): ") or "100")
+        except ValueError:
+            count = 100
+
+    detector = ARPSpoofDetector(packet_count=count, interface=args.interface,
+                                continuous=args.continuous,
+                                verbose=args.verbose or not args.continuous,
+                                **detector_options(args))
+    if args.workers:
+        detector.run_pipeline()
+    else:
+        detector.analyze()
+
     print("="*60 + "\n")
 
 if __name__ == "__main__":
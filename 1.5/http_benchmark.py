@@ -0,0 +1,231 @@
+"""
+Lab 1.5: Benchmark - simple_http_get_server.py vs http_server.py
+Starts both servers on free ports and drives them with concurrent HTTP
+clients for a fixed time:
+
+- old server, one connection per request (it closes after every response)
+- new server, one connection per request (Connection: close)
+- new server, keep-alive
+- new server, keep-alive with --pipeline requests in flight per connection
+
+Responses are read with common/httpparse.py, so the close-delimited
+responses of the old server are measured correctly too.
+
+--static adds static file cases (http_server.py --root on a temp dir):
+a small cached file with keep-alive, and large downloads with sendfile()
+vs --no-sendfile, reporting throughput and server CPU per GB.
+
+Usage:
+    python http_benchmark.py [--concurrency 50] [--duration 5] [--pipeline 8]
+                             [--static] [--file-mb 100]
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import tempfile
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.httpparse import HTTPParser, HTTPError, RESPONSE
+from common.metrics import Histogram
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REQUEST_TIMEOUT = 5.0
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _wait_listening(port, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"server on port {port} did not start")
+
+
+class Stats:
+    def __init__(self):
+        self.latency = Histogram('latency')
+        self.completed = 0
+        self.errors = 0
+
+
+async def _read_responses(reader, parser, count):
+    got = []
+    while len(got) < count:
+        data = await reader.read(65536)
+        if not data:
+            last = parser.eof()
+            if last is not None:
+                got.append(last)
+            break
+        parser.feed(data)
+        got.extend(parser.messages())
+    return got
+
+
+def _cpu_seconds(pid):
+    """utime + stime of a process, from /proc (Linux)"""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+async def _download(port, path):
+    """GET a large file, counting (not keeping) the body; returns body bytes"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n".encode())
+    head = await reader.readuntil(b'\r\n\r\n')
+    length = next(int(line.split(b':', 1)[1]) for line in head.split(b'\r\n')
+                  if line.lower().startswith(b'content-length:'))
+    received = 0
+    while received < length:
+        data = await reader.read(1 << 20)
+        if not data:
+            break
+        received += len(data)
+    writer.close()
+    return received
+
+
+async def download_case(port, path, concurrency, rounds):
+    start = time.perf_counter()
+    total = 0
+    for _ in range(rounds):
+        total += sum(await asyncio.gather(*(_download(port, path) for _ in range(concurrency))))
+    return total, time.perf_counter() - start
+
+
+async def worker(port, path, deadline, stats, keep_alive, pipeline):
+    request = (f"GET {path} HTTP/1.1\r\nHost: localhost\r\n"
+               f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode()
+    writer = None
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection('127.0.0.1', port), REQUEST_TIMEOUT)
+                parser = HTTPParser(RESPONSE)
+            depth = pipeline if keep_alive else 1
+            for _ in range(depth):
+                parser.expect('GET')
+            writer.write(request * depth)
+            responses = await asyncio.wait_for(
+                _read_responses(reader, parser, depth), REQUEST_TIMEOUT)
+            ok = sum(1 for r in responses if r.status == 200)
+            stats.completed += ok
+            stats.errors += depth - ok
+            stats.latency.record((time.perf_counter() - started) * 1e6, count=max(ok, 1))
+            if not keep_alive or len(responses) < depth:
+                writer.close()
+                writer = None
+        except (OSError, asyncio.TimeoutError, HTTPError):
+            stats.errors += 1
+            if writer is not None:
+                writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_case(port, concurrency, duration, keep_alive, pipeline, path='/'):
+    stats = Stats()
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(port, path, deadline, stats, keep_alive, pipeline)
+                           for _ in range(concurrency)))
+    return stats, time.perf_counter() - start
+
+
+def start_server(script, port, args):
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, script), *args],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    _wait_listening(port)
+    return proc
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lab 1.5 HTTP Server Benchmark")
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--pipeline', type=int, default=8)
+    parser.add_argument('--static', action='store_true',
+                        help="also benchmark static files (cache, sendfile vs copy)")
+    parser.add_argument('--file-mb', type=int, default=100,
+                        help="size of the large file in the static cases")
+    args = parser.parse_args()
+
+    old_port, new_port = _free_port(), _free_port()
+    servers = [start_server('simple_http_get_server.py', old_port, [str(old_port)]),
+               start_server('http_server.py', new_port,
+                            ['--host', '127.0.0.1', '--port', str(new_port), '--request-log', 'off'])]
+    cases = [
+        ("old, connection per request", old_port, False, 1),
+        ("new, connection per request", new_port, False, 1),
+        ("new, keep-alive", new_port, True, 1),
+        (f"new, keep-alive + pipeline {args.pipeline}", new_port, True, args.pipeline),
+    ]
+    print(f"\n🔬 HTTP GET /: {args.concurrency} concurrent clients, {args.duration:.0f}s per case")
+    print("-" * 84)
+    print(f"{'Case':<34} {'req/sec':>10} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>8}")
+    try:
+        for name, port, keep_alive, pipeline in cases:
+            stats, elapsed = asyncio.run(
+                run_case(port, args.concurrency, args.duration, keep_alive, pipeline))
+            lat = stats.latency
+            print(f"{name:<34} {stats.completed / elapsed:>10.0f} {lat.percentile(50) / 1000:>9.2f} "
+                  f"{lat.percentile(99) / 1000:>9.2f} {lat.max / 1000:>9.2f} {stats.errors:>8}")
+    finally:
+        for proc in servers:
+            proc.terminate()
+            proc.wait()
+    if args.static:
+        static_cases(args)
+
+
+def static_cases(args):
+    with tempfile.TemporaryDirectory() as root:
+        with open(os.path.join(root, 'small.css'), 'wb') as f:
+            f.write(b'body { color: #333; }\n' * 200)
+        with open(os.path.join(root, 'large.bin'), 'wb') as f:
+            block = os.urandom(1 << 20)
+            for _ in range(args.file_mb):
+                f.write(block)
+
+        print(f"\n🔬 Static files from {root}")
+        print("-" * 84)
+        for name, extra in (("sendfile", []), ("copy (--no-sendfile)", ['--no-sendfile'])):
+            port = _free_port()
+            proc = start_server('http_server.py', port,
+                                ['--host', '127.0.0.1', '--port', str(port), '--root', root,
+                                 '--request-log', 'off', *extra])
+            try:
+                if not extra:
+                    stats, elapsed = asyncio.run(
+                        run_case(port, args.concurrency, args.duration, True, 1, '/small.css'))
+                    print(f"{'4 KB cached file, keep-alive':<34} {stats.completed / elapsed:>10.0f} req/s "
+                          f"p99 {stats.latency.percentile(99) / 1000:.2f}ms, errors {stats.errors}")
+                cpu = _cpu_seconds(proc.pid)
+                total, elapsed = asyncio.run(download_case(port, '/large.bin', 4, 3))
+                cpu = _cpu_seconds(proc.pid) - cpu
+                gb = total / 1e9
+                print(f"{args.file_mb} MB x 12 downloads, {name:<20} {total / elapsed / 1e6:>8.0f} MB/s   "
+                      f"server CPU {cpu / gb:.2f}s per GB")
+            finally:
+                proc.terminate()
+                proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Lab 1.5: Pre-encoded Response Heads
+simple_http_get_server.py runs str.format() on the whole response and
+encodes it for every request. Here everything that does not change between
+requests is encoded to bytes once:
+
+    HTTP/1.1 200 OK\\r\\n                    template (per status)
+    Date: Tue, 15 Nov 1994 08:12:31 GMT\\r\\n  DateCache, re-formatted once a second
+    Server: ...\\r\\nContent-Type: ...\\r\\n     template (per status/type/extra headers)
+    Content-Length: 1234\\r\\n               per response
+    Connection: keep-alive\\r\\n\\r\\n         two constants
+
+A response is then a tuple of bytes handed to writer.writelines() with the
+body pieces after it - nothing is joined or re-encoded in Python. (Python
+3.12+ sends such a list with one sendmsg() scatter write; 3.11 joins it
+once inside the transport.)
+
+Pages with a dynamic part are split the same way: PageTemplate keeps the
+bytes before and after the placeholder and only encodes the value.
+"""
+import time
+from http import HTTPStatus
+from email.utils import formatdate
+
+SERVER_NAME = 'Lab15/1.1'
+CHUNKED = 'chunked'         # length=CHUNKED: Transfer-Encoding instead of a length
+MAX_TEMPLATES = 256         # build_head() cache size
+
+_KEEP_ALIVE = b"Connection: keep-alive\r\n\r\n"
+_CLOSE = b"Connection: close\r\n\r\n"
+_CHUNKED = b"Transfer-Encoding: chunked\r\n"
+
+
+class DateCache:
+    """The "Date: ...\\r\\n" line, formatted at most once per second"""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._second = None
+        self._line = b''
+
+    def line(self):
+        now = int(self.clock())
+        if now != self._second:
+            self._second = now
+            self._line = b"Date: %s\r\n" % formatdate(now, usegmt=True).encode('ascii')
+        return self._line
+
+
+date_cache = DateCache()
+
+
+class ResponseTemplate:
+    """Head of one kind of response; only Date, length and Connection vary"""
+    __slots__ = ('status_line', 'fixed')
+
+    def __init__(self, status, content_type=None, extra=(), server=SERVER_NAME):
+        self.status_line = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n".encode('latin-1')
+        lines = [f"Server: {server}"]
+        if content_type:
+            lines.append(f"Content-Type: {content_type}")
+        lines.extend(extra)
+        self.fixed = ''.join(line + '\r\n' for line in lines).encode('latin-1')
+
+    def parts(self, length=None, keep_alive=True):
+        """
+        The head as a tuple of bytes for writelines(). length is a byte
+        count, CHUNKED, or None for a body that ends when the connection closes.
+        """
+        if length is None:
+            framing = b''
+        elif length == CHUNKED:
+            framing = _CHUNKED
+        else:
+            framing = b"Content-Length: %d\r\n" % length
+        return (self.status_line, date_cache.line(), self.fixed, framing,
+                _KEEP_ALIVE if keep_alive else _CLOSE)
+
+    def head(self, length=None, keep_alive=True):
+        return b''.join(self.parts(length, keep_alive))
+
+
+class PageTemplate:
+    """A body with one "{}" placeholder, pre-encoded around it"""
+    __slots__ = ('before', 'after', 'fixed_size')
+
+    def __init__(self, text):
+        before, after = text.split('{}', 1)
+        self.before = before.encode('utf-8')
+        self.after = after.encode('utf-8')
+        self.fixed_size = len(self.before) + len(self.after)
+
+    def render(self, value):
+        """(body pieces, total length)"""
+        middle = str(value).encode('utf-8')
+        return (self.before, middle, self.after), self.fixed_size + len(middle)
+
+
+_templates = {}
+
+
+def template(status, content_type=None, extra=()):
+    """Shared ResponseTemplate for (status, content_type, extra)"""
+    key = (status, content_type, extra)
+    tpl = _templates.get(key)
+    if tpl is None:
+        if len(_templates) >= MAX_TEMPLATES:
+            _templates.clear()      # Only per-request extra headers can get here
+        tpl = _templates[key] = ResponseTemplate(status, content_type, extra)
+    return tpl
+
+
+def build_head(status, content_type=None, length=None, keep_alive=True, extra=()):
+    """Status line and headers, encoded (see ResponseTemplate.parts)"""
+    return template(status, content_type, tuple(extra)).head(length, keep_alive)
+
+
+def chunk(data):
+    return b'%x\r\n%s\r\n' % (len(data), data)
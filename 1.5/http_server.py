@@ -0,0 +1,310 @@
+"""
+Lab 1.5: Concurrent HTTP/1.1 Server
+Successor of simple_http_get_server.py, which serves one connection at a
+time, reads a single 1024-byte recv(), rebuilds the page with str.format
+and sends no Content-Length, so every response ends with a close.
+
+- asyncio: thousands of concurrent connections in one thread
+- persistent connections: HTTP/1.1 keep-alive by default (HTTP/1.0 when
+  the client asks), closed after --keepalive-timeout seconds idle
+- pipelining: all requests already received are answered in order and
+  their responses leave in one write
+- incremental parser (common/httpparse.py): heads and bodies split over
+  any number of reads, Content-Length and chunked request bodies
+- every response is framed: Content-Length, or Transfer-Encoding: chunked
+  for streamed bodies (close-delimited for HTTP/1.0 clients)
+
+Routes:
+    GET  /stream?lines=N   N lines, streamed with chunked encoding
+    POST /echo             the request body, echoed back
+    GET  <anything else>   the test page of simple_http_get_server.py,
+                           or with --root DIR, the file under DIR
+    HEAD                   any GET route, headers only
+
+Response heads are pre-encoded (http_response.py): per response only the
+cached Date line and the length are spliced in, and head and body pieces
+go out through writelines() without being joined or formatted.
+
+Static files (--root, see static_files.py): small files come from an LRU
+cache with precomputed headers and ETags, large ones are sent with
+sendfile() (no copy through Python). If-None-Match answers 304, a single
+Range answers 206 (or 416).
+
+Usage:
+    python http_server.py [--host 0.0.0.0] [--port 8080] [--root DIR] [--no-sendfile]
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.httpparse import HTTPParser, HTTPError
+from common.framing import READ_SIZE
+from common.metrics import MetricsRegistry
+from common.logpipe import SampledLogger, setup_logging, add_logging_args, configure_request_log
+from static_files import StaticFiles, parse_range
+from http_response import (CHUNKED, PageTemplate, ResponseTemplate, build_head, chunk,
+                           template)
+
+logger = logging.getLogger(__name__)
+request_log = SampledLogger(logger)
+
+KEEPALIVE_TIMEOUT = 15      # Seconds an idle persistent connection stays open
+MAX_STREAM_LINES = 10000
+COPY_CHUNK = 256 * 1024     # --no-sendfile: bytes read into Python per write
+HTML = 'text/html; charset=utf-8'
+TEXT = 'text/plain; charset=utf-8'
+
+PAGE = PageTemplate("""<!DOCTYPE html>
+<html>
+<head>
+    <title>Simple HTTP Server</title>
+</head>
+<body>
+    <h1>Lab 1.5 HTTP Server</h1>
+    <p>This is a simple HTTP GET server for testing.</p>
+    <p>Request received at: {}</p>
+</body>
+</html>
+""")
+PAGE_HEAD = template(200, HTML)
+
+
+class HTTPServer:
+    def __init__(self, host='0.0.0.0', port=8080, keepalive_timeout=KEEPALIVE_TIMEOUT,
+                 backlog=4096, metrics_interval=10, root=None, use_sendfile=True):
+        self.host = host
+        self.port = port
+        self.keepalive_timeout = keepalive_timeout
+        self.backlog = backlog
+        self.metrics_interval = metrics_interval
+        self.static = StaticFiles(root) if root else None
+        self.use_sendfile = use_sendfile
+
+        self.metrics = MetricsRegistry('http_')
+        self.requests = self.metrics.counter('requests_total', 'Requests answered')
+        self.errors = self.metrics.counter('bad_requests_total', 'Malformed requests (4xx/5xx, closed)')
+        self.connections = self.metrics.gauge('active_connections', 'Open client connections')
+        self.accepted = self.metrics.counter('connections_total', 'Connections accepted')
+        self.latency = self.metrics.histogram(
+            'service_seconds', 'Time from request parsed to response written')
+        self.file_bytes = self.metrics.counter(
+            'file_bytes_total', 'Bytes of large files streamed (sendfile or copy)')
+        self.metrics.gauge('cache_hits', 'Static file cache hits',
+                           fn=lambda: self.static.hits if self.static else 0)
+
+    async def handle_client(self, reader, writer):
+        addr = writer.get_extra_info('peername')
+        parser = HTTPParser()
+        self.connections.inc()
+        self.accepted.inc()
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    data = await asyncio.wait_for(reader.read(READ_SIZE), self.keepalive_timeout)
+                except asyncio.TimeoutError:
+                    break
+                if not data:
+                    break
+                parser.feed(data)
+                # Pipelined requests are answered back-to-back, in order
+                for request in parser.messages():
+                    started = time.perf_counter_ns()
+                    keep_alive, transfer = self.respond(request, writer, addr)
+                    if transfer is not None:
+                        # Large file: the head is buffered, the body follows in order
+                        keep_alive = await self.send_file(writer, *transfer) and keep_alive
+                    self.requests.inc()
+                    self.latency.record_ns(time.perf_counter_ns() - started)
+                    if not keep_alive:
+                        break
+                transport = writer.transport
+                if transport.get_write_buffer_size() > transport.get_write_buffer_limits()[1]:
+                    await writer.drain()
+            await writer.drain()
+        except HTTPError as e:
+            self.errors.inc()
+            request_log.info("Bad request from %s: %s", addr, e)
+            body = f"{e}\n".encode('utf-8')
+            writer.write(build_head(e.status, TEXT, len(body), keep_alive=False) + body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.dec()
+            try:
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    def respond(self, request, writer, addr):
+        """
+        Write the response to one request. Returns (keep the connection?,
+        file transfer still to do or None).
+        """
+        keep_alive = request.keep_alive
+        method = request.method
+        path = urlsplit(request.target).path
+        request_log.info("%s %s %s from %s", method, request.target, request.version, addr)
+
+        if method == 'POST' and path == '/echo':
+            body = request.body
+            writer.write(build_head(200, request.header('content-type', 'application/octet-stream'),
+                                    len(body), keep_alive) + body)
+        elif method in ('GET', 'HEAD') and path == '/stream':
+            keep_alive = self.stream(request, writer, keep_alive)
+        elif method in ('GET', 'HEAD') and self.static is not None:
+            return self.serve_static(request, writer, path, keep_alive)
+        elif method in ('GET', 'HEAD'):
+            body, length = PAGE.render(addr)
+            head = PAGE_HEAD.parts(length, keep_alive)
+            writer.writelines(head if method == 'HEAD' else head + body)
+        else:
+            body = b"Method not allowed\n"
+            writer.write(build_head(405, TEXT, len(body), keep_alive,
+                                    extra=("Allow: GET, HEAD, POST",)) + body)
+        return keep_alive, None
+
+    def serve_static(self, request, writer, path, keep_alive):
+        entry = self.static.lookup(path)
+        if entry is None:
+            body = b"Not found\n"
+            writer.write(build_head(404, TEXT, len(body), keep_alive) + body)
+            return keep_alive, None
+
+        if_none_match = request.header('if-none-match')
+        if if_none_match is not None and entry.matches(if_none_match):
+            # entry.headers[0] is Content-Type; validators only
+            writer.write(build_head(304, None, None, keep_alive, extra=entry.headers[1:]))
+            return keep_alive, None
+
+        start, count, head = 0, entry.size, entry.template
+        range_header = request.header('range')
+        if_range = request.header('if-range')
+        if range_header is not None and (if_range is None or if_range == entry.etag):
+            try:
+                span = parse_range(range_header, entry.size)
+            except ValueError:
+                writer.write(build_head(416, None, 0, keep_alive,
+                                        extra=(f"Content-Range: bytes */{entry.size}",)))
+                return keep_alive, None
+            if span is not None:
+                start, end = span
+                count = end - start + 1
+                head = ResponseTemplate(206, None, entry.headers + (
+                    f"Content-Range: bytes {start}-{end}/{entry.size}",))
+
+        head = head.parts(count, keep_alive)
+        if request.method == 'HEAD':
+            writer.writelines(head)
+        elif entry.body is not None:
+            body = entry.body if count == entry.size else memoryview(entry.body)[start:start + count]
+            writer.writelines(head + (body,))
+        else:
+            writer.writelines(head)
+            return keep_alive, (entry.path, start, count)
+        return keep_alive, None
+
+    async def send_file(self, writer, path, offset, count):
+        """Stream count bytes of a file; False if the file changed under us"""
+        try:
+            with open(path, 'rb') as f:
+                if self.use_sendfile:
+                    # Page cache -> socket in the kernel (falls back to copying if unsupported)
+                    sent = await asyncio.get_running_loop().sendfile(
+                        writer.transport, f, offset, count)
+                else:
+                    f.seek(offset)
+                    sent = 0
+                    while sent < count:
+                        data = f.read(min(COPY_CHUNK, count - sent))
+                        if not data:
+                            break
+                        writer.write(data)
+                        sent += len(data)
+                        await writer.drain()
+        except OSError as e:
+            logger.warning("Error sending %s: %s", path, e)
+            return False
+        self.file_bytes.inc(sent)
+        # A short file would leave the client waiting for Content-Length bytes
+        return sent == count
+
+    def stream(self, request, writer, keep_alive):
+        """Body of unknown length: chunked for HTTP/1.1, until-close for 1.0"""
+        query = parse_qs(urlsplit(request.target).query)
+        try:
+            count = min(MAX_STREAM_LINES, int(query.get('lines', ['10'])[0]))
+        except ValueError:
+            count = 10
+        lines = (f"line {i}\n".encode('ascii') for i in range(count))
+
+        if request.version == 'HTTP/1.0':
+            # No chunked encoding before HTTP/1.1: the close marks the end
+            writer.write(build_head(200, TEXT, None, keep_alive=False))
+            if request.method != 'HEAD':
+                writer.writelines(lines)
+            return False
+        writer.write(build_head(200, TEXT, CHUNKED, keep_alive))
+        if request.method != 'HEAD':
+            writer.writelines([chunk(line) for line in lines] + [b'0\r\n\r\n'])
+        return keep_alive
+
+    async def metrics_loop(self):
+        last = None
+        while True:
+            await asyncio.sleep(self.metrics_interval)
+            if self.requests.value == last:
+                continue
+            last = self.requests.value
+            logger.info("Metrics: %d requests | %d connections (%d open) | %d bad | "
+                        "p50 %.3fms p99 %.3fms",
+                        self.requests.value, self.accepted.value, self.connections.value,
+                        self.errors.value, self.latency.percentile(50) / 1000,
+                        self.latency.percentile(99) / 1000)
+
+    async def run(self):
+        server = await asyncio.start_server(self.handle_client, self.host, self.port,
+                                            backlog=self.backlog)
+        logger.info("HTTP/1.1 server listening on http://%s:%s", self.host, self.port)
+        metrics = asyncio.create_task(self.metrics_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            metrics.cancel()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lab 1.5 Concurrent HTTP/1.1 Server")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--keepalive-timeout', type=float, default=KEEPALIVE_TIMEOUT,
+                        help="seconds an idle keep-alive connection stays open")
+    parser.add_argument('--root', default=None,
+                        help="serve static files from this directory")
+    parser.add_argument('--no-sendfile', action='store_true',
+                        help="copy large files through Python instead of sendfile()")
+    add_logging_args(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    setup_logging()
+    configure_request_log(request_log, args)
+    server = HTTPServer(args.host, args.port, args.keepalive_timeout,
+                        root=args.root, use_sendfile=not args.no_sendfile)
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        logger.info("Server stopped")
+
+
+if __name__ == "__main__":
+    main()
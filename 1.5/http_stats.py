@@ -0,0 +1,215 @@
+"""
+Lab 1.5: Streaming HTTP Statistics
+Aggregates the requests and responses the traffic analyzer reassembles,
+in memory that stays the same however long the capture runs: nothing
+per request is kept.
+
+- top hosts and paths: common/sketches.py TopK (count-min sketch + k
+  candidates), so counts are estimates that never undercount
+- unique clients and unique paths: HyperLogLog (~0.8% error)
+- requests per second, overall and for each current top host: RateSeries
+  ring buffers over the last `window` intervals. A host's series starts
+  when it enters the top k and is dropped when it leaves.
+- statuses (a bounded set of codes) and latency (a Histogram)
+- the last `recent` requests, for display
+
+snapshot() returns all of it as a JSON-ready dict; SnapshotWriter appends
+one to a JSON-lines file every `every` seconds of traffic time.
+ShardSnapshots does the same for statistics split over processes.
+"""
+import os
+import sys
+import json
+import pickle
+from collections import Counter, deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.metrics import Histogram
+from common.sketches import TopK, HyperLogLog, RateSeries, hash64
+
+TOP_K = 10
+INTERVAL = 1.0                  # Seconds per rate bucket
+WINDOW = 60                     # Rate buckets kept
+RECENT = 20
+MAX_PENDING = 32                # Intervals kept per shard while waiting for a lagging one
+
+
+class HTTPStats:
+    def __init__(self, top=TOP_K, interval=INTERVAL, window=WINDOW, recent=RECENT):
+        self.interval = interval
+        self.window = window
+        self.requests = 0
+        self.responses = 0
+        self.hosts = TopK(top)
+        self.paths = TopK(top)
+        self.clients = HyperLogLog()
+        self.unique_paths = HyperLogLog()
+        self.rate = RateSeries(interval, window)
+        self.host_rates = {}        # host -> RateSeries, top hosts only
+        self.statuses = Counter()
+        self.latency = Histogram('latency', 'Request complete to first response byte')
+        self.recent = deque(maxlen=recent)
+        self.first_ts = self.last_ts = None
+
+    def request(self, record):
+        """Count an HTTPRecord from tcp_reassembly (on_request)"""
+        ts = record.ts
+        self.requests += 1
+        if self.first_ts is None:
+            self.first_ts = ts
+        self.last_ts = ts
+        host = record.host or '-'
+        path = record.path
+        self.hosts.add(host)
+        h = hash64(path)            # Shared by the two path sketches
+        self.paths.add(path, h=h)
+        self.unique_paths.add(path, h=h)
+        self.clients.add(record.client[0])
+        self.rate.add(ts)
+        if host in self.hosts:
+            series = self.host_rates.get(host)
+            if series is None:
+                series = self.host_rates[host] = RateSeries(self.interval, self.window)
+                if len(self.host_rates) > 2 * self.hosts.k:
+                    self._prune()
+            series.add(ts)
+        self.recent.append(record)
+
+    def response(self, record):
+        """Count the response of an HTTPRecord (on_response)"""
+        self.responses += 1
+        self.statuses[record.status] += 1
+        self.latency.record(record.latency * 1e6)
+
+    def _prune(self):
+        """Drop the series of hosts that left the top k"""
+        for host in [h for h in self.host_rates if h not in self.hosts]:
+            del self.host_rates[host]
+
+    @staticmethod
+    def _rate_summary(series):
+        rates = series.rates()
+        return {
+            'total': series.total,
+            'mean': round(sum(rates) / len(rates), 3) if rates else 0.0,
+            'peak': max(rates, default=0.0),
+            'last': rates[-1] if rates else 0.0,
+        }
+
+    def merge(self, other):
+        """Add the statistics of another HTTPStats (e.g. from another process)"""
+        self.requests += other.requests
+        self.responses += other.responses
+        self.hosts.merge(other.hosts)
+        self.paths.merge(other.paths)
+        self.clients.merge(other.clients)
+        self.unique_paths.merge(other.unique_paths)
+        self.rate.merge(other.rate)
+        for host, series in other.host_rates.items():
+            mine = self.host_rates.get(host)
+            if mine is None:
+                mine = self.host_rates[host] = RateSeries(self.interval, self.window)
+            mine.merge(series)
+        self._prune()
+        self.statuses.update(other.statuses)
+        self.latency.merge(other.latency)
+        self.recent.extend(other.recent)
+        if other.first_ts is not None:
+            self.first_ts = min(self.first_ts or other.first_ts, other.first_ts)
+            self.last_ts = max(self.last_ts or other.last_ts, other.last_ts)
+
+    def snapshot(self):
+        """JSON-ready summary of everything counted so far"""
+        self._prune()
+        return {
+            'time': self.last_ts,
+            'requests': self.requests,
+            'responses': self.responses,
+            'unique_clients': self.clients.count(),
+            'unique_paths': self.unique_paths.count(),
+            'top_hosts': [[host, count] for host, count in self.hosts.items()],
+            'top_paths': [[path, count] for path, count in self.paths.items()],
+            'rate': self._rate_summary(self.rate),
+            'host_rates': {host: self._rate_summary(self.host_rates[host])
+                           for host, _ in self.hosts.items() if host in self.host_rates},
+            'statuses': {str(status): n for status, n in sorted(self.statuses.items())},
+            'latency': self.latency.summary(),
+        }
+
+
+class SnapshotWriter:
+    """Appends stats.snapshot() as a JSON line every `every` seconds of traffic time"""
+
+    def __init__(self, path, every=10.0):
+        self.path = path
+        self.every = every
+        self.due = None
+        self.written = 0
+        self._file = open(path, 'a')
+
+    def tick(self, now, stats):
+        if self.due is None:
+            self.due = now + self.every
+        elif now >= self.due:
+            self.write(stats)
+            self.due = now + self.every
+
+    def write(self, stats):
+        self._file.write(json.dumps(stats.snapshot()) + '\n')
+        self._file.flush()
+        self.written += 1
+
+    def close(self, stats=None):
+        """Write a final snapshot (when given stats) and close the file"""
+        if stats is not None:
+            self.write(stats)
+        self._file.close()
+
+
+class ShardSnapshots:
+    """
+    SnapshotWriter for statistics kept by several processes (shards, e.g.
+    packet_pipeline workers). A shard sends its pickled HTTPStats as its
+    traffic enters each new `writer.every`-second interval; the snapshot of
+    an interval merges every shard's statistics at its start, and is
+    written once all shards have reached it. Shards run at their own pace,
+    so merging whatever each has now would describe no moment of the
+    traffic. A shard without traffic must still report each interval
+    (packet_pipeline heartbeats do that). If a shard falls more than
+    `max_pending` intervals behind (or died), the snapshot is written
+    with its last known statistics instead, so memory stays bounded.
+    """
+
+    def __init__(self, writer, shards, top=TOP_K, max_pending=MAX_PENDING):
+        self.writer = writer
+        self.top = top
+        self.max_pending = max_pending
+        self.pending = [deque() for _ in range(shards)]     # (interval, pickled stats)
+        self.latest = [None] * shards   # Last update taken from each shard
+        self.started = False
+        self.last = None                # Interval of the last snapshot handled
+        self.incomplete = 0             # Snapshots written without a lagging shard's state
+
+    def add(self, shard, interval, data):
+        """Shard `shard` entered `interval` with the statistics pickled in data"""
+        if self.last is not None and interval <= self.last:
+            self.latest[shard] = data   # A lagging shard catching up: written already
+            return
+        self.pending[shard].append((interval, data))
+        while all(self.pending) or len(self.pending[shard]) > self.max_pending:
+            # Reached by every shard. A shard whose next update is for a later
+            # interval had no traffic in between: that update is its state now.
+            interval = min(queue[0][0] for queue in self.pending if queue)
+            if self.started:                # Like SnapshotWriter: none at the start
+                merged = HTTPStats(self.top)
+                for queue, latest in zip(self.pending, self.latest):
+                    data = queue[0][1] if queue else latest
+                    if data is not None:
+                        merged.merge(pickle.loads(data))
+                self.incomplete += not all(self.pending)
+                self.writer.write(merged)
+            self.started = True
+            self.last = interval
+            for i, queue in enumerate(self.pending):
+                if queue and queue[0][0] == interval:
+                    self.latest[i] = queue.popleft()[1]
@@ -1,82 +1,243 @@
 """
 Lab 1.5.3: HTTP Traffic Analyzer
 Capture and analyze HTTP traffic to extract URLs
+
+Live mode sniffs with scapy (root needed). Offline mode (--read) streams a
+pcap/pcapng file through common/pcapio.py instead: the file is mmap()ed
+and each frame's Ethernet/IP/TCP headers are decoded with struct, so
+multi-GB captures run at hundreds of thousands of packets per second, with
+no privileges and without scapy (used only for frames the fast decoder
+does not understand, when it is installed).
+
+Both modes reassemble TCP streams (tcp_reassembly.py) before parsing
+HTTP, so requests split over segments, retransmitted or pipelined are
+each counted once, and responses are matched to their requests (status,
+latency).
+
+Requests are not stored: http_stats.py aggregates them into top hosts and
+paths, unique client/path estimates and per-host request rates in fixed
+memory. --snapshot FILE appends that summary as JSON lines every
+--snapshot-every seconds of traffic.
+
+--workers N moves decoding and analysis off the capture path
+(packet_pipeline.py): capture only copies raw frames into per-worker
+shared-memory rings, sharded by connection, and N processes each run
+their own analyzer; their results are merged at the end. Frames that find
+a ring full are counted as drops (live; a file replay waits instead,
+unless --lossy). With --snapshot, workers send their statistics at the
+start of every --snapshot-every interval of traffic (a worker without
+traffic learns the time from the pipeline's heartbeats), and the capture
+process writes their merge (http_stats.ShardSnapshots).
+
+Usage:
+    sudo python http_traffic_analyzer.py [--count 10] [--interface eth0]
+    python http_traffic_analyzer.py --read capture.pcap [--ports 80,8080] [-v]
+                                    [--top 10] [--snapshot stats.jsonl]
+                                    [--workers 4] [--lossy] [--metrics-port 9100]
 """
+import os
+import sys
+import time
+import pickle
 import logging
-from scapy.all import sniff, IP, TCP, Raw, conf
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.pcapio import (iter_frames, decode_tcp, scapy_decode_tcp, TCPSegment,
+                           UNDECODED, CaptureError, ip_pton)
+from tcp_reassembly import FlowTable
+from http_stats import HTTPStats, SnapshotWriter, ShardSnapshots, TOP_K
+from packet_pipeline import PacketPipeline, serve_metrics_thread
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-conf.verb = 0
+
+HTTP_PORTS = (80, 8080)
 
 class HTTPTrafficAnalyzer:
-    def __init__(self, interface=None, packet_count=10):
+    def __init__(self, interface=None, packet_count=10, ports=HTTP_PORTS, verbose=True,
+                 top=TOP_K, snapshot=None, snapshot_every=None):
         self.interface = interface
         self.packet_count = packet_count
-        self.urls = set()
-        self.http_requests = []
-    
-    def extract_urls_from_payload(self, payload):
-        """Extract URLs from HTTP payload"""
+        self.ports = frozenset(ports)
+        self.verbose = verbose
+        self.stats = HTTPStats(top)
+        self.snapshots = snapshot       # SnapshotWriter or None
+        self.flows = FlowTable(self.on_request, self.on_response, server_ports=self.ports)
+        # Offline statistics
+        self.packets = 0
+        self.tcp_packets = 0
+        self.undecoded = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.pipeline = None            # PacketPipeline report, with --workers
+        # Pipeline worker: statistics at the start of each snapshot_every interval
+        self.snapshot_every = snapshot_every
+        self._interval = None
+        self._updates = []
+        self._shards = None             # Capture process: ShardSnapshots
+
+    def handle_segment(self, seg, ts):
+        """One decoded TCP segment (live or from a file)"""
+        # Check for HTTP traffic (port 80 or 8080)
+        if seg.dport in self.ports or seg.sport in self.ports:
+            self.flows.process(ts, seg)
+
+    def handle_frame(self, ts, linktype, frame):
+        """One raw frame (pipeline worker); decoded here instead of on the capture path"""
+        self.packets += 1
+        self.bytes += len(frame)
+        if self.snapshot_every:
+            self.tick(ts)
+        seg = decode_tcp(frame, linktype)
+        if seg is UNDECODED:
+            seg = scapy_decode_tcp(frame, linktype)
+            if seg is None:
+                self.undecoded += 1
+                return
+        if seg is not None:
+            self.tcp_packets += 1
+            self.handle_segment(seg, ts)
+
+    def tick(self, ts):
+        """Pipeline worker: capture time is ts (every frame, and the pipeline's heartbeats)"""
+        if not self.snapshot_every:
+            return
+        interval = int(ts // self.snapshot_every)
+        if self._interval is None or interval > self._interval:
+            self._interval = interval
+            # Pickled now: the state before this frame, and the queue
+            # would pickle it later, in a thread, while it changes
+            self._updates.append((interval, pickle.dumps(self.stats)))
+
+    def result(self):
+        """End of a worker's share of the traffic: everything merge_result() needs"""
+        self.flows.close_all()
+        return {'stats': self.stats, 'flows': self.flows.counters(),
+                'packets': self.packets, 'tcp_packets': self.tcp_packets,
+                'undecoded': self.undecoded, 'bytes': self.bytes}
+
+    def progress(self):
+        """Pipeline worker: [(interval, pickled statistics)] since the last call, or None"""
+        if not self._updates:
+            return None
+        updates, self._updates = self._updates, []
+        return updates
+
+    def on_progress(self, worker_id, updates):
+        """Capture process: a worker's progress()"""
+        for interval, data in updates:
+            self._shards.add(worker_id, interval, data)
+
+    def merge_result(self, result):
+        self.stats.merge(result['stats'])
+        self.flows.add_counters(result['flows'])
+        self.packets += result['packets']
+        self.tcp_packets += result['tcp_packets']
+        self.undecoded += result['undecoded']
+        self.bytes += result['bytes']
+
+    def run_pipeline(self, workers, path=None, lossless=True, metrics_port=None):
+        """Capture (live, or replay `path`) in this process, analyze in `workers` processes"""
+        ports, verbose, top = self.ports, self.verbose, self.stats.hosts.k
+        every = self.snapshots.every if self.snapshots else None
+
+        def make_handler(worker_id):
+            return HTTPTrafficAnalyzer(ports=ports, verbose=verbose, top=top,
+                                       snapshot_every=every)
+
+        pipeline = PacketPipeline(make_handler, workers, lossless=lossless,
+                                  on_progress=self.on_progress if self.snapshots else None)
+        if self.snapshots:
+            self._shards = ShardSnapshots(self.snapshots, pipeline.num_workers, top)
+        if metrics_port:
+            serve_metrics_thread(pipeline.registry, metrics_port)
+            logger.info(f"Pipeline metrics on http://127.0.0.1:{metrics_port}/metrics")
+        ports_text = ', '.join(map(str, sorted(ports)))
+        logger.info(f"\n{'Reading ' + path if path else 'Capturing'} (ports {ports_text}) "
+                    f"with {pipeline.num_workers} worker processes...")
+        logger.info("="*60)
+        started = time.perf_counter()
+        pipeline.start()
         try:
-            payload_str = payload.decode('utf-8', errors='ignore')
-            
-            # Look for GET/POST requests
-            if 'GET' in payload_str or 'POST' in payload_str or 'Host:' in payload_str:
-                lines = payload_str.split('\r\n')
-                
-                for line in lines:
-                    if line.startswith('GET') or line.startswith('POST'):
-                        parts = line.split()
-                        if len(parts) >= 2:
-                            url = parts[1]
-                            self.urls.add(url)
-                    elif line.startswith('Host:'):
-                        host = line.split(':', 1)[1].strip()
-                        return host
-        except Exception as e:
-            pass
-        
-        return None
-    
+            if path:
+                pipeline.replay(path)
+            else:
+                pipeline.sniff(self.interface,
+                               ' or '.join(f"tcp port {port}" for port in sorted(ports)),
+                               count=self.packet_count, timeout=120)
+        except (OSError, CaptureError, RuntimeError) as e:
+            logger.error(f"Error: {e}")
+        except KeyboardInterrupt:
+            logger.info("Stopping capture...")
+        finally:
+            results = pipeline.stop()
+            self.elapsed += time.perf_counter() - started
+        for worker_id in sorted(results):
+            self.merge_result(results[worker_id])
+        self.pipeline = pipeline.report()
+        if len(results) < pipeline.num_workers:
+            logger.error(f"{pipeline.num_workers - len(results)} worker(s) died; "
+                         f"their traffic is missing from the results")
+        if self._shards and self._shards.incomplete:
+            logger.warning(f"{self._shards.incomplete} snapshot(s) written without a lagging "
+                           f"worker's latest statistics")
+        logger.info("="*60)
+        self.print_results()
+        return bool(results)
+
+    def on_request(self, record):
+        """A complete request, reassembled from its connection"""
+        if self.verbose:
+            logger.info(f"HTTP Request: {record.endpoint(record.client)} → "
+                       f"{record.endpoint(record.server)}")
+            logger.info(f"  {record.method} {record.host or ''}{record.target}")
+        self.stats.request(record)
+        if self.snapshots:
+            self.snapshots.tick(record.ts, self.stats)
+
+    def on_response(self, record):
+        """The response to an earlier request"""
+        self.stats.response(record)
+        if self.verbose:
+            logger.info(f"  ← {record.status} for {record.method} {record.target} "
+                        f"({record.latency * 1000:.2f}ms, {record.response_size} bytes)")
+
     def packet_callback(self, packet):
         """Callback for each captured packet"""
-        if packet.haslayer(IP) and packet.haslayer(TCP):
-            ip_layer = packet[IP]
+        from scapy.all import IP, IPv6, TCP, Raw
+        if packet.haslayer(TCP) and (packet.haslayer(IP) or packet.haslayer(IPv6)):
+            ip_layer = packet[IP] if packet.haslayer(IP) else packet[IPv6]
             tcp_layer = packet[TCP]
-            
-            # Check for HTTP traffic (port 80 or 8080)
-            if tcp_layer.dport in [80, 8080] or tcp_layer.sport in [80, 8080]:
-                
-                # Check for payload
-                if packet.haslayer(Raw):
-                    payload = packet[Raw].load
-                    host = self.extract_urls_from_payload(payload)
-                    
-                    if host:
-                        logger.info(f"HTTP Request: {ip_layer.src}:{tcp_layer.sport} → "
-                                   f"{ip_layer.dst}:{tcp_layer.dport}")
-                        logger.info(f"  Host: {host}")
-                        
-                        self.http_requests.append({
-                            'src_ip': ip_layer.src,
-                            'src_port': tcp_layer.sport,
-                            'dst_ip': ip_layer.dst,
-                            'dst_port': tcp_layer.dport
-                        })
-    
+            payload = bytes(packet[Raw].load) if packet.haslayer(Raw) else b''
+            self.handle_segment(TCPSegment(ip_pton(ip_layer.src), ip_pton(ip_layer.dst),
+                                           tcp_layer.sport,
+                                           tcp_layer.dport, tcp_layer.seq, tcp_layer.ack,
+                                           int(tcp_layer.flags), payload),
+                                float(packet.time))
+
     def analyze(self):
         """Start packet capture and analysis"""
-        logger.info(f"\nCapturing {self.packet_count} packets on port 80 and 8080...")
+        try:
+            from scapy.all import sniff, conf
+        except ImportError:
+            logger.error("Error: live capture needs scapy (pip install scapy); "
+                         "use --read FILE to analyze a capture file")
+            return False
+        conf.verb = 0
+        ports = sorted(self.ports)
+        logger.info(f"\nCapturing {self.packet_count} packets on ports "
+                    f"{', '.join(map(str, ports))}...")
         logger.info("(Make HTTP requests to see traffic)\n")
         logger.info("="*60)
-        
+
         try:
             sniff(
-                filter="tcp port 80 or tcp port 8080",
+                iface=self.interface,
+                filter=' or '.join(f"tcp port {port}" for port in ports),
                 prn=self.packet_callback,
                 count=self.packet_count,
                 timeout=120
@@ -87,44 +248,155 @@ class HTTPTrafficAnalyzer:
         except Exception as e:
             logger.error(f"Error: {str(e)}")
             return False
-        
+        self.flows.close_all()
+
         logger.info("="*60)
         self.print_results()
         return True
-    
+
+    def analyze_file(self, path):
+        """Offline analysis of a pcap/pcapng file, streamed"""
+        logger.info(f"\nReading {path} (ports {', '.join(map(str, sorted(self.ports)))})...")
+        logger.info("="*60)
+        started = time.perf_counter()
+        handle = self.handle_segment
+        packets = tcp_packets = undecoded = size = 0     # Locals: this loop is the hot path
+        try:
+            for ts, linktype, frame in iter_frames(path):
+                packets += 1
+                size += len(frame)
+                seg = decode_tcp(frame, linktype)
+                if seg is None:
+                    continue
+                if seg is UNDECODED:
+                    seg = scapy_decode_tcp(frame, linktype)
+                    if seg is None:
+                        undecoded += 1
+                        continue
+                tcp_packets += 1
+                handle(seg, ts)
+        except (OSError, CaptureError) as e:
+            logger.error(f"Error: {e}")
+            return False
+        finally:
+            self.packets += packets
+            self.tcp_packets += tcp_packets
+            self.undecoded += undecoded
+            self.bytes += size
+            self.flows.close_all()
+            self.elapsed += time.perf_counter() - started
+
+        logger.info("="*60)
+        self.print_results()
+        return True
+
     def print_results(self):
         """Print analysis results"""
         logger.info(f"\n--- Analysis Results ---")
-        logger.info(f"Total HTTP Requests Captured: {len(self.http_requests)}")
-        
-        if self.urls:
-            logger.info(f"Unique URLs/Paths Found: {len(self.urls)}")
-            for url in sorted(self.urls):
-                logger.info(f"  - {url}")
-        else:
+        if self.packets:
+            rate = self.packets / max(self.elapsed, 1e-9)
+            logger.info(f"Packets: {self.packets} ({self.tcp_packets} TCP, "
+                        f"{self.undecoded} undecoded) in {self.elapsed:.2f}s - "
+                        f"{rate:,.0f} packets/s, {self.bytes / max(self.elapsed, 1e-9) / 1e6:.0f} MB/s")
+        if self.pipeline:
+            report = self.pipeline
+            logger.info(f"Pipeline: {report['received']} frames captured, "
+                        f"{report['dropped']} dropped (ring full)")
+            for worker in report['workers']:
+                logger.info(f"  worker {worker['worker']}: {worker['processed']} frames, "
+                            f"busy {worker['busy_seconds']:.2f}s, {worker['dropped']} dropped, "
+                            f"peak queue {worker['queue_peak']}")
+        flows = self.flows
+        logger.info(f"TCP flows: {flows.flows_total} ({flows.expired} idle-expired, "
+                    f"{flows.evicted} evicted), {flows.duplicates} retransmitted segments, "
+                    f"{flows.gaps} gaps, {flows.parse_errors} unparsable streams")
+        stats = self.stats
+        logger.info(f"Total HTTP Requests Captured: {stats.requests}")
+        if stats.statuses:
+            statuses = ', '.join(f"{status}: {n}" for status, n in sorted(stats.statuses.items()))
+            logger.info(f"Responses: {stats.responses} ({statuses}), "
+                        f"{flows.unanswered} unanswered - latency "
+                        f"p50 {stats.latency.percentile(50) / 1000:.2f}ms "
+                        f"p99 {stats.latency.percentile(99) / 1000:.2f}ms")
+        if not stats.requests:
             logger.info("No URLs found in captured traffic")
-        
-        if self.http_requests:
-            logger.info(f"\nHTTP Connections:")
-            for req in self.http_requests:
-                logger.info(f"  {req['src_ip']}:{req['src_port']} → "
-                           f"{req['dst_ip']}:{req['dst_port']}")
+            return
+
+        snapshot = stats.snapshot()
+        logger.info(f"Unique clients: ~{snapshot['unique_clients']}, "
+                    f"unique paths: ~{snapshot['unique_paths']}")
+        rate = snapshot['rate']
+        logger.info(f"Requests/s over the last {stats.window * stats.interval:g}s: "
+                    f"mean {rate['mean']:.1f}, peak {rate['peak']:.0f}")
+        logger.info(f"Top hosts:")
+        for host, count in snapshot['top_hosts']:
+            series = snapshot['host_rates'].get(host)
+            peak = f"  (peak {series['peak']:.0f}/s)" if series else ''
+            logger.info(f"  {count:>9}  {host}{peak}")
+        logger.info(f"Top paths:")
+        for path, count in snapshot['top_paths']:
+            logger.info(f"  {count:>9}  {path}")
+
+        if stats.recent and self.verbose:
+            logger.info(f"\nLast {len(stats.recent)} HTTP requests:")
+            for record in stats.recent:
+                logger.info(f"  {record.endpoint(record.client)} → "
+                            f"{record.endpoint(record.server)}  {record.method} {record.target}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lab 1.5.3: HTTP Traffic Analyzer")
+    parser.add_argument('-r', '--read', metavar='FILE',
+                        help="analyze a pcap/pcapng file instead of sniffing")
+    parser.add_argument('-c', '--count', type=int, default=10,
+                        help="live mode: packets to capture")
+    parser.add_argument('-i', '--interface', default=None, help="live mode: interface")
+    parser.add_argument('--ports', default=','.join(map(str, HTTP_PORTS)),
+                        help="TCP ports that carry HTTP (comma separated)")
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help="offline mode: log every request (always on when live)")
+    parser.add_argument('--top', type=int, default=TOP_K, help="hosts and paths to rank")
+    parser.add_argument('--snapshot', metavar='FILE',
+                        help="append JSON statistics snapshots to FILE")
+    parser.add_argument('--snapshot-every', type=float, default=10.0, metavar='SECONDS',
+                        help="seconds of traffic between snapshots")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="analyze in this many processes (0: in the capture process)")
+    parser.add_argument('--lossy', action='store_true',
+                        help="with --workers and --read: drop frames when a worker falls "
+                             "behind, like live capture, instead of waiting")
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="with --workers: serve pipeline metrics on this port")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    ports = [int(p) for p in args.ports.split(',') if p.strip()]
     print("\n" + "="*60)
     print("Lab 1.5.3: HTTP Traffic Analyzer")
     print("="*60)
-    print("\nNote: This requires administrator/root privileges")
-    print("Make HTTP requests (e.g., curl http://example.com) in another terminal")
-    
-    try:
-        count = int(input("\nNumber of packets to capture (default: 10): ") or "10")
-    except ValueError:
-        count = 10
-    
-    analyzer = HTTPTrafficAnalyzer(packet_count=count)
-    analyzer.analyze()
-    
+
+    snapshots = SnapshotWriter(args.snapshot, args.snapshot_every) if args.snapshot else None
+    if args.read:
+        analyzer = HTTPTrafficAnalyzer(ports=ports, verbose=args.verbose, top=args.top,
+                                       snapshot=snapshots)
+        if args.workers:
+            analyzer.run_pipeline(args.workers, args.read, lossless=not args.lossy,
+                                  metrics_port=args.metrics_port)
+        else:
+            analyzer.analyze_file(args.read)
+    else:
+        print("\nNote: This requires administrator/root privileges")
+        print("Make HTTP requests (e.g., curl http://example.com) in another terminal")
+        analyzer = HTTPTrafficAnalyzer(args.interface, args.count, ports, top=args.top,
+                                       snapshot=snapshots)
+        if args.workers:
+            analyzer.run_pipeline(args.workers, lossless=False, metrics_port=args.metrics_port)
+        else:
+            analyzer.analyze()
+    if snapshots:
+        snapshots.close(analyzer.stats)
+        print(f"{snapshots.written} snapshots appended to {args.snapshot}")
+
     print("="*60 + "\n")
 
 if __name__ == "__main__":
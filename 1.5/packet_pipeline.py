@@ -0,0 +1,304 @@
+"""
+Lab 1.5: Multi-core Packet Pipeline
+With sniff(prn=callback) every packet is dissected and analyzed on the
+capture thread: while the callback runs nothing reads the socket, and
+once the kernel buffer fills, packets are dropped where nobody counts
+them. Here capture and analysis are separate processes:
+
+capture (this process)
+    reads raw frames (scapy's L2 listen socket, recv_raw(): no
+    dissection, or a pcap/pcapng file), computes a flow key
+    (pcapio.flow_key: the 4-tuple for TCP/UDP, the sender for ARP) and
+    appends the frame to the shared-memory ring (common/shmring.py) of
+    worker crc32(key) % N. Both directions of a connection share a key,
+    so every flow is handled by exactly one worker.
+workers (N forked processes)
+    drain their ring in batches and call handler.handle_frame(ts,
+    linktype, frame); at the end handler.result() is sent back for the
+    caller to merge. A handler may also have progress(), called after
+    every batch: whatever it returns other than None is passed to the
+    caller's on_progress(worker_id, update) while the capture runs
+    (periodic snapshots of a worker's partial results). A handler with
+    tick(ts) is told the capture time every so often by a heartbeat
+    record in its ring (every POLL_EVERY frames replayed, every
+    REPORT_INTERVAL seconds live): a worker whose flows see no traffic
+    still sees time pass, so its progress does not stall.
+
+A frame that finds its worker's ring full is dropped and counted
+(frames_dropped, per worker), unless the pipeline is lossless: then
+capture waits, which is what replaying a file normally wants. Queue depth
+(current and peak, per worker), frames processed and worker busy time are
+in `registry` (common/metrics.py) and can be served with --metrics-port.
+
+    pipeline = PacketPipeline(lambda worker_id: Handler(), workers=4)
+    pipeline.start()
+    pipeline.replay('capture.pcap')     # or pipeline.sniff(iface, 'tcp port 80')
+    results = pipeline.stop()           # {worker_id: handler.result()}
+"""
+import os
+import sys
+import time
+import queue
+import signal
+import asyncio
+import threading
+import multiprocessing
+from zlib import crc32
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.pcapio import iter_frames, flow_key, LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL
+from common.shmring import FrameRing, RING_SIZE
+from common.metrics import MetricsRegistry, serve_metrics
+
+DEFAULT_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+PUBLISH_EVERY = 64              # Frames per ring between publish() calls
+PUBLISH_INTERVAL = 0.01         # ... or seconds, whichever comes first (live capture)
+REPORT_INTERVAL = 1.0           # Seconds between worker metric updates
+POLL_EVERY = 4096               # Frames replayed between on_progress() deliveries
+FULL_WAIT = 0.0005              # Lossless mode: sleep while a ring is full
+HEARTBEAT = 0xFFFF              # Link type of a heartbeat record: a time, no frame
+
+
+def _worker_main(worker_id, ring, make_handler, results, metrics, progress):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)    # The parent decides when to stop
+    handler = make_handler(worker_id)
+    report_progress = getattr(handler, 'progress', None)
+    tick = getattr(handler, 'tick', None)
+    processed = 0
+    busy = 0.0
+    next_report = time.monotonic() + REPORT_INTERVAL
+    while True:
+        records = ring.get(timeout=0.2)
+        if records:
+            started = time.perf_counter()
+            handle = handler.handle_frame
+            for ts, linktype, frame in records:
+                if linktype == HEARTBEAT:
+                    processed -= 1              # Not a frame
+                    if tick is not None:
+                        tick(ts)
+                else:
+                    handle(ts, linktype, frame)
+            if report_progress is not None:
+                update = report_progress()
+                if update is not None:
+                    progress.put((worker_id, update))
+            busy += time.perf_counter() - started
+            processed += len(records)
+        elif ring.drained():
+            break
+        if time.monotonic() >= next_report:
+            metrics.put((worker_id, {'processed': processed, 'busy_seconds': busy}))
+            next_report = time.monotonic() + REPORT_INTERVAL
+    metrics.put((worker_id, {'processed': processed, 'busy_seconds': busy}))
+    results.put((worker_id, handler.result()))
+
+
+class PacketPipeline:
+    def __init__(self, make_handler, workers=DEFAULT_WORKERS, ring_size=RING_SIZE,
+                 shard=flow_key, lossless=False, on_progress=None):
+        self.make_handler = make_handler
+        self.on_progress = on_progress
+        self.num_workers = max(1, workers)
+        self.ring_size = ring_size
+        self.shard = shard
+        self.lossless = lossless
+        self.ctx = multiprocessing.get_context('fork')
+        self.rings = []
+        self.processes = []
+        self.results_queue = self.ctx.Queue()
+        self.metrics_queue = self.ctx.Queue()
+        self.progress_queue = self.ctx.Queue()
+        self.worker_metrics = {}    # worker_id -> last snapshot
+        self.dropped = [0] * self.num_workers
+        self._pending = [0] * self.num_workers
+        self._last_publish = time.monotonic()
+        self._last_ts = None            # Newest capture time submitted
+        self.received = 0
+
+        self.registry = MetricsRegistry('pipeline_')
+        self.registry.gauge('frames_received', 'Frames read by the capture process',
+                            fn=lambda: self.received)
+        self.registry.gauge('frames_dropped', 'Frames dropped because a worker ring was full',
+                            fn=lambda: sum(self.dropped))
+        for i in range(self.num_workers):
+            self.registry.gauge(f'worker_{i}_dropped', fn=lambda i=i: self.dropped[i])
+            self.registry.gauge(f'worker_{i}_queue_depth', 'Frames waiting in the ring',
+                                fn=lambda i=i: self.rings[i].depth() if self.rings else 0)
+            self.registry.gauge(f'worker_{i}_queue_peak', 'Most frames ever waiting',
+                                fn=lambda i=i: self.rings[i].peak_depth if self.rings else 0)
+            self.registry.gauge(f'worker_{i}_processed',
+                                fn=lambda i=i: self._worker_value(i, 'processed'))
+            self.registry.gauge(f'worker_{i}_busy_seconds',
+                                fn=lambda i=i: round(self._worker_value(i, 'busy_seconds'), 3))
+
+    def _worker_value(self, worker_id, key):
+        self._drain_metrics()
+        return self.worker_metrics.get(worker_id, {}).get(key, 0)
+
+    def _drain_metrics(self):
+        while True:
+            try:
+                worker_id, snapshot = self.metrics_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.worker_metrics[worker_id] = snapshot
+
+    def poll(self):
+        """Pass the workers' progress updates received so far to on_progress"""
+        while True:
+            try:
+                worker_id, update = self.progress_queue.get_nowait()
+            except queue.Empty:
+                return
+            if self.on_progress:
+                self.on_progress(worker_id, update)
+
+    def start(self):
+        self.rings = [FrameRing(self.ring_size, self.ctx) for _ in range(self.num_workers)]
+        for worker_id, ring in enumerate(self.rings):
+            proc = self.ctx.Process(
+                target=_worker_main,
+                args=(worker_id, ring, self.make_handler, self.results_queue, self.metrics_queue,
+                      self.progress_queue),
+                name=f"pipeline-worker-{worker_id}",
+                daemon=True
+            )
+            proc.start()
+            self.processes.append(proc)
+
+    def submit(self, ts, linktype, frame):
+        """Queue one frame for its worker; False if it was dropped"""
+        self.received += 1
+        worker_id = crc32(self.shard(frame, linktype)) % self.num_workers
+        ring = self.rings[worker_id]
+        if not ring.put(ts, linktype, frame):
+            ring.publish()
+            if not self.lossless:
+                self.dropped[worker_id] += 1
+                return False
+            while not ring.put(ts, linktype, frame):
+                if not self.processes[worker_id].is_alive():
+                    raise RuntimeError(f"pipeline worker {worker_id} died")
+                time.sleep(FULL_WAIT)
+        if self._last_ts is None or ts > self._last_ts:
+            self._last_ts = ts
+        self._pending[worker_id] += 1
+        if self._pending[worker_id] >= PUBLISH_EVERY:
+            ring.publish()
+            self._pending[worker_id] = 0
+        return True
+
+    def heartbeat(self, ts=None):
+        """Tell every worker the capture time (default: the newest submitted), then flush"""
+        ts = self._last_ts if ts is None else ts
+        if ts is not None:
+            for ring in self.rings:
+                ring.put(ts, HEARTBEAT, b'')    # A full ring's worker is busy anyway
+        self.flush()
+
+    def flush(self):
+        """Publish every ring's queued frames"""
+        for worker_id, ring in enumerate(self.rings):
+            ring.publish()
+            self._pending[worker_id] = 0
+        self._last_publish = time.monotonic()
+
+    def replay(self, path):
+        """Feed a pcap/pcapng file through the pipeline; returns the frame count"""
+        submit = self.submit
+        count = 0
+        for ts, linktype, frame in iter_frames(path):
+            submit(ts, linktype, frame)
+            count += 1
+            if count % POLL_EVERY == 0:
+                self.heartbeat()
+                self.poll()
+        self.heartbeat()
+        return count
+
+    def sniff(self, iface=None, bpf=None, count=0, timeout=None):
+        """Live capture (root + scapy): raw frames straight into the rings"""
+        try:
+            from scapy.all import conf
+        except ImportError:
+            raise RuntimeError("live capture needs scapy (pip install scapy); "
+                               "use a capture file instead")
+        import select
+        sock = conf.L2listen(iface=iface, filter=bpf)
+        deadline = time.monotonic() + timeout if timeout else None
+        next_heartbeat = time.monotonic() + REPORT_INTERVAL
+        try:
+            while not count or self.received < count:
+                now = time.monotonic()
+                if deadline and now >= deadline:
+                    break
+                if now >= next_heartbeat:
+                    self.heartbeat(time.time())     # Live: capture time is wall time
+                    next_heartbeat = now + REPORT_INTERVAL
+                if now - self._last_publish >= PUBLISH_INTERVAL:
+                    self.flush()
+                    self.poll()
+                ready, _, _ = select.select([sock], [], [], PUBLISH_INTERVAL)
+                if not ready:
+                    continue
+                cls, frame, ts = sock.recv_raw()
+                if frame is None:
+                    continue
+                linktype = (LINKTYPE_LINUX_SLL if cls is not None and cls.__name__ == 'CookedLinux'
+                            else LINKTYPE_ETHERNET)
+                self.submit(ts if ts is not None else time.time(), linktype, frame)
+        finally:
+            sock.close()
+            self.flush()
+
+    def stop(self):
+        """Drain and stop the workers; returns {worker_id: handler.result()}"""
+        for ring in self.rings:
+            ring.close()
+        results = {}
+        while len(results) < len(self.processes):
+            # A worker exits only once its queued updates are read: keep reading
+            self.poll()
+            try:
+                worker_id, result = self.results_queue.get(timeout=0.5)
+            except queue.Empty:
+                if not any(proc.is_alive() for proc in self.processes):
+                    break           # A worker died without a result
+                continue
+            results[worker_id] = result
+        self.poll()
+        for proc in self.processes:
+            proc.join(timeout=5)
+        self._drain_metrics()
+        self.poll()
+        return results
+
+    def report(self):
+        """Per-worker and total pipeline figures"""
+        self._drain_metrics()
+        workers = []
+        for i, ring in enumerate(self.rings):
+            workers.append({
+                'worker': i,
+                'processed': self.worker_metrics.get(i, {}).get('processed', 0),
+                'busy_seconds': self.worker_metrics.get(i, {}).get('busy_seconds', 0.0),
+                'dropped': self.dropped[i],
+                'queue_depth': ring.depth(),
+                'queue_peak': ring.peak_depth,
+            })
+        return {'received': self.received, 'dropped': sum(self.dropped), 'workers': workers}
+
+
+def serve_metrics_thread(registry, port, host='127.0.0.1'):
+    """Serve registry on /metrics from a daemon thread (the capture loop is not async)"""
+    def run():
+        async def main():
+            server = await serve_metrics(registry, host, port)
+            async with server:
+                await server.serve_forever()
+        asyncio.run(main())
+
+    thread = threading.Thread(target=run, name='metrics', daemon=True)
+    thread.start()
+    return thread
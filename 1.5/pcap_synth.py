@@ -0,0 +1,261 @@
+"""
+Lab 1.5: Synthetic Captures
+Writes pcap files of made-up but well-formed traffic, so the offline
+analyzers can be tested and benchmarked without root or a network.
+
+http_capture() - HTTP/1.1 connections: handshake, GET requests with a
+    Host header, 200 responses, FIN teardown. Client addresses, paths and
+    hosts are drawn from small pools so the output has repeats. Optional
+    impairments for reassembly tests:
+      split       requests cut into this many segments (headers span packets)
+      pipeline    all requests of a connection sent back-to-back first
+      retransmit  probability that a data segment is captured twice
+      reorder     probability that a segment swaps places with the next one
+
+arp_capture() - a LAN of `hosts` stations asking for the gateway every
+    `interval` seconds (the gateway answers), address probes followed by
+    announcements, and a host that returns with a new NIC after its
+    binding expired - plus, with attacks=True, gateway spoofing with the
+    real gateway fighting back, a gratuitous takeover, a poisoning sweep
+    of many IPs from one MAC and an Ethernet/ARP source mismatch. Returns
+    the alerts a detector should raise, as {(kind, subject)}.
+
+Usage:
+    python pcap_synth.py http.pcap [--connections 10000] [--requests 3]
+                         [--split 3] [--pipeline] [--retransmit 0.05] [--reorder 0.05]
+    python pcap_synth.py arp.pcap --arp [--hosts 4096] [--duration 900]
+"""
+import os
+import sys
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.pcapio import (PcapWriter, ether_ipv4_tcp, ether_arp,
+                           TCP_SYN, TCP_ACK, TCP_PSH, TCP_FIN)
+
+SERVER = '10.0.0.80'
+HOSTS = ['example.com', 'api.example.com', 'static.example.com', 'lab.local']
+PATHS = ['/', '/index.html', '/api/users', '/api/orders?page=2', '/static/app.js',
+         '/static/style.css', '/login', '/search?q=scapy', '/favicon.ico', '/health']
+RTT = 0.0004                    # Seconds between a packet and its answer
+
+
+class _Connection:
+    """One TCP connection; tracks both sequence numbers, collects (ts, frame, has data)"""
+
+    def __init__(self, client, cport, server, sport, rng):
+        self.client, self.cport = client, cport
+        self.server, self.sport = server, sport
+        self.cseq = rng.randrange(1 << 32)
+        self.sseq = rng.randrange(1 << 32)
+        self.packets = []
+
+    def client_sends(self, ts, flags, payload=b''):
+        self.packets.append((ts, ether_ipv4_tcp(self.client, self.server, self.cport, self.sport,
+                                                self.cseq, self.sseq, flags, payload),
+                             bool(payload)))
+        self.cseq = (self.cseq + len(payload) + (1 if flags & (TCP_SYN | TCP_FIN) else 0)) & 0xFFFFFFFF
+
+    def server_sends(self, ts, flags, payload=b''):
+        self.packets.append((ts, ether_ipv4_tcp(self.server, self.client, self.sport, self.cport,
+                                                self.sseq, self.cseq, flags, payload,
+                                                src_mac='02:00:00:00:00:02',
+                                                dst_mac='02:00:00:00:00:01'),
+                             bool(payload)))
+        self.sseq = (self.sseq + len(payload) + (1 if flags & (TCP_SYN | TCP_FIN) else 0)) & 0xFFFFFFFF
+
+    def client_sends_split(self, ts, payload, parts):
+        """payload as `parts` segments, RTT/10 apart; returns the time after the last"""
+        step = max(1, -(-len(payload) // parts))
+        for i in range(0, len(payload), step):
+            self.client_sends(ts, TCP_ACK | TCP_PSH, payload[i:i + step])
+            ts += RTT / 10
+        return ts
+
+    def impaired(self, rng, retransmit, reorder):
+        """The packets with duplicates and swaps applied (timestamps stay in order)"""
+        packets = []
+        for ts, frame, data in self.packets:
+            packets.append([ts, frame])
+            if data and rng.random() < retransmit:
+                packets.append([ts + RTT / 20, frame])
+        for i in range(len(packets) - 1):
+            if rng.random() < reorder:
+                packets[i][1], packets[i + 1][1] = packets[i + 1][1], packets[i][1]
+        return packets
+
+
+def http_request(method, path, host):
+    return (f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+            f"User-Agent: lab15-synth\r\nAccept: */*\r\n\r\n").encode('latin-1')
+
+
+def http_response(status=200, body=b'ok\n'):
+    return (f"HTTP/1.1 {status} OK\r\nContent-Type: text/plain\r\n"
+            f"Content-Length: {len(body)}\r\n\r\n").encode('latin-1') + body
+
+
+def http_capture(path, connections=1000, requests=3, server=SERVER, port=80,
+                 clients=200, start=1_700_000_000.0, seed=1, split=1, pipeline=False,
+                 retransmit=0.0, reorder=0.0):
+    """Write `connections` HTTP connections with `requests` each; returns the packet count"""
+    rng = random.Random(seed)
+    packets = 0
+    ts = start
+    with PcapWriter(path) as writer:
+        for i in range(connections):
+            client = f"192.168.{1 + rng.randrange(clients) // 250}.{1 + rng.randrange(250)}"
+            conn = _Connection(client, 1024 + i % 60000, server, port, rng)
+            conn.client_sends(ts, TCP_SYN)
+            conn.server_sends(ts + RTT, TCP_SYN | TCP_ACK)
+            conn.client_sends(ts + 2 * RTT, TCP_ACK)
+            ts += 3 * RTT
+            batch = [http_request('GET', rng.choice(PATHS), rng.choice(HOSTS))
+                     for _ in range(requests)]
+            if pipeline:
+                ts = conn.client_sends_split(ts, b''.join(batch), split) + RTT
+                for _ in batch:
+                    conn.server_sends(ts, TCP_ACK | TCP_PSH,
+                                      http_response(body=b'x' * rng.randrange(16, 512)))
+                    ts += RTT / 10
+                conn.client_sends(ts, TCP_ACK)
+                ts += RTT
+            else:
+                for request in batch:
+                    ts = conn.client_sends_split(ts, request, split)
+                    conn.server_sends(ts + RTT, TCP_ACK | TCP_PSH,
+                                      http_response(body=b'x' * rng.randrange(16, 512)))
+                    conn.client_sends(ts + 2 * RTT, TCP_ACK)
+                    ts += 3 * RTT
+            conn.client_sends(ts, TCP_FIN | TCP_ACK)
+            conn.server_sends(ts + RTT, TCP_FIN | TCP_ACK)
+            conn.client_sends(ts + 2 * RTT, TCP_ACK)
+            ts += 3 * RTT
+            for when, frame in conn.impaired(rng, retransmit, reorder):
+                writer.write(frame, when)
+                packets += 1
+    return packets
+
+
+GATEWAY = '10.0.0.1'
+GATEWAY_MAC = '02:00:0a:00:00:01'
+ATTACKS_END = 600.0             # Seconds: the last attack; the victims' bindings must be live
+ATTACKER_MACS = ['de:ad:be:ef:00:01', 'de:ad:be:ef:00:02', 'de:ad:be:ef:00:03',
+                 'de:ad:be:ef:00:04']
+ARP_REQUEST, ARP_REPLY = 1, 2
+
+
+def _host(i):
+    """IP and MAC of station i (10.0.0.10 upwards, up to a /16)"""
+    n = i + 10
+    return f"10.0.{n >> 8 & 0xFF}.{n & 0xFF}", f"02:00:00:{n >> 16 & 0xFF:02x}:{n >> 8 & 0xFF:02x}:{n & 0xFF:02x}"
+
+
+def arp_capture(path, hosts=4096, duration=900.0, interval=120.0, ttl=300.0,
+                start=1_700_000_000.0, seed=1, attacks=True, sweep=40):
+    """Write an ARP capture; returns (packets, expected alerts {(kind, subject)})"""
+    if hosts + 10 > 65536:
+        raise ValueError("at most 65526 hosts (one /16)")
+    if attacks and duration <= ATTACKS_END:
+        # Hosts stop claiming at `duration`: later attacks would hit expired
+        # bindings and raise none of the alerts expected of them
+        raise ValueError(f"the attacks run until {ATTACKS_END:g}s: duration must be longer")
+    rng = random.Random(seed)
+    events = []                 # (time offset, frame)
+    expected = set()
+    # A host that goes quiet, and comes back with a new NIC after its binding expired
+    returning = rng.randrange(hosts)
+    quiet_from, back_at = 50.0, 50.0 + ttl + 60.0
+    new_nic = '02:ff:00:00:00:01'
+    for i in range(hosts):
+        ip, mac = _host(i)
+        t = rng.uniform(0, interval)
+        while t < duration:
+            if i == returning and quiet_from <= t < back_at:
+                t = back_at
+                continue
+            if i == returning and t >= back_at:
+                mac = new_nic
+            events.append((t, ether_arp(ARP_REQUEST, mac, ip, GATEWAY)))
+            events.append((t + RTT, ether_arp(ARP_REPLY, GATEWAY_MAC, GATEWAY, ip, mac)))
+            t += interval * rng.uniform(0.9, 1.1)
+    # Newcomers: a DHCP-style probe from 0.0.0.0, then an announcement
+    for j in range(min(8, 65526 - hosts)):
+        t = rng.uniform(0, duration - 1)
+        mac = f"02:fe:00:00:00:{j:02x}"
+        ip = _host(hosts + j)[0]
+        events.append((t, ether_arp(ARP_REQUEST, mac, '0.0.0.0', ip)))
+        events.append((t + 1.0, ether_arp(ARP_REQUEST, mac, ip, ip)))
+
+    if attacks:
+        # Gateway spoofing: replies to a victim every 2s, the gateway fights back
+        spoofer, victim = ATTACKER_MACS[0], _host(0)
+        t = 200.0
+        while t < 230.0:
+            events.append((t, ether_arp(ARP_REPLY, spoofer, GATEWAY, victim[0], victim[1])))
+            events.append((t + 1.0, ether_arp(ARP_REPLY, GATEWAY_MAC, GATEWAY, victim[0], victim[1])))
+            t += 2.0
+        expected |= {('binding_change', GATEWAY), ('flapping', GATEWAY)}
+        # Gratuitous takeover of a host's address (the host later claims it back)
+        target = _host((hosts // 2) if hosts > 1 else 0)
+        if target[0] != _host(returning)[0]:
+            events.append((400.0, ether_arp(ARP_REQUEST, ATTACKER_MACS[1], target[0], target[0])))
+            expected |= {('gratuitous', target[0]), ('binding_change', target[0])}
+        # Sweep: one MAC claims many addresses within 20s
+        swept = [_host(i)[0] for i in rng.sample(range(hosts), min(sweep, hosts))
+                 if i != returning]
+        for k, ip in enumerate(swept):
+            events.append((500.0 + k * 20.0 / len(swept), ether_arp(ARP_REPLY, ATTACKER_MACS[2],
+                                                                    ip, GATEWAY, GATEWAY_MAC)))
+        expected |= {('binding_change', ip) for ip in swept}
+        if len(swept) > 16:
+            expected.add(('many_ips', ATTACKER_MACS[2]))
+        # A host's own claim sent from another Ethernet address
+        ip, mac = _host(1 % hosts)
+        events.append((ATTACKS_END, ether_arp(ARP_REPLY, mac, ip, GATEWAY, GATEWAY_MAC,
+                                        eth_src=ATTACKER_MACS[3])))
+        expected.add(('eth_mismatch', ip))
+
+    events.sort(key=lambda event: event[0])
+    with PcapWriter(path) as writer:
+        for t, frame in events:
+            writer.write(frame, start + t)
+    return len(events), expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lab 1.5 Synthetic Capture Writer")
+    parser.add_argument('output')
+    parser.add_argument('--arp', action='store_true', help="write an ARP capture instead")
+    parser.add_argument('--hosts', type=int, default=4096, help="ARP: stations on the LAN")
+    parser.add_argument('--duration', type=float, default=900.0, help="ARP: seconds of traffic")
+    parser.add_argument('--no-attacks', action='store_true', help="ARP: benign traffic only")
+    parser.add_argument('--connections', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=3, help="requests per connection")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--split', type=int, default=1, help="segments per request")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="send all requests of a connection before any response")
+    parser.add_argument('--retransmit', type=float, default=0.0,
+                        help="probability a data segment appears twice")
+    parser.add_argument('--reorder', type=float, default=0.0,
+                        help="probability a segment swaps with the next")
+    args = parser.parse_args()
+    if args.arp:
+        try:
+            packets, expected = arp_capture(args.output, args.hosts, args.duration,
+                                            seed=args.seed, attacks=not args.no_attacks)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Wrote {packets} packets to {args.output}, {len(expected)} expected alerts")
+        return
+    packets = http_capture(args.output, args.connections, args.requests, seed=args.seed,
+                           split=args.split, pipeline=args.pipeline,
+                           retransmit=args.retransmit, reorder=args.reorder)
+    print(f"Wrote {packets} packets to {args.output} "
+          f"({os.path.getsize(args.output) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
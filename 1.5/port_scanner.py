@@ -1,77 +1,378 @@
 """
 Lab 1.5.2: Port Scanner
 Scan a range of ports on target host
+
+The original scanner sent one SYN with scapy sr1() and waited up to a
+second for each port in turn - 1-65535 took most of a day. Two engines
+replace it:
+
+connect (default, no root needed)
+    non-blocking connect() to every port from asyncio, at most --concurrency
+    in flight (a semaphore; only that many tasks ever exist). Refused ->
+    closed, accepted -> open (then reset with SO_LINGER 0, so no TIME_WAIT
+    pile-up), timeout / unreachable -> filtered. A probe that cannot get a
+    socket or an ephemeral port (EMFILE, EAGAIN, ...) is retried after a
+    pause; if that keeps failing the port is reported as an error, not
+    given a state.
+
+syn (root + scapy)
+    Raw SYNs are built and sent in batches over one L3 socket while a
+    single background sniffer matches SYN-ACK / RST replies by source
+    port and acknowledgement number. Ports that did not answer are sent
+    again (--retries) and are filtered after that. Nothing is waited for
+    per port.
+
+Both take --rate (probes per second, 0 = unlimited).
+
+Usage:
+    python port_scanner.py [target] [-p 20-100] [--mode connect|syn]
+                           [--concurrency 1000] [--rate 0] [--timeout 1.0]
+    python port_scanner.py 127.0.0.1 -p 1-65535
 """
-import logging
+import os
 import sys
-from scapy.all import IP, TCP, sr1, conf
+import time
+import errno
+import random
+import socket
+import struct
+import asyncio
+import logging
+import argparse
+import threading
+from collections import Counter
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-conf.verb = 0
+
+OPEN, CLOSED, FILTERED = 'open', 'closed', 'filtered'
+CONCURRENCY = 1000          # Connect mode: connections in flight
+SYN_BATCH = 256             # SYN mode: packets built and sent per batch
+SYN_RETRIES = 1             # SYN mode: extra rounds for ports that did not answer
+FD_RESERVE = 64             # File descriptors kept free in connect mode
+PROBE_RETRIES = 5           # Connect mode: retries of a probe short of sockets or ports
+RETRY_DELAY = 0.05          # Seconds before the first retry, doubled after each
+# Out of descriptors, buffers or ephemeral ports: says nothing about the port
+_TRANSIENT = frozenset((errno.EAGAIN, errno.EMFILE, errno.ENFILE, errno.ENOBUFS,
+                        errno.EADDRNOTAVAIL))
+
+
+def parse_ports(spec):
+    """"22,80,8000-8100" -> sorted list of ports ("-" means 1-65535)"""
+    ports = set()
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, dash, last = part.partition('-')
+        if dash:
+            start = int(first) if first else 1
+            end = int(last) if last else 65535
+        else:
+            start = end = int(first)
+        if not 1 <= start <= end <= 65535:
+            raise ValueError(f"Bad port range: {part}")
+        ports.update(range(start, end + 1))
+    return sorted(ports)
+
+
+class RateLimiter:
+    """Token bucket: wait() / take() until `rate` probes per second (0 = off)"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate / 20))    # ~50ms worth of probes
+        self.tokens = self.burst
+        self.last = time.monotonic()
+
+    def _delay(self, count):
+        """Seconds to wait before `count` probes may go (and reserve them)"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= count
+        return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    async def wait(self, count=1):
+        if self.rate:
+            delay = self._delay(count)
+            if delay:
+                await asyncio.sleep(delay)
+
+    def take(self, count=1):
+        if self.rate:
+            delay = self._delay(count)
+            if delay:
+                time.sleep(delay)
+
+
+def _fd_limit():
+    """Soft RLIMIT_NOFILE, raised to the hard limit if we can"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+            soft = hard
+        except (ValueError, OSError):
+            pass
+    return None if soft == resource.RLIM_INFINITY else soft
+
+
+def _writable(loop, fd, future):
+    """add_writer callback: fires once (the selector is level-triggered)"""
+    loop.remove_writer(fd)
+    if not future.done():
+        future.set_result(None)
+
 
 class PortScanner:
-    def __init__(self, target, start_port=20, end_port=100, timeout=1):
+    def __init__(self, target, start_port=20, end_port=100, timeout=1,
+                 ports=None, mode='connect', concurrency=CONCURRENCY, rate=0,
+                 retries=SYN_RETRIES):
         self.target = target
         self.start_port = start_port
         self.end_port = end_port
+        self.ports = ports if ports is not None else list(range(start_port, end_port + 1))
         self.timeout = timeout
+        self.mode = mode
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.results = {}           # port -> OPEN / CLOSED / FILTERED
+        self.errors = {}            # port -> OSError of a probe that never ran
         self.open_ports = []
-    
+
+    def _record(self, port, state):
+        self.results[port] = state
+        if state == OPEN:
+            logger.info(f"✓ Port {port:5}/tcp OPEN")
+
+    # ---- connect mode ---------------------------------------------------
+
+    async def _probe(self, loop, family, addr, port):
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            # Loopback / LAN answers often arrive within connect() itself
+            err = sock.connect_ex((addr, port))
+            if err in _TRANSIENT:
+                raise OSError(err, os.strerror(err))
+            if err == errno.EINPROGRESS:
+                writable = loop.create_future()
+                # By fd: a socket object is repr()'d on every selector lookup miss
+                fd = sock.fileno()
+                loop.add_writer(fd, _writable, loop, fd, writable)
+                try:
+                    await asyncio.wait_for(writable, self.timeout)
+                except asyncio.TimeoutError:
+                    return FILTERED
+                finally:
+                    loop.remove_writer(fd)
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err == errno.ECONNREFUSED:
+                return CLOSED
+            if err:
+                return FILTERED     # Unreachable, ...
+            if sock.getsockname() == sock.getpeername():
+                return CLOSED       # Loopback self-connect: our own ephemeral port
+            # Close with RST instead of FIN: no TIME_WAIT entry per open port
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            return OPEN
+        finally:
+            sock.close()
+
+    async def connect_scan(self):
+        info = await asyncio.get_running_loop().getaddrinfo(
+            self.target, None, type=socket.SOCK_STREAM)
+        family, addr = info[0][0], info[0][4][0]
+        concurrency = self.concurrency
+        limit = _fd_limit()
+        if limit is not None and concurrency > limit - FD_RESERVE:
+            concurrency = max(1, limit - FD_RESERVE)
+            logger.info(f"Concurrency capped at {concurrency} (open file limit {limit})")
+        limiter = RateLimiter(self.rate)
+        sem = asyncio.Semaphore(concurrency)
+        tasks = set()
+        loop = asyncio.get_running_loop()
+
+        async def probe(port):
+            try:
+                delay = RETRY_DELAY
+                for attempt in range(PROBE_RETRIES + 1):
+                    try:
+                        state = await self._probe(loop, family, addr, port)
+                    except OSError as e:
+                        if e.errno not in _TRANSIENT or attempt == PROBE_RETRIES:
+                            self.errors[port] = e
+                            return
+                        await asyncio.sleep(delay)
+                        delay *= 2
+                    else:
+                        self._record(port, state)
+                        return
+            finally:
+                sem.release()
+
+        for port in self.ports:
+            await sem.acquire()     # At most `concurrency` tasks exist at once
+            await limiter.wait()
+            task = asyncio.create_task(probe(port))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    # ---- SYN mode -------------------------------------------------------
+
+    def syn_scan(self):
+        """Raw SYN scan: batched sends, one sniffer matching replies (root + scapy)"""
+        try:
+            from scapy.all import IP, TCP, AsyncSniffer, conf
+        except ImportError:
+            raise RuntimeError("SYN mode needs scapy (pip install scapy); "
+                               "use --mode connect without it")
+        if hasattr(os, 'geteuid') and os.geteuid() != 0:
+            raise RuntimeError("SYN mode needs root (raw sockets); use --mode connect")
+        conf.verb = 0
+        dst = socket.gethostbyname(self.target)
+        sport = random.randint(40000, 60000)
+        seq = random.randint(0, 2**32 - 1)
+        answered = {}
+        lock = threading.Lock()
+
+        def on_reply(pkt):
+            tcp = pkt[TCP]
+            # Our SYNs all carry `seq`: a genuine reply acknowledges seq + 1
+            if tcp.dport != sport or tcp.ack != (seq + 1) & 0xFFFFFFFF:
+                return
+            flags = int(tcp.flags)
+            with lock:
+                if tcp.sport not in answered:
+                    answered[tcp.sport] = OPEN if flags & 0x12 == 0x12 else CLOSED
+
+        sniffer = AsyncSniffer(
+            filter=f"tcp and src host {dst} and dst port {sport}",
+            prn=on_reply, store=False)
+        sniffer.start()
+        time.sleep(0.2)                 # Let the capture socket come up
+        limiter = RateLimiter(self.rate, burst=SYN_BATCH if self.rate else None)
+        l3 = conf.L3socket()
+        try:
+            pending = list(self.ports)
+            for _ in range(1 + self.retries):
+                for i in range(0, len(pending), SYN_BATCH):
+                    batch = pending[i:i + SYN_BATCH]
+                    limiter.take(len(batch))
+                    for pkt in IP(dst=dst) / TCP(sport=sport, dport=batch, flags='S', seq=seq):
+                        l3.send(pkt)
+                time.sleep(self.timeout)    # Replies still in flight
+                with lock:
+                    pending = [p for p in pending if p not in answered]
+                if not pending:
+                    break
+        finally:
+            l3.close()
+            sniffer.stop()
+        for port in self.ports:
+            self._record(port, answered.get(port, FILTERED))
+
+    # ---- common ---------------------------------------------------------
+
     def scan_port(self, port):
         """Scan single port"""
+        saved = self.ports
+        self.ports = [port]
         try:
-            syn = IP(dst=self.target) / TCP(dport=port, flags="S")
-            response = sr1(syn, timeout=self.timeout)
-            
-            if response:
-                if response.haslayer(TCP) and response[TCP].flags == "SA":
-                    logger.info(f"✓ Port {port:5}/tcp OPEN")
-                    self.open_ports.append(port)
-                    return "open"
-            return "closed"
-        except Exception as e:
-            logger.error(f"Error scanning port {port}: {str(e)}")
-            return "error"
-    
+            self._run()
+        finally:
+            self.ports = saved
+        if port in self.errors:
+            raise self.errors.pop(port)
+        return self.results[port]
+
+    def _run(self):
+        if self.mode == 'syn':
+            self.syn_scan()
+        else:
+            asyncio.run(self.connect_scan())
+
     def scan_range(self):
         """Scan port range"""
-        logger.info(f"\nScanning {self.target} ports {self.start_port}-{self.end_port}...")
+        first, last = (self.ports[0], self.ports[-1]) if self.ports else (0, 0)
+        logger.info(f"\nScanning {self.target} ports {first}-{last} "
+                    f"({len(self.ports)} ports, {self.mode} mode)...")
         logger.info("="*50)
-        
-        for port in range(self.start_port, self.end_port + 1):
-            self.scan_port(port)
-        
+
+        started = time.perf_counter()
+        try:
+            self._run()
+        except (RuntimeError, OSError) as e:
+            logger.error(f"Scan failed: {e}")
+            return
+        elapsed = time.perf_counter() - started
+        self.open_ports = sorted(p for p, state in self.results.items() if state == OPEN)
+
         logger.info("="*50)
+        counts = {state: 0 for state in (OPEN, CLOSED, FILTERED)}
+        for state in self.results.values():
+            counts[state] += 1
+        logger.info(f"{len(self.results)} ports in {elapsed:.2f}s "
+                    f"({len(self.results) / max(elapsed, 1e-9):,.0f} ports/s): "
+                    f"{counts[OPEN]} open, {counts[CLOSED]} closed, {counts[FILTERED]} filtered")
+        if self.errors:
+            reasons = Counter(e.strerror or str(e) for e in self.errors.values())
+            logger.warning(f"{len(self.errors)} ports not scanned: "
+                           + ", ".join(f"{n} x {reason}" for reason, n in reasons.most_common()))
         if self.open_ports:
             logger.info(f"\nOpen ports found: {self.open_ports}")
         else:
             logger.info("\nNo open ports found in range")
-    
+
     def get_results(self):
         return self.open_ports
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lab 1.5.2: TCP Port Scanner")
+    parser.add_argument('target', nargs='?', default='localhost')
+    parser.add_argument('-p', '--ports', default='20-100',
+                        help="e.g. 20-100, 22,80,443 or - for 1-65535")
+    parser.add_argument('--mode', choices=('connect', 'syn'), default='connect',
+                        help="connect: no root needed; syn: raw SYNs via scapy (root)")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help="connect mode: connections in flight")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="probes per second (0 = unlimited)")
+    parser.add_argument('--timeout', type=float, default=1.0,
+                        help="seconds to wait for an answer")
+    parser.add_argument('--retries', type=int, default=SYN_RETRIES,
+                        help="syn mode: resends to ports that did not answer")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
     print("\n" + "="*60)
     print("Lab 1.5.2: TCP Port Scanner")
     print("="*60)
-    
-    target = input("Enter target IP/hostname (default: localhost): ").strip()
-    if not target:
-        target = "localhost"
-    
     try:
-        start = int(input("Enter start port (default: 20): ") or "20")
-        end = int(input("Enter end port (default: 100): ") or "100")
-    except ValueError:
-        start, end = 20, 100
-    
-    scanner = PortScanner(target, start, end)
+        ports = parse_ports(args.ports)
+    except ValueError as e:
+        print(f"[!] {e}")
+        sys.exit(1)
+
+    scanner = PortScanner(args.target, ports[0], ports[-1], args.timeout, ports=ports,
+                          mode=args.mode, concurrency=args.concurrency, rate=args.rate,
+                          retries=args.retries)
     scanner.scan_range()
-    
+
     print("="*60 + "\n")
 
 if __name__ == "__main__":
@@ -0,0 +1,106 @@
+"""
+Lab 1.5: Benchmark - building HTTP responses
+Responses built per second (no sockets) for the test page:
+
+- format:    simple_http_get_server.py - str.format() on the whole
+             response, then encode()
+- per-field: the head built line by line with f-strings, formatdate()
+             and encode() on every response (http_server.py before
+             http_response.py)
+- template:  pre-encoded ResponseTemplate/PageTemplate pieces with the
+             cached Date line, as handed to writelines()
+- template+join: the same pieces joined into one bytes object
+
+End to end (sockets, keep-alive, pipelining) see http_benchmark.py.
+
+Usage:
+    python response_benchmark.py [--seconds 1]
+"""
+import argparse
+import time
+from http import HTTPStatus
+from email.utils import formatdate
+
+from http_response import SERVER_NAME
+from http_server import PAGE, PAGE_HEAD, HTML
+
+ADDR = ('127.0.0.1', 54321)
+
+FORMAT_RESPONSE = """HTTP/1.1 200 OK
+Content-Type: text/html; charset=utf-8
+
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Simple HTTP Server</title>
+</head>
+<body>
+    <h1>Lab 1.5 HTTP Server</h1>
+    <p>This is a simple HTTP GET server for testing.</p>
+    <p>Request received at: {}</p>
+</body>
+</html>
+"""
+PAGE_TEXT = PAGE.before.decode('utf-8') + '{}' + PAGE.after.decode('utf-8')
+
+
+def build_format():
+    return FORMAT_RESPONSE.format(ADDR).encode('utf-8')
+
+
+def build_per_field():
+    body = PAGE_TEXT.format(ADDR).encode('utf-8')
+    lines = [f"HTTP/1.1 200 {HTTPStatus(200).phrase}",
+             f"Date: {formatdate(usegmt=True)}",
+             f"Server: {SERVER_NAME}",
+             f"Content-Type: {HTML}",
+             f"Content-Length: {len(body)}",
+             "Connection: keep-alive"]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+
+def build_template():
+    body, length = PAGE.render(ADDR)
+    return PAGE_HEAD.parts(length, True) + body
+
+
+def build_template_join():
+    return b''.join(build_template())
+
+
+def rate(fn, seconds):
+    """Calls per second, measured in batches for at least `seconds`"""
+    batch, calls = 1000, 0
+    start = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            fn()
+        calls += batch
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return calls / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lab 1.5 Response Building Benchmark")
+    parser.add_argument('--seconds', type=float, default=1.0, help="time per case")
+    args = parser.parse_args()
+
+    # Same bytes on the wire (the format case has no Date/Server/length headers)
+    assert b''.join(build_template())[-len(PAGE.after):] == build_per_field()[-len(PAGE.after):]
+
+    cases = [("format (simple_http_get_server)", build_format),
+             ("per-field head + formatdate", build_per_field),
+             ("template (writelines pieces)", build_template),
+             ("template + join", build_template_join)]
+    print(f"\n🔬 Responses built per second ({args.seconds:.1f}s per case)")
+    print("-" * 60)
+    baseline = None
+    for name, fn in cases:
+        per_sec = rate(fn, args.seconds)
+        baseline = baseline or per_sec
+        print(f"{name:<34} {per_sec:>12,.0f}/s  {per_sec / baseline:>5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 Lab 1.5: Simple HTTP GET Server
 For testing HTTP traffic analyzer
 """
+import sys
 import socket
 import logging
 
@@ -12,7 +13,7 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 HOST = '0.0.0.0'
-PORT = 8080
+PORT = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
 
 def handle_request(client_socket, addr):
     """Handle single HTTP request"""
@@ -0,0 +1,168 @@
+"""
+Lab 1.5: Static File Cache
+Maps URL paths to files under a root directory for http_server.py.
+
+- small files (<= cache_max_file) are kept in memory in an LRU bounded by
+  total bytes, together with their precomputed headers and ETag
+- larger files are not cached: the server streams them with sendfile(),
+  so the bytes go from the page cache to the socket without being copied
+  into Python
+- entries are revalidated with os.stat() at most once per `revalidate`
+  seconds; a changed mtime or size reloads the entry (and its ETag)
+- paths are normalised and must stay inside the root (no "..", no
+  symlinks pointing outside)
+"""
+import os
+import time
+import mimetypes
+from collections import OrderedDict
+from email.utils import formatdate
+from urllib.parse import unquote
+
+from http_response import ResponseTemplate
+
+CACHE_BYTES = 64 * 1024 * 1024      # Total size of cached bodies
+CACHE_MAX_FILE = 256 * 1024         # Larger files are served with sendfile()
+REVALIDATE = 1.0                    # Seconds between stat() checks of a cached entry
+INDEX = 'index.html'
+
+
+class StaticEntry:
+    """One file: its validators, precomputed headers and (maybe) its bytes"""
+    __slots__ = ('path', 'size', 'mtime_ns', 'etag', 'headers', 'template', 'body', 'checked')
+
+    def __init__(self, path, st, body=None):
+        self.path = path
+        self.size = st.st_size
+        self.mtime_ns = st.st_mtime_ns
+        self.etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+        content_type, encoding = mimetypes.guess_type(path)
+        if content_type is None:
+            content_type = 'application/octet-stream'
+        elif content_type.startswith('text/'):
+            content_type += '; charset=utf-8'
+        self.headers = (f"Content-Type: {content_type}",
+                        f"ETag: {self.etag}",
+                        f"Last-Modified: {formatdate(st.st_mtime, usegmt=True)}",
+                        "Accept-Ranges: bytes")
+        if encoding:
+            self.headers += (f"Content-Encoding: {encoding}",)
+        self.template = ResponseTemplate(200, None, self.headers)     # The 200 head, pre-encoded
+        self.body = body
+        self.checked = time.monotonic()
+
+    def matches(self, if_none_match):
+        """If-None-Match: does the client already have this version?"""
+        if if_none_match.strip() == '*':
+            return True
+        tags = (tag.strip() for tag in if_none_match.split(','))
+        return any(tag.removeprefix('W/') == self.etag for tag in tags)
+
+
+def parse_range(header, size):
+    """
+    A single "bytes=" range -> (start, end inclusive). None means ignore the
+    header and send the whole file; ValueError means 416 (not satisfiable).
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None         # Other units / multiple ranges: serve everything
+    first, dash, last = (part.strip() for part in spec.partition('-'))
+    digits = [part for part in (first, last) if part]
+    if not dash or not digits or not all(p.isascii() and p.isdigit() for p in digits):
+        return None         # Malformed: ignore
+    if first:
+        start = int(first)
+        if start >= size:
+            raise ValueError("range not satisfiable")
+        end = int(last) if last else size - 1
+        if start > end:
+            return None
+    else:
+        suffix = int(last)  # "-N": the last N bytes
+        if suffix == 0:
+            raise ValueError("empty suffix range")
+        start, end = max(0, size - suffix), size - 1
+    if start >= size:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+class StaticFiles:
+    def __init__(self, root, cache_bytes=CACHE_BYTES, cache_max_file=CACHE_MAX_FILE,
+                 revalidate=REVALIDATE):
+        self.root = os.path.realpath(root)
+        self.cache_bytes = cache_bytes
+        self.cache_max_file = cache_max_file
+        self.revalidate = revalidate
+        self.cache = OrderedDict()      # URL path -> StaticEntry, least recently used first
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, url_path):
+        """Filesystem path for a URL path, or None if it is outside the root"""
+        path = unquote(url_path)
+        if '\0' in path:
+            return None
+        full = os.path.realpath(os.path.join(self.root, path.lstrip('/')))
+        if full != self.root and not full.startswith(self.root + os.sep):
+            return None
+        if os.path.isdir(full):
+            full = os.path.join(full, INDEX)
+        return full
+
+    def lookup(self, url_path):
+        """StaticEntry for a URL path, or None (missing / not a regular file)"""
+        # Keyed by URL path: a fresh hit costs no system call at all
+        entry = self.cache.get(url_path)
+        now = time.monotonic()
+        if entry is not None:
+            if now - entry.checked < self.revalidate:
+                self.cache.move_to_end(url_path)
+                self.hits += 1
+                return entry
+            try:
+                st = os.stat(entry.path)
+            except OSError:
+                st = None
+            if st and st.st_mtime_ns == entry.mtime_ns and st.st_size == entry.size:
+                entry.checked = now
+                self.cache.move_to_end(url_path)
+                self.hits += 1
+                return entry
+            self._evict(url_path)      # Changed or gone: look it up again
+        self.misses += 1
+        path = self.resolve(url_path)
+        if path is None:
+            return None
+        return self._load(url_path, path)
+
+    def _load(self, url_path, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        if st.st_size > self.cache_max_file:
+            return StaticEntry(path, st)        # Served with sendfile, not cached
+        try:
+            with open(path, 'rb') as f:
+                body = f.read()
+        except OSError:
+            return None
+        if len(body) != st.st_size:
+            return StaticEntry(path, st)        # Being written: don't cache a torn copy
+        entry = StaticEntry(path, st, body)
+        self.cache[url_path] = entry
+        self.cached_bytes += len(body)
+        while self.cached_bytes > self.cache_bytes and self.cache:
+            _, old = self.cache.popitem(last=False)
+            self.cached_bytes -= len(old.body)
+        return entry
+
+    def _evict(self, url_path):
+        entry = self.cache.pop(url_path, None)
+        if entry is not None:
+            self.cached_bytes -= len(entry.body)
@@ -0,0 +1,393 @@
+"""
+Lab 1.5: TCP Stream Reassembly for HTTP
+Parsing each packet's payload on its own misses requests whose headers
+span segments, counts retransmissions twice and sees only the first of
+several pipelined requests. Here segments are put back into byte streams
+first, and HTTP is parsed from the streams.
+
+FlowTable
+    connections keyed by their 4-tuple (either direction maps to the same
+    Flow). Client and server are told apart by the SYN, or by the server
+    port when the handshake was not captured.
+StreamBuffer (one per direction)
+    delivers bytes in sequence-number order: retransmitted and overlapping
+    data is trimmed, early segments wait until the hole before them is
+    filled. At most `max_buffer` bytes wait per direction; past that the
+    hole is declared lost (a gap) and the stream skips ahead.
+HTTP
+    each direction feeds a common/httpparse.py parser with discard_body,
+    so bodies are framed but never stored. After a gap the parser is
+    restarted; if the stream does not resume at a message boundary the
+    direction stops being parsed.
+Eviction
+    flows are closed by RST, or once both streams reach their FIN (late
+    retransmissions are then ignored). Flows are expired after
+    `idle_timeout` seconds of capture time without packets
+    (common/timerwheel.py), and the oldest is dropped when `max_flows`
+    are open.
+
+Complete requests go to on_request(record); when the matching response
+head and body are complete the same HTTPRecord goes to on_response(record)
+with its status and latency.
+"""
+import os
+import sys
+from collections import deque, OrderedDict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.httpparse import HTTPParser, REQUEST, RESPONSE
+from common.pcapio import ip_ntop, TCP_FIN, TCP_SYN, TCP_RST, TCP_ACK
+from common.timerwheel import TimerWheel
+
+SEQ_MASK = 0xFFFFFFFF
+MAX_BUFFER = 1024 * 1024        # Out-of-order bytes held per direction
+MAX_FLOWS = 100000
+IDLE_TIMEOUT = 120.0            # Seconds of capture time
+EXPIRY_TICK = 1.0
+RECENTLY_CLOSED = 4096          # Closed 4-tuples remembered, to ignore late retransmissions
+
+
+def seq_diff(a, b):
+    """a - b in 32-bit sequence space (negative if a is before b)"""
+    d = (a - b) & SEQ_MASK
+    return d - (1 << 32) if d & 0x80000000 else d
+
+
+class StreamBuffer:
+    """One direction of a connection: segments in, in-order bytes out"""
+    __slots__ = ('next_seq', 'pending', 'buffered', 'max_buffer', 'gaps', 'duplicates')
+
+    def __init__(self, max_buffer=MAX_BUFFER):
+        self.next_seq = None        # Sequence number of the next byte to deliver
+        self.pending = {}           # seq -> bytes that arrived early
+        self.buffered = 0
+        self.max_buffer = max_buffer
+        self.gaps = 0
+        self.duplicates = 0
+
+    def syn(self, seq):
+        if self.next_seq is None:   # A late or retransmitted SYN changes nothing
+            self.next_seq = (seq + 1) & SEQ_MASK
+
+    def add(self, seq, data):
+        """
+        Returns (bytes now deliverable in order, whether a gap was skipped
+        before them).
+        """
+        if self.next_seq is None:
+            self.next_seq = seq     # Joined mid-stream: start here
+        offset = seq_diff(seq, self.next_seq)
+        if offset < 0:
+            if -offset >= len(data):
+                self.duplicates += 1
+                return b'', False
+            data = data[-offset:]   # Partly retransmitted: keep the new tail
+            offset = 0
+        if offset > 0:
+            held = self.pending.get(seq)
+            if held is not None and len(held) >= len(data):
+                self.duplicates += 1
+                return b'', False
+            self.pending[seq] = data
+            self.buffered += len(data) - (len(held) if held else 0)
+            if self.buffered <= self.max_buffer:
+                return b'', False
+            # The hole is not going to be filled: skip to the earliest held segment
+            self.next_seq = min(self.pending, key=lambda s: seq_diff(s, self.next_seq))
+            self.gaps += 1
+            out = []
+            self._drain(out)
+            return b''.join(out), True
+        out = [data]
+        self.next_seq = (self.next_seq + len(data)) & SEQ_MASK
+        if self.pending:
+            self._drain(out)
+        return (data if len(out) == 1 else b''.join(out)), False
+
+    def _drain(self, out):
+        """Move held segments that are now in order to out"""
+        while self.pending:
+            chunk = self.pending.pop(self.next_seq, None)
+            start = self.next_seq
+            if chunk is None:
+                start = next((s for s in self.pending if seq_diff(s, self.next_seq) < 0), None)
+                if start is None:
+                    return
+                chunk = self.pending.pop(start)
+            self.buffered -= len(chunk)
+            skip = seq_diff(self.next_seq, start)
+            if skip < len(chunk):
+                out.append(chunk[skip:])
+                self.next_seq = (self.next_seq + len(chunk) - skip) & SEQ_MASK
+
+
+class HTTPRecord:
+    """One request and (once seen) its response"""
+    __slots__ = ('client', 'server', 'method', 'target', 'host', 'started', 'ts',
+                 'status', 'response_started', 'response_ts', 'response_size')
+
+    def __init__(self, client, server, request, started, ts):
+        self.client = client        # (packed address, port)
+        self.server = server
+        self.method = request.method
+        self.target = request.target
+        self.host = request.headers.get('host')
+        self.started = started      # First segment of the request
+        self.ts = ts                # Request complete
+        self.status = None
+        self.response_started = self.response_ts = None
+        self.response_size = 0
+
+    @property
+    def path(self):
+        return self.target.split('?', 1)[0]
+
+    @property
+    def latency(self):
+        """Request complete -> first byte of the response (seconds), or None"""
+        if self.response_started is None:
+            return None
+        return max(0.0, self.response_started - self.ts)
+
+    def endpoint(self, which):
+        addr, port = which
+        return f"{ip_ntop(addr)}:{port}"
+
+    def __repr__(self):
+        return (f"<HTTPRecord {self.endpoint(self.client)} -> {self.endpoint(self.server)} "
+                f"{self.method} {self.host}{self.target} {self.status}>")
+
+
+class _Direction:
+    """Stream + parser + timing for one direction of a Flow"""
+    __slots__ = ('stream', 'parser', 'started', 'fin')
+
+    def __init__(self, kind, max_buffer):
+        self.stream = StreamBuffer(max_buffer)
+        self.parser = HTTPParser(kind, discard_body=True)
+        self.started = None         # Capture time of the message in progress
+        self.fin = None             # Sequence number of this direction's FIN
+
+    @property
+    def finished(self):
+        """FIN seen and every byte before it delivered"""
+        return self.fin is not None and self.stream.next_seq == self.fin
+
+
+class Flow:
+    __slots__ = ('key', 'client', 'server', 'up', 'down', 'waiting', 'early',
+                 'first_seen', 'last_seen')
+
+    def __init__(self, key, client, server, ts, max_buffer):
+        self.key = key
+        self.client = client
+        self.server = server
+        self.up = _Direction(REQUEST, max_buffer)       # client -> server
+        self.down = _Direction(RESPONSE, max_buffer)    # server -> client
+        self.waiting = deque()      # Requests whose response has not been seen yet
+        self.early = deque()        # (message, started, ts) of responses seen before their request
+        self.first_seen = self.last_seen = ts
+
+
+class FlowTable:
+    def __init__(self, on_request=None, on_response=None, server_ports=(80, 8080),
+                 idle_timeout=IDLE_TIMEOUT, max_flows=MAX_FLOWS, max_buffer=MAX_BUFFER):
+        self.on_request = on_request
+        self.on_response = on_response
+        self.server_ports = frozenset(server_ports)
+        self.idle_timeout = idle_timeout
+        self.max_flows = max_flows
+        self.max_buffer = max_buffer
+        self.flows = {}             # key -> Flow, oldest first
+        self.recently_closed = OrderedDict()
+        self.expiry = None          # TimerWheel on capture time, made at the first packet
+        self._next_tick = 0.0
+        # Statistics
+        self.flows_total = 0
+        self.closed = 0
+        self.expired = 0
+        self.evicted = 0
+        self.gaps = 0
+        self.duplicates = 0
+        self.parse_errors = 0
+        self.requests = 0
+        self.responses = 0
+        self.unanswered = 0
+
+    def __len__(self):
+        return len(self.flows)
+
+    COUNTERS = ('flows_total', 'closed', 'expired', 'evicted', 'gaps', 'duplicates',
+                'parse_errors', 'requests', 'responses', 'unanswered')
+
+    def counters(self):
+        """The statistics as a dict (picklable, to send from a worker process)"""
+        return {name: getattr(self, name) for name in self.COUNTERS}
+
+    def add_counters(self, counters):
+        """Add another table's counters() to this one's"""
+        for name, value in counters.items():
+            setattr(self, name, getattr(self, name) + value)
+
+    # ---- packets --------------------------------------------------------
+
+    def process(self, ts, seg):
+        src, dst = (seg.saddr, seg.sport), (seg.daddr, seg.dport)
+        key = (src, dst) if src < dst else (dst, src)
+        flow = self.flows.get(key)
+        flags = seg.flags
+        if flow is None:
+            if flags & TCP_RST or (not seg.payload and not flags & TCP_SYN):
+                return None         # Nothing to learn from a stray ACK/RST
+            if key in self.recently_closed and not flags & TCP_SYN:
+                return None         # Retransmission after the close
+            flow = self._open(key, src, dst, seg, ts)
+        flow.last_seen = ts
+        self.expiry.touch(key, ts)
+        if ts >= self._next_tick:
+            self._next_tick = ts + EXPIRY_TICK
+            for old in self.expiry.advance(ts):
+                self.expired += 1
+                self._close(self.flows[old])
+        if not seg.payload and not flags & (TCP_SYN | TCP_FIN | TCP_RST):
+            return flow             # Pure ACK: nothing to reassemble
+
+        from_client = src == flow.client
+        side = flow.up if from_client else flow.down
+        if flags & TCP_SYN:
+            side.stream.syn(seg.seq)
+        if seg.payload:
+            data, gap = side.stream.add(seg.seq, seg.payload)
+            if gap:
+                self.gaps += 1
+                if side.parser is not None:
+                    # Mid-message after the hole: start over, hope for a boundary
+                    side.parser = HTTPParser(side.parser.kind, discard_body=True)
+                    if not from_client:
+                        for record in flow.waiting:
+                            side.parser.expect(record.method)
+            if data:
+                self._feed(flow, side, from_client, data, ts)
+        if flags & TCP_RST:
+            self._close(flow)
+            return flow
+        if flags & TCP_FIN:
+            side.fin = (seg.seq + len(seg.payload)) & SEQ_MASK
+            if side.stream.next_seq is None:
+                side.stream.next_seq = side.fin
+        if side.finished:
+            if not from_client and side.parser is not None:
+                self._eof(flow, ts)
+            if flow.up.finished and flow.down.finished:
+                self._close(flow)
+        return flow
+
+    def _open(self, key, src, dst, seg, ts):
+        if seg.flags & TCP_SYN:
+            client, server = (dst, src) if seg.flags & TCP_ACK else (src, dst)
+        elif seg.sport in self.server_ports and seg.dport not in self.server_ports:
+            client, server = dst, src
+        else:
+            client, server = src, dst
+        if len(self.flows) >= self.max_flows:
+            self.evicted += 1
+            self._close(next(iter(self.flows.values())))
+        if self.expiry is None:
+            self.expiry = TimerWheel(self.idle_timeout, tick=EXPIRY_TICK, clock=lambda: ts)
+            self._next_tick = ts + EXPIRY_TICK
+        flow = self.flows[key] = Flow(key, client, server, ts, self.max_buffer)
+        self.flows_total += 1
+        return flow
+
+    # ---- HTTP -----------------------------------------------------------
+
+    def _feed(self, flow, side, from_client, data, ts):
+        parser = side.parser
+        if parser is None:
+            return
+        if parser.idle:
+            side.started = ts
+        parser.feed(data)
+        messages = parser.messages()
+        while True:
+            try:                    # The parser only: callback errors should surface
+                message = next(messages, None)
+            except Exception:
+                # HTTPError: not HTTP, or lost sync for good. Anything else
+                # is input the parser did not expect - one bad stream must
+                # not end the capture either way. Stop parsing this direction.
+                self.parse_errors += 1
+                side.parser = None
+                if from_client:
+                    self.unanswered += len(flow.waiting)
+                    flow.waiting.clear()
+                return
+            if message is None:
+                return
+            if from_client:
+                self._request(flow, message, side.started, ts)
+            else:
+                self._response(flow, message, side.started, ts)
+            side.started = ts if not parser.idle else None
+
+    def _request(self, flow, message, started, ts):
+        record = HTTPRecord(flow.client, flow.server, message, started or ts, ts)
+        self.requests += 1
+        if flow.down.parser is not None:
+            flow.down.parser.expect(message.method)
+        flow.waiting.append(record)
+        if self.on_request:
+            self.on_request(record)
+        if flow.early:
+            self._answer(flow, *flow.early.popleft())
+
+    def _response(self, flow, message, started, ts):
+        self.responses += 1
+        if flow.waiting:
+            self._answer(flow, message, started, ts)
+        elif flow.up.parser is not None and (flow.up.stream.pending or not flow.up.parser.idle):
+            # Captured ahead of the last segment of its request (the tap saw
+            # the directions out of order): match it once the request completes
+            flow.early.append((message, started, ts))
+        # else: its request was before the capture started
+
+    def _answer(self, flow, message, started, ts):
+        record = flow.waiting.popleft()
+        record.status = message.status
+        record.response_started = started or ts
+        record.response_ts = ts
+        record.response_size = message.body_size
+        if self.on_response:
+            self.on_response(record)
+
+    def _eof(self, flow, ts):
+        """Server closed: a response delimited by the close is now complete"""
+        side = flow.down
+        try:
+            message = side.parser.eof()
+        except Exception:           # HTTPError, or a parser bug (see _feed)
+            self.parse_errors += 1
+            message = None
+        side.parser = None
+        if message is not None:
+            self._response(flow, message, side.started, ts)
+
+    # ---- eviction -------------------------------------------------------
+
+    def _close(self, flow):
+        if self.flows.pop(flow.key, None) is None:
+            return
+        self.expiry.remove(flow.key)
+        self.recently_closed[flow.key] = True
+        if len(self.recently_closed) > RECENTLY_CLOSED:
+            self.recently_closed.popitem(last=False)
+        self.closed += 1
+        self.duplicates += flow.up.stream.duplicates + flow.down.stream.duplicates
+        self.unanswered += len(flow.waiting)
+
+    def close_all(self):
+        """End of the capture: finish close-delimited responses, close every flow"""
+        for flow in list(self.flows.values()):
+            if flow.down.parser is not None and flow.down.finished:
+                self._eof(flow, flow.last_seen)
+            self._close(flow)
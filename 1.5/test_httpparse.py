@@ -0,0 +1,154 @@
+"""
+Lab 1.5: HTTPParser tests (common/httpparse.py)
+Every message must parse the same however it is split into reads, and
+every malformed one must raise HTTPError (never another exception).
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.httpparse import HTTPParser, HTTPError, REQUEST, RESPONSE
+
+
+def parse(data, kind=REQUEST, step=None, methods=(), eof=False, **options):
+    """Feed data `step` bytes at a time; returns the messages"""
+    parser = HTTPParser(kind, **options)
+    for method in methods:
+        parser.expect(method)
+    messages = []
+    step = step or len(data) or 1
+    for i in range(0, len(data), step):
+        parser.feed(data[i:i + step])
+        messages.extend(parser.messages())
+    if eof:
+        last = parser.eof()
+        if last is not None:
+            messages.append(last)
+    return messages
+
+
+PIPELINED = (b'GET /a HTTP/1.1\r\nHost: x\r\n\r\n'
+             b'POST /b HTTP/1.1\r\nHost: x\r\nContent-Length: 5\r\n\r\nhello'
+             b'\r\n'                                # Stray CRLF between messages
+             b'PUT /c HTTP/1.1\nTransfer-Encoding: chunked\n\n'
+             b'5;ext=1\nworld\n0\nX-Trailer: t\n\n'
+             b'GET /d HTTP/1.0\r\nConnection: keep-alive\r\n\r\n')
+
+
+@pytest.mark.parametrize('step', [1, 2, 3, 10, 47, None])
+def test_pipelined_requests_at_any_split(step):
+    messages = parse(PIPELINED, step=step)
+    assert [(m.method, m.target, m.body) for m in messages] == [
+        ('GET', '/a', b''), ('POST', '/b', b'hello'), ('PUT', '/c', b'world'), ('GET', '/d', b'')]
+    assert messages[2].chunked and messages[2].header('X-Trailer') == 't'
+    assert all(m.keep_alive for m in messages)
+
+
+def test_headers_are_case_insensitive_and_repeats_joined():
+    (message,) = parse(b'GET / HTTP/1.1\r\nAccept: a\r\naccept: b\r\nX-Y:  z \r\n\r\n')
+    assert message.header('ACCEPT') == 'a, b'
+    assert message.headers['x-y'] == 'z'
+
+
+@pytest.mark.parametrize('version, connection, keep_alive', [
+    ('HTTP/1.1', None, True), ('HTTP/1.1', 'close', False),
+    ('HTTP/1.0', None, False), ('HTTP/1.0', 'keep-alive', True),
+])
+def test_keep_alive(version, connection, keep_alive):
+    head = f"GET / {version}\r\n" + (f"Connection: {connection}\r\n" if connection else '')
+    (message,) = parse((head + '\r\n').encode())
+    assert message.keep_alive is keep_alive
+
+
+@pytest.mark.parametrize('data, status', [
+    (b'GET /\r\n\r\n', 400),                                    # No version
+    (b'GET / HTTP/2.0\r\n\r\n', 505),
+    (b'GET / HTTP/1.1\r\nno colon\r\n\r\n', 400),
+    (b'GET / HTTP/1.1\r\n Folded: x\r\n\r\n', 400),
+    (b'POST / HTTP/1.1\r\nContent-Length: -1\r\n\r\n', 400),
+    (b'POST / HTTP/1.1\r\nContent-Length: 1, 1\r\n\r\n', 400),
+    ('POST / HTTP/1.1\r\nContent-Length: ²\r\n\r\n'.encode('latin-1'), 400),
+    ('POST / HTTP/1.1\r\nContent-Length: ²\r\n\r\n'.encode('utf-8'), 400),
+    (b'POST / HTTP/1.1\r\nContent-Length: 99999999999\r\n\r\n', 413),
+    (b'POST / HTTP/1.1\r\nTransfer-Encoding: gzip\r\n\r\n', 501),
+    (b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n0x5\r\nhello\r\n0\r\n\r\n', 400),
+    (b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n1_0\r\n', 400),
+    (b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n+5\r\n', 400),
+    (b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n-5\r\n', 400),
+    (b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n\r\n', 400),
+    (b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabcX\r\n', 400),
+    (b'POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\nfffffff\r\n', 413),
+])
+def test_malformed_requests_raise_http_error(data, status):
+    for step in (1, None):
+        with pytest.raises(HTTPError) as error:
+            parse(data, step=step)
+        assert error.value.status == status
+
+
+def test_head_size_limit():
+    with pytest.raises(HTTPError) as error:
+        parse(b'GET / HTTP/1.1\r\nX: ' + b'a' * 200, max_head=100)
+    assert error.value.status == 431
+
+
+@pytest.mark.parametrize('status_line', [
+    b'HTTP/1.1 2OO OK', 'HTTP/1.1 ²²² OK'.encode('latin-1'), b'HTTP/1.1', b'ICY 200 OK',
+])
+def test_bad_status_lines(status_line):
+    with pytest.raises(HTTPError):
+        parse(status_line + b'\r\n\r\n', RESPONSE)
+
+
+def test_responses_without_bodies():
+    data = (b'HTTP/1.1 100 Continue\r\n\r\n'              # Interim: same request
+            b'HTTP/1.1 200 OK\r\nContent-Length: 4\r\n\r\n'     # To HEAD: no body
+            b'HTTP/1.1 304 Not Modified\r\nContent-Length: 4\r\n\r\n'
+            b'HTTP/1.1 204 No Content\r\n\r\n')
+    messages = parse(data, RESPONSE, methods=['HEAD', 'GET', 'GET'])
+    assert [m.status for m in messages] == [100, 200, 304, 204]
+    assert all(m.body == b'' for m in messages)
+
+
+@pytest.mark.parametrize('step', [1, 5, None])
+def test_close_delimited_response(step):
+    data = b'HTTP/1.0 200 OK\r\nServer: old\r\n\r\nall of this until the close'
+    (message,) = parse(data, RESPONSE, step=step, eof=True)
+    assert message.body == b'all of this until the close'
+    assert message.reason == 'OK' and message.version == 'HTTP/1.0'
+
+
+def test_eof_mid_message():
+    parser = HTTPParser()
+    parser.feed(b'GET / HTTP/1.1\r\nHost')
+    assert list(parser.messages()) == []
+    with pytest.raises(HTTPError):
+        parser.eof()
+    assert HTTPParser().eof() is None
+
+
+@pytest.mark.parametrize('step', [1, 7, None])
+def test_discard_body_counts_without_keeping(step):
+    body = b'z' * 10000
+    data = (b'HTTP/1.1 200 OK\r\nContent-Length: 10000\r\n\r\n' + body
+            + b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+            + b'1388\r\n' + body[:5000] + b'\r\n1388\r\n' + body[:5000] + b'\r\n0\r\n\r\n')
+    messages = parse(data, RESPONSE, step=step, discard_body=True, max_body=100)
+    assert [(m.body, m.body_size) for m in messages] == [(b'', 10000), (b'', 10000)]
+
+
+def test_idle_and_pending():
+    parser = HTTPParser()
+    assert parser.idle
+    parser.feed(b'GET / HTTP/1.1\r\n')
+    assert not parser.idle and parser.pending == 16
+    parser.feed(b'\r\n')
+    assert len(list(parser.messages())) == 1
+    assert parser.idle and parser.pending == 0
+
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        HTTPParser('neither')
@@ -0,0 +1,171 @@
+"""
+Lab 1.5: Packet pipeline tests (common/shmring.py, packet_pipeline.py)
+The ring on its own (wraparound, full ring), then forked workers: drops
+versus lossless waits, and a replay through several workers that must
+give the same results as the single-process analysis of the file.
+"""
+import os
+import sys
+import json
+import time
+import random
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from packet_pipeline import PacketPipeline
+from http_traffic_analyzer import HTTPTrafficAnalyzer
+from http_stats import SnapshotWriter
+from pcap_synth import http_capture, http_request, http_response, _Connection, RTT
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.shmring import FrameRing
+from common.pcapio import PcapWriter, TCP_SYN, TCP_ACK, TCP_PSH, TCP_FIN
+
+
+def test_ring_wraps_around_in_order():
+    ring = FrameRing(4096)
+    rng = random.Random(4)
+    sent, received = [], []
+    for i in range(3000):
+        frame = bytes([i % 256]) * rng.randrange(0, 700)
+        while not ring.put(float(i), i % 7, frame):
+            ring.publish()
+            received.extend((ts, linktype, bytes(f)) for ts, linktype, f in ring.get(timeout=0))
+        sent.append((float(i), i % 7, frame))
+        if rng.random() < 0.2:
+            ring.publish()
+    ring.close()
+    while not ring.drained():
+        received.extend((ts, linktype, bytes(f)) for ts, linktype, f in ring.get(timeout=0))
+    assert received == sent
+    assert ring.used() == 0 and ring.depth() == 0 and ring.peak_depth > 0
+
+
+def test_full_ring_refuses_until_consumed():
+    ring = FrameRing(1024)
+    frame = b'x' * 100                      # 16-byte header + 100, padded: 120 bytes
+    accepted = 0
+    while ring.put(0.0, 1, frame):
+        accepted += 1
+    assert accepted == 1024 // 120
+    ring.publish()
+    assert len(ring.get(timeout=0, limit=2)) == 2
+    assert ring.put(0.0, 1, frame) and ring.put(0.0, 1, frame)
+    assert not ring.put(0.0, 1, frame)
+    assert not ring.put(0.0, 1, b'y' * 2000)    # Larger than the whole ring
+
+
+def test_get_times_out_when_empty():
+    ring = FrameRing(1024)
+    assert ring.get(timeout=0.01) == []
+    assert not ring.drained()
+    ring.close()
+    assert ring.get(timeout=0.01) == [] and ring.drained()
+
+
+class Counting:
+    """Handler that counts its frames, `delay` seconds each"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.frames = 0
+        self.ticks = 0
+
+    def handle_frame(self, ts, linktype, frame):
+        self.frames += 1
+        if self.delay:
+            time.sleep(self.delay)
+
+    def tick(self, ts):
+        self.ticks += 1
+
+    def result(self):
+        return {'frames': self.frames, 'ticks': self.ticks}
+
+
+def submit_all(pipeline, frames):
+    pipeline.start()
+    for i in range(frames):
+        pipeline.submit(float(i), 1, i.to_bytes(4, 'big') + bytes(60))
+    pipeline.heartbeat()
+    return pipeline.stop()
+
+
+@pytest.mark.parametrize('lossless', [False, True])
+def test_full_ring_drops_or_waits(lossless):
+    pipeline = PacketPipeline(lambda worker_id: Counting(delay=0.0005), workers=2,
+                              ring_size=4096, shard=lambda frame, linktype: frame[:4],
+                              lossless=lossless)
+    results = submit_all(pipeline, 2000)
+    handled = sum(result['frames'] for result in results.values())
+    report = pipeline.report()
+    assert report['received'] == 2000
+    assert handled + report['dropped'] == 2000
+    assert handled == sum(worker['processed'] for worker in report['workers'])
+    if lossless:
+        assert report['dropped'] == 0
+    else:
+        assert report['dropped'] > 0
+
+
+def test_every_worker_gets_heartbeats():
+    # Every frame goes to one worker; the other still learns the time
+    pipeline = PacketPipeline(lambda worker_id: Counting(), workers=2,
+                              shard=lambda frame, linktype: b'same flow')
+    results = submit_all(pipeline, 100)
+    assert sorted(result['frames'] for result in results.values()) == [0, 100]
+    assert all(result['ticks'] >= 1 for result in results.values())
+
+
+def analyze(path, workers=0, snapshot=None, every=10.0):
+    writer = SnapshotWriter(snapshot, every) if snapshot else None
+    analyzer = HTTPTrafficAnalyzer(verbose=False, snapshot=writer)
+    if workers:
+        assert analyzer.run_pipeline(workers, path)
+    else:
+        assert analyzer.analyze_file(path)
+    if writer:
+        writer.close()
+    return analyzer
+
+
+def test_replay_through_workers_matches_single_process(tmp_path):
+    path = str(tmp_path / 'http.pcap')
+    http_capture(path, connections=300, requests=3, split=3, retransmit=0.05, reorder=0.05)
+    single, sharded = analyze(path), analyze(path, workers=3)
+    assert sharded.packets == single.packets and sharded.tcp_packets == single.tcp_packets
+    assert sharded.flows.counters() == single.flows.counters()
+    assert sharded.flows.requests == 900 and sharded.flows.parse_errors == 0
+    expected, merged = single.stats.snapshot(), sharded.stats.snapshot()
+    for field in ('requests', 'responses', 'unique_clients', 'unique_paths', 'top_hosts',
+                  'top_paths', 'statuses'):
+        assert merged[field] == expected[field], field
+    assert sharded.pipeline['dropped'] == 0
+
+
+def sparse_capture(path, seconds=60, start=1_700_000_000.0):
+    """One connection, one request a second: most workers never see a frame"""
+    conn = _Connection('192.168.1.1', 40000, '10.0.0.80', 80, random.Random(1))
+    conn.client_sends(start, TCP_SYN)
+    conn.server_sends(start + RTT, TCP_SYN | TCP_ACK)
+    conn.client_sends(start + 2 * RTT, TCP_ACK)
+    for i in range(1, seconds):
+        conn.client_sends(start + i, TCP_ACK | TCP_PSH, http_request('GET', f"/{i}", 'a.test'))
+        conn.server_sends(start + i + RTT, TCP_ACK | TCP_PSH, http_response())
+    conn.client_sends(start + seconds, TCP_FIN | TCP_ACK)
+    conn.server_sends(start + seconds + RTT, TCP_FIN | TCP_ACK)
+    with PcapWriter(path) as writer:
+        for ts, frame, _ in conn.packets:
+            writer.write(frame, ts)
+
+
+def test_snapshots_with_idle_workers(tmp_path):
+    path, out = str(tmp_path / 'sparse.pcap'), str(tmp_path / 'stats.jsonl')
+    sparse_capture(path)
+    analyzer = analyze(path, workers=3, snapshot=out)
+    with open(out) as f:
+        snapshots = [json.loads(line) for line in f]
+    # The capture starts on a 10s boundary: the snapshot at the start of
+    # the k-th interval holds the requests sent before it, one per second
+    assert [s['requests'] for s in snapshots] == [10 * k - 1 for k in range(1, 7)]
+    assert analyzer.stats.requests == 59
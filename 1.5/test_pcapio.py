@@ -0,0 +1,143 @@
+"""
+Lab 1.5: Capture I/O tests (common/pcapio.py)
+pcap written by PcapWriter and hand-built pcapng read back; corrupt
+pcapng raises CaptureError; the TCP/ARP decoders and flow_key.
+"""
+import os
+import sys
+import struct
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.pcapio import (iter_frames, decode_tcp, decode_arp, flow_key, ether_ipv4_tcp,
+                           ether_arp, ip_pton, mac_bytes, PcapWriter, CaptureError,
+                           LINKTYPE_ETHERNET, LINKTYPE_RAW, TCP_SYN, TCP_ACK)
+
+FRAME = ether_ipv4_tcp('10.0.0.1', '10.0.0.2', 1000, 80, seq=7, payload=b'GET / HTTP/1.1\r\n')
+
+
+def block(block_type, body):
+    """A little-endian pcapng block, body padded to 4 bytes"""
+    body += b'\0' * (-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack('<II', block_type, length) + body + struct.pack('<I', length)
+
+
+SHB = block(0x0A0D0D0A, struct.pack('<IHHq', 0x1A2B3C4D, 1, 0, -1))
+IDB = block(1, struct.pack('<HHI', LINKTYPE_ETHERNET, 0, 65535))
+IDB_NS = block(1, struct.pack('<HHI', LINKTYPE_ETHERNET, 0, 65535)
+               + struct.pack('<HHB3x', 9, 1, 9) + struct.pack('<HH', 0, 0))   # if_tsresol 10^-9
+SPB = block(3, struct.pack('<I', len(FRAME)) + FRAME)
+
+
+def epb(iface=0, ts_units=1500000, frame=FRAME, caplen=None):
+    caplen = len(frame) if caplen is None else caplen
+    return block(6, struct.pack('<IIIII', iface, ts_units >> 32, ts_units & 0xFFFFFFFF,
+                                caplen, len(frame)) + frame)
+
+
+def read(tmp_path, data):
+    path = tmp_path / 'capture'
+    path.write_bytes(data)
+    return [(ts, linktype, bytes(frame)) for ts, linktype, frame in iter_frames(str(path))]
+
+
+def test_pcap_round_trip(tmp_path):
+    path = str(tmp_path / 'out.pcap')
+    frames = [(FRAME, 1.5), (ether_arp(1, '02:00:00:00:00:01', '10.0.0.1', '10.0.0.2'), 2.25)]
+    with PcapWriter(path) as writer:
+        for frame, ts in frames:
+            writer.write(frame, ts)
+    assert [(bytes(frame), ts, linktype) for ts, linktype, frame in iter_frames(path)] == [
+        (frame, ts, LINKTYPE_ETHERNET) for frame, ts in frames]
+
+
+def test_pcap_truncated_last_record_is_skipped(tmp_path):
+    path = str(tmp_path / 'out.pcap')
+    with PcapWriter(path) as writer:
+        writer.write(FRAME, 1.0)
+        writer.write(FRAME, 2.0)
+    data = open(path, 'rb').read()
+    assert [ts for ts, _, _ in read(tmp_path, data[:-5])] == [1.0]
+
+
+def test_empty_and_unknown_files(tmp_path):
+    assert read(tmp_path, b'') == []
+    with pytest.raises(CaptureError):
+        read(tmp_path, b'\0\1')
+    with pytest.raises(CaptureError):
+        read(tmp_path, b'not a capture file')
+
+
+def test_pcapng_packets(tmp_path):
+    frames = read(tmp_path, SHB + IDB + epb() + SPB + IDB_NS + epb(1, 3 * 10 ** 9))
+    assert frames == [(1.5, LINKTYPE_ETHERNET, FRAME), (0.0, LINKTYPE_ETHERNET, FRAME),
+                      (3.0, LINKTYPE_ETHERNET, FRAME)]
+
+
+def test_pcapng_new_section_forgets_interfaces(tmp_path):
+    with pytest.raises(CaptureError):
+        read(tmp_path, SHB + IDB + epb() + SHB + epb())
+
+
+@pytest.mark.parametrize('name, data', [
+    ('packet before any IDB', SHB + epb()),
+    ('undescribed interface', SHB + IDB + epb(iface=3)),
+    ('simple packet before any IDB', SHB + SPB),
+    ('enhanced packet block too short', SHB + IDB + block(6, bytes(8))),
+    ('interface block too short', SHB + block(1, bytes(4))),
+    ('block length not a multiple of 4', SHB + IDB + struct.pack('<II', 6, 30) + bytes(22)),
+])
+def test_corrupt_pcapng_raises_capture_error(tmp_path, name, data):
+    with pytest.raises(CaptureError):
+        read(tmp_path, data)
+
+
+def test_pcapng_caplen_is_clipped_to_the_block(tmp_path):
+    (_, _, first), (_, _, second) = read(tmp_path, SHB + IDB + epb(caplen=5000) + epb())
+    assert first == FRAME + bytes(-len(FRAME) % 4)      # Up to the padding, not beyond
+    assert second == FRAME
+
+
+def test_pcapng_truncated_last_block_is_skipped(tmp_path):
+    assert len(read(tmp_path, SHB + IDB + epb() + epb()[:-8])) == 1
+
+
+def test_decode_tcp():
+    segment = decode_tcp(FRAME)
+    assert (segment.src, segment.sport, segment.dst, segment.dport) == ('10.0.0.1', 1000,
+                                                                        '10.0.0.2', 80)
+    assert segment.seq == 7 and segment.flags == TCP_ACK | 0x08
+    assert segment.payload == b'GET / HTTP/1.1\r\n'
+
+
+def test_decode_tcp_ignores_ethernet_padding():
+    syn = ether_ipv4_tcp('10.0.0.1', '10.0.0.2', 1000, 80, flags=TCP_SYN)
+    segment = decode_tcp(syn + bytes(6))
+    assert segment.flags == TCP_SYN and segment.payload == b''
+
+
+def test_decode_tcp_raw_ip_and_non_tcp():
+    assert decode_tcp(FRAME[14:], LINKTYPE_RAW).payload == b'GET / HTTP/1.1\r\n'
+    assert decode_tcp(ether_arp(1, '02:00:00:00:00:01', '10.0.0.1', '10.0.0.2')) is None
+
+
+def test_decode_arp():
+    frame = ether_arp(2, '02:00:00:00:00:01', '10.0.0.1', '10.0.0.2',
+                      target_mac='02:00:00:00:00:02', eth_src='02:00:00:00:00:99')
+    arp = decode_arp(frame)
+    assert (arp.op, arp.psrc, arp.hwsrc, arp.pdst, arp.hwdst) == (
+        2, '10.0.0.1', '02:00:00:00:00:01', '10.0.0.2', '02:00:00:00:00:02')
+    assert arp.eth_src == mac_bytes('02:00:00:00:00:99')
+    assert decode_arp(FRAME) is None
+    assert decode_arp(frame[:30]) is None
+
+
+def test_flow_key_is_the_same_both_ways():
+    reply = ether_ipv4_tcp('10.0.0.2', '10.0.0.1', 80, 1000)
+    other = ether_ipv4_tcp('10.0.0.1', '10.0.0.2', 1001, 80)
+    assert flow_key(FRAME) == flow_key(reply) != flow_key(other)
+    arp = ether_arp(1, '02:00:00:00:00:01', '10.0.0.1', '10.0.0.2')
+    assert flow_key(arp) == ip_pton('10.0.0.1')
+    assert flow_key(b'\0' * 20) == b''
@@ -0,0 +1,218 @@
+"""
+Lab 1.5: Streaming sketch tests (common/sketches.py, http_stats.py)
+Error bounds checked against exact counts of the same skewed stream;
+merging the sketches of two halves must equal the sketch of the whole.
+"""
+import os
+import sys
+import pickle
+import random
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from http_stats import HTTPStats, ShardSnapshots
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.sketches import CountMinSketch, TopK, HyperLogLog, RateSeries, hash64
+
+
+def zipf_stream(n, keys=5000, seed=1):
+    """n keys drawn with Zipf-like weights: a few heavy hitters, a long tail"""
+    rng = random.Random(seed)
+    population = [f"key-{i}" for i in range(keys)]
+    return rng.choices(population, weights=[1 / (i + 1) for i in range(keys)], k=n)
+
+
+STREAM = zipf_stream(50000)
+EXACT = Counter(STREAM)
+
+
+def test_hash64_is_stable_and_str_matches_bytes():
+    assert hash64('abc') == hash64(b'abc')
+    assert hash64('abc') != hash64('abd')
+    assert 0 <= hash64('\udcff') < 1 << 64          # Lone surrogates from undecodable input
+
+
+def test_count_min_never_undercounts():
+    sketch = CountMinSketch(width=512)
+    for key in STREAM:
+        sketch.add(key)
+    bound = 2 / sketch.width * len(STREAM)
+    errors = [sketch.estimate(key) - count for key, count in EXACT.items()]
+    assert min(errors) >= 0
+    assert sum(error > bound for error in errors) <= len(errors) * 0.05
+    assert sketch.total == len(STREAM)
+
+
+def test_count_min_merge_equals_whole():
+    whole, a, b = CountMinSketch(), CountMinSketch(), CountMinSketch()
+    for i, key in enumerate(STREAM):
+        whole.add(key)
+        (a if i % 2 else b).add(key)
+    a.merge(b)
+    assert a.counts == whole.counts and a.total == whole.total
+    with pytest.raises(ValueError):
+        a.merge(CountMinSketch(width=16))
+
+
+def test_top_k_finds_the_heavy_hitters():
+    top = TopK(10)
+    for key in STREAM:
+        top.add(key)
+    found = [key for key, _ in top.items()]
+    assert set(found[:5]) == {key for key, _ in EXACT.most_common(5)}
+    assert all(estimate >= EXACT[key] for key, estimate in top.items())
+    assert len(top) == 10 and top.total == len(STREAM)
+
+
+def test_top_k_merge():
+    a, b = TopK(10), TopK(10)
+    for i, key in enumerate(STREAM):
+        (a if i < len(STREAM) // 3 else b).add(key)
+    a.merge(b)
+    assert {key for key, _ in a.items()[:5]} == {key for key, _ in EXACT.most_common(5)}
+    assert len(a) == 10
+
+
+@pytest.mark.parametrize('distinct', [0, 10, 1000, 100000])
+def test_hyperloglog_error(distinct):
+    hll = HyperLogLog()
+    for i in range(distinct):
+        hll.add(f"client-{i}")
+        hll.add(f"client-{i}")                     # Repeats change nothing
+    assert abs(hll.count() - distinct) <= max(1, distinct * 0.03)
+
+
+def test_hyperloglog_merge_of_overlapping_sets():
+    a, b = HyperLogLog(12), HyperLogLog(12)
+    for i in range(30000):
+        a.add(str(i))
+        b.add(str(i + 20000))
+    a.merge(b)
+    assert abs(len(a) - 50000) <= 50000 * 0.05
+    with pytest.raises(ValueError):
+        a.merge(HyperLogLog(14))
+
+
+@pytest.mark.parametrize('precision', [3, 19])
+def test_hyperloglog_precision_bounds(precision):
+    with pytest.raises(ValueError):
+        HyperLogLog(precision)
+
+
+def test_rate_series_buckets_and_window():
+    series = RateSeries(interval=1.0, slots=5)
+    for when in (0.1, 0.5, 1.2, 4.0, 4.9):
+        series.add(when)
+    assert series.buckets() == [(0.0, 2), (1.0, 1), (2.0, 0), (3.0, 0), (4.0, 2)]
+    series.add(7.5)
+    assert series.buckets() == [(3.0, 0), (4.0, 2), (5.0, 0), (6.0, 0), (7.0, 1)]
+    series.add(2.5)                                 # Older than the window: total only
+    assert series.total == 7 and sum(count for _, count in series.buckets()) == 3
+    series.add(100.0, 4)                            # A long pause clears everything
+    assert series.buckets()[-1] == (100.0, 4) and series.rates() == [0, 0, 0, 0, 4.0]
+
+
+def test_rate_series_merge():
+    whole, a, b = RateSeries(slots=10), RateSeries(slots=10), RateSeries(slots=10)
+    rng = random.Random(2)
+    for i in range(1000):
+        when = rng.uniform(0, 25)
+        whole.add(when)
+        (a if i % 3 else b).add(when)
+    assert whole.buckets() != a.buckets()
+    a.merge(b)
+    assert a.buckets() == whole.buckets() and a.total == whole.total
+    with pytest.raises(ValueError):
+        a.merge(RateSeries(interval=2.0, slots=10))
+
+
+class Record:
+    """The HTTPRecord fields HTTPStats uses"""
+
+    def __init__(self, ts, host, path, client, status=200, latency=0.001):
+        self.ts = ts
+        self.host = host
+        self.path = path
+        self.client = (client, 40000)
+        self.status = status
+        self.latency = latency
+
+
+def records(n, seed=3):
+    rng = random.Random(seed)
+    return [Record(i * 0.01, f"host-{min(int(rng.expovariate(0.5)), 30)}", f"/p/{rng.randrange(50)}",
+                   rng.randrange(200).to_bytes(4, 'big'), rng.choice([200, 200, 404]))
+            for i in range(n)]
+
+
+def counted(stats, batch):
+    for record in batch:
+        stats.request(record)
+        stats.response(record)
+    return stats
+
+
+def test_http_stats_merge_equals_whole():
+    batch = records(3000)
+    whole = counted(HTTPStats(), batch)
+    a, b = counted(HTTPStats(), batch[::2]), counted(HTTPStats(), batch[1::2])
+    a.merge(b)
+    merged, expected = a.snapshot(), whole.snapshot()
+    for field in ('requests', 'responses', 'unique_clients', 'unique_paths', 'top_hosts',
+                  'top_paths', 'rate', 'statuses', 'time'):
+        assert merged[field] == expected[field], field
+    assert expected['statuses'] == {str(s): n for s, n in
+                                    sorted(Counter(r.status for r in batch).items())}
+
+
+class Writer:
+    def __init__(self):
+        self.written = []
+
+    def write(self, stats):
+        self.written.append(stats.snapshot())
+
+
+def test_shard_snapshots_wait_for_every_shard():
+    batch = records(2000)
+    writer = Writer()
+    snapshots = ShardSnapshots(writer, 2)
+    shards = [HTTPStats(), HTTPStats()]
+    updates = [[], []]
+    interval = [0, 0]
+    for i, record in enumerate(batch):      # What the workers send: stats entering each second
+        shard = i % 2
+        if int(record.ts) > interval[shard]:
+            interval[shard] = int(record.ts)
+            updates[shard].append((interval[shard], pickle.dumps(shards[shard])))
+        counted(shards[shard], [record])
+    for shard, interval, data in [(0, *u) for u in updates[0]]:
+        snapshots.add(shard, interval, data)
+    assert writer.written == []             # Shard 1 has reached nothing yet
+    for interval, data in updates[1]:
+        snapshots.add(1, interval, data)
+    expected = [counted(HTTPStats(), [r for r in batch if r.ts < second]).requests
+                for second in range(2, int(batch[-1].ts) + 1)]
+    assert [snapshot['requests'] for snapshot in writer.written] == expected
+
+
+def test_shard_snapshots_do_not_wait_for_a_silent_shard_forever():
+    def stats_with(requests):
+        stats = HTTPStats()
+        stats.requests = requests
+        return pickle.dumps(stats)
+
+    writer = Writer()
+    snapshots = ShardSnapshots(writer, 2, max_pending=8)
+    for interval in range(1, 41):           # Shard 1 says nothing (dead, or far behind)
+        snapshots.add(0, interval, stats_with(interval * 10))
+    assert max(len(queue) for queue in snapshots.pending) <= 8
+    assert [s['requests'] for s in writer.written] == [interval * 10 for interval in range(2, 33)]
+    assert snapshots.incomplete == len(writer.written)
+    for interval in range(1, 41):           # ... until it catches up
+        snapshots.add(1, interval, stats_with(interval))
+    # Intervals already written are not written again, later ones have both shards
+    assert [s['requests'] for s in writer.written][31:] == [interval * 11
+                                                            for interval in range(33, 41)]
@@ -0,0 +1,233 @@
+"""
+Lab 1.5: TCP reassembly tests (tcp_reassembly.py)
+StreamBuffer ordering on its own, then whole HTTP conversations through
+FlowTable with segments split, reordered, retransmitted and lost.
+"""
+import os
+import sys
+import random
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from tcp_reassembly import StreamBuffer, FlowTable, SEQ_MASK, seq_diff
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.pcapio import TCPSegment, ip_pton, TCP_SYN, TCP_ACK, TCP_FIN, TCP_PSH, TCP_RST
+
+CLIENT, SERVER = ip_pton('10.0.0.1'), ip_pton('10.0.0.2')
+
+
+def segments(data, seq, size):
+    """[(seq, chunk)] cutting data into `size`-byte segments"""
+    return [((seq + i) & SEQ_MASK, data[i:i + size]) for i in range(0, len(data), size)]
+
+
+def deliver(buffer, segs):
+    out = []
+    for seq, chunk in segs:
+        data, gap = buffer.add(seq, chunk)
+        assert not gap
+        out.append(data)
+    return b''.join(out)
+
+
+@pytest.mark.parametrize('a, b, expected', [
+    (5, 3, 2), (3, 5, -2), (0, SEQ_MASK, 1), (SEQ_MASK, 0, -1), (0x7FFFFFFF, 0, 0x7FFFFFFF),
+])
+def test_seq_diff(a, b, expected):
+    assert seq_diff(a, b) == expected
+
+
+@pytest.mark.parametrize('start', [1000, SEQ_MASK - 20])      # The second wraps around
+def test_stream_buffer_reorders_and_drops_duplicates(start):
+    data = bytes(range(256)) * 4
+    segs = segments(data, start, 37)
+    shuffled = segs[:1] + random.Random(3).sample(segs[1:], len(segs) - 1)
+    buffer = StreamBuffer()
+    buffer.syn((start - 1) & SEQ_MASK)
+    assert deliver(buffer, shuffled + segs[5:9]) == data
+    assert buffer.duplicates == 4 and not buffer.pending and buffer.buffered == 0
+
+
+def test_stream_buffer_overlaps_keep_only_new_bytes():
+    buffer = StreamBuffer()
+    buffer.syn(99)
+    assert buffer.add(100, b'abcdef') == (b'abcdef', False)
+    assert buffer.add(103, b'defghi') == (b'ghi', False)        # Overlaps the delivered tail
+    assert buffer.add(112, b'mn') == (b'', False)
+    assert buffer.add(110, b'klmnop') == (b'', False)           # Longer copy replaces the held one
+    assert buffer.add(109, b'jk') == (b'jklmnop', False)
+    assert buffer.buffered == 0
+
+
+def test_stream_buffer_skips_a_hole_past_max_buffer():
+    buffer = StreamBuffer(max_buffer=10)
+    buffer.syn(0)
+    buffer.add(1, b'abc')
+    assert buffer.add(10, b'123456') == (b'', False)
+    assert buffer.add(16, b'78901') == (b'12345678901', True)   # Bytes 4..9 are lost
+    assert buffer.gaps == 1 and buffer.add(4, b'lost!!') == (b'', False)
+
+
+class Conversation:
+    """Segments of one client/server connection, by direction"""
+
+    def __init__(self, table, sport=40000, client_isn=1000, server_isn=SEQ_MASK - 100):
+        self.table = table
+        self.sport = sport
+        self.seq = {True: client_isn, False: server_isn}
+
+    def segment(self, from_client, payload=b'', flags=TCP_ACK | TCP_PSH, seq=None):
+        src, dst = ((CLIENT, self.sport), (SERVER, 80)) if from_client else \
+            ((SERVER, 80), (CLIENT, self.sport))
+        if seq is None:
+            seq = self.seq[from_client]
+            self.seq[from_client] = (seq + len(payload) + (1 if flags & (TCP_SYN | TCP_FIN) else 0)) \
+                & SEQ_MASK
+        return TCPSegment(src[0], dst[0], src[1], dst[1], seq, 0, flags, payload)
+
+    def handshake(self):
+        return [self.segment(True, flags=TCP_SYN), self.segment(False, flags=TCP_SYN | TCP_ACK),
+                self.segment(True, flags=TCP_ACK)]
+
+    def send(self, from_client, data, size):
+        return [self.segment(from_client, data[i:i + size]) for i in range(0, len(data), size)]
+
+    def close(self):
+        return [self.segment(True, flags=TCP_FIN | TCP_ACK),
+                self.segment(False, flags=TCP_FIN | TCP_ACK)]
+
+
+def run(table, segs, ts=0.0):
+    for i, seg in enumerate(segs):
+        table.process(ts + i * 0.001, seg)
+
+
+REQUESTS = (b'GET /one HTTP/1.1\r\nHost: example.com\r\n\r\n'
+            b'POST /two HTTP/1.1\r\nHost: example.com\r\nContent-Length: 11\r\n\r\nhello world'
+            b'HEAD /three HTTP/1.1\r\nHost: example.com\r\n\r\n')
+RESPONSES = (b'HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\nabc'
+             b'HTTP/1.1 201 Created\r\nTransfer-Encoding: chunked\r\n\r\n2\r\nok\r\n0\r\n\r\n'
+             b'HTTP/1.1 404 Not Found\r\nContent-Length: 99\r\n\r\n')
+
+
+@pytest.mark.parametrize('size', [1, 7, 1460])
+@pytest.mark.parametrize('reorder', [False, True])
+def test_pipelined_requests_split_and_reordered(size, reorder):
+    answered = []
+    table = FlowTable(on_response=answered.append)
+    conversation = Conversation(table)
+    handshake = conversation.handshake()
+    up = conversation.send(True, REQUESTS, size)
+    down = conversation.send(False, RESPONSES, size)
+    if reorder:
+        rng = random.Random(size)
+        up = up[:1] + rng.sample(up[1:], len(up) - 1)
+        down = down[:1] + rng.sample(down[1:], len(down) - 1)
+        up += up[:3]                # ... and some retransmitted
+    run(table, handshake + up + down + conversation.close())
+    assert [(r.method, r.path, r.host, r.status) for r in answered] == [
+        ('GET', '/one', 'example.com', 200), ('POST', '/two', 'example.com', 201),
+        ('HEAD', '/three', 'example.com', 404)]
+    assert [r.response_size for r in answered] == [3, 2, 0]
+    assert (table.requests, table.responses, table.parse_errors, table.unanswered) == (3, 3, 0, 0)
+    assert len(table) == 0 and table.closed == 1
+
+
+def test_response_captured_before_its_request_completes():
+    answered = []
+    table = FlowTable(on_response=answered.append)
+    conversation = Conversation(table)
+    handshake = conversation.handshake()
+    request = conversation.send(True, b'GET / HTTP/1.1\r\n\r\n', 10)
+    response = conversation.send(False, b'HTTP/1.1 204 No Content\r\n\r\n', 100)
+    run(table, handshake + request[:1] + response + request[1:])
+    assert [r.status for r in answered] == [204]
+
+
+def test_connection_joined_mid_stream_uses_the_server_port():
+    answered = []
+    table = FlowTable(on_response=answered.append)
+    conversation = Conversation(table)
+    run(table, conversation.send(False, b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n', 100)
+        + conversation.send(True, b'GET /late HTTP/1.1\r\n\r\n', 100)
+        + conversation.send(False, b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n', 100))
+    assert [r.path for r in answered] == ['/late']
+
+
+def test_malformed_stream_is_counted_and_other_flows_go_on():
+    answered = []
+    table = FlowTable(on_response=answered.append)
+    bad, good = Conversation(table, sport=40001), Conversation(table, sport=40002)
+    run(table, bad.handshake() + good.handshake()
+        + bad.send(True, b'\x16\x03\x01 not http at all\r\n\r\n', 100)
+        + good.send(True, b'GET / HTTP/1.1\r\n\r\n', 100)
+        + bad.send(True, b'GET /ignored HTTP/1.1\r\n\r\n', 100)
+        + good.send(False, b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n', 100))
+    assert table.parse_errors == 1 and table.requests == 1
+    assert [r.status for r in answered] == [200]
+
+
+def test_parser_exception_does_not_escape(monkeypatch):
+    import tcp_reassembly
+
+    class Broken(tcp_reassembly.HTTPParser):
+        def messages(self):
+            raise IndexError("parser bug")
+            yield
+
+    table = FlowTable()
+    conversation = Conversation(table)
+    run(table, conversation.handshake())
+    monkeypatch.setattr(tcp_reassembly, 'HTTPParser', Broken)
+    other = Conversation(table, sport=40003)
+    run(table, other.handshake() + other.send(True, b'GET / HTTP/1.1\r\n\r\n', 100))
+    assert table.parse_errors == 1
+
+
+def test_callback_errors_surface():
+    def on_request(record):
+        raise RuntimeError("callback bug")
+
+    table = FlowTable(on_request=on_request)
+    conversation = Conversation(table)
+    with pytest.raises(RuntimeError):
+        run(table, conversation.handshake() + conversation.send(True, b'GET / HTTP/1.1\r\n\r\n', 100))
+
+
+def test_close_delimited_response_and_unanswered():
+    answered = []
+    table = FlowTable(on_response=answered.append)
+    conversation = Conversation(table)
+    run(table, conversation.handshake()
+        + conversation.send(True, b'GET /a HTTP/1.0\r\n\r\nGET /b HTTP/1.0\r\n\r\n', 100)
+        + conversation.send(False, b'HTTP/1.0 200 OK\r\n\r\nuntil the close', 100)
+        + conversation.close())
+    assert [(r.path, r.response_size) for r in answered] == [('/a', 15)]
+    assert table.unanswered == 1 and len(table) == 0
+
+
+def test_rst_closes_and_late_retransmissions_are_ignored():
+    table = FlowTable()
+    conversation = Conversation(table)
+    handshake = conversation.handshake()
+    request = conversation.send(True, b'GET / HTTP/1.1\r\n\r\n', 100)
+    run(table, handshake + request + [conversation.segment(False, flags=TCP_RST)])
+    run(table, request, ts=1.0)
+    assert len(table) == 0 and table.flows_total == 1 and table.unanswered == 1
+
+
+def test_idle_flows_expire():
+    table = FlowTable(idle_timeout=10.0)
+    for sport in (40010, 40011):
+        run(table, Conversation(table, sport=sport).handshake())
+    run(table, Conversation(table, sport=40012).handshake(), ts=30.0)
+    assert len(table) == 1 and table.expired == 2 and table.closed == 2
+
+
+def test_max_flows_evicts_the_oldest():
+    table = FlowTable(max_flows=2)
+    for sport in (40010, 40011, 40012):
+        run(table, Conversation(table, sport=sport).handshake())
+    assert len(table) == 2 and table.evicted == 1
+    assert sorted(port for (_, port), _ in table.flows) == [40011, 40012]
@@ -8,6 +8,7 @@ BUGS INTENTIONALLY INCLUDED:
 3. Resource limit - no connection pooling
 4. Unbounded queue - accumulates clients indefinitely
 """
+import sys
 import asyncio
 import logging
 
@@ -73,7 +74,9 @@ class BuggyAsyncServer:
                 logger.info("Shutting down...")
 
 async def main():
-    server = BuggyAsyncServer(port=9995)
+    # Optional port argument (used by the benchmark matrix)
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 9995
+    server = BuggyAsyncServer(port=port)
     await server.run()
 
 if __name__ == "__main__":
@@ -1,21 +1,48 @@
 """
 Lab 1.6.2: Fixed and Optimized Async Server
 Demonstrates fixes for bugs found in buggy_server.py
+
+Scale out with `--workers N`: N processes bind port 9996 with SO_REUSEPORT
+and a supervisor restarts dead workers and aggregates their metrics.
+
+Metrics (counters + service-time histogram) are served on
+http://127.0.0.1:9101/metrics (Prometheus) and /metrics.json.
 """
 import asyncio
+import argparse
+import functools
 import logging
+import os
+import sys
+import time
 from collections import deque
 from datetime import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.framing import FrameDecoder, FrameError, LINE, READ_SIZE
+from common.workers import WorkerSupervisor
+from common.metrics import MetricsRegistry, serve_metrics
+from common.logpipe import (SampledLogger, setup_logging, add_logging_args,
+                            configure_request_log)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+# Per-connection lines (can be sampled or switched off with --request-log)
+request_log = SampledLogger(logger)
 
 class OptimizedAsyncServer:
-    def __init__(self, port=9996, max_connections=100, queue_size=1000):
+    def __init__(self, port=9996, max_connections=100, queue_size=1000, framing=LINE,
+                 reuse_port=False, metrics_sink=None, metrics_interval=10,
+                 metrics_port=None):
         self.port = port
+        self.framing = framing
+        self.reuse_port = reuse_port
+        self.metrics_sink = metrics_sink
+        self.metrics_interval = metrics_interval
+        self.metrics_port = metrics_port
         self.max_connections = max_connections
         self.queue_size = queue_size
         
@@ -26,9 +53,30 @@ class OptimizedAsyncServer:
         self.request_queue = deque(maxlen=queue_size)
         
         # Metrics
-        self.total_requests = 0
-        self.total_connections = 0
         self.start_time = datetime.now()
+        self.metrics = MetricsRegistry('optimized_')
+        self.requests = self.metrics.counter(
+            'requests_total', 'Requests answered')
+        self.connections = self.metrics.counter(
+            'connections_total', 'Connections accepted')
+        self.bytes_in = self.metrics.counter(
+            'bytes_received_total', 'Bytes read from clients')
+        self.metrics.gauge('active_connections', 'Open client connections',
+                           fn=lambda: len(self.active_clients))
+        self.latency = self.metrics.histogram(
+            'service_seconds', 'Time from request parsed to response written')
+    
+    @property
+    def total_requests(self):
+        return self.requests.value
+    
+    @property
+    def total_connections(self):
+        return self.connections.value
+    
+    @property
+    def bytes_received(self):
+        return self.bytes_in.value
     
     async def handle_client(self, reader, writer):
         """Fixed handler with proper error handling"""
@@ -36,54 +84,63 @@ class OptimizedAsyncServer:
         
         # FIX 1: Track clients properly
         client_id = f"{client_addr[0]}:{client_addr[1]}"
+        decoder = FrameDecoder(self.framing)
         self.active_clients.add(client_id)
-        self.total_connections += 1
+        self.connections.inc()
         
-        logger.info(f"Client connected: {client_id} "
-                   f"(Active: {len(self.active_clients)}/{self.max_connections})")
+        request_log.info("Client connected: %s (Active: %d/%d)",
+                         client_id, len(self.active_clients), self.max_connections)
         
         try:
             while True:
                 try:
                     # FIX 2: Add timeout to prevent hanging connections
                     data = await asyncio.wait_for(
-                        reader.read(1024),
+                        reader.read(READ_SIZE),
                         timeout=30.0
                     )
                     
                     # FIX 3: Handle empty data gracefully
                     if not data:
-                        logger.info(f"Client {client_id} closed connection")
+                        request_log.info("Client %s closed connection", client_id)
                         break
                     
-                    # FIX 4: Proper error handling for malformed data
-                    try:
-                        message = data.decode('utf-8').upper()
-                    except UnicodeDecodeError:
-                        logger.warning(f"Invalid UTF-8 from {client_id}")
-                        response = b"ERROR: Invalid encoding\n"
-                        writer.write(response)
+                    # FIX 6: Frame the byte stream - one read != one message
+                    self.bytes_in.inc(len(data))
+                    decoder.feed(data)
+                    for frame in decoder.frames():
+                        started = time.perf_counter_ns()
+                        # FIX 4: Proper error handling for malformed data
+                        try:
+                            message = str(frame, 'utf-8').upper()
+                        except UnicodeDecodeError:
+                            logger.warning(f"Invalid UTF-8 from {client_id}")
+                            writer.write(decoder.encode(b"ERROR: Invalid encoding"))
+                            await writer.drain()
+                            continue
+                        
+                        # Echo response
+                        response = f"ECHO: {message}".encode('utf-8')
+                        writer.write(decoder.encode(response))
                         await writer.drain()
-                        continue
-                    
-                    # Echo response
-                    response = f"ECHO: {message}".encode('utf-8')
-                    writer.write(response)
-                    await writer.drain()
-                    
-                    # FIX 2: Use bounded queue
-                    self.request_queue.append({
-                        'client': client_id,
-                        'timestamp': datetime.now().isoformat(),
-                        'data_len': len(data)
-                    })
-                    
-                    self.total_requests += 1
+                        self.latency.record_ns(time.perf_counter_ns() - started)
+                        
+                        # FIX 2: Use bounded queue
+                        self.request_queue.append({
+                            'client': client_id,
+                            'timestamp': datetime.now().isoformat(),
+                            'data_len': len(frame)
+                        })
+                        
+                        self.requests.inc()
                 
                 except asyncio.TimeoutError:
                     logger.warning(f"Client {client_id} idle timeout")
                     break
         
+        except FrameError as e:
+            logger.warning(f"Framing error from {client_id}: {e}")
+        
         except Exception as e:
             logger.error(f"Error handling {client_id}: {str(e)}")
         
@@ -97,20 +154,35 @@ class OptimizedAsyncServer:
             
             # FIX 1: Remove from tracking
             self.active_clients.discard(client_id)
-            logger.info(f"Connection closed: {client_id} "
-                       f"(Active: {len(self.active_clients)})")
+            request_log.info("Connection closed: %s (Active: %d)",
+                             client_id, len(self.active_clients))
+    
+    def metrics_snapshot(self):
+        """Additive counters/gauges, summed across workers by the supervisor"""
+        return {
+            'total_requests': self.total_requests,
+            'total_connections': self.total_connections,
+            'bytes_received': self.bytes_received,
+            'active_connections': len(self.active_clients),
+        }
     
     async def print_metrics(self):
         """Periodically print server metrics"""
         while True:
             try:
-                await asyncio.sleep(10)
+                await asyncio.sleep(self.metrics_interval)
+                if self.metrics_sink:
+                    self.metrics_sink(self.metrics_snapshot())
+                    continue
                 uptime = (datetime.now() - self.start_time).total_seconds()
                 logger.info(f"=== METRICS === "
                            f"Uptime: {uptime:.1f}s | "
                            f"Total Connections: {self.total_connections} | "
                            f"Active: {len(self.active_clients)} | "
                            f"Requests: {self.total_requests} | "
+                           f"p50/p99/p99.9: {self.latency.percentile(50) / 1000:.2f}/"
+                           f"{self.latency.percentile(99) / 1000:.2f}/"
+                           f"{self.latency.percentile(99.9) / 1000:.2f} ms | "
                            f"Queue: {len(self.request_queue)}/{self.queue_size}")
             except asyncio.CancelledError:
                 break
@@ -120,12 +192,16 @@ class OptimizedAsyncServer:
         server = await asyncio.start_server(
             self.handle_client,
             '0.0.0.0',
-            self.port
+            self.port,
+            reuse_port=self.reuse_port or None
         )
         
         logger.info(f"Optimized Server listening on port {self.port}")
         logger.info(f"Max connections: {self.max_connections}")
         logger.info(f"Queue size: {self.queue_size}")
+        if self.metrics_port:
+            await serve_metrics(self.metrics, '127.0.0.1', self.metrics_port)
+            logger.info(f"Metrics: http://127.0.0.1:{self.metrics_port}/metrics")
         
         # Start metrics task
         metrics_task = asyncio.create_task(self.print_metrics())
@@ -137,18 +213,60 @@ class OptimizedAsyncServer:
                 logger.info("Shutting down...")
             finally:
                 metrics_task.cancel()
+                if self.metrics_sink:
+                    self.metrics_sink(self.metrics_snapshot())
 
-async def main():
-    # Use uvloop for better performance (optional)
+def use_uvloop():
+    """Install uvloop (optional) - must happen before the loop is created"""
     try:
         import uvloop
         asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
         logger.info("Using uvloop for improved performance")
     except ImportError:
         logger.info("uvloop not installed. Using standard asyncio")
+
+def run_worker(port, metrics_port, worker_id, metrics_queue):
+    """Entry point of one forked worker process"""
+    # The parent's log writer thread does not survive fork()
+    setup_logging()
+    
+    def sink(snapshot):
+        metrics_queue.put((worker_id, snapshot))
     
-    server = OptimizedAsyncServer(port=9996)
+    server = OptimizedAsyncServer(port=port, reuse_port=True,
+                                  metrics_sink=sink, metrics_interval=2,
+                                  metrics_port=metrics_port + worker_id if metrics_port else None)
+    try:
+        asyncio.run(server.run())
+    except KeyboardInterrupt:
+        pass
+
+async def main(port=9996, metrics_port=9101):
+    server = OptimizedAsyncServer(port=port, metrics_port=metrics_port or None)
     await server.run()
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lab 1.6 Optimized Async Server")
+    parser.add_argument('--port', type=int, default=9996)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="processes sharing the port via SO_REUSEPORT")
+    parser.add_argument('--metrics-port', type=int, default=9101,
+                        help="local scrape endpoint (worker i uses port + i), 0 = off")
+    parser.add_argument('--no-uvloop', action='store_true',
+                        help="stay on the default asyncio loop even if uvloop is installed")
+    add_logging_args(parser)
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    args = parse_args()
+    setup_logging()
+    configure_request_log(request_log, args)
+    # Use uvloop for better performance (optional)
+    if not args.no_uvloop:
+        use_uvloop()
+    if args.workers > 1:
+        supervisor = WorkerSupervisor(functools.partial(run_worker, args.port, args.metrics_port),
+                                      args.workers, name='optimized')
+        supervisor.run()
+    else:
+        asyncio.run(main(args.port, args.metrics_port))
@@ -0,0 +1,7 @@
+"""
+Shared building blocks used by several labs (framing, metrics, logging).
+
+Lab scripts live in directories like `1.4/` which are not importable
+packages, so each script adds the repository root to sys.path before
+importing from `common`.
+"""
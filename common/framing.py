@@ -0,0 +1,135 @@
+"""
+Shared: Message Framing
+TCP is a byte stream - one recv() is NOT one message.
+
+Two framing modes:
+- LINE:   newline-delimited text (telnet friendly, default)
+- LENGTH: 4-byte big-endian length prefix + payload (binary safe)
+
+FrameDecoder is incremental: it keeps one receive buffer per connection,
+reads straight into it with recv_into(), and yields every complete frame
+already buffered, so pipelined requests are handled back-to-back.
+"""
+import struct
+
+LINE = 'line'
+LENGTH = 'length'
+MODES = (LINE, LENGTH)
+
+READ_SIZE = 64 * 1024           # Bytes requested per read (was 1024)
+MAX_FRAME_SIZE = 1024 * 1024    # Reject frames larger than 1 MiB
+
+_HEADER = struct.Struct('!I')
+
+
+class FrameError(ValueError):
+    """Raised when the peer sends a frame we refuse to buffer"""
+
+
+class FrameDecoder:
+    """
+    Incremental frame parser with a reusable receive buffer.
+
+    Frames are yielded as memoryview slices of the internal buffer - they
+    are only valid until the next recv_into()/feed() call, so decode or
+    copy them before reading again.
+    """
+
+    def __init__(self, mode=LINE, bufsize=READ_SIZE, max_frame=MAX_FRAME_SIZE):
+        if mode not in MODES:
+            raise ValueError(f"Unknown framing mode: {mode!r}")
+        self.mode = mode
+        self.max_frame = max_frame
+        self._buf = bytearray(bufsize)
+        self._view = memoryview(self._buf)
+        self._start = 0     # First unconsumed byte
+        self._end = 0       # End of received data
+        self._scan = 0      # LINE mode: where to resume searching for b'\n'
+
+    @property
+    def pending(self):
+        """Number of buffered bytes not yet returned as a frame"""
+        return self._end - self._start
+
+    def _reserve(self, size):
+        """Make room for `size` more bytes at the end of the buffer"""
+        if len(self._buf) - self._end >= size:
+            return
+        pending = self._end - self._start
+        if pending + size <= len(self._buf):
+            # Compact in place: move unconsumed bytes to the front
+            self._buf[:pending] = self._buf[self._start:self._end]
+        else:
+            # Grow (new buffer, so outstanding views stay intact)
+            new_size = len(self._buf)
+            while new_size < pending + size:
+                new_size *= 2
+            new_buf = bytearray(new_size)
+            new_buf[:pending] = self._buf[self._start:self._end]
+            self._buf = new_buf
+            self._view = memoryview(new_buf)
+        self._scan -= self._start
+        self._start = 0
+        self._end = pending
+
+    def recv_into(self, sock, size=READ_SIZE):
+        """Read from a blocking socket directly into the buffer; returns bytes read"""
+        self._reserve(size)
+        n = sock.recv_into(self._view[self._end:self._end + size])
+        self._end += n
+        return n
+
+    def feed(self, data):
+        """Append bytes received by other means (e.g. asyncio StreamReader)"""
+        n = len(data)
+        self._reserve(n)
+        self._buf[self._end:self._end + n] = data
+        self._end += n
+
+    def frames(self):
+        """Yield every complete frame currently buffered"""
+        if self.mode == LINE:
+            yield from self._line_frames()
+        else:
+            yield from self._length_frames()
+        if self._start == self._end:
+            # Everything consumed - rewind for free instead of compacting later
+            self._start = self._end = self._scan = 0
+
+    def _line_frames(self):
+        buf = self._buf
+        while True:
+            scan = max(self._scan, self._start)
+            idx = buf.find(b'\n', scan, self._end)
+            if idx < 0:
+                self._scan = self._end
+                if self._end - self._start > self.max_frame:
+                    raise FrameError(f"Line exceeds {self.max_frame} bytes")
+                return
+            start = self._start
+            stop = idx - 1 if idx > start and buf[idx - 1] == 0x0D else idx
+            self._start = self._scan = idx + 1
+            yield self._view[start:stop]
+
+    def _length_frames(self):
+        size = _HEADER.size
+        while self._end - self._start >= size:
+            (length,) = _HEADER.unpack_from(self._buf, self._start)
+            if length > self.max_frame:
+                raise FrameError(f"Frame of {length} bytes exceeds {self.max_frame}")
+            begin = self._start + size
+            if self._end - begin < length:
+                return
+            self._start = begin + length
+            yield self._view[begin:begin + length]
+
+    def encode(self, payload):
+        """Frame an outgoing payload (bytes) according to the mode"""
+        return encode_frame(payload, self.mode)
+
+
+def encode_frame(payload, mode=LINE):
+    """Return payload wrapped as a single frame"""
+    if mode == LINE:
+        return payload + b'\n'
+    return _HEADER.pack(len(payload)) + payload
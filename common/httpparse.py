@@ -0,0 +1,340 @@
+"""
+Shared: Incremental HTTP/1.1 Parser
+Like FrameDecoder, but for HTTP messages: feed() whatever bytes arrived,
+then messages() yields every request (or response) that is complete.
+
+- a head split across reads is resumed, not rescanned from the start
+- several pipelined messages in one read come out back-to-back
+- bodies: Content-Length, chunked (with trailers), and for responses
+  "until the connection closes" (finished by eof())
+- bare LF line endings are accepted as well as CRLF (RFC 7230 3.5)
+- limits on head and body size; violations raise HTTPError carrying the
+  status a server should answer with (400, 413, 431, 501)
+- discard_body=True: bodies are framed and counted (body_size) but not
+  kept, so a passive observer's memory does not grow with transfer sizes
+"""
+from collections import deque
+
+REQUEST = 'request'
+RESPONSE = 'response'
+
+MAX_HEAD_SIZE = 64 * 1024       # Request line + headers
+MAX_BODY_SIZE = 8 * 1024 * 1024
+
+_HEAD, _LENGTH, _CHUNK_SIZE, _CHUNK_DATA, _TRAILER, _UNTIL_CLOSE = range(6)
+_HEX_DIGITS = frozenset(b'0123456789abcdefABCDEF')
+
+
+def _is_digits(text):
+    """ASCII digits only: str.isdigit() also takes '²' and other Unicode digits"""
+    return text.isascii() and text.isdigit()
+
+
+class HTTPError(ValueError):
+    """Malformed or oversized message; `status` is the response to send"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class HTTPMessage:
+    """A parsed request (method, target) or response (status, reason)"""
+    __slots__ = ('method', 'target', 'status', 'reason', 'version',
+                 'headers', 'body', 'body_size', 'chunked')
+
+    def __init__(self):
+        self.method = self.target = self.reason = None
+        self.status = None
+        self.version = 'HTTP/1.1'
+        self.headers = {}       # lower-case name -> value (repeats joined by ', ')
+        self.body = b''
+        self.body_size = 0      # Bytes of body (also counted when discarded)
+        self.chunked = False
+
+    def header(self, name, default=None):
+        return self.headers.get(name.lower(), default)
+
+    @property
+    def keep_alive(self):
+        """Whether the connection stays open after this message"""
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return 'keep-alive' in connection
+        return 'close' not in connection
+
+    def __repr__(self):
+        if self.method:
+            return f"<HTTPMessage {self.method} {self.target} {self.version}>"
+        return f"<HTTPMessage {self.version} {self.status} {self.reason}>"
+
+
+class HTTPParser:
+    """
+    Incremental parser for one direction of one connection.
+
+    For responses, call expect(method) for every request sent on the
+    connection (in order), so responses to HEAD are known to have no body.
+    """
+
+    def __init__(self, kind=REQUEST, max_head=MAX_HEAD_SIZE, max_body=MAX_BODY_SIZE,
+                 discard_body=False):
+        if kind not in (REQUEST, RESPONSE):
+            raise ValueError(f"Unknown message kind: {kind!r}")
+        self.kind = kind
+        self.max_head = max_head
+        self.max_body = max_body
+        self.discard_body = discard_body    # No size limit then: nothing is kept
+        self._buf = bytearray()
+        self._start = 0         # First unconsumed byte
+        self._scan = 0          # Where to resume looking for the end of the head
+        self._state = _HEAD
+        self._message = None
+        self._remaining = 0     # Body / chunk bytes still expected
+        self._parts = []        # Chunked body pieces
+        self._body_size = 0     # Chunked body bytes so far
+        self._methods = deque() # RESPONSE: methods of the requests sent
+
+    @property
+    def pending(self):
+        """Buffered bytes not yet returned as part of a message"""
+        return len(self._buf) - self._start
+
+    @property
+    def idle(self):
+        """True between messages (nothing partially received)"""
+        return self._state == _HEAD and self.pending == 0
+
+    def expect(self, method):
+        self._methods.append(method.upper())
+
+    def feed(self, data):
+        if self._start and self._start >= len(self._buf) // 2:
+            # Drop consumed bytes once they are at least half the buffer
+            del self._buf[:self._start]
+            self._scan = max(0, self._scan - self._start)
+            self._start = 0
+        self._buf += data
+
+    def messages(self):
+        """Yield every message that is complete"""
+        while True:
+            message = self._step()
+            if message is None:
+                return
+            yield message
+
+    def eof(self):
+        """The peer closed: returns a close-delimited response, if one was in progress"""
+        if self._state == _UNTIL_CLOSE:
+            message = self._message
+            if not self.discard_body:
+                message.body = bytes(self._buf[self._start:])
+            message.body_size += len(self._buf) - self._start
+            self._start = len(self._buf)
+            self._reset()
+            return message
+        if self._state != _HEAD or self.pending:
+            raise HTTPError("Connection closed in the middle of a message")
+        return None
+
+    # ---- state machine -------------------------------------------------
+
+    def _reset(self):
+        self._state = _HEAD
+        self._message = None
+        self._parts = []
+        self._body_size = 0
+
+    def _step(self):
+        buf = self._buf
+        while True:
+            state = self._state
+            if state == _HEAD:
+                if not self._parse_head():
+                    return None
+                if self._state == _HEAD:
+                    return self._finish()
+            elif state == _LENGTH:
+                if self.discard_body:
+                    taken = min(len(buf) - self._start, self._remaining)
+                    self._start += taken
+                    self._remaining -= taken
+                    self._message.body_size += taken
+                    if self._remaining:
+                        return None
+                    return self._finish()
+                if len(buf) - self._start < self._remaining:
+                    return None
+                end = self._start + self._remaining
+                self._message.body = bytes(buf[self._start:end])
+                self._message.body_size = self._remaining
+                self._start = end
+                return self._finish()
+            elif state == _CHUNK_SIZE:
+                line = self._line()
+                if line is None:
+                    return None
+                size = line.split(b';', 1)[0].strip()
+                # int(size, 16) alone would also take '0x10', '1_0' and '+10'
+                if not size or not _HEX_DIGITS.issuperset(size):
+                    raise HTTPError(f"Bad chunk size: {size[:20]!r}")
+                self._remaining = int(size, 16)
+                self._body_size += self._remaining
+                if self._body_size > self.max_body and not self.discard_body:
+                    raise HTTPError(f"Body exceeds {self.max_body} bytes", 413)
+                self._state = _CHUNK_DATA if self._remaining else _TRAILER
+            elif state == _CHUNK_DATA:
+                if self.discard_body and self._remaining:
+                    taken = min(len(buf) - self._start, self._remaining)
+                    self._start += taken
+                    self._remaining -= taken
+                    if self._remaining:
+                        return None
+                end = self._start + self._remaining
+                if len(buf) < end + 1 or buf[end:end + 1] == b'\r' and len(buf) < end + 2:
+                    return None
+                if buf[end:end + 1] == b'\n':
+                    after = end + 1
+                elif buf[end:end + 2] == b'\r\n':
+                    after = end + 2
+                else:
+                    raise HTTPError("Chunk not followed by CRLF")
+                if not self.discard_body:
+                    self._parts.append(bytes(buf[self._start:end]))
+                self._start = after
+                self._state = _CHUNK_SIZE
+            elif state == _TRAILER:
+                line = self._line()
+                if line is None:
+                    return None
+                if not line:
+                    self._message.body = b''.join(self._parts)
+                    self._message.body_size = self._body_size
+                    return self._finish()
+                self._add_header(self._message, line)
+            else:   # _UNTIL_CLOSE: everything until eof() is body
+                if self.discard_body:
+                    self._message.body_size += len(buf) - self._start
+                    self._start = len(buf)
+                elif len(buf) - self._start > self.max_body:
+                    raise HTTPError(f"Body exceeds {self.max_body} bytes", 413)
+                return None
+
+    def _finish(self):
+        message = self._message
+        self._reset()
+        if self._start == len(self._buf):
+            # Everything consumed - rewind for free
+            self._buf.clear()
+            self._start = self._scan = 0
+        return message
+
+    def _line(self):
+        idx = self._buf.find(b'\n', self._start)
+        if idx < 0:
+            if len(self._buf) - self._start > self.max_head:
+                raise HTTPError("Line too long", 431)
+            return None
+        line = bytes(self._buf[self._start:idx]).rstrip(b'\r')
+        self._start = idx + 1
+        return line
+
+    def _parse_head(self):
+        buf = self._buf
+        if self._start == len(buf):
+            return False
+        # Tolerate stray CRLFs between pipelined messages (RFC 7230 3.5)
+        while True:
+            if buf.startswith(b'\r\n', self._start):
+                self._start += 2
+            elif buf.startswith(b'\n', self._start):
+                self._start += 1
+            else:
+                break
+        # The head ends with an empty line: "\n\r\n" (CRLF) or "\n\n" (bare LF)
+        scan = max(self._scan, self._start)
+        crlf = buf.find(b'\n\r\n', scan)
+        lf = buf.find(b'\n\n', scan, crlf + 2 if crlf >= 0 else len(buf))
+        if lf >= 0:
+            idx, end = lf, lf + 2
+        elif crlf >= 0:
+            idx, end = crlf, crlf + 3
+        else:
+            self._scan = max(self._start, len(buf) - 2)
+            if len(buf) - self._start > self.max_head:
+                raise HTTPError(f"Header section exceeds {self.max_head} bytes", 431)
+            return False
+        if idx - self._start > self.max_head:
+            raise HTTPError(f"Header section exceeds {self.max_head} bytes", 431)
+        lines = [line.rstrip(b'\r') for line in bytes(buf[self._start:idx]).split(b'\n')]
+        self._start = self._scan = end
+
+        message = self._message = HTTPMessage()
+        self._start_line(message, lines[0])
+        for line in lines[1:]:
+            self._add_header(message, line)
+        self._body_framing(message)
+        return True
+
+    def _start_line(self, message, line):
+        try:
+            text = line.decode('latin-1')
+        except UnicodeDecodeError:
+            raise HTTPError("Bad start line")
+        parts = text.split(' ', 2)
+        if self.kind == REQUEST:
+            if len(parts) != 3 or not parts[2].startswith('HTTP/'):
+                raise HTTPError(f"Bad request line: {text[:80]!r}")
+            message.method, message.target, message.version = parts
+            if message.version not in ('HTTP/1.0', 'HTTP/1.1'):
+                raise HTTPError(f"Unsupported version {message.version}", 505)
+        else:
+            if len(parts) < 2 or not parts[0].startswith('HTTP/') or not _is_digits(parts[1]):
+                raise HTTPError(f"Bad status line: {text[:80]!r}")
+            message.version = parts[0]
+            message.status = int(parts[1])
+            message.reason = parts[2] if len(parts) > 2 else ''
+
+    @staticmethod
+    def _add_header(message, line):
+        name, sep, value = line.partition(b':')
+        if not sep or not name or name != name.strip():
+            raise HTTPError(f"Bad header line: {line[:80]!r}")
+        name = name.decode('latin-1').lower()
+        value = value.strip().decode('latin-1')
+        headers = message.headers
+        headers[name] = f"{headers[name]}, {value}" if name in headers else value
+
+    def _body_framing(self, message):
+        headers = message.headers
+        if self.kind == RESPONSE:
+            if 100 <= message.status < 200:
+                self._state = _HEAD     # Interim (100 Continue): the final response follows
+                return
+            method = self._methods.popleft() if self._methods else None
+            if method == 'HEAD' or message.status in (204, 304):
+                self._state = _HEAD
+                return
+        encoding = headers.get('transfer-encoding')
+        if encoding is not None:
+            if encoding.lower().rsplit(',', 1)[-1].strip() != 'chunked':
+                if self.kind == REQUEST:
+                    raise HTTPError(f"Unsupported transfer-encoding {encoding}", 501)
+                self._state = _UNTIL_CLOSE
+                return
+            # Transfer-Encoding wins over Content-Length (RFC 7230 3.3.3)
+            message.chunked = True
+            self._state = _CHUNK_SIZE
+            return
+        length = headers.get('content-length')
+        if length is not None:
+            if not _is_digits(length):
+                raise HTTPError(f"Bad Content-Length: {length[:20]!r}")
+            self._remaining = int(length)
+            if self._remaining > self.max_body and not self.discard_body:
+                raise HTTPError(f"Body exceeds {self.max_body} bytes", 413)
+            self._state = _LENGTH if self._remaining else _HEAD
+            return
+        # Requests without framing headers have no body; responses run to close
+        self._state = _UNTIL_CLOSE if self.kind == RESPONSE else _HEAD
@@ -0,0 +1,129 @@
+"""
+Shared: Non-blocking Logging Pipeline
+Writing a log line to stdout is a blocking syscall; doing it (plus
+f-string and strftime formatting) for every request stalls the event loop.
+
+- setup_logging(): the root logger gets a QueueHandler that only enqueues
+  the raw LogRecord; a background QueueListener thread formats and writes.
+  The queue is bounded - when the writer falls behind, records are dropped
+  (and counted) instead of blocking the server.
+- SampledLogger: wrapper for per-request messages where each level is
+  'on', 'sampled' (1 in N) or 'off'. The decision is made before a
+  LogRecord is even created, so 'off' costs one dict lookup.
+
+Always pass arguments lazily: request_log.info("from %s: %s", addr, msg)
+"""
+import sys
+import queue
+import atexit
+import logging
+import logging.handlers
+
+ON = 'on'
+SAMPLED = 'sampled'
+OFF = 'off'
+LOG_MODES = (ON, SAMPLED, OFF)
+
+DEFAULT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that defers all formatting to the listener thread"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stock QueueHandler formats here (caller thread). We stay in one
+        # process, so the listener can format msg % args itself.
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(level=logging.INFO, fmt=DEFAULT_FORMAT, datefmt=None,
+                  stream=None, queue_size=10000):
+    """
+    Route the root logger through a bounded queue to a background writer.
+    Returns the LazyQueueHandler (its `dropped` counts lost records).
+    """
+    target = logging.StreamHandler(stream or sys.stderr)
+    target.setFormatter(logging.Formatter(fmt, datefmt))
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = LazyQueueHandler(log_queue)
+    listener = logging.handlers.QueueListener(log_queue, target,
+                                              respect_handler_level=True)
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+        old.close()
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    listener.start()
+    atexit.register(listener.stop)
+    return handler
+
+
+class SampledLogger:
+    """
+    Per-request logging that can be switched per level:
+    modes = {logging.INFO: 'sampled', logging.DEBUG: 'off'}
+    Levels not listed are 'on'. 'sampled' keeps 1 of every `sample_every`.
+    """
+
+    def __init__(self, logger, modes=None, sample_every=100):
+        self.logger = logger
+        self._every = {}
+        self._seen = {}
+        self.configure(modes or {}, sample_every)
+
+    def configure(self, modes, sample_every=100):
+        every = {}
+        for level, mode in modes.items():
+            if mode not in LOG_MODES:
+                raise ValueError(f"Unknown log mode: {mode!r}")
+            every[level] = {ON: 1, SAMPLED: max(1, sample_every), OFF: 0}[mode]
+        self._every = every
+        self._seen = {}
+
+    def log(self, level, msg, *args):
+        every = self._every.get(level, 1)
+        if not every or not self.logger.isEnabledFor(level):
+            return
+        if every > 1:
+            seen = self._seen.get(level, 0)
+            self._seen[level] = seen + 1
+            if seen % every:
+                return
+        self.logger.log(level, msg, *args)
+
+    def debug(self, msg, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg, *args):
+        self.log(logging.WARNING, msg, *args)
+
+
+def add_logging_args(parser):
+    """--request-log / --log-sample-every options shared by the servers"""
+    parser.add_argument('--request-log', choices=LOG_MODES, default=ON,
+                        help="per-request log lines: on, sampled or off")
+    parser.add_argument('--log-sample-every', type=int, default=100,
+                        help="with --request-log sampled, keep 1 of every N lines")
+
+
+def configure_request_log(request_log, args):
+    """Apply --request-log to the INFO and DEBUG levels of a SampledLogger"""
+    modes = {logging.INFO: args.request_log, logging.DEBUG: args.request_log}
+    request_log.configure(modes, args.log_sample_every)
@@ -0,0 +1,282 @@
+"""
+Shared: Metrics Registry
+Counters, gauges and fixed-bucket latency histograms with a local scrape
+endpoint (Prometheus text format at /metrics, JSON at /metrics.json).
+
+Updates are plain attribute increments with no locks: cheap enough for the
+hot path of a single event loop. Each process (worker) owns its registry.
+
+Histogram buckets are log-linear like HdrHistogram: every power of two is
+split into 16 sub-buckets, so any recorded value is off by at most ~6%
+while the bucket array stays a few hundred ints.
+"""
+import json
+import asyncio
+
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+def _bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+
+def _bucket_upper(index):
+    """Largest value that lands in bucket `index`"""
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    sub = index % SUB_BUCKETS + SUB_BUCKETS
+    return ((sub + 1) << shift) - 1
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help=''):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def to_dict(self):
+        return self.value
+
+
+class Gauge:
+    """Settable value, or a callback evaluated at scrape time"""
+    kind = 'gauge'
+
+    def __init__(self, name, help='', fn=None):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self._value = 0
+
+    @property
+    def value(self):
+        return self.fn() if self.fn else self._value
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        self._value += amount
+
+    def dec(self, amount=1):
+        self._value -= amount
+
+    def to_dict(self):
+        return self.value
+
+
+class Histogram:
+    """
+    Log-linear histogram of non-negative integers (default unit: microseconds).
+
+    `scale` converts recorded units to the exported unit (1e-6 -> seconds).
+    Values above `max_value` are clamped into the last bucket.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help='', max_value=60_000_000, scale=1e-6):
+        self.name = name
+        self.help = help
+        self.max_value = max_value
+        self.scale = scale
+        self.counts = [0] * (_bucket_index(max_value) + 1)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value, count=1):
+        value = int(value)
+        if value < 0:
+            value = 0
+        elif value > self.max_value:
+            value = self.max_value
+        self.counts[_bucket_index(value)] += count
+        self.count += count
+        self.total += value * count
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def record_ns(self, nanoseconds, count=1):
+        """Record a perf_counter_ns() delta in microsecond resolution"""
+        self.record(nanoseconds // 1000, count)
+
+    def record_corrected(self, value, expected_interval):
+        """
+        Record `value` and back-fill the samples a stalled closed-loop
+        client never sent (coordinated omission correction, as in
+        HdrHistogram's recordValueWithExpectedInterval)
+        """
+        self.record(value)
+        if expected_interval <= 0:
+            return
+        missing = value - expected_interval
+        while missing >= expected_interval:
+            self.record(missing)
+            missing -= expected_interval
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th percentile"""
+        if not self.count:
+            return 0
+        target = max(1, -(-self.count * pct // 100))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(_bucket_upper(i), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self, percentiles=(50, 90, 99, 99.9)):
+        """Scaled summary: count, min, mean, max and pXX"""
+        scale = self.scale
+        result = {
+            'count': self.count,
+            'min': round((self.min or 0) * scale, 9),
+            'mean': round(self.mean * scale, 9),
+            'max': round(self.max * scale, 9),
+        }
+        for pct in percentiles:
+            result[f"p{pct:g}"] = round(self.percentile(pct) * scale, 9)
+        return result
+
+    def to_dict(self):
+        return self.summary()
+
+    def state(self):
+        """Raw, picklable state (to ship between processes)"""
+        return {'counts': {i: c for i, c in enumerate(self.counts) if c},
+                'count': self.count, 'total': self.total,
+                'min': self.min, 'max': self.max}
+
+    def load_state(self, state):
+        """Merge a state() produced by another histogram"""
+        other = Histogram(self.name, max_value=self.max_value, scale=self.scale)
+        for i, c in state['counts'].items():
+            other.counts[int(i)] = c
+        other.count = state['count']
+        other.total = state['total']
+        other.min = state['min']
+        other.max = state['max']
+        self.merge(other)
+
+    def prometheus_buckets(self):
+        """Cumulative counts at every power-of-two boundary up to max (+Inf last)"""
+        buckets = []
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            upper = _bucket_upper(i)
+            if (upper + 1) & upper == 0:
+                buckets.append((upper * self.scale, seen))
+                if upper >= self.max:
+                    break
+        buckets.append(('+Inf', self.count))
+        return buckets
+
+
+class MetricsRegistry:
+    """Named metrics, rendered for Prometheus or JSON"""
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix
+        self.metrics = {}
+
+    def _get(self, cls, name, *args, **kwargs):
+        name = self.prefix + name
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, *args, **kwargs)
+        return metric
+
+    def counter(self, name, help=''):
+        return self._get(Counter, name, help)
+
+    def gauge(self, name, help='', fn=None):
+        return self._get(Gauge, name, help, fn)
+
+    def histogram(self, name, help='', **kwargs):
+        return self._get(Histogram, name, help, **kwargs)
+
+    def snapshot(self):
+        """JSON-ready dict of every metric"""
+        return {name: metric.to_dict() for name, metric in self.metrics.items()}
+
+    def render_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def render_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines = []
+        for name, metric in self.metrics.items():
+            if metric.help:
+                lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            if metric.kind == 'histogram':
+                for le, count in metric.prometheus_buckets():
+                    le = le if isinstance(le, str) else f"{le:.6g}"
+                    lines.append(f'{name}_bucket{{le="{le}"}} {count}')
+                lines.append(f"{name}_sum {metric.total * metric.scale:.6f}")
+                lines.append(f"{name}_count {metric.count}")
+            else:
+                lines.append(f"{name} {metric.value}")
+        return '\n'.join(lines) + '\n'
+
+
+async def serve_metrics(registry, host='127.0.0.1', port=9100):
+    """
+    Start a minimal HTTP endpoint for scraping:
+    GET /metrics (Prometheus text) and GET /metrics.json
+    """
+    async def handle(reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Skip headers
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            path = parts[1] if len(parts) > 1 else '/'
+            if path == '/metrics':
+                status, ctype = '200 OK', 'text/plain; version=0.0.4'
+                body = registry.render_prometheus().encode('utf-8')
+            elif path == '/metrics.json':
+                status, ctype = '200 OK', 'application/json'
+                body = registry.render_json().encode('utf-8')
+            else:
+                status, ctype, body = '404 Not Found', 'text/plain', b'not found\n'
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {ctype}\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+                         .encode('latin-1') + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
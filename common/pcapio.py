@@ -0,0 +1,463 @@
+"""
+Shared: Streaming Capture Files
+Reads pcap and pcapng files without loading them: the file is mmap()ed and
+records are sliced out one by one, so a multi-GB capture costs no more
+memory than a small one. Headers are decoded with struct, not scapy - a
+full scapy dissection is ~100x slower and only needed for the rare frame
+the fast decoder does not understand.
+
+    for ts, linktype, frame in iter_frames(path):
+        seg = decode_tcp(frame, linktype)   # TCPSegment, None, or UNDECODED
+
+- pcap: both byte orders, microsecond and nanosecond timestamps
+- pcapng: section/interface blocks (per-interface link type and
+  if_tsresol), enhanced, simple and obsolete packet blocks; other blocks
+  are skipped
+- link types: Ethernet (with 802.1Q/802.1ad tags), Linux cooked (SLL,
+  SLL2), raw IP, BSD loopback
+- decode_tcp(): IPv4 (with options) and IPv6 (with the common extension
+  headers) carrying TCP. Non-first IPv4 fragments carry no TCP header and
+  decode to None. UNDECODED means "ask scapy" (scapy_decode_tcp)
+- decode_arp(): Ethernet/IPv4 ARP; flow_key(): a direction-independent
+  key per conversation, for spreading frames over worker processes
+
+PcapWriter and the ether_*() builders (TCP, ARP) write captures for tests,
+benchmarks and replay harnesses.
+"""
+import mmap
+import socket
+import struct
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETH_IPV4 = 0x0800
+ETH_ARP = 0x0806
+ETH_VLAN = 0x8100
+ETH_QINQ = 0x88A8
+ETH_IPV6 = 0x86DD
+
+TCP_FIN, TCP_SYN, TCP_RST, TCP_PSH, TCP_ACK = 0x01, 0x02, 0x04, 0x08, 0x10
+
+UNDECODED = object()        # decode_tcp(): fast decoder gave up, try scapy
+
+_PCAP_MAGIC = {             # magic as read little-endian -> (byte order, ts divisor)
+    0xa1b2c3d4: ('<', 1e6), 0xd4c3b2a1: ('>', 1e6),
+    0xa1b23c4d: ('<', 1e9), 0x4d3cb2a1: ('>', 1e9),
+}
+_PCAPNG_SHB = 0x0A0D0D0A
+_PCAPNG_BOM = 0x1A2B3C4D
+_IPV6_EXT = {0, 43, 60}     # hop-by-hop, routing, destination options
+_IPV6_FRAG = 44
+
+_ETH = struct.Struct('!6s6sH')
+_U16 = struct.Struct('!H')
+_IPV4 = struct.Struct('!BBHHHBBH4s4s')
+_IPV6 = struct.Struct('!IHBB16s16s')
+_TCP = struct.Struct('!HHIIBB')
+_IPV4_TCP = struct.Struct('!2xHHHxB2x4s4sHHIIBB')    # IPv4 without options, then TCP
+_ARP = struct.Struct('!HHBBH6s4s6s4s')
+
+
+class CaptureError(ValueError):
+    """Not a pcap/pcapng file, or a corrupt one"""
+
+
+# ---- reading -----------------------------------------------------------
+
+def iter_frames(path):
+    """Yield (timestamp, linktype, frame bytes) for every packet in a pcap/pcapng file"""
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return              # Empty file
+        with mm:
+            if len(mm) < 4:
+                raise CaptureError(f"{path}: too short for a capture file")
+            magic = struct.unpack_from('<I', mm)[0]
+            if magic == _PCAPNG_SHB:
+                yield from _iter_pcapng(mm)
+            elif magic in _PCAP_MAGIC:
+                yield from _iter_pcap(mm, *_PCAP_MAGIC[magic])
+            else:
+                raise CaptureError(f"{path}: unknown magic 0x{magic:08x}")
+
+
+def _iter_pcap(mm, order, divisor):
+    if len(mm) < 24:
+        raise CaptureError("truncated pcap header")
+    linktype = struct.unpack_from(order + 'I', mm, 20)[0] & 0x0FFFFFFF
+    record = struct.Struct(order + 'IIII')
+    unpack = record.unpack_from
+    size = len(mm)
+    offset = 24
+    while offset + 16 <= size:
+        sec, frac, caplen, _ = unpack(mm, offset)
+        offset += 16
+        end = offset + caplen
+        if end > size:
+            return              # Truncated last record (capture still being written)
+        yield sec + frac / divisor, linktype, mm[offset:end]
+        offset = end
+
+
+def _iter_pcapng(mm):
+    size = len(mm)
+    offset = 0
+    order = '<'
+    interfaces = []             # [(linktype, ts units per second)]
+    while offset + 12 <= size:
+        block_type = struct.unpack_from(order + 'I', mm, offset)[0]
+        if block_type == _PCAPNG_SHB:
+            # Byte order can change from one section to the next
+            bom = struct.unpack_from('<I', mm, offset + 8)[0]
+            order = '<' if bom == _PCAPNG_BOM else '>'
+            interfaces = []
+        length = struct.unpack_from(order + 'I', mm, offset + 4)[0]
+        if length < 12 or length % 4 or offset + length > size:
+            if offset + length > size:
+                return          # Truncated last block
+            raise CaptureError(f"bad pcapng block length {length} at offset {offset}")
+        body = offset + 8
+        end = offset + length - 4               # Trailing copy of the length
+        if block_type == 6:                     # Enhanced packet block
+            _need(length, 32, offset)
+            iface, hi, lo, caplen = struct.unpack_from(order + 'IIII', mm, body)
+            linktype, units = _interface(interfaces, iface, offset)
+            start = body + 20
+            yield ((hi << 32) | lo) / units, linktype, mm[start:min(start + caplen, end)]
+        elif block_type == 3:                   # Simple packet block: interface 0, no time
+            _need(length, 16, offset)
+            origlen = struct.unpack_from(order + 'I', mm, body)[0]
+            caplen = min(origlen, length - 16)
+            yield 0.0, _interface(interfaces, 0, offset)[0], mm[body + 4:body + 4 + caplen]
+        elif block_type == 1:                   # Interface description block
+            _need(length, 20, offset)
+            linktype = struct.unpack_from(order + 'H', mm, body)[0]
+            interfaces.append((linktype, _tsresol(mm, order, body + 8, end)))
+        elif block_type == 2:                   # Obsolete packet block
+            _need(length, 32, offset)
+            iface, _, hi, lo, caplen = struct.unpack_from(order + 'HHIII', mm, body)
+            linktype, units = _interface(interfaces, iface, offset)
+            start = body + 20
+            yield ((hi << 32) | lo) / units, linktype, mm[start:min(start + caplen, end)]
+        offset += length
+
+
+def _need(length, minimum, offset):
+    if length < minimum:
+        raise CaptureError(f"pcapng block of {length} bytes at offset {offset} is too short")
+
+
+def _interface(interfaces, iface, offset):
+    """(linktype, units) of interface `iface`, which an IDB must have described"""
+    if iface >= len(interfaces):
+        raise CaptureError(f"packet at offset {offset} refers to undescribed interface {iface}")
+    return interfaces[iface]
+
+
+def _tsresol(mm, order, offset, end):
+    """Timestamp units per second from an IDB's options (if_tsresol, default 10^6)"""
+    while offset + 4 <= end:
+        code, length = struct.unpack_from(order + 'HH', mm, offset)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:
+            value = mm[offset + 4]
+            return 2 ** (value & 0x7F) if value & 0x80 else 10 ** value
+        offset += 4 + (length + 3) // 4 * 4
+    return 10 ** 6
+
+
+# ---- decoding ----------------------------------------------------------
+
+def ip_ntop(addr):
+    """Packed 4- or 16-byte address -> text"""
+    return socket.inet_ntoa(addr) if len(addr) == 4 else socket.inet_ntop(socket.AF_INET6, addr)
+
+
+def ip_pton(text):
+    return socket.inet_pton(socket.AF_INET6 if ':' in text else socket.AF_INET, text)
+
+
+def mac_ntop(mac):
+    """6 bytes -> 'aa:bb:cc:dd:ee:ff'"""
+    return mac.hex(':')
+
+
+class TCPSegment:
+    """
+    The parts of an IP/TCP packet the analyzers use. Addresses are kept
+    packed (saddr/daddr, cheap to hash); src/dst format them on demand.
+    """
+    __slots__ = ('saddr', 'daddr', 'sport', 'dport', 'seq', 'ack', 'flags', 'payload')
+
+    def __init__(self, saddr, daddr, sport, dport, seq, ack, flags, payload):
+        self.saddr = saddr
+        self.daddr = daddr
+        self.sport = sport
+        self.dport = dport
+        self.seq = seq
+        self.ack = ack
+        self.flags = flags
+        self.payload = payload
+
+    @property
+    def src(self):
+        return ip_ntop(self.saddr)
+
+    @property
+    def dst(self):
+        return ip_ntop(self.daddr)
+
+    def __repr__(self):
+        return (f"<TCPSegment {self.src}:{self.sport} -> {self.dst}:{self.dport} "
+                f"seq={self.seq} flags=0x{self.flags:02x} len={len(self.payload)}>")
+
+
+def l3_offset(frame, linktype):
+    """(ethertype, offset of the network header), or (None, 0) for unknown link types"""
+    if linktype == LINKTYPE_ETHERNET:
+        if len(frame) < 14:
+            return None, 0
+        ethertype = _U16.unpack_from(frame, 12)[0]
+        offset = 14
+        while ethertype in (ETH_VLAN, ETH_QINQ) and len(frame) >= offset + 4:
+            ethertype = _U16.unpack_from(frame, offset + 2)[0]
+            offset += 4
+        return ethertype, offset
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        if not frame:
+            return None, 0
+        return (ETH_IPV6 if frame[0] >> 4 == 6 else ETH_IPV4), 0
+    if linktype == LINKTYPE_LINUX_SLL:
+        return (_U16.unpack_from(frame, 14)[0], 16) if len(frame) >= 16 else (None, 0)
+    if linktype == LINKTYPE_LINUX_SLL2:
+        return (_U16.unpack_from(frame, 0)[0], 20) if len(frame) >= 20 else (None, 0)
+    if linktype == LINKTYPE_NULL:
+        if len(frame) < 4:
+            return None, 0
+        # AF_ value in the capturing host's byte order
+        family = struct.unpack_from('<I', frame)[0]
+        if family > 0xFFFF:
+            family = struct.unpack_from('>I', frame)[0]
+        return (ETH_IPV4 if family == 2 else ETH_IPV6), 4
+    return None, 0
+
+
+def decode_tcp(frame, linktype=LINKTYPE_ETHERNET):
+    """TCPSegment for an IP/TCP frame, None for other traffic, UNDECODED if unsure"""
+    if linktype == LINKTYPE_ETHERNET and frame[12:15] == b'\x08\x00\x45' and len(frame) >= 54:
+        # Most common frame: untagged Ethernet, IPv4 without options - one unpack
+        (total, _, frag, proto, src, dst,
+         sport, dport, seq, ack, data_off, flags) = _IPV4_TCP.unpack_from(frame, 14)
+        if proto == 6 and not frag & 0x3FFF:
+            return TCPSegment(src, dst, sport, dport, seq, ack, flags,
+                              frame[34 + (data_off >> 4) * 4:14 + total if total else None])
+        ethertype, offset = ETH_IPV4, 14
+    else:
+        ethertype, offset = l3_offset(frame, linktype)
+    if ethertype == ETH_IPV4:
+        if len(frame) < offset + 20:
+            return None
+        (vihl, _, total, _, frag, _, proto, _,
+         src, dst) = _IPV4.unpack_from(frame, offset)
+        if proto != 6 or frag & 0x1FFF:
+            return None             # Not TCP, or a fragment without the TCP header
+        if frag & 0x2000:
+            return UNDECODED        # First fragment: the segment is incomplete
+        end = offset + total if total else len(frame)   # total 0: TSO capture
+        offset += (vihl & 0x0F) * 4
+    elif ethertype == ETH_IPV6:
+        if len(frame) < offset + 40:
+            return None
+        _, plen, proto, _, src, dst = _IPV6.unpack_from(frame, offset)
+        end = offset + 40 + plen if plen else len(frame)
+        offset += 40
+        while proto in _IPV6_EXT and len(frame) >= offset + 8:
+            proto = frame[offset]
+            offset += (frame[offset + 1] + 1) * 8
+        if proto == _IPV6_FRAG:
+            return UNDECODED
+        if proto != 6:
+            return None
+    elif ethertype is None:
+        return UNDECODED
+    else:
+        return None
+    if len(frame) < offset + 20:
+        return None
+    sport, dport, seq, ack, data_off, flags = _TCP.unpack_from(frame, offset)
+    return TCPSegment(src, dst, sport, dport, seq, ack, flags,
+                      frame[offset + (data_off >> 4) * 4:end])
+
+
+def scapy_decode_tcp(frame, linktype):
+    """Slow path for decode_tcp() == UNDECODED; None without scapy or TCP"""
+    try:
+        from scapy.all import conf, IP, IPv6, TCP, Raw
+    except ImportError:
+        return None
+    cls = conf.l2types.get(linktype)
+    if cls is None:
+        return None
+    pkt = cls(bytes(frame))
+    if not pkt.haslayer(TCP):
+        return None
+    ip = pkt[IP] if pkt.haslayer(IP) else pkt[IPv6]
+    tcp = pkt[TCP]
+    payload = bytes(tcp[Raw].load) if tcp.haslayer(Raw) else b''
+    return TCPSegment(ip_pton(ip.src), ip_pton(ip.dst), tcp.sport, tcp.dport, tcp.seq, tcp.ack,
+                      int(tcp.flags), payload)
+
+
+class ARPPacket:
+    """
+    An Ethernet/IPv4 ARP packet. Addresses are packed (sha/spa: sender MAC
+    and IP, tha/tpa: target); hwsrc/psrc/hwdst/pdst format them like scapy.
+    eth_src is the link-layer source address when the link type has one.
+    """
+    __slots__ = ('op', 'sha', 'spa', 'tha', 'tpa', 'eth_src')
+
+    def __init__(self, op, sha, spa, tha, tpa, eth_src=None):
+        self.op = op
+        self.sha = sha
+        self.spa = spa
+        self.tha = tha
+        self.tpa = tpa
+        self.eth_src = eth_src
+
+    @property
+    def hwsrc(self):
+        return mac_ntop(self.sha)
+
+    @property
+    def psrc(self):
+        return ip_ntop(self.spa)
+
+    @property
+    def hwdst(self):
+        return mac_ntop(self.tha)
+
+    @property
+    def pdst(self):
+        return ip_ntop(self.tpa)
+
+    def __repr__(self):
+        return f"<ARPPacket op={self.op} {self.psrc} is-at {self.hwsrc} -> {self.pdst}>"
+
+
+def decode_arp(frame, linktype=LINKTYPE_ETHERNET):
+    """ARPPacket for an Ethernet/IPv4 ARP frame, else None"""
+    ethertype, offset = l3_offset(frame, linktype)
+    if ethertype != ETH_ARP or len(frame) < offset + 28:
+        return None
+    htype, ptype, hlen, plen, op, sha, spa, tha, tpa = _ARP.unpack_from(frame, offset)
+    if htype != 1 or ptype != ETH_IPV4 or hlen != 6 or plen != 4:
+        return None
+    if linktype == LINKTYPE_ETHERNET:
+        eth_src = bytes(frame[6:12])
+    elif linktype == LINKTYPE_LINUX_SLL and _U16.unpack_from(frame, 4)[0] == 6:
+        eth_src = bytes(frame[6:12])
+    else:
+        eth_src = None
+    return ARPPacket(op, sha, spa, tha, tpa, eth_src)
+
+
+def flow_key(frame, linktype=LINKTYPE_ETHERNET):
+    """
+    Bytes naming the conversation a frame belongs to, the same in both
+    directions (for sharding): the address and port pairs for IP, the
+    sender address for ARP, b'' for anything else
+    """
+    ethertype, offset = l3_offset(frame, linktype)
+    if ethertype == ETH_IPV4 and len(frame) >= offset + 20:
+        a, b = frame[offset + 12:offset + 16], frame[offset + 16:offset + 20]
+        start = offset + (frame[offset] & 0x0F) * 4
+        frag = _U16.unpack_from(frame, offset + 6)[0] & 0x3FFF
+        if frame[offset + 9] in (6, 17) and not frag and len(frame) >= start + 4:
+            a += frame[start:start + 2]
+            b += frame[start + 2:start + 4]
+    elif ethertype == ETH_IPV6 and len(frame) >= offset + 40:
+        a, b = frame[offset + 8:offset + 24], frame[offset + 24:offset + 40]
+        start = offset + 40
+        if frame[offset + 6] in (6, 17) and len(frame) >= start + 4:
+            a += frame[start:start + 2]
+            b += frame[start + 2:start + 4]
+    elif ethertype == ETH_ARP and len(frame) >= offset + 18:
+        return bytes(frame[offset + 14:offset + 18])
+    else:
+        return b''
+    return bytes(a + b if a <= b else b + a)
+
+
+# ---- writing -----------------------------------------------------------
+
+class PcapWriter:
+    """Classic little-endian pcap, microsecond timestamps"""
+
+    def __init__(self, path, linktype=LINKTYPE_ETHERNET, snaplen=262144):
+        self.f = open(path, 'wb')
+        self.f.write(struct.pack('<IHHiIII', 0xa1b2c3d4, 2, 4, 0, 0, snaplen, linktype))
+        self._record = struct.Struct('<IIII')
+
+    def write(self, frame, ts):
+        sec = int(ts)
+        self.f.write(self._record.pack(sec, int(round((ts - sec) * 1e6)), len(frame), len(frame)))
+        self.f.write(frame)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def mac_bytes(mac):
+    """"aa:bb:cc:dd:ee:ff" -> 6 bytes"""
+    return bytes.fromhex(mac.replace(':', '').replace('-', ''))
+
+
+def _checksum(data):
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack(f'!{len(data) // 2}H', data))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def ether_ipv4_tcp(src, dst, sport, dport, seq=0, ack=0, flags=TCP_ACK | TCP_PSH,
+                   payload=b'', src_mac='02:00:00:00:00:01', dst_mac='02:00:00:00:00:02',
+                   window=65535):
+    """Ethernet/IPv4/TCP frame with valid IP and TCP checksums"""
+    saddr, daddr = socket.inet_aton(src), socket.inet_aton(dst)
+    tcp = struct.pack('!HHIIBBHHH', sport, dport, seq & 0xFFFFFFFF, ack & 0xFFFFFFFF,
+                      5 << 4, flags, window, 0, 0)
+    pseudo = saddr + daddr + struct.pack('!BBH', 0, 6, len(tcp) + len(payload))
+    csum = _checksum(pseudo + tcp + payload)
+    tcp = tcp[:16] + struct.pack('!H', csum) + tcp[18:]
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(tcp) + len(payload), 0, 0x4000,
+                     64, 6, 0, saddr, daddr)
+    ip = ip[:10] + struct.pack('!H', _checksum(ip)) + ip[12:]
+    return _ETH.pack(mac_bytes(dst_mac), mac_bytes(src_mac), ETH_IPV4) + ip + tcp + payload
+
+
+def ether_arp(op, sender_mac, sender_ip, target_ip, target_mac='00:00:00:00:00:00',
+              eth_src=None, eth_dst=None):
+    """Ethernet/ARP frame; requests go to broadcast, replies to the target MAC by default"""
+    if eth_dst is None:
+        eth_dst = 'ff:ff:ff:ff:ff:ff' if op == 1 else target_mac
+    arp = _ARP.pack(1, ETH_IPV4, 6, 4, op, mac_bytes(sender_mac), socket.inet_aton(sender_ip),
+                    mac_bytes(target_mac), socket.inet_aton(target_ip))
+    return (_ETH.pack(mac_bytes(eth_dst), mac_bytes(eth_src or sender_mac), ETH_ARP)
+            + arp + b'\0' * 18)      # Padded to the 60-byte Ethernet minimum
@@ -0,0 +1,140 @@
+"""
+Shared: Shared-Memory Frame Ring
+A single-producer / single-consumer ring of packets in an anonymous shared
+mmap, to hand frames from a capture process to a worker process without a
+pickle and a pipe write per packet.
+
+Layout: the producer's counters (bytes and frames written, closed flag)
+on one cache line, the consumer's (bytes and frames consumed) on the
+next, then the data area. Positions only grow; a record lives at
+position % capacity. A record is a 16-byte header (length, link type,
+timestamp) and the frame, padded to 8 bytes; one that would run past the
+end of the area is put at the start, behind a wrap marker.
+
+- put() appends one frame (False when the ring is full: the caller
+  drops it and counts the drop); publish() makes everything put so far
+  visible and posts a semaphore. Publishing per batch keeps the
+  semaphore out of the per-packet cost.
+- get() waits on the semaphore, copies up to `limit` records out and
+  only then advances the consumer position, freeing their space.
+- The semaphore also orders the producer's stores before the consumer's
+  loads, so the data is complete by the time its position is seen.
+
+The ring is created before fork() (multiprocessing 'fork' context, as in
+workers.py); the mmap and semaphore are inherited by the worker.
+"""
+import mmap
+import struct
+import multiprocessing
+
+RING_SIZE = 16 * 1024 * 1024
+_HEADER = 128                   # Producer line at 0, consumer line at 64
+_CONSUMER = 64
+_CLOSED = 16
+_WRAP = 0xFFFFFFFF
+_RECORD = struct.Struct('<IHxxd')       # frame length, link type, timestamp
+_POSITION = struct.Struct('<QQ')        # bytes, frames
+_U32 = struct.Struct('<I')
+
+
+class FrameRing:
+    def __init__(self, capacity=RING_SIZE, ctx=None):
+        self.capacity = capacity // 8 * 8
+        self.mm = mmap.mmap(-1, _HEADER + self.capacity)
+        ctx = ctx or multiprocessing.get_context('fork')
+        self.ready = ctx.Semaphore(0)
+        # Producer side (only meaningful in the producing process)
+        self._head = 0
+        self._frames_in = 0
+        self._published = 0
+        self._tail_seen = 0         # Consumer position as last read
+        self.peak_depth = 0         # Most frames waiting at any publish()
+        # Consumer side
+        self._tail = 0
+        self._frames_out = 0
+        self._backlog = False       # Last get() stopped at `limit`: don't wait
+
+    # ---- producer ------------------------------------------------------
+
+    def put(self, ts, linktype, frame):
+        """Append a frame; False if it does not fit (ring full)"""
+        capacity = self.capacity
+        need = (_RECORD.size + len(frame) + 7) & ~7
+        offset = self._head % capacity
+        room = capacity - offset
+        total = need if need <= room else room + need
+        if self._head + total - self._tail_seen > capacity:
+            self._tail_seen = _POSITION.unpack_from(self.mm, _CONSUMER)[0]
+            if self._head + total - self._tail_seen > capacity:
+                return False
+        mm = self.mm
+        if need > room:
+            _U32.pack_into(mm, _HEADER + offset, _WRAP)
+            self._head += room
+            offset = 0
+        start = _HEADER + offset
+        _RECORD.pack_into(mm, start, len(frame), linktype, ts)
+        mm[start + _RECORD.size:start + _RECORD.size + len(frame)] = frame
+        self._head += need
+        self._frames_in += 1
+        return True
+
+    def publish(self):
+        """Make the frames put so far visible to the consumer"""
+        if self._head != self._published:
+            _POSITION.pack_into(self.mm, 0, self._head, self._frames_in)
+            self._published = self._head
+            self.ready.release()
+            depth = self.depth()
+            if depth > self.peak_depth:
+                self.peak_depth = depth
+
+    def close(self):
+        """No more frames: the consumer drains the ring and stops"""
+        self.publish()
+        self.mm[_CLOSED] = 1
+        self.ready.release()
+
+    # ---- consumer ------------------------------------------------------
+
+    def get(self, timeout=None, limit=1024):
+        """Wait for frames; [(ts, linktype, frame bytes)], [] on timeout"""
+        if not self._backlog and not self.ready.acquire(timeout=timeout):
+            return []
+        mm = self.mm
+        capacity = self.capacity
+        head = _POSITION.unpack_from(mm, 0)[0]
+        tail = self._tail
+        records = []
+        while tail < head and len(records) < limit:
+            offset = tail % capacity
+            start = _HEADER + offset
+            length = _U32.unpack_from(mm, start)[0]
+            if length == _WRAP:
+                tail += capacity - offset
+                continue
+            length, linktype, ts = _RECORD.unpack_from(mm, start)
+            start += _RECORD.size
+            records.append((ts, linktype, mm[start:start + length]))
+            tail += (_RECORD.size + length + 7) & ~7
+        self._backlog = tail < head
+        self._tail = tail
+        self._frames_out += len(records)
+        _POSITION.pack_into(mm, _CONSUMER, tail, self._frames_out)
+        return records
+
+    def drained(self):
+        """Closed by the producer and everything consumed"""
+        return self.mm[_CLOSED] == 1 and self._tail == _POSITION.unpack_from(self.mm, 0)[0]
+
+    # ---- either side ---------------------------------------------------
+
+    def depth(self):
+        """Frames published but not yet consumed"""
+        return (_POSITION.unpack_from(self.mm, 0)[1]
+                - _POSITION.unpack_from(self.mm, _CONSUMER)[1])
+
+    def used(self):
+        """Bytes of the data area in use"""
+        return (_POSITION.unpack_from(self.mm, 0)[0]
+                - _POSITION.unpack_from(self.mm, _CONSUMER)[0])
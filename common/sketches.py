@@ -0,0 +1,204 @@
+"""
+Shared: Streaming Sketches
+Fixed-size summaries of unbounded streams, for statistics that must not
+grow with the length of a capture (or the uptime of a server).
+
+CountMinSketch  approximate count per key: `depth` rows of `width`
+                counters; a key's estimate is the minimum over its counters,
+                never below the true count and above it by at most
+                ~2/width of the stream total (with high probability).
+TopK            the k heaviest keys: a count-min sketch plus k candidates;
+                a key replaces the lightest candidate once its estimate
+                exceeds it.
+HyperLogLog     distinct count in 2**precision one-byte registers (16 KiB
+                by default, ~0.8% standard error).
+RateSeries      events per interval over the last `slots` intervals, in a
+                ring buffer indexed by event time (capture time works as
+                well as wall time).
+
+All of them merge(): sketches built in different processes over parts of
+one stream combine into the sketch of the whole stream. Keys are hashed
+with blake2b, not hash(), so that holds across processes too.
+"""
+import math
+from hashlib import blake2b
+
+
+def hash64(key):
+    """Stable 64-bit hash of a str or bytes key"""
+    if isinstance(key, str):
+        key = key.encode('utf-8', 'surrogatepass')
+    return int.from_bytes(blake2b(key, digest_size=8).digest(), 'little')
+
+
+class CountMinSketch:
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.counts = [0] * (width * depth)     # Row-major, one flat list
+        self.total = 0
+
+    def _cells(self, h):
+        # Kirsch-Mitzenmacher: `depth` indexes from one 64-bit hash
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def add(self, key, count=1, h=None):
+        """Count key (h: its hash64, if already known); returns its new estimate"""
+        counts = self.counts
+        estimate = None
+        for cell in self._cells(hash64(key) if h is None else h):
+            value = counts[cell] = counts[cell] + count
+            if estimate is None or value < estimate:
+                estimate = value
+        self.total += count
+        return estimate
+
+    def estimate(self, key):
+        counts = self.counts
+        return min(counts[cell] for cell in self._cells(hash64(key)))
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Count-min sketches differ in size")
+        counts = self.counts
+        for i, value in enumerate(other.counts):
+            if value:
+                counts[i] += value
+        self.total += other.total
+
+
+class TopK:
+    def __init__(self, k=10, width=2048, depth=4):
+        self.k = k
+        self.sketch = CountMinSketch(width, depth)
+        self.top = {}           # key -> estimate, at most k entries
+        self._floor = 0         # Lower bound of the smallest estimate in top
+
+    def __len__(self):
+        return len(self.top)
+
+    def __contains__(self, key):
+        return key in self.top
+
+    @property
+    def total(self):
+        return self.sketch.total
+
+    def add(self, key, count=1, h=None):
+        estimate = self.sketch.add(key, count, h)
+        top = self.top
+        if key in top or len(top) < self.k:
+            top[key] = estimate
+            return
+        if estimate <= self._floor:
+            return              # The common case: a key from the long tail
+        lightest = min(top, key=top.get)
+        self._floor = top[lightest]
+        if estimate > self._floor:
+            del top[lightest]
+            top[key] = estimate
+            self._floor = min(top.values())
+
+    def items(self):
+        """[(key, estimate)], heaviest first"""
+        return sorted(self.top.items(), key=lambda item: (-item[1], item[0]))
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        candidates = set(self.top) | set(other.top)
+        estimates = sorted(((self.sketch.estimate(key), key) for key in candidates), reverse=True)
+        self.top = {key: estimate for estimate, key in estimates[:self.k]}
+        self._floor = min(self.top.values()) if self.top else 0
+
+
+class HyperLogLog:
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, key, h=None):
+        if h is None:
+            h = hash64(key)
+        bits = 64 - self.precision
+        index = h >> bits
+        # Rank: position of the first 1 bit in the remaining bits
+        rank = bits - (h & ((1 << bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        """Estimated number of distinct keys added"""
+        registers = self.registers
+        m = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(_INVERSE_POWERS[r] for r in registers)
+        if estimate <= 2.5 * m:
+            zeros = registers.count(0)
+            if zeros:
+                estimate = m * math.log(m / zeros)   # Linear counting for small sets
+        return int(round(estimate))
+
+    def __len__(self):
+        return self.count()
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("HyperLogLogs differ in precision")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+
+_INVERSE_POWERS = [2.0 ** -i for i in range(66)]
+
+
+class RateSeries:
+    def __init__(self, interval=1.0, slots=60):
+        self.interval = interval
+        self.slots = slots
+        self.counts = [0] * slots
+        self.first = None       # Index (time // interval) of the first interval seen
+        self.last = None        # ... and of the newest one
+        self.total = 0
+
+    def add(self, when, count=1):
+        index = int(when // self.interval)
+        last = self.last
+        if last is None or index > last:
+            if last is not None:
+                # Zero the intervals that passed without events
+                for skipped in range(last + 1, min(index, last + self.slots) + 1):
+                    self.counts[skipped % self.slots] = 0
+            else:
+                self.first = index
+            self.last = last = index
+        elif index <= last - self.slots:
+            self.total += count
+            return              # Older than the window (reordered input)
+        if index < self.first:
+            self.first = index
+        self.counts[index % self.slots] += count
+        self.total += count
+
+    def buckets(self):
+        """[(start time, count)] for the window, oldest first"""
+        if self.last is None:
+            return []
+        first = max(self.first, self.last - self.slots + 1)
+        return [(index * self.interval, self.counts[index % self.slots])
+                for index in range(first, self.last + 1)]
+
+    def rates(self):
+        """Events per second for each interval of the window, oldest first"""
+        return [count / self.interval for _, count in self.buckets()]
+
+    def merge(self, other):
+        if (other.interval, other.slots) != (self.interval, self.slots):
+            raise ValueError("Rate series differ in interval or window")
+        total = self.total
+        for start, count in other.buckets():
+            if count:
+                self.add(start, count)
+        self.total = total + other.total
@@ -0,0 +1,79 @@
+"""
+Shared: Timer Wheel for Idle Expiry
+Tracks "last seen" times for many keys (client addresses, ARP bindings...)
+and reports the ones idle for longer than `timeout`.
+
+- touch(key) is O(1): it only records the time. The key is not moved in
+  the wheel on every packet.
+- The wheel has `slots` buckets of `tick` seconds each. advance() empties
+  the buckets whose time has come; a key found there that was touched in
+  the meantime is simply re-filed under its new deadline (lazy
+  rescheduling). Each key is therefore looked at about once per timeout,
+  so the per-tick cost is O(keys due), O(1) amortized per key.
+"""
+import math
+import time
+
+
+class TimerWheel:
+    def __init__(self, timeout, tick=1.0, slots=None, clock=time.monotonic):
+        self.timeout = timeout
+        self.tick = tick
+        # Enough slots to file any deadline within one timeout directly
+        self.slots = slots or int(math.ceil(timeout / tick)) + 1
+        self.clock = clock
+        self.wheel = [set() for _ in range(self.slots)]
+        self.last_seen = {}     # key -> last activity time
+        self._slot_of = {}      # key -> wheel index it is filed under
+        self._origin = clock()
+        self._current = 0       # Ticks since origin already processed
+
+    def __len__(self):
+        return len(self.last_seen)
+
+    def __contains__(self, key):
+        return key in self.last_seen
+
+    def _tick_of(self, when):
+        return int((when - self._origin) // self.tick)
+
+    def _file(self, key, deadline):
+        # Never file in the slot being processed; cap at one full turn
+        ahead = min(max(1, self._tick_of(deadline) - self._current + 1), self.slots - 1)
+        index = (self._current + ahead) % self.slots
+        self.wheel[index].add(key)
+        self._slot_of[key] = index
+
+    def touch(self, key, now=None):
+        """Record activity for key (adds it if new)"""
+        now = self.clock() if now is None else now
+        if key not in self.last_seen:
+            self._file(key, now + self.timeout)
+        self.last_seen[key] = now
+
+    def remove(self, key):
+        """Stop tracking key (e.g. it left on its own)"""
+        if self.last_seen.pop(key, None) is not None:
+            self.wheel[self._slot_of.pop(key)].discard(key)
+
+    def advance(self, now=None):
+        """Process every tick up to `now`; returns the keys that expired"""
+        now = self.clock() if now is None else now
+        target = self._tick_of(now)
+        expired = []
+        # After a long pause, one pass over every slot is enough
+        if target - self._current > self.slots:
+            self._current = target - self.slots
+        while self._current < target:
+            self._current += 1
+            index = self._current % self.slots
+            due, self.wheel[index] = self.wheel[index], set()
+            for key in due:
+                last = self.last_seen[key]
+                if now - last >= self.timeout:
+                    del self.last_seen[key]
+                    del self._slot_of[key]
+                    expired.append(key)
+                else:
+                    self._file(key, last + self.timeout)
+        return expired
@@ -0,0 +1,155 @@
+"""
+Shared: Batched UDP Sends
+Fanning one datagram out to N peers with sendto() costs N syscalls. On
+Linux, sendmmsg(2) hands the kernel up to BATCH_SIZE messages per call; the
+payload buffer is shared by every message, only the destination changes.
+
+BatchSender.send_many() uses sendmmsg through ctypes when the platform has
+it and falls back to a non-blocking sendto() loop everywhere else. Both
+stop at the first EAGAIN and report how many datagrams went out, so the
+caller decides whether to retry later or drop.
+"""
+import sys
+import errno
+import socket
+import struct
+import ctypes
+import ctypes.util
+
+BATCH_SIZE = 1024           # Linux caps one sendmmsg() call at UIO_MAXIOV (1024)
+MSG_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+
+
+class _IOVec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+
+class _MsgHdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p), ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(_IOVec)), ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p), ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+
+class _MMsgHdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', _MsgHdr), ('msg_len', ctypes.c_uint)]
+
+
+def _load_sendmmsg():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        fn = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None
+    fn.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    fn.restype = ctypes.c_int
+    return fn
+
+
+_sendmmsg = _load_sendmmsg()
+
+
+def sendmmsg_supported():
+    return _sendmmsg is not None
+
+
+def _sockaddr(family, addr):
+    """Pack (host, port[, flowinfo, scope_id]) into a struct sockaddr_in/_in6"""
+    if family == socket.AF_INET:
+        return (struct.pack('=H', family) + struct.pack('!H', addr[1]) +
+                socket.inet_pton(socket.AF_INET, addr[0]) + b'\0' * 8)
+    flowinfo = addr[2] if len(addr) > 2 else 0
+    scope_id = addr[3] if len(addr) > 3 else 0
+    return (struct.pack('=H', family) + struct.pack('!HI', addr[1], flowinfo) +
+            socket.inet_pton(socket.AF_INET6, addr[0]) + struct.pack('=I', scope_id))
+
+
+class _HeaderCache(dict):
+    """
+    addr -> packed struct mmsghdr pointing at that peer's sockaddr and the
+    shared iovec. A batch is then one b''.join() of cached headers instead
+    of several ctypes attribute writes per recipient.
+    """
+
+    def __init__(self, family, iov):
+        super().__init__()
+        self.family = family
+        self.iov = iov
+        self.names = {}     # addr -> ctypes buffer that must stay alive
+
+    def __missing__(self, addr):
+        raw = _sockaddr(self.family, addr)
+        name = self.names[addr] = ctypes.create_string_buffer(raw, len(raw))
+        hdr = _MMsgHdr()
+        hdr.msg_hdr.msg_name = ctypes.addressof(name)
+        hdr.msg_hdr.msg_namelen = len(raw)
+        hdr.msg_hdr.msg_iov = ctypes.pointer(self.iov)
+        hdr.msg_hdr.msg_iovlen = 1
+        packed = self[addr] = bytes(hdr)
+        return packed
+
+    def forget(self, addr):
+        self.pop(addr, None)
+        self.names.pop(addr, None)
+
+
+class BatchSender:
+    """Send one payload to many addresses over a non-blocking UDP socket"""
+
+    def __init__(self, sock, batch_size=BATCH_SIZE, use_sendmmsg=True):
+        self.sock = sock
+        self.batch_size = min(batch_size, BATCH_SIZE)
+        self.use_sendmmsg = use_sendmmsg and _sendmmsg is not None
+        self.syscalls = 0
+        if self.use_sendmmsg:
+            self._iov = _IOVec()
+            self._headers = _HeaderCache(sock.family, self._iov)
+
+    def forget(self, addr):
+        """Drop the cached header of a peer that went away"""
+        if self.use_sendmmsg:
+            self._headers.forget(addr)
+
+    def send_many(self, payload, addrs):
+        """
+        Send `payload` to each address in `addrs` (a sequence).
+        Returns how many were sent, in order; fewer than len(addrs) means
+        the socket buffer is full (EAGAIN) and the rest should be retried.
+        """
+        if self.use_sendmmsg:
+            return self._send_mmsg(payload, addrs)
+        sent = 0
+        sendto = self.sock.sendto
+        for addr in addrs:
+            try:
+                sendto(payload, MSG_DONTWAIT, addr) if MSG_DONTWAIT else sendto(payload, addr)
+            except BlockingIOError:
+                break
+            except OSError:
+                pass        # Unreachable peer: skip it, like a lost datagram
+            sent += 1
+        self.syscalls += sent
+        return sent
+
+    def _send_mmsg(self, payload, addrs):
+        buf = ctypes.create_string_buffer(payload, len(payload))
+        self._iov.iov_base = ctypes.addressof(buf)
+        self._iov.iov_len = len(payload)
+        headers = self._headers
+        fd = self.sock.fileno()
+        total = 0
+        while total < len(addrs):
+            chunk = addrs[total:total + self.batch_size]
+            msgs = ctypes.create_string_buffer(b''.join(map(headers.__getitem__, chunk)))
+            n = _sendmmsg(fd, ctypes.addressof(msgs), len(chunk), MSG_DONTWAIT)
+            self.syscalls += 1
+            if n < 0:
+                err = ctypes.get_errno()
+                if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS):
+                    break
+                # Failure on the first message (e.g. unreachable peer): skip it
+                n = 1
+            total += n
+        return total
@@ -0,0 +1,148 @@
+"""
+Shared: Multi-process SO_REUSEPORT Sharding
+One asyncio event loop only uses one core. With SO_REUSEPORT, N processes
+can bind the same port and the kernel load-balances new connections
+between them.
+
+WorkerSupervisor forks the workers, restarts any that die, and merges the
+metric snapshots each worker pushes into one report.
+"""
+import os
+import sys
+import time
+import queue
+import socket
+import multiprocessing
+from datetime import datetime
+
+RESTART_BACKOFF = 1.0       # Seconds before respawning a crashed worker slot
+
+
+def reuse_port_supported():
+    return hasattr(socket, 'SO_REUSEPORT') and sys.platform != 'win32'
+
+
+class WorkerSupervisor:
+    """
+    Run `target(worker_id, metrics_queue)` in N forked processes.
+
+    Workers push `(worker_id, snapshot)` tuples on metrics_queue; snapshot
+    values must be additive (counters and gauges) so they can be summed.
+    Keys listed in `gauges` describe current state and are dropped when a
+    worker dies; everything else is a counter kept across restarts.
+    """
+
+    def __init__(self, target, num_workers, report_interval=10,
+                 gauges=('active_connections',), name='server'):
+        self.target = target
+        self.num_workers = num_workers
+        self.report_interval = report_interval
+        self.gauges = set(gauges)
+        self.name = name
+        self.ctx = multiprocessing.get_context('fork')
+        self.metrics_queue = self.ctx.Queue()
+        self.processes = {}         # worker_id -> Process
+        self.latest = {}            # worker_id -> last snapshot
+        self.retired = {}           # counters from workers that exited
+        self.restarts = 0
+
+    def _spawn(self, worker_id):
+        proc = self.ctx.Process(
+            target=self.target,
+            args=(worker_id, self.metrics_queue),
+            name=f"{self.name}-worker-{worker_id}",
+            daemon=True
+        )
+        proc.start()
+        self.processes[worker_id] = proc
+        print(f"[{self._timestamp()}] 👷 Worker {worker_id} started (pid {proc.pid})")
+
+    def _retire(self, worker_id):
+        """Fold a dead worker's counters into the running totals"""
+        snapshot = self.latest.pop(worker_id, {})
+        for key, value in snapshot.items():
+            if key not in self.gauges:
+                self.retired[key] = self.retired.get(key, 0) + value
+
+    def _drain_metrics(self):
+        while True:
+            try:
+                worker_id, snapshot = self.metrics_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.latest[worker_id] = snapshot
+
+    def _check_workers(self, last_death):
+        for worker_id, proc in list(self.processes.items()):
+            if proc.is_alive():
+                continue
+            proc.join()
+            self._drain_metrics()
+            self._retire(worker_id)
+            print(f"[{self._timestamp()}] 💀 Worker {worker_id} (pid {proc.pid}) "
+                  f"exited with code {proc.exitcode}")
+            # Avoid a tight crash loop if the worker dies on startup
+            wait = RESTART_BACKOFF - (time.monotonic() - last_death.get(worker_id, 0))
+            if wait > 0:
+                time.sleep(wait)
+            last_death[worker_id] = time.monotonic()
+            self.restarts += 1
+            self._spawn(worker_id)
+
+    def aggregate(self):
+        """Sum the latest snapshot of every worker plus retired counters"""
+        totals = dict(self.retired)
+        for snapshot in self.latest.values():
+            for key, value in snapshot.items():
+                totals[key] = totals.get(key, 0) + value
+        totals['workers'] = sum(1 for p in self.processes.values() if p.is_alive())
+        totals['restarts'] = self.restarts
+        return totals
+
+    def print_report(self):
+        totals = self.aggregate()
+        print(f"\n[{self._timestamp()}] 📊 Aggregated Metrics ({self.name}):")
+        for key in sorted(totals):
+            value = totals[key]
+            if isinstance(value, float):
+                value = f"{value:.2f}"
+            print(f"   ├─ {key}: {value}")
+        print(f"   └─ per-worker requests: "
+              f"{ {wid: s.get('total_requests', 0) for wid, s in sorted(self.latest.items())} }")
+
+    def run(self):
+        """Spawn workers and supervise until Ctrl+C"""
+        if not reuse_port_supported():
+            print("❌ SO_REUSEPORT is not available on this platform - use --workers 1")
+            sys.exit(1)
+
+        print(f"\n🚀 Supervisor pid {os.getpid()}: starting {self.num_workers} workers "
+              f"(SO_REUSEPORT)")
+        for worker_id in range(self.num_workers):
+            self._spawn(worker_id)
+
+        last_death = {}
+        next_report = time.monotonic() + self.report_interval
+        try:
+            while True:
+                time.sleep(0.5)
+                self._drain_metrics()
+                self._check_workers(last_death)
+                if time.monotonic() >= next_report:
+                    self.print_report()
+                    next_report += self.report_interval
+        except KeyboardInterrupt:
+            pass
+        finally:
+            print(f"\n[{self._timestamp()}] 🛑 Stopping workers...")
+            for proc in self.processes.values():
+                if proc.is_alive():
+                    proc.terminate()
+            for proc in self.processes.values():
+                proc.join(timeout=5)
+            self._drain_metrics()
+            self.print_report()
+
+    @staticmethod
+    def _timestamp():
+        return datetime.now().strftime("%H:%M:%S")
@@ -0,0 +1,9 @@
+"""
+pytest configuration. Unit tests sit next to the labs (1.x/test_*.py) and,
+like the lab scripts, put the repository root on sys.path themselves.
+1.1/test_lab1.1.py is a manual client for a running echo server, not a
+test module, so it is not collected.
+
+    python -m pytest -q
+"""
+collect_ignore = ['1.1/test_lab1.1.py']